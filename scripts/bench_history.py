@@ -0,0 +1,119 @@
+"""
+Benchmark de lectura de historial con muchas conversaciones activas.
+
+Mide la latencia de get_history() servida desde el cache en memoria
+(caso normal) y, como referencia, la de una lectura desde SQLite
+(cache miss).
+
+Uso:
+    python -m scripts.bench_history
+    python -m scripts.bench_history --conversations 100000 --turns 10 --max-mb 64
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from src.core.config import ClientConfig
+from src.domain.services.conversation_history import ConversationHistoryStore
+from src.infrastructure.cache.history_cache import ConversationHistoryCache
+
+
+def _client_config(database_url: str) -> ClientConfig:
+    return ClientConfig(
+        client_id="bench_client",
+        client_name="Bench",
+        plan="basic",
+        features={},
+        personality={},
+        messaging_config={},
+        ai_provider="gemini",
+        ai_config={},
+        database_url=database_url,
+    )
+
+
+def _percentiles(samples_ns: list[int]) -> dict:
+    samples_us = sorted(s / 1000 for s in samples_ns)
+    n = len(samples_us)
+    return {
+        "mean_us": round(statistics.fmean(samples_us), 2),
+        "p50_us": round(samples_us[n // 2], 2),
+        "p99_us": round(samples_us[min(n - 1, int(n * 0.99))], 2),
+        "max_us": round(samples_us[-1], 2),
+    }
+
+
+async def run(conversations: int, turns: int, max_mb: int, lookups: int, db_lookups: int):
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bench_history_"))
+    database_url = f"sqlite+aiosqlite:///{tmp_dir / 'bench.db'}"
+    client_config = _client_config(database_url)
+
+    cache = ConversationHistoryCache(max_turns=turns, max_bytes=max_mb * 1024 * 1024)
+    store = ConversationHistoryStore(cache, database_url)
+
+    phones = [f"whatsapp:+54911{i:08d}" for i in range(conversations)]
+    sample_turn = "¿A qué hora abren el domingo? Quería reservar para cuatro personas."
+
+    print(f"📋 Loading {conversations:,} conversations x {turns} turns into cache...")
+    start = time.perf_counter()
+    for phone in phones:
+        cache.put(client_config.client_id, phone, [
+            {'role': 'user' if t % 2 == 0 else 'assistant', 'content': sample_turn}
+            for t in range(turns)
+        ])
+    print(f"   done in {time.perf_counter() - start:.2f}s — {cache.stats()}")
+
+    # Cache hits (conversaciones que siguen en memoria)
+    cached_phones = [key[1] for key in cache._conversations.keys()]
+    samples = []
+    for _ in range(lookups):
+        phone = random.choice(cached_phones)
+        t0 = time.perf_counter_ns()
+        await store.get_history(client_config, phone)
+        samples.append(time.perf_counter_ns() - t0)
+
+    print()
+    print(f"⚡ get_history() cache hit ({lookups:,} lookups)")
+    print(f"   {_percentiles(samples)}")
+
+    # Cache miss: lectura desde SQLite
+    if db_lookups:
+        repository = store._repository(client_config)
+        miss_phones = [f"whatsapp:+1555{i:07d}" for i in range(db_lookups)]
+        for phone in miss_phones:
+            await repository.add_messages(phone, [
+                {'role': 'user', 'content': sample_turn} for _ in range(turns)
+            ])
+
+        samples = []
+        for phone in miss_phones:
+            t0 = time.perf_counter_ns()
+            await store.get_history(client_config, phone)
+            samples.append(time.perf_counter_ns() - t0)
+
+        print()
+        print(f"🐢 get_history() cache miss -> SQLite ({db_lookups:,} lookups)")
+        print(f"   {_percentiles(samples)}")
+
+    print()
+    print(f"📊 Final cache stats: {cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de historial de conversaciones")
+    parser.add_argument("--conversations", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--max-mb", type=int, default=256)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--db-lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.conversations, args.turns, args.max_mb, args.lookups, args.db_lookups))
+
+
+if __name__ == "__main__":
+    main()
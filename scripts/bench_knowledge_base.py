@@ -0,0 +1,150 @@
+"""
+Benchmark de la base de conocimiento (índice BM25 con mmap).
+
+Genera un corpus sintético (vocabulario con distribución Zipf, como un
+texto real, encabezado por las stopwords en español), construye el índice y mide la latencia de búsquedas top-k.
+Como referencia mide también la acumulación en Python puro
+(search_exhaustive) y verifica que ambas devuelvan los mismos scores.
+
+Uso:
+    python -m scripts.bench_knowledge_base
+    python -m scripts.bench_knowledge_base --passages 200000 --queries 5000 --k 3
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from itertools import accumulate
+from pathlib import Path
+
+from src.features.knowledge_base.index import STOPWORDS, KnowledgeIndex, build_index
+
+_SYLLABLES = [
+    "ca", "sa", "ma", "pa", "ta", "la", "ra", "na", "do", "lo", "to", "mo",
+    "ri", "ni", "li", "ci", "te", "de", "me", "re", "se", "ne", "bu", "cu",
+]
+
+
+def _vocabulary(size: int, rng: random.Random) -> list[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _corpus(passages: int, vocabulary_size: int, seed: int) -> tuple[list[str], set[str]]:
+    rng = random.Random(seed)
+    content_words = _vocabulary(vocabulary_size, rng)
+    rng.shuffle(content_words)
+
+    # Las palabras más frecuentes de un texto real son stopwords (tokenize() las descarta)
+    stopwords = sorted(STOPWORDS)
+    rng.shuffle(stopwords)
+    vocabulary = stopwords + content_words
+    weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    texts = []
+    for _ in range(passages):
+        words = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(30, 90))
+        texts.append(" ".join(words) + ".")
+
+    return texts, set(stopwords)
+
+
+def _percentiles(samples_ns: list[int]) -> dict:
+    samples_us = sorted(s / 1000 for s in samples_ns)
+    n = len(samples_us)
+    return {
+        "mean_us": round(statistics.fmean(samples_us), 1),
+        "p50_us": round(samples_us[n // 2], 1),
+        "p99_us": round(samples_us[min(n - 1, int(n * 0.99))], 1),
+        "max_us": round(samples_us[-1], 1),
+    }
+
+
+def _queries(texts: list[str], stopwords: set[str], count: int, seed: int) -> list[str]:
+    """
+    Consultas de 2 a 5 palabras tomadas de pasajes del corpus, como un
+    mensaje de usuario: 1 o 2 stopwords y el resto palabras de contenido.
+    """
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(count):
+        words = set(rng.choice(texts).rstrip(".").split())
+        content = sorted(words - stopwords)
+        common = sorted(words & stopwords)
+        picked = rng.sample(content, min(len(content), rng.randint(1, 3)))
+        picked += rng.sample(common, min(len(common), rng.randint(1, 2)))
+        rng.shuffle(picked)
+        queries.append(" ".join(picked))
+    return queries
+
+
+def _measure(search, queries: list[str], k: int) -> tuple[dict, list]:
+    results = []
+    samples = []
+    for query in queries:
+        t0 = time.perf_counter_ns()
+        found = search(query, k=k)
+        samples.append(time.perf_counter_ns() - t0)
+        results.append([result.score for result in found])
+    return _percentiles(samples), results
+
+
+def run(passages: int, vocabulary_size: int, queries_count: int, k: int, seed: int):
+    print(f"📝 Generating {passages:,} passages (vocabulary {vocabulary_size:,})...")
+    texts, stopwords = _corpus(passages, vocabulary_size, seed)
+
+    path = Path(tempfile.mkdtemp(prefix="bench_kb_")) / "bench.idx"
+    start = time.perf_counter()
+    build_index(texts, path)
+    print(
+        f"   index built in {time.perf_counter() - start:.1f}s — "
+        f"{path.stat().st_size / 1024 / 1024:.1f} MB on disk"
+    )
+
+    start = time.perf_counter()
+    index = KnowledgeIndex.open(path)
+    print(f"   opened (mmap) in {(time.perf_counter() - start) * 1000:.1f} ms — {index.vocabulary_size:,} terms")
+
+    queries = _queries(texts, stopwords, queries_count, seed)
+
+    # Calentar el page cache
+    _measure(index.search, queries[:200], k)
+
+    stats, fast = _measure(index.search, queries, k)
+    print()
+    print(f"⚡ search() top-{k} ({queries_count:,} queries)")
+    print(f"   {stats}")
+
+    stats, exhaustive = _measure(index.search_exhaustive, queries, k)
+    print()
+    print(f"🐢 search_exhaustive() top-{k} ({queries_count:,} queries)")
+    print(f"   {stats}")
+
+    # search() acumula en float32: se comparan scores con tolerancia
+    mismatches = sum(
+        1 for a, b in zip(fast, exhaustive)
+        if len(a) != len(b) or any(abs(x - y) > 1e-3 for x, y in zip(a, b))
+    )
+    print()
+    print(f"🎯 queries with different top-{k} scores: {mismatches}")
+
+    index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la base de conocimiento")
+    parser.add_argument("--passages", type=int, default=100_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=5_000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    run(args.passages, args.vocabulary, args.queries, args.k, args.seed)
+
+
+if __name__ == "__main__":
+    main()
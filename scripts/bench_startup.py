@@ -0,0 +1,256 @@
+"""
+Benchmark de arranque: tiempo de import y tiempo hasta el primer /ping.
+
+Cada medición corre en un proceso nuevo (como un worker que reinicia o
+una réplica nueva de autoscaling):
+
+- Import: `python -X importtime -c "import src.main"`. Reporta el total,
+  los paquetes que más tiempo suman y los módulos más lentos.
+- SDKs diferidos: verifica que importar la app no cargue los SDKs que se
+  importan recién cuando un cliente los usa (twilio.rest, providers de IA,
+  numpy).
+- Primer /ping: levanta uvicorn en un puerto libre y mide desde el spawn
+  hasta la primera respuesta 200 (incluye el lifespan completo).
+
+Termina con código 1 si el arranque supera los límites (--max-import-ms,
+--max-ping-ms) o si empeora más que --tolerance respecto de un baseline
+guardado con --save-baseline.
+
+Uso:
+    python -m scripts.bench_startup
+    python -m scripts.bench_startup --runs 10 --max-import-ms 1500 --max-ping-ms 4000
+    python -m scripts.bench_startup --save-baseline startup_baseline.json
+    python -m scripts.bench_startup --baseline startup_baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Módulos que no deben cargarse sólo por importar la app
+DEFERRED_MODULES = (
+    "twilio.rest",
+    "google.generativeai",
+    "anthropic",
+    "numpy",
+    "src.features.ai_responses.feature",
+    "src.features.knowledge_base.feature",
+)
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    # Sin watcher de configs: no forma parte del camino crítico del arranque
+    env.setdefault("CONFIG_WATCH_ENABLED", "false")
+    return env
+
+
+def _parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """Líneas de -X importtime -> [(módulo, self_us, cumulative_us)]"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        entries.append((module.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure_imports(runs: int) -> dict:
+    totals = []
+    packages: dict[str, list[int]] = defaultdict(list)
+    modules: dict[str, list[int]] = defaultdict(list)
+
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import src.main"],
+            cwd=ROOT, env=_env(), capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"import src.main failed:\n{result.stderr[-2000:]}")
+
+        entries = _parse_importtime(result.stderr)
+        totals.append(sum(self_us for _, self_us, _ in entries))
+
+        per_package: dict[str, int] = defaultdict(int)
+        for module, self_us, _ in entries:
+            top = module.split(".")[0]
+            per_package[top if top != "src" else ".".join(module.split(".")[:2])] += self_us
+            modules[module].append(self_us)
+        for package, us in per_package.items():
+            packages[package].append(us)
+
+    def median_ms(samples: list[int]) -> float:
+        return round(statistics.median(samples) / 1000, 1)
+
+    return {
+        "total_ms": median_ms(totals),
+        "min_ms": round(min(totals) / 1000, 1),
+        "packages_ms": dict(sorted(
+            ((package, median_ms(us)) for package, us in packages.items()),
+            key=lambda item: -item[1],
+        )),
+        "slowest_modules_ms": dict(sorted(
+            ((module, median_ms(us)) for module, us in modules.items()),
+            key=lambda item: -item[1],
+        )[:15]),
+    }
+
+
+def loaded_deferred_modules() -> list[str]:
+    """SDKs diferidos que igual se cargan al importar la app"""
+    code = (
+        "import sys, json, src.main; "
+        f"print(json.dumps([m for m in {list(DEFERRED_MODULES)!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import src.main failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_ping(timeout_seconds: float) -> float:
+    """Milisegundos desde el spawn de uvicorn hasta el primer /ping exitoso"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/ping"
+
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - start < timeout_seconds:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited early:\n{server.stderr.read()[-2000:]}")
+                try:
+                    if client.get(url).status_code == 200:
+                        return (time.perf_counter() - start) * 1000
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError(f"/ping did not answer within {timeout_seconds:.0f}s")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def measure_ping(runs: int, timeout_seconds: float) -> dict:
+    samples = [time_to_first_ping(timeout_seconds) for _ in range(runs)]
+    return {
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def check_regressions(report: dict, args) -> list[str]:
+    failures = []
+    import_ms = report["imports"]["total_ms"]
+    ping_ms = report["first_ping"]["median_ms"] if report.get("first_ping") else None
+
+    if report["deferred_modules_loaded"]:
+        failures.append(
+            f"deferred modules imported at startup: {', '.join(report['deferred_modules_loaded'])}"
+        )
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"import time {import_ms:.0f}ms > {args.max_import_ms:.0f}ms")
+    if args.max_ping_ms is not None and ping_ms is not None and ping_ms > args.max_ping_ms:
+        failures.append(f"time to first /ping {ping_ms:.0f}ms > {args.max_ping_ms:.0f}ms")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        limit = 1 + args.tolerance
+        if import_ms > baseline["imports"]["total_ms"] * limit:
+            failures.append(
+                f"import time {import_ms:.0f}ms vs baseline "
+                f"{baseline['imports']['total_ms']:.0f}ms (+{args.tolerance:.0%} allowed)"
+            )
+        if ping_ms is not None and baseline.get("first_ping") and (
+            ping_ms > baseline["first_ping"]["median_ms"] * limit
+        ):
+            failures.append(
+                f"time to first /ping {ping_ms:.0f}ms vs baseline "
+                f"{baseline['first_ping']['median_ms']:.0f}ms (+{args.tolerance:.0%} allowed)"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque (imports y primer /ping)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Paquetes/módulos a mostrar")
+    parser.add_argument("--skip-ping", action="store_true", help="Medir sólo imports")
+    parser.add_argument("--ping-timeout", type=float, default=30.0)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-ping-ms", type=float, default=None)
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento permitido vs baseline")
+    parser.add_argument("--save-baseline", help="Guardar el reporte como baseline")
+    parser.add_argument("--json", action="store_true", help="Imprimir el reporte en JSON")
+    args = parser.parse_args()
+
+    report = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "imports": measure_imports(args.runs),
+        "deferred_modules_loaded": loaded_deferred_modules(),
+        "first_ping": None if args.skip_ping else measure_ping(args.runs, args.ping_timeout),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        imports = report["imports"]
+        print(f"📦 import src.main: {imports['total_ms']:.0f}ms median (min {imports['min_ms']:.0f}ms, {args.runs} runs)")
+        for package, ms in list(imports["packages_ms"].items())[:args.top]:
+            print(f"   {ms:8.1f}ms  {package}")
+        print("🐢 slowest modules (self time)")
+        for module, ms in list(imports["slowest_modules_ms"].items())[:args.top]:
+            print(f"   {ms:8.1f}ms  {module}")
+        loaded = report["deferred_modules_loaded"]
+        print(f"💤 deferred modules loaded at startup: {', '.join(loaded) if loaded else 'none'}")
+        if report["first_ping"]:
+            ping = report["first_ping"]
+            print(
+                f"🏓 time to first /ping: {ping['median_ms']:.0f}ms median "
+                f"(min {ping['min_ms']:.0f}ms, max {ping['max_ms']:.0f}ms)"
+            )
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2))
+        print(f"💾 Baseline saved to {args.save_baseline}")
+
+    failures = check_regressions(report, args)
+    for failure in failures:
+        print(f"❌ Startup regression: {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark del índice vectorial (int8 + IVF opcional, mmap).
+
+Genera embeddings sintéticos agrupados en clusters (como los de textos
+reales, que se concentran por tema), construye un índice plano y uno
+IVF, y compara latencia y recall@k contra la búsqueda exacta en float32
+(producto de matrices sobre todos los vectores).
+
+Uso:
+    python -m scripts.bench_vector_index
+    python -m scripts.bench_vector_index --vectors 200000 --dim 384 --lists 512
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.infrastructure.ai.embeddings import normalize_rows
+from src.infrastructure.ai.vector_index import VectorIndex, build_vector_index
+
+
+def _corpus(vectors: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((clusters, dim), dtype=np.float32))
+    assignment = rng.integers(0, clusters, vectors)
+    noise = rng.standard_normal((vectors, dim), dtype=np.float32) / np.sqrt(dim)
+    return normalize_rows(centers[assignment] + 1.0 * noise)
+
+
+def _queries(corpus: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Consultas cercanas (pero no iguales) a vectores del corpus"""
+    rng = np.random.default_rng(seed + 1)
+    picked = corpus[rng.integers(0, len(corpus), count)]
+    noise = rng.standard_normal(picked.shape, dtype=np.float32) / np.sqrt(corpus.shape[1])
+    return normalize_rows(picked + 0.5 * noise)
+
+
+def _percentiles(samples_ns: list[int]) -> dict:
+    samples_us = sorted(s / 1000 for s in samples_ns)
+    n = len(samples_us)
+    return {
+        "mean_us": round(statistics.fmean(samples_us), 1),
+        "p50_us": round(samples_us[n // 2], 1),
+        "p99_us": round(samples_us[min(n - 1, int(n * 0.99))], 1),
+    }
+
+
+def _exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _measure_exact(corpus: np.ndarray, queries: np.ndarray, k: int) -> dict:
+    samples = []
+    for query in queries:
+        t0 = time.perf_counter_ns()
+        scores = corpus @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top[np.argsort(-scores[top])]
+        samples.append(time.perf_counter_ns() - t0)
+    return _percentiles(samples)
+
+
+def _measure(index: VectorIndex, queries: np.ndarray, k: int, n_probe, truth: np.ndarray) -> tuple[dict, float]:
+    samples = []
+    found = []
+    for query in queries:
+        t0 = time.perf_counter_ns()
+        doc_ids, _ = index.search(query, k=k, n_probe=n_probe)
+        samples.append(time.perf_counter_ns() - t0)
+        found.append(doc_ids[0])
+
+    recall = statistics.fmean(
+        len(set(result.tolist()) & set(expected.tolist())) / k
+        for result, expected in zip(found, truth)
+    )
+    return _percentiles(samples), recall
+
+
+def _measure_batch(index: VectorIndex, queries: np.ndarray, k: int, n_probe, batch: int) -> float:
+    """Consultas por segundo buscando en lotes"""
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch):
+        index.search(queries[offset:offset + batch], k=k, n_probe=n_probe)
+    return len(queries) / (time.perf_counter() - start)
+
+
+def run(vectors: int, dim: int, clusters: int, n_lists: int, queries_count: int, k: int, seed: int):
+    print(f"📝 Generating {vectors:,} vectors of {dim} dims ({clusters:,} clusters)...")
+    corpus = _corpus(vectors, dim, clusters, seed)
+    queries = _queries(corpus, queries_count, seed)
+    truth = _exact_top_k(corpus, queries, k)
+    texts = [""] * vectors
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_vec_"))
+    indexes = {}
+    for label, lists in (("flat", 0), (f"ivf{n_lists}", n_lists)):
+        path = workdir / f"{label}.vec"
+        start = time.perf_counter()
+        build_vector_index(corpus, texts, path, "bench", n_lists=lists)
+        print(
+            f"   {label}: built in {time.perf_counter() - start:.1f}s — "
+            f"{path.stat().st_size / 1024 / 1024:.1f} MB on disk "
+            f"(float32: {corpus.nbytes / 1024 / 1024:.1f} MB)"
+        )
+        indexes[label] = VectorIndex.open(path)
+
+    print()
+    print(f"🎯 exact float32 top-{k} ({queries_count:,} queries)")
+    print(f"   {_measure_exact(corpus, queries, k)}")
+
+    flat = indexes["flat"]
+    int8_flat = VectorIndex.open(workdir / "flat.vec", dequantize_max_bytes=0)
+    for label, index in (("flat (dequantized)", flat), ("int8 flat (mmap scan)", int8_flat)):
+        _measure(index, queries[:50], k, None, truth[:50])
+        stats, recall = _measure(index, queries, k, None, truth)
+        print()
+        print(f"⚡ {label} top-{k}: recall@{k}={recall:.3f}")
+        print(f"   {stats}")
+        print(f"   batched (64): {_measure_batch(index, queries, k, None, 64):,.0f} queries/s")
+    int8_flat.close()
+
+    ivf = indexes[f"ivf{n_lists}"]
+    for n_probe in (1, 4, 8, 16, 32):
+        if n_probe > n_lists:
+            break
+        stats, recall = _measure(ivf, queries, k, n_probe, truth)
+        print()
+        print(f"⚡ int8 ivf{n_lists} n_probe={n_probe} top-{k}: recall@{k}={recall:.3f}")
+        print(f"   {stats}")
+
+    for index in indexes.values():
+        index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice vectorial")
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=1_000)
+    parser.add_argument("--lists", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    run(args.vectors, args.dim, args.clusters, args.lists, args.queries, args.k, args.seed)
+
+
+if __name__ == "__main__":
+    main()
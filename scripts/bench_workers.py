@@ -0,0 +1,314 @@
+"""
+Benchmark de workers: throughput de 1 a N workers y memoria por worker.
+
+Para cada cantidad de workers levanta `python -m src.server --workers N`
+(clientes con FakeProvider y un Twilio falso, como scripts.load_test) y
+lo satura en lazo cerrado: --concurrency requests en vuelo repartidos en
+--generators procesos, cada uno enviando el siguiente apenas recibe la
+respuesta. Reporta:
+
+- Throughput (requests/s), speedup respecto de 1 worker y eficiencia
+  (speedup / workers), con latencia p50/p99.
+- Memoria de cada worker (rss, pss y uss de /proc/<pid>/smaps_rollup) y
+  del padre. rss - uss es lo que el worker sigue compartiendo con el
+  padre (config, imports) gracias al fork después de gc.freeze().
+
+El generador corre en la misma máquina: para que el escalado sea real
+necesita cores propios (workers + generators <= cores).
+
+Uso:
+    python -m scripts.bench_workers
+    python -m scripts.bench_workers --workers 1,2,4,8 --duration 15 --concurrency 128
+    python -m scripts.bench_workers --llm-latency fixed:0.05 --output workers.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from scripts.load_test import (  # noqa: E402
+    FakeTwilio,
+    ServerThread,
+    _free_port,
+    parse_latency,
+    percentiles,
+    twilio_form,
+    write_tenants,
+)
+from src.server import read_memory  # noqa: E402
+
+
+def _children(pid: int) -> List[int]:
+    """Procesos hijos de pid (los workers del servidor)"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+
+    children = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # pid (comm) state ppid ...: comm puede tener espacios
+            stat = (entry / "stat").read_text()
+            if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+                children.append(int(entry.name))
+        except (OSError, ValueError, IndexError):
+            continue
+    return children
+
+
+def _mb(value: float) -> float:
+    return round(value / 2**20, 1)
+
+
+def generator_process(base_url: str, tenants: List[Dict[str, str]], concurrency: int,
+                      warmup: float, duration: float, timeout: float, seed: int) -> Dict[str, Any]:
+    """Un proceso generador: concurrency loops que envían un request tras otro"""
+
+    async def main():
+        rng = random.Random(seed)
+        phones = [f"+549{rng.randrange(10**9, 10**10)}" for _ in range(500)]
+        latencies: List[float] = []
+        errors = 0
+        start = time.perf_counter()
+        measure_from = start + warmup
+        end = measure_from + duration
+
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+
+            async def loop():
+                nonlocal errors
+                while True:
+                    sent = time.perf_counter()
+                    if sent >= end:
+                        return
+                    form = twilio_form(rng.choice(tenants), rng.choice(phones), rng)
+                    try:
+                        response = await client.post("/webhook/whatsapp", data=form)
+                        ok = response.status_code == 200
+                    except httpx.HTTPError:
+                        ok = False
+                    finished = time.perf_counter()
+                    if sent >= measure_from and finished <= end:
+                        if ok:
+                            latencies.append(finished - sent)
+                        else:
+                            errors += 1
+
+            await asyncio.gather(*(loop() for _ in range(concurrency)))
+
+        return {"latencies": latencies, "errors": errors}
+
+    return asyncio.run(main())
+
+
+def _wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/ping", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def measure(workers: int, tenants: List[Dict[str, str]], workdir: Path, env: Dict[str, str], args) -> Dict[str, Any]:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.server", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir,
+        env=env,
+    )
+    try:
+        _wait_ready(base_url, process)
+
+        per_generator = max(1, args.concurrency // args.generators)
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(args.generators) as pool:
+            pending = [
+                pool.apply_async(generator_process, (
+                    base_url, tenants, per_generator, args.warmup, args.duration, args.timeout, args.seed + index,
+                ))
+                for index in range(args.generators)
+            ]
+            results = [result.get() for result in pending]
+
+        # Memoria medida con los workers ya calientes (después de la carga)
+        worker_memory = [memory for memory in map(read_memory, _children(process.pid)) if memory]
+        parent_memory = read_memory(process.pid)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    report: Dict[str, Any] = {
+        "workers": workers,
+        "completed": len(latencies),
+        "errors": sum(result["errors"] for result in results),
+        "throughput_per_second": round(len(latencies) / args.duration, 2),
+        "latency_ms": percentiles(latencies),
+        "memory_mb": None,
+    }
+    if worker_memory:
+        report["memory_mb"] = {
+            "worker": {
+                key: _mb(statistics.fmean(memory[key] for memory in worker_memory))
+                for key in ("rss", "pss", "uss")
+            },
+            "worker_shared": _mb(statistics.fmean(memory["rss"] - memory["uss"] for memory in worker_memory)),
+            "parent": {key: _mb(value) for key, value in (parent_memory or {}).items()},
+            # Memoria real del conjunto (pss reparte lo compartido entre quienes lo comparten)
+            "total_pss": _mb(sum(memory["pss"] for memory in worker_memory) + (parent_memory or {}).get("pss", 0)),
+        }
+    return report
+
+
+def run(args) -> Dict[str, Any]:
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="bench_workers_")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    fake_twilio = FakeTwilio(args.twilio_latency, 0.0, args.seed)
+    twilio_port = _free_port()
+    twilio_thread = ServerThread(fake_twilio, twilio_port, "fake-twilio")
+    twilio_thread.start()
+    twilio_thread.wait_started()
+
+    # write_tenants deja las credenciales de cada cliente en os.environ
+    tenants = write_tenants(workdir, args)
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")])),
+        "TWILIO_API_BASE_URL": f"http://127.0.0.1:{twilio_port}",
+        "CONFIG_WATCH_ENABLED": "false",
+        "RATE_LIMIT_ENABLED": "false",
+        "WEBHOOK_MODE": "sync",
+        "LOG_LEVEL": "WARNING",
+        "LOG_DEBUG_SAMPLE_RATE": "0",
+        "METRICS_MULTIPROCESS_DIR": str(workdir / "metrics"),
+    })
+
+    results = []
+    for workers in args.workers:
+        print(f"⏱️  {workers} worker(s)...", file=sys.stderr)
+        results.append(measure(workers, tenants, workdir, env, args))
+
+    twilio_thread.stop()
+
+    baseline = next((result for result in results if result["workers"] == 1), None)
+    for result in results:
+        if baseline and baseline["throughput_per_second"]:
+            speedup = result["throughput_per_second"] / baseline["throughput_per_second"]
+            result["speedup"] = round(speedup, 2)
+            result["efficiency"] = round(speedup / result["workers"], 2)
+
+    return {
+        "config": {
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "generators": args.generators,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "tenants": args.tenants,
+            "llm_latency": args.llm_latency,
+            "twilio_latency": args.twilio_latency,
+        },
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+
+
+def _print_table(report: Dict[str, Any]):
+    print(
+        f"{'workers':>7} {'req/s':>9} {'speedup':>8} {'effic.':>7} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'rss MB':>7} {'pss MB':>7} {'uss MB':>7} {'shared':>7} {'total':>7}",
+        file=sys.stderr,
+    )
+    for result in report["results"]:
+        memory = result["memory_mb"] or {}
+        worker = memory.get("worker", {})
+        print(
+            f"{result['workers']:>7} {result['throughput_per_second']:>9} "
+            f"{result.get('speedup', '-'):>8} {result.get('efficiency', '-'):>7} "
+            f"{result['latency_ms']['p50']:>8} {result['latency_ms']['p99']:>8} "
+            f"{worker.get('rss', '-'):>7} {worker.get('pss', '-'):>7} {worker.get('uss', '-'):>7} "
+            f"{memory.get('worker_shared', '-'):>7} {memory.get('total_pss', '-'):>7}",
+            file=sys.stderr,
+        )
+
+
+def _worker_counts(value: str) -> List[int]:
+    counts = sorted({int(count) for count in value.split(",") if count.strip()})
+    if not counts or counts[0] < 1:
+        raise argparse.ArgumentTypeError("expected a comma-separated list of positive integers")
+    return counts
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = ",".join(str(count) for count in sorted({1, *[2 ** i for i in range(1, 8) if 2 ** i <= cpus], cpus}))
+
+    parser = argparse.ArgumentParser(description="Throughput y memoria de 1 a N workers pre-forkeados")
+    parser.add_argument("--workers", type=_worker_counts, default=_worker_counts(default_workers),
+                        help=f"Cantidades de workers a medir (default: {default_workers})")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requests en vuelo en total")
+    parser.add_argument("--generators", type=int, default=max(1, min(4, cpus // 4)),
+                        help="Procesos generadores de carga")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos medidos por corrida")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Segundos iniciales sin medir")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--llm-latency", type=parse_latency, default=parse_latency("fixed:0.01"))
+    parser.add_argument("--twilio-latency", type=parse_latency, default=parse_latency("fixed:0.005"))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workdir", help="Directorio de trabajo (default: temporal)")
+    parser.add_argument("--output", help="Archivo JSON con el reporte")
+    args = parser.parse_args()
+
+    # Opciones de FakeProvider que write_tenants espera (sin errores: se mide capacidad)
+    args.llm_error_rate = 0.0
+    args.llm_chunk_chars = 24
+    args.llm_script = None
+    args.streaming = False
+
+    report = run(args)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text)
+        print(f"💾 Report written to {args.output}", file=sys.stderr)
+    print(text)
+    _print_table(report)
+
+
+if __name__ == "__main__":
+    main()
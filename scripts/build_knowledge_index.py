@@ -0,0 +1,140 @@
+"""
+Construye el índice de la base de conocimiento de un cliente.
+
+Lee los documentos (.md/.txt) de features.knowledge_base.config.documents_path,
+los divide en pasajes y escribe el índice BM25 en index_path. Si el
+cliente configura vector_index_path, escribe también el índice vectorial
+de los mismos pasajes con el embedder configurado.
+
+Uso:
+    python -m scripts.build_knowledge_index --client restaurante_pepe
+    python -m scripts.build_knowledge_index --all
+    python -m scripts.build_knowledge_index --documents ./docs --output ./data/kb.idx
+    python -m scripts.build_knowledge_index --documents ./docs --output ./data/kb.idx --vector-output ./data/kb.vec
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.core.config import get_config_manager
+from src.features.knowledge_base.index import KnowledgeIndex, build_index, load_document_passages
+from src.infrastructure.ai.embeddings import create_embedder
+from src.infrastructure.ai.vector_index import build_vector_index
+
+
+def build_vectors(passages: List[str], output: Path, embedder_config: Dict[str, Any], n_lists: int):
+    embedder = create_embedder(embedder_config)
+
+    start = time.perf_counter()
+    vectors = asyncio.run(embedder.embed(passages))
+    count = build_vector_index(vectors, passages, output, embedder.name, n_lists=n_lists)
+    elapsed = time.perf_counter() - start
+
+    size_kb = output.stat().st_size / 1024
+    print(
+        f"✓ {output}: {count:,} vectors ({embedder.name}, {n_lists} lists), "
+        f"{size_kb:,.1f} KB in {elapsed:.2f}s"
+    )
+
+
+def build(
+    documents_dir: Path,
+    output: Path,
+    max_chars: int,
+    vector_output: Optional[Path] = None,
+    embedder_config: Optional[Dict[str, Any]] = None,
+    n_lists: int = 0
+):
+    if not documents_dir.is_dir():
+        print(f"❌ Documents directory not found: {documents_dir}")
+        return False
+
+    passages = list(load_document_passages(documents_dir, max_chars))
+
+    start = time.perf_counter()
+    count = build_index(passages, output)
+    elapsed = time.perf_counter() - start
+
+    index = KnowledgeIndex.open(output)
+    terms = index.vocabulary_size
+    index.close()
+
+    size_kb = output.stat().st_size / 1024
+    print(
+        f"✓ {output}: {count:,} passages, {terms:,} terms, "
+        f"{size_kb:,.1f} KB in {elapsed:.2f}s"
+    )
+
+    if vector_output:
+        build_vectors(passages, vector_output, embedder_config or {}, n_lists)
+    return True
+
+
+def build_client(client_id: str, max_chars: int) -> bool:
+    config_manager = get_config_manager()
+    try:
+        client_config = config_manager.get_client_config(client_id)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+
+    feature = client_config.features.get('knowledge_base')
+    if feature is None:
+        print(f"⚠️  Client '{client_id}' has no knowledge_base feature configured, skipping")
+        return True
+
+    documents_path = feature.config.get('documents_path')
+    index_path = feature.config.get('index_path')
+    if not documents_path or not index_path:
+        print(f"❌ Client '{client_id}': knowledge_base needs documents_path and index_path")
+        return False
+
+    vector_index_path = feature.config.get('vector_index_path')
+
+    print(f"📚 Building knowledge base for '{client_id}'...")
+    return build(
+        Path(documents_path),
+        Path(index_path),
+        max_chars,
+        vector_output=Path(vector_index_path) if vector_index_path else None,
+        embedder_config=feature.config.get('embedder', {}),
+        n_lists=feature.config.get('n_lists', 0)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye índices de la base de conocimiento")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--client", help="ID del cliente")
+    target.add_argument("--all", action="store_true", help="Todos los clientes con knowledge_base")
+    target.add_argument("--documents", type=Path, help="Directorio de documentos (requiere --output)")
+    parser.add_argument("--output", type=Path, help="Ruta del índice a generar")
+    parser.add_argument("--vector-output", type=Path, help="Índice vectorial a generar (con --documents)")
+    parser.add_argument("--n-lists", type=int, default=0, help="Particiones IVF del índice vectorial")
+    parser.add_argument("--max-passage-chars", type=int, default=600)
+    args = parser.parse_args()
+
+    if args.documents:
+        if not args.output:
+            parser.error("--documents requires --output")
+        ok = build(
+            args.documents, args.output, args.max_passage_chars,
+            vector_output=args.vector_output, n_lists=args.n_lists
+        )
+    elif args.all:
+        results = [
+            build_client(client_id, args.max_passage_chars)
+            for client_id in get_config_manager().list_clients()
+        ]
+        ok = all(results)
+    else:
+        ok = build_client(args.client, args.max_passage_chars)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,563 @@
+"""
+Prueba de carga end-to-end: la app real contra un Twilio y un LLM falsos.
+
+Todo corre en este proceso, sin red externa ni credenciales:
+
+- LLM: cada cliente usa FakeProvider con la latencia (distribución) y la
+  tasa de errores pedidas (también acepta un script de pasos).
+- Twilio: un servidor HTTP local que imita POST .../Messages.json con su
+  propia distribución de latencia y tasa de errores (TWILIO_API_BASE_URL).
+- App: src.main:app servida por uvicorn en un thread con su propio event
+  loop, donde además se mide el lag del loop.
+- Generador: envía formularios de webhook como los de Twilio a
+  /webhook/whatsapp a una tasa objetivo (llegadas Poisson, lazo abierto),
+  repartidos entre muchos clientes y teléfonos.
+
+La latencia se mide desde el momento en que el request *debía* salir (no
+cuando salió), así una app saturada no esconde su cola (coordinated
+omission). Generador, app y fakes comparten el GIL: los números sirven
+para comparar corridas entre sí, no como capacidad absoluta de un worker.
+
+Uso:
+    python -m scripts.load_test
+    python -m scripts.load_test --rate 200 --duration 30 --tenants 20 --phones 5000
+    python -m scripts.load_test --llm-latency lognormal:0.8:0.5 --llm-error-rate 0.02 \\
+        --twilio-latency uniform:0.05:0.3 --twilio-error-rate 0.01 --output load.json
+    python -m scripts.load_test --mode ack_first --llm-script '[{"delay_seconds": 2}, {"error": "boom"}]'
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+import httpx
+import uvicorn
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.features.ai_responses.providers.fake_provider import sample_latency  # noqa: E402
+
+SAMPLE_MESSAGES = [
+    "Hola",
+    "Buenas tardes, ¿están abiertos?",
+    "¿Cuál es el horario de atención?",
+    "Quiero hacer un pedido para dos personas",
+    "¿Hacen envíos a domicilio?",
+    "¿Cuánto sale la pizza grande de muzzarella?",
+    "Gracias!",
+    "¿Aceptan tarjeta de crédito?",
+    "Necesito cambiar la dirección de mi pedido, ¿se puede?",
+    "¿Tienen opciones sin TACC?",
+]
+
+
+def parse_latency(spec: str) -> Optional[Dict[str, Any]]:
+    """
+    "lognormal:0.8:0.5" -> {distribution: lognormal, median_seconds: 0.8, sigma: 0.5}
+
+    Formatos: none, fixed:S, uniform:MIN:MAX, exponential:MEAN, lognormal:MEDIAN[:SIGMA]
+    """
+    name, *values = spec.split(":")
+    numbers = [float(value) for value in values]
+    if name == "none":
+        return None
+    if name == "fixed":
+        return {"distribution": "fixed", "seconds": numbers[0]}
+    if name == "uniform":
+        return {"distribution": "uniform", "min_seconds": numbers[0], "max_seconds": numbers[1]}
+    if name == "exponential":
+        return {"distribution": "exponential", "mean_seconds": numbers[0]}
+    if name == "lognormal":
+        return {
+            "distribution": "lognormal",
+            "median_seconds": numbers[0],
+            "sigma": numbers[1] if len(numbers) > 1 else 0.5,
+        }
+    raise argparse.ArgumentTypeError(f"Unknown latency spec: {spec}")
+
+
+def percentiles(samples: List[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max (en ms por defecto)"""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def pick(p: float) -> float:
+        return round(ordered[min(n - 1, int(p * n))] * scale, 2)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1] * scale, 2)}
+
+
+class FakeTwilio:
+    """
+    App ASGI que imita el endpoint de envío de mensajes de Twilio.
+
+    Args:
+        latency: Distribución de latencia (ver sample_latency)
+        error_rate: Fracción de envíos que responden 500
+        seed: Semilla del sorteo
+    """
+
+    def __init__(self, latency: Optional[Dict[str, Any]], error_rate: float, seed: int):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.received: Counter = Counter()
+        self.failed = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        # /2010-04-01/Accounts/{AccountSid}/Messages.json
+        parts = scope["path"].strip("/").split("/")
+        account = parts[2] if len(parts) > 2 else "unknown"
+
+        delay = sample_latency(self.latency, self.rng)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.failed += 1
+            status, payload = 500, {"code": 20500, "message": "simulated error"}
+        else:
+            self.received[account] += 1
+            form = parse_qs(body.decode())
+            status, payload = 201, {
+                "sid": f"SM{uuid.uuid4().hex}",
+                "status": "queued",
+                "to": (form.get("To") or [""])[0],
+            }
+
+        content = json.dumps(payload).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode())],
+        })
+        await send({"type": "http.response.body", "body": content})
+
+
+class LoopLagMonitor:
+    """Mide cuánto se atrasa un sleep corto en el event loop donde corre"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def reset(self):
+        self.samples = []
+
+
+class ServerThread(threading.Thread):
+    """Servidor uvicorn en un thread con su propio event loop (y monitor de lag)"""
+
+    def __init__(self, app: Any, port: int, name: str):
+        super().__init__(name=name, daemon=True)
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", log_config=None,
+            lifespan="on", access_log=False,
+        ))
+        self.lag = LoopLagMonitor()
+
+    def run(self):
+        async def main():
+            monitor = asyncio.create_task(self.lag.run())
+            try:
+                await self.server.serve()
+            finally:
+                monitor.cancel()
+
+        asyncio.run(main())
+
+    def wait_started(self, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"{self.name} did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(timeout=30)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def tenant_number(index: int) -> str:
+    return f"+1555{index:07d}"
+
+
+def write_tenants(workdir: Path, args) -> List[Dict[str, str]]:
+    """Un YAML por cliente, todos con FakeProvider; devuelve [{client_id, number}]"""
+    clients_dir = workdir / "configs" / "clients"
+    clients_dir.mkdir(parents=True, exist_ok=True)
+
+    provider_config: Dict[str, Any] = {
+        "reply": "Gracias por tu mensaje. Te respondo enseguida: {message}",
+        "chunk_chars": args.llm_chunk_chars,
+        "error_rate": args.llm_error_rate,
+    }
+    if args.llm_latency:
+        provider_config["latency"] = args.llm_latency
+    if args.llm_script:
+        provider_config["script"] = json.loads(args.llm_script)
+
+    tenants = []
+    for index in range(args.tenants):
+        client_id = f"load_{index:03d}"
+        config = {
+            "client_id": client_id,
+            "client_name": f"Load {index}",
+            "plan": "pro",
+            "features": {
+                "ai_responses": {
+                    "enabled": True,
+                    "config": {
+                        "provider": "fake",
+                        "provider_config": {**provider_config, "seed": args.seed + index},
+                        "streaming": {"enabled": args.streaming},
+                    },
+                },
+            },
+            "personality": {
+                "name": f"Load Bot {index}",
+                "system_prompt": "Sos un asistente de prueba de carga.",
+                "fallback_messages": ["No pude responder"],
+            },
+            "messaging_provider": "twilio",
+            "messaging_config": {"whatsapp_number": tenant_number(index)},
+            "ai_provider": "fake",
+            "ai_config": {},
+            "database_url": f"sqlite+aiosqlite:///{workdir / f'{client_id}.db'}",
+        }
+        (clients_dir / f"{client_id}.yaml").write_text(yaml.safe_dump(config, allow_unicode=True))
+
+        env_id = client_id.upper()
+        os.environ[f"TWILIO_ACCOUNT_SID_{env_id}"] = f"AC{index:032d}"
+        os.environ[f"TWILIO_AUTH_TOKEN_{env_id}"] = "load-test-token"
+        os.environ[f"TWILIO_WHATSAPP_NUMBER_{env_id}"] = tenant_number(index)
+        tenants.append({"client_id": client_id, "number": tenant_number(index), "account": f"AC{index:032d}"})
+
+    return tenants
+
+
+def twilio_form(tenant: Dict[str, str], phone: str, rng: random.Random) -> Dict[str, str]:
+    """Formulario como el que envía Twilio por un mensaje entrante de WhatsApp"""
+    sid = f"SM{uuid.uuid4().hex}"
+    return {
+        "SmsMessageSid": sid,
+        "MessageSid": sid,
+        "SmsSid": sid,
+        "AccountSid": tenant["account"],
+        "MessagingServiceSid": "",
+        "From": f"whatsapp:{phone}",
+        "To": f"whatsapp:{tenant['number']}",
+        "Body": rng.choice(SAMPLE_MESSAGES),
+        "NumMedia": "0",
+        "NumSegments": "1",
+        "ProfileName": f"Usuario {phone[-4:]}",
+        "WaId": phone.lstrip("+"),
+        "SmsStatus": "received",
+        "ApiVersion": "2010-04-01",
+    }
+
+
+async def generate_load(base_url: str, tenants: List[Dict[str, str]], args, on_measure_start) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    phones = [f"+549{rng.randrange(10**9, 10**10)}" for _ in range(args.phones)]
+
+    # Clientes con carga desigual (Zipf) si tenant_skew > 0
+    weights = [1 / (rank + 1) ** args.tenant_skew for rank in range(len(tenants))]
+    cum_weights = [sum(weights[:rank + 1]) for rank in range(len(weights))]
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    measuring = False
+    in_flight = 0
+    max_in_flight = 0
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+
+        async def fire(intended: float, form: Dict[str, str], counted: bool):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            try:
+                response = await client.post("/webhook/whatsapp", data=form)
+                status = str(response.status_code)
+                if response.status_code == 200:
+                    status = f"200:{response.json().get('status')}"
+            except httpx.HTTPError as e:
+                status = "error"
+                if counted:
+                    errors[type(e).__name__] += 1
+            finally:
+                in_flight -= 1
+
+            if counted:
+                statuses[status] += 1
+                latencies.append(time.perf_counter() - intended)
+
+        loop_start = time.perf_counter()
+        warmup_end = loop_start + args.warmup
+        end = warmup_end + args.duration
+        next_at = loop_start
+        tasks = set()
+        sent = 0
+
+        while next_at < end:
+            now = time.perf_counter()
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+
+            if not measuring and next_at >= warmup_end:
+                measuring = True
+                on_measure_start()
+
+            tenant = rng.choices(tenants, cum_weights=cum_weights)[0]
+            form = twilio_form(tenant, rng.choice(phones), rng)
+            task = asyncio.create_task(fire(next_at, form, measuring))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            if measuring:
+                sent += 1
+
+            next_at += rng.expovariate(args.rate)
+
+        send_window = time.perf_counter() - warmup_end
+        if tasks:
+            await asyncio.wait(tasks, timeout=args.timeout)
+        elapsed = time.perf_counter() - warmup_end
+
+    completed = sum(statuses.values())
+    return {
+        "sent": sent,
+        "completed": completed,
+        "offered_rate": round(sent / send_window, 2) if send_window > 0 else None,
+        "throughput_per_second": round(completed / elapsed, 2) if elapsed > 0 else None,
+        "elapsed_seconds": round(elapsed, 2),
+        "max_in_flight": max_in_flight,
+        "statuses": dict(statuses),
+        "client_errors": dict(errors),
+        "latency_ms": percentiles(latencies),
+        "latency_mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+def stage_means(metrics_text: str) -> Dict[str, Any]:
+    """Duración media por etapa y envíos según /metrics"""
+    sums: Counter = Counter()
+    counts: Counter = Counter()
+    sends: Counter = Counter()
+    retries: Counter = Counter()
+    ai_errors = 0.0
+    guard_rejections = 0.0
+
+    for line in metrics_text.splitlines():
+        if line.startswith("#") or " " not in line:
+            continue
+        series, value = line.rsplit(" ", 1)
+        labels = dict(
+            pair.split("=", 1) for pair in series[series.find("{") + 1:-1].split(",") if "=" in pair
+        )
+        labels = {key: label.strip('"') for key, label in labels.items()}
+
+        if series.startswith("whatsapp_stage_duration_seconds_sum"):
+            sums[labels["stage"]] += float(value)
+        elif series.startswith("whatsapp_stage_duration_seconds_count"):
+            counts[labels["stage"]] += float(value)
+        elif series.startswith("whatsapp_messages_sent_total"):
+            sends[labels["status"]] += float(value)
+        elif series.startswith("whatsapp_outbound_retries_total"):
+            retries[labels["reason"]] += float(value)
+        elif series.startswith("whatsapp_ai_errors_total"):
+            ai_errors += float(value)
+        elif series.startswith("whatsapp_ai_provider_stat") and labels.get("stat") == "rejected":
+            guard_rejections += float(value)
+
+    return {
+        "stage_mean_ms": {
+            stage: round(sums[stage] / counts[stage] * 1000, 2) for stage in sorted(counts) if counts[stage]
+        },
+        "messages_sent": {status: int(count) for status, count in sends.items()},
+        "send_retries": {reason: int(count) for reason, count in retries.items()},
+        "ai_errors": int(ai_errors),
+        # Llamadas que cortó el circuit breaker o el límite de concurrencia (incluidas en ai_errors)
+        "ai_guard_rejections": int(guard_rejections),
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="load_test_")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    fake_twilio = FakeTwilio(args.twilio_latency, args.twilio_error_rate, args.seed)
+    twilio_port = _free_port()
+    twilio_thread = ServerThread(fake_twilio, twilio_port, "fake-twilio")
+    twilio_thread.start()
+    twilio_thread.wait_started()
+
+    tenants = write_tenants(workdir, args)
+
+    # La app lee settings y configs/ al importarse: entorno y cwd antes del import
+    os.environ.update({
+        "TWILIO_API_BASE_URL": f"http://127.0.0.1:{twilio_port}",
+        "CONFIG_WATCH_ENABLED": "false",
+        "RATE_LIMIT_ENABLED": "true" if args.rate_limits else "false",
+        "WEBHOOK_MODE": args.mode,
+        "SPOOL_PATH": str(workdir / "spool.db"),
+        "LOG_LEVEL": args.log_level,
+        "LOG_DEBUG_SAMPLE_RATE": "0",
+        "METRICS_MULTIPROCESS_DIR": "",
+    })
+    os.chdir(workdir)
+
+    from src.main import app
+
+    app_port = _free_port()
+    app_thread = ServerThread(app, app_port, "app")
+    started = time.perf_counter()
+    app_thread.start()
+    app_thread.wait_started()
+    startup_seconds = time.perf_counter() - started
+
+    print(
+        f"🚀 App on :{app_port} ({args.tenants} tenants, {args.mode}), fake Twilio on :{twilio_port}; "
+        f"{args.rate}/s for {args.duration}s after {args.warmup}s warmup",
+        file=sys.stderr,
+    )
+
+    def on_measure_start():
+        app_thread.lag.reset()
+
+    load = asyncio.run(generate_load(f"http://127.0.0.1:{app_port}", tenants, args, on_measure_start))
+    lag_samples = list(app_thread.lag.samples)
+
+    # Dejar terminar los envíos en background antes de leer las métricas
+    time.sleep(args.drain)
+    metrics_text = httpx.get(f"http://127.0.0.1:{app_port}/metrics").text
+
+    app_thread.stop()
+    twilio_thread.stop()
+
+    return {
+        "config": {
+            "rate": args.rate,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "tenants": args.tenants,
+            "tenant_skew": args.tenant_skew,
+            "phones": args.phones,
+            "mode": args.mode,
+            "streaming": args.streaming,
+            "llm_latency": args.llm_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "llm_script": json.loads(args.llm_script) if args.llm_script else None,
+            "twilio_latency": args.twilio_latency,
+            "twilio_error_rate": args.twilio_error_rate,
+            "seed": args.seed,
+        },
+        "python": sys.version.split()[0],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "startup_seconds": round(startup_seconds, 2),
+        **load,
+        "event_loop_lag_ms": percentiles(lag_samples),
+        "app": stage_means(metrics_text),
+        "fake_twilio": {
+            "delivered": sum(fake_twilio.received.values()),
+            "failed": fake_twilio.failed,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con Twilio y LLM falsos")
+    parser.add_argument("--rate", type=float, default=50.0, help="Mensajes por segundo (promedio)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Segundos medidos")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Segundos iniciales sin medir")
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--tenant-skew", type=float, default=1.0, help="Exponente Zipf (0 = uniforme)")
+    parser.add_argument("--phones", type=int, default=1000, help="Teléfonos distintos")
+    parser.add_argument("--mode", choices=["sync", "ack_first"], default="sync")
+    parser.add_argument("--streaming", action="store_true", help="Respuestas en streaming")
+    parser.add_argument("--rate-limits", action="store_true", help="Aplicar rate limits por usuario")
+    parser.add_argument("--llm-latency", type=parse_latency, default=parse_latency("lognormal:0.3:0.5"))
+    parser.add_argument("--llm-error-rate", type=float, default=0.01)
+    parser.add_argument("--llm-chunk-chars", type=int, default=24)
+    parser.add_argument("--llm-script", help="JSON: lista de pasos {delay_seconds, error} de FakeProvider")
+    parser.add_argument("--twilio-latency", type=parse_latency, default=parse_latency("lognormal:0.12:0.4"))
+    parser.add_argument("--twilio-error-rate", type=float, default=0.005)
+    parser.add_argument("--connections", type=int, default=256, help="Conexiones HTTP del generador")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--drain", type=float, default=2.0, help="Espera final para envíos en background")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workdir", help="Directorio de trabajo (default: temporal)")
+    parser.add_argument("--output", help="Archivo JSON con el reporte")
+    args = parser.parse_args()
+    if args.output:
+        # run() cambia el cwd al directorio de trabajo
+        args.output = str(Path(args.output).resolve())
+
+    report = run(args)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text)
+        print(f"💾 Report written to {args.output}", file=sys.stderr)
+    print(text)
+
+    latency = report["latency_ms"]
+    print(
+        f"📊 {report['throughput_per_second']}/s completed (offered {report['offered_rate']}/s) — "
+        f"latency p50 {latency['p50']}ms p95 {latency['p95']}ms p99 {latency['p99']}ms — "
+        f"loop lag p99 {report['event_loop_lag_ms']['p99']}ms",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
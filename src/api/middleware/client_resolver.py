@@ -0,0 +1,140 @@
+"""
+Middleware que identifica el cliente (tenant) de cada webhook.
+
+Lee el campo To del formulario de Twilio, lo busca en el índice de
+números del ConfigManager y deja el ClientConfig en ClientContext
+antes de llegar al router.
+
+También abre el contexto de logging del request (correlation_id =
+MessageSid): todas las líneas del request, incluidas las de los envíos
+en background, llevan ese id, y al terminar se emite un único resumen
+con la duración de cada etapa y el status HTTP.
+
+El body se lee completo en memoria, así que antes se limita su tamaño
+(settings.webhook_max_body_bytes): un formulario de Twilio pesa pocos KB
+y lo que excede el límite se rechaza con 413 sin seguir leyendo.
+"""
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qs
+import logging
+import time
+import uuid
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.client_context import ClientContext
+from src.core.config import ClientConfig, get_config_manager, get_settings
+from src.core.logging_config import debug_sample_rate, request_log
+from src.infrastructure.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+class ClientResolverMiddleware:
+    """
+    Middleware ASGI de resolución de cliente.
+
+    Para los paths indicados:
+    1. Busca el cliente por el número de destino (To)
+    2. Si no hay match, usa settings.default_client_id (si existe)
+    3. Si tampoco, deja el contexto vacío y el endpoint responde 404
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Iterable[str] = ("/webhook/whatsapp",),
+        max_body_bytes: Optional[int] = None
+    ):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_body_bytes = max_body_bytes or get_settings().webhook_max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        # Rechazar por Content-Length antes de leer nada
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await self._too_large(scope, receive, send)
+            return
+
+        # Leer el body completo para obtener el campo To (sin pasar del límite:
+        # el body puede venir chunked, sin Content-Length)
+        chunks: List[bytes] = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                await self._too_large(scope, receive, send)
+                return
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        form = parse_qs(body.decode("utf-8", errors="replace"))
+        message_sid = (form.get("MessageSid") or [""])[0] or uuid.uuid4().hex
+
+        with request_log(message_sid) as current:
+            started = time.perf_counter()
+            client_config = self._resolve(form)
+            client_id = client_config.client_id if client_config else "unknown"
+            observe_stage(
+                "resolve",
+                client_id,
+                client_config.messaging_provider if client_config else "unknown",
+                time.perf_counter() - started
+            )
+            if client_config is not None:
+                current.set_client(client_id, debug_sample_rate(client_config))
+            ClientContext.set(client_config)
+
+            # Re-entregar el body al endpoint
+            body_sent = False
+
+            async def replay_receive() -> Message:
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                return await receive()
+
+            async def send_with_status(message: Message):
+                if message["type"] == "http.response.start":
+                    current.fields["status"] = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, replay_receive, send_with_status)
+            finally:
+                ClientContext.clear()
+
+    async def _too_large(self, scope: Scope, receive: Receive, send: Send):
+        logger.warning(f"Webhook body over {self.max_body_bytes} bytes rejected: {scope['path']}")
+        response = JSONResponse({"detail": "Request body too large"}, status_code=413)
+        await response(scope, receive, send)
+
+    def _resolve(self, form: Dict[str, List[str]]) -> Optional[ClientConfig]:
+        """Resuelve el cliente a partir del formulario"""
+        config_manager = get_config_manager()
+
+        to_number = (form.get("To") or [""])[0]
+
+        client_id = config_manager.resolve_client_id(to_number) if to_number else None
+        if client_id is None:
+            client_id = get_settings().default_client_id
+            logger.debug(f"No client for number '{to_number}', using default: {client_id}")
+
+        try:
+            return config_manager.get_client_config(client_id)
+        except ValueError:
+            logger.warning(f"Could not resolve client for number '{to_number}'")
+            return None
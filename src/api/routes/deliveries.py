@@ -0,0 +1,71 @@
+"""
+Consulta del estado de entrega de los mensajes enviados.
+
+Los datos salen de los callbacks de /webhook/status (ver
+src.domain.services.delivery_status), no de consultar a Twilio mensaje
+por mensaje. Requiere el header X-API-Key con settings.admin_api_key.
+"""
+from datetime import datetime, timezone
+from typing import Annotated, Optional
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from src.core.config import get_config_manager, get_settings
+from src.infrastructure.database.repositories.delivery_repository import DeliveryRepository
+
+settings = get_settings()
+
+
+def require_admin_key(x_api_key: Annotated[Optional[str], Header()] = None):
+    """Valida el header X-API-Key contra settings.admin_api_key"""
+    if x_api_key is None or not secrets.compare_digest(x_api_key, settings.admin_api_key):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+
+router = APIRouter(prefix="/deliveries", tags=["deliveries"], dependencies=[Depends(require_admin_key)])
+
+
+def _client_repository(client_id: str) -> DeliveryRepository:
+    try:
+        client_config = get_config_manager().get_client_config(client_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Client '{client_id}' not found")
+    return DeliveryRepository(client_config.database_url or settings.database_url)
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Las columnas guardan UTC sin zona horaria
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get("/{client_id}/funnel")
+async def delivery_funnel(
+    client_id: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """
+    Embudo de entrega de un cliente: enviados, entregados, leídos y fallidos.
+
+    since/until filtran por el momento en que se registró el mensaje (UTC).
+    Los estados recibidos en el último flush_interval todavía pueden no estar.
+    """
+    since, until = _utc(since), _utc(until)
+    return {
+        "client_id": client_id,
+        "since": since,
+        "until": until,
+        **await _client_repository(client_id).funnel(client_id, since, until),
+    }
+
+
+@router.get("/{client_id}/messages/{message_sid}")
+async def delivery_status(client_id: str, message_sid: str):
+    """Último estado conocido de un mensaje enviado"""
+    delivery = await _client_repository(client_id).get(client_id, message_sid)
+    if delivery is None:
+        raise HTTPException(status_code=404, detail=f"No delivery status for {message_sid}")
+    return delivery
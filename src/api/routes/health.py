@@ -1,21 +1,41 @@
 """
 Health check endpoints.
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from datetime import datetime
 from src.core.config import get_settings, get_config_manager
+from src.infrastructure.cache.response_cache import get_response_cache
+from src.infrastructure.cache.idempotency import get_deduplicator
+from src.domain.services.burst_coalescer import get_burst_coalescer
+from src.domain.services.delivery_status import get_delivery_status_buffer
+from src.infrastructure.messaging.outbound import get_outbound_scheduler
 
 router = APIRouter(tags=["health"])
 settings = get_settings()
 
 
+def ai_provider_stats(request: Request) -> dict:
+    """Estado de los providers de IA de cada cliente (circuit breaker, concurrencia, failover)"""
+    registry = getattr(request.app.state, "tenant_runtimes", None)
+    if registry is None:
+        return {}
+
+    stats = {}
+    for runtime in registry.ready_runtimes():
+        feature = runtime.get_feature('ai_responses')
+        if feature is not None:
+            stats[runtime.client_id] = feature.provider_stats()
+    return stats
+
+
 @router.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """
     Health check endpoint.
     Verifica que la aplicación esté funcionando correctamente.
     """
     config_manager = get_config_manager()
+    spool_workers = getattr(request.app.state, "spool_workers", None)
 
     return {
         "status": "healthy",
@@ -24,7 +44,14 @@ async def health_check():
         "environment": settings.environment,
         "timestamp": datetime.utcnow().isoformat(),
         "clients_loaded": len(config_manager.list_clients()),
-        "clients": config_manager.list_clients()
+        "clients": config_manager.list_clients(),
+        "response_cache": get_response_cache().stats(),
+        "webhook_dedup": get_deduplicator().stats(),
+        "burst_coalescing": get_burst_coalescer().stats(),
+        "outbound": get_outbound_scheduler().stats(),
+        "delivery_status": get_delivery_status_buffer().stats(),
+        "spool": spool_workers.stats() if spool_workers is not None else None,
+        "ai_providers": ai_provider_stats(request)
     }
 
 
@@ -0,0 +1,93 @@
+"""
+Endpoint de métricas para Prometheus.
+
+Además de las métricas del pipeline (src.infrastructure.metrics) expone,
+calculados al momento del scrape, los stats() que ya muestra /health:
+caches, deduplicación, agrupación de ráfagas y el estado de los
+providers de IA de cada cliente.
+"""
+from typing import Any, Callable, Dict, Iterator, Optional
+import asyncio
+
+from fastapi import APIRouter, Request, Response
+
+from src.core.tenant_runtime import TenantRuntimeRegistry
+from src.domain.services.burst_coalescer import get_burst_coalescer
+from src.domain.services.delivery_status import get_delivery_status_buffer
+from src.infrastructure.cache.idempotency import get_deduplicator
+from src.infrastructure.cache.response_cache import get_response_cache
+from src.infrastructure.messaging.outbound import get_outbound_scheduler
+from src.infrastructure.messaging.worker_pool import SpoolWorkerPool
+from src.infrastructure.metrics import REGISTRY, CONTENT_TYPE, CollectedSample, render
+
+router = APIRouter(tags=["metrics"])
+
+# Estado del circuit breaker como número para poder graficarlo
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _numeric(stats: Dict[str, Any]) -> Iterator[tuple]:
+    for stat, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        yield stat, value
+
+
+def app_stats_collector(
+    registry: TenantRuntimeRegistry,
+    spool_workers: Optional[SpoolWorkerPool] = None
+) -> Callable[[], Iterator[CollectedSample]]:
+    """Collector con los stats() de los componentes y de los providers de cada cliente"""
+
+    def collect() -> Iterator[CollectedSample]:
+        components = {
+            "response_cache": get_response_cache().stats(),
+            "webhook_dedup": get_deduplicator().stats(),
+            "burst_coalescing": get_burst_coalescer().stats(),
+            "outbound": get_outbound_scheduler().stats(),
+            "delivery_status": get_delivery_status_buffer().stats(),
+        }
+        if spool_workers is not None:
+            components["spool"] = spool_workers.stats()
+        for component, stats in components.items():
+            for stat, value in _numeric(stats):
+                yield (
+                    "whatsapp_component_stat", "gauge",
+                    "Counters and sizes reported by stats() of each component",
+                    {"component": component, "stat": stat}, value,
+                )
+
+        for runtime in registry.ready_runtimes():
+            feature = runtime.get_feature('ai_responses')
+            if feature is None:
+                continue
+
+            for provider, stats in feature.provider_stats().items():
+                stats = dict(stats)
+                circuit = stats.pop('circuit', None)
+                if circuit is not None:
+                    stats['circuit_state'] = CIRCUIT_STATES.get(circuit, -1)
+                usage = stats.pop('usage', None) or {}
+                stats.update({f"usage_{key}": value for key, value in usage.items()})
+
+                for stat, value in _numeric(stats):
+                    yield (
+                        "whatsapp_ai_provider_stat", "gauge",
+                        "Circuit breaker, concurrency limit, failover and token usage per AI provider "
+                        "(circuit_state: 0 closed, 1 half open, 2 open)",
+                        {"client_id": runtime.client_id, "provider": provider, "stat": stat}, value,
+                    )
+
+    return collect
+
+
+@router.get("/metrics")
+async def metrics(request: Request):
+    """Métricas en formato de texto de Prometheus (sumadas entre workers si hay varios)"""
+    snapshot = REGISTRY.snapshot()
+
+    multiprocess = getattr(request.app.state, "metrics_multiprocess", None)
+    if multiprocess is not None:
+        snapshot = await asyncio.to_thread(multiprocess.collect, snapshot)
+
+    return Response(content=render(snapshot), media_type=CONTENT_TYPE)
@@ -1,20 +1,37 @@
 """
 Webhook endpoints para recibir mensajes de WhatsApp.
 """
-from fastapi import APIRouter, Request, Form, BackgroundTasks, HTTPException
-from typing import Annotated
+from fastapi import APIRouter, Request, Form, BackgroundTasks, HTTPException, Response
+from typing import Annotated, Any, Dict
+from urllib.parse import parse_qs
 import logging
+import re
+import time
 
 from src.core.config import get_config_manager, get_settings
 from src.core.client_context import ClientContext
-from src.core.feature_manager import FeatureManager
-from src.core.exceptions import ClientNotFoundError, AIServiceError
-from src.integrations.twilio_client import TwilioClient
+from src.core.exceptions import ClientNotFoundError
+from src.domain.services.delivery_status import delivery_row, get_delivery_status_buffer
+from src.domain.services.message_pipeline import (
+    coalesce_reply,
+    reply_sender,
+    send_whatsapp_message,
+    streams_replies,
+)
+from src.infrastructure.database.models.delivery import STATUS_RANKS
+from src.infrastructure.messaging.spool import SpooledMessage
+from src.infrastructure.cache.idempotency import get_deduplicator
+from src.infrastructure.metrics import IN_FLIGHT, observe_stage
+from src.integrations.twilio_client import get_twilio_client
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 settings = get_settings()
 
+# SID de un mensaje de Twilio (SM...) o con media (MM...)
+MESSAGE_SID_PATTERN = re.compile(r"^(SM|MM)[0-9a-f]{32}$")
+ERROR_CODE_PATTERN = re.compile(r"^[0-9]{1,20}$")
+
 
 @router.post("/whatsapp")
 async def whatsapp_webhook(
@@ -30,118 +47,155 @@ async def whatsapp_webhook(
     Webhook para recibir mensajes de WhatsApp vía Twilio.
 
     Flujo:
-    1. Identificar qué cliente es (por ahora usamos default_client_id)
-    2. Cargar configuración del cliente
-    3. Inicializar features del cliente
-    4. Procesar mensaje
-    5. Enviar respuesta
-    """
-
-    logger.info(f"📨 WhatsApp message received: {MessageSid} from {From}")
-    logger.info(f"Message body: {Body[:100]}...")
-
-    try:
-        # PASO 1: Identificar cliente
-        # Por ahora usamos el default_client_id, pero en producción
-        # se puede identificar por subdomain, phone number, etc.
-        client_id = settings.default_client_id
-
-        # PASO 2: Cargar configuración del cliente
-        config_manager = get_config_manager()
-
-        try:
-            client_config = config_manager.get_client_config(client_id)
-        except ValueError as e:
-            logger.error(f"Client not found: {client_id}")
-            raise ClientNotFoundError(client_id)
-
-        logger.info(f"✓ Using client: {client_config.client_name} ({client_config.plan})")
-
-        # PASO 3: Inicializar features del cliente
-        feature_manager = FeatureManager()
-
-        # Obtener features disponibles del app state
-        available_features = request.app.state.available_features
-
-        # Activar solo las features habilitadas para este cliente
-        for feature_name, feature_config in client_config.features.items():
-            if feature_config.enabled:
-                if feature_name in available_features:
-                    feature_class = available_features[feature_name]
-                    logger.info(f"Enabling feature: {feature_name}")
-
-                    feature_manager.register_feature(feature_name, feature_class)
-                    feature_manager.enable_feature(feature_name, feature_config.config)
-
-                    logger.info(f"✓ Feature '{feature_name}' enabled")
-                else:
-                    logger.warning(f"Feature '{feature_name}' not available (not implemented yet)")
-
-        # PASO 4: Procesar mensaje con features activas
-        # Construir contexto del usuario
-        user_context = {
-            'phone_number': From,
-            'personality': client_config.personality,
-            'history': [],  # TODO: Obtener historial de BD
-            'client_config': client_config
-        }
-
-        response_text = None
-
-        # Intentar procesar con AI Responses (feature principal)
-        if feature_manager.is_enabled('ai_responses'):
-            ai_feature = feature_manager.get_feature('ai_responses')
+    1. Identificar qué cliente es (por número de destino, vía ClientResolverMiddleware)
+    2. Obtener el runtime del cliente (creado en el startup)
+    3. Procesar mensaje
+    4. Enviar respuesta
 
-            try:
-                result = await ai_feature.process_message(Body, user_context)
+    Los reintentos de un mismo MessageSid devuelven el resultado guardado
+    sin volver a ejecutar el pipeline.
 
-                if result:
-                    response_text = result.get('response')
-                    logger.info(f"✓ AI response generated: {response_text[:50]}...")
-
-            except AIServiceError as e:
-                logger.error(f"AI service error: {e.message}")
-                response_text = "Lo siento, tuve un problema al procesar tu mensaje. Intenta de nuevo."
-
-        # Si no hay respuesta, usar mensaje de fallback
-        if not response_text:
-            fallback_messages = client_config.personality.get('fallback_messages', [])
-            response_text = fallback_messages[0] if fallback_messages else "Lo siento, no pude procesar tu mensaje."
-
-        # PASO 5: Enviar respuesta (en background)
-        logger.info(f"📤 Response to {From}: {response_text}")
+    En modo ack_first (settings.webhook_mode) el mensaje se guarda en el
+    spool durable y se responde 200 de inmediato; los pasos 3 y 4 los
+    ejecutan los workers.
+    """
 
-        # Enviar mensaje vía Twilio en background
-        background_tasks.add_task(
-            send_whatsapp_message,
-            client_id=client_id,
-            to=From,
-            message=response_text
-        )
+    logger.debug(f"📨 WhatsApp message received: {MessageSid} from {From}")
+    logger.debug(f"Message body: {Body[:100]}...")
 
-        # TODO: Guardar conversación en base de datos
-        # background_tasks.add_task(save_conversation, ...)
+    # Twilio reintenta ante timeouts/5xx: no reprocesar un MessageSid ya visto
+    deduplicator = get_deduplicator()
+    existing = await deduplicator.claim(MessageSid)
+    if existing is not None:
+        logger.info(f"Duplicate webhook suppressed: {MessageSid} ({existing.state})")
+        if existing.result is not None:
+            return existing.result
+        return {"status": "duplicate", "message_sid": MessageSid}
 
-        # Cleanup features
-        feature_manager.cleanup_all()
+    resolved_client = ClientContext.get_safe()
+    client_id = resolved_client.client_id if resolved_client else "unknown"
+    provider = resolved_client.ai_provider if resolved_client else "unknown"
+    started = time.perf_counter()
+    IN_FLIGHT.inc("webhook", client_id)
 
-        return {
-            "status": "success",
-            "message_sid": MessageSid,
-            "response_preview": response_text[:50] + "..." if len(response_text) > 50 else response_text
-        }
+    try:
+        result = await _process_message(request, background_tasks, MessageSid, From, To, Body)
 
     except ClientNotFoundError as e:
+        await deduplicator.release(MessageSid)
         logger.error(f"Client not found: {e.message}")
         raise HTTPException(status_code=404, detail=e.message)
 
     except Exception as e:
+        # Liberar el claim para que el reintento de Twilio pueda procesarlo
+        await deduplicator.release(MessageSid)
         logger.error(f"Unexpected error processing webhook: {e}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
 
+    finally:
+        IN_FLIGHT.dec("webhook", client_id)
+        observe_stage("webhook", client_id, provider, time.perf_counter() - started)
+
+    await deduplicator.complete(MessageSid, result)
+    return result
+
+
+async def _process_message(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    message_sid: str,
+    from_number: str,
+    to_number: str,
+    body: str
+) -> Dict[str, Any]:
+    """Ejecuta los pasos del webhook para un mensaje nuevo"""
+
+    # PASO 1: Identificar cliente
+    # ClientResolverMiddleware lo resuelve por el número de destino (To)
+    resolved_client = ClientContext.get_safe()
+    if resolved_client is None:
+        raise ClientNotFoundError(to_number)
+    client_id = resolved_client.client_id
+
+    # PASO 2: Obtener el runtime del cliente (config + features ya inicializadas)
+    provider = resolved_client.ai_provider
+    started = time.perf_counter()
+    registry = request.app.state.tenant_runtimes
+    try:
+        await registry.get(client_id)
+    except ValueError as e:
+        logger.error(f"Client not found: {client_id}")
+        raise ClientNotFoundError(client_id)
+
+    # El lease mantiene este runtime (y su config) hasta el final del request,
+    # aunque mientras tanto se recargue el YAML del cliente
+    async with registry.lease(client_id) as runtime:
+        observe_stage("runtime", client_id, provider, time.perf_counter() - started)
+        client_config = runtime.client_config
+        logger.debug(f"✓ Using client: {client_config.client_name} ({client_config.plan})")
+
+        # Modo ack_first: guardar en el spool y responder de inmediato.
+        # Los workers generan y envían la respuesta.
+        spool_workers = request.app.state.spool_workers
+        if spool_workers is not None:
+            await spool_workers.submit(SpooledMessage(
+                message_sid=message_sid,
+                client_id=client_id,
+                from_number=from_number,
+                to_number=to_number,
+                body=body
+            ))
+            return {"status": "accepted", "message_sid": message_sid}
+
+        # PASO 3: Procesar mensaje con features activas
+        # Con streaming, cada segmento se envía apenas se completa (PASO 4 incluido)
+        sender = reply_sender(client_id, from_number) if streams_replies(runtime) else None
+        started = time.perf_counter()
+        try:
+            burst = await coalesce_reply(
+                runtime, from_number, body, sender.submit if sender is not None else None
+            )
+        except BaseException:
+            if sender is not None:
+                await sender.close()
+            raise
+        finally:
+            observe_stage("reply", client_id, provider, time.perf_counter() - started)
+
+        if sender is not None:
+            # Terminar de enviar los segmentos pendientes después de responder a Twilio
+            background_tasks.add_task(sender.close)
+
+        if burst.superseded:
+            # Se respondió junto con un mensaje posterior del mismo usuario
+            return {"status": "coalesced", "message_sid": message_sid}
+
+        response_text = burst.value
+        if response_text is None:
+            # Usuario limitado por rate limit que ya recibió el aviso
+            return {"status": "rate_limited", "message_sid": message_sid}
+
+        # PASO 4: Enviar respuesta (en background)
+        if sender is None:
+            logger.debug(f"📤 Response to {from_number}: {response_text}")
+
+            # Enviar mensaje vía Twilio en background
+            background_tasks.add_task(
+                send_whatsapp_message,
+                client_id=client_id,
+                to=from_number,
+                message=response_text
+            )
+
+        return {
+            "status": "success",
+            "message_sid": message_sid,
+            "response_preview": response_text[:50] + "..." if len(response_text) > 50 else response_text
+        }
+
 
 @router.get("/whatsapp")
 async def whatsapp_webhook_verify():
@@ -152,31 +206,85 @@ async def whatsapp_webhook_verify():
     return {"status": "webhook_ready"}
 
 
-async def send_whatsapp_message(client_id: str, to: str, message: str):
+async def _read_limited_body(request: Request, max_bytes: int) -> bytes:
     """
-    Envía un mensaje de WhatsApp vía Twilio (ejecutado en background).
+    Lee el body cortando en max_bytes, como ClientResolverMiddleware en
+    /webhook/whatsapp (este endpoint no pasa por el middleware).
 
-    Args:
-        client_id: ID del cliente
-        to: Número de destino (ej: +5491123456789)
-        message: Texto del mensaje
+    Raises:
+        HTTPException: 413 si el body supera max_bytes
     """
-    try:
-        twilio_client = TwilioClient(client_id=client_id)
-
-        if not twilio_client.is_configured():
-            logger.warning(
-                f"Twilio not configured for client '{client_id}'. "
-                f"Message will not be sent: {message[:50]}..."
-            )
-            return
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+        logger.warning(f"Webhook body over {max_bytes} bytes rejected: {request.url.path}")
+        raise HTTPException(status_code=413, detail="Request body too large")
+
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            logger.warning(f"Webhook body over {max_bytes} bytes rejected: {request.url.path}")
+            raise HTTPException(status_code=413, detail="Request body too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@router.post("/status", status_code=204)
+async def status_webhook(request: Request):
+    """
+    Callback de estado de entrega de Twilio (StatusCallback de cada envío).
 
-        message_sid = await twilio_client.send_message(to=to, message=message)
+    Recibe un request por cada cambio de estado (sent, delivered, read,
+    failed...) de cada mensaje: sólo valida los campos y encola el estado en
+    el DeliveryStatusBuffer, que los escribe en lote. No pasa por
+    ClientResolverMiddleware: el cliente es el dueño del número emisor (From).
 
-        if message_sid:
-            logger.info(f"✓ Message sent successfully. SID: {message_sid}")
-        else:
-            logger.error(f"Failed to send message to {to}")
+    La firma (X-Twilio-Signature) se valida con el auth token del cliente
+    dueño del número, sobre TWILIO_STATUS_CALLBACK_URL (la URL que Twilio
+    llama) o, si no está definida, la URL del request.
 
-    except Exception as e:
-        logger.error(f"Error in background task send_whatsapp_message: {e}", exc_info=True)
+    Responde 204 si se aceptó, 400 si el callback no es válido, 403 si la
+    firma no es válida, 404 si el número no es de ningún cliente, 413 si el
+    body supera settings.webhook_max_body_bytes y 503 si el buffer está lleno.
+    """
+    body = await _read_limited_body(request, settings.webhook_max_body_bytes)
+    # El form se parsea a mano: el callback tiene pocos campos y llega en volumen.
+    # Los valores vacíos se conservan: también entran en la firma
+    form = parse_qs(body.decode("utf-8", errors="replace"), keep_blank_values=True)
+    message_sid = (form.get("MessageSid") or [""])[0]
+    status = (form.get("MessageStatus") or [""])[0].lower()
+    from_number = (form.get("From") or [""])[0]
+    to_number = (form.get("To") or [""])[0]
+    error_code = (form.get("ErrorCode") or [""])[0] or None
+
+    if not MESSAGE_SID_PATTERN.match(message_sid):
+        raise HTTPException(status_code=400, detail="Invalid MessageSid")
+    if status not in STATUS_RANKS:
+        raise HTTPException(status_code=400, detail=f"Unknown MessageStatus: {status or 'missing'}")
+    if error_code is not None and not ERROR_CODE_PATTERN.match(error_code):
+        raise HTTPException(status_code=400, detail="Invalid ErrorCode")
+
+    config_manager = get_config_manager()
+    client_id = config_manager.resolve_client_id(from_number)
+    if client_id is None:
+        logger.warning(f"Status callback for unknown sender {from_number}: {message_sid}")
+        raise HTTPException(status_code=404, detail=f"No client for {from_number}")
+
+    twilio_client = get_twilio_client(client_id)
+    callback_url = twilio_client.status_callback_url or str(request.url)
+    if not twilio_client.validate_signature(
+        callback_url, form, request.headers.get("X-Twilio-Signature", "")
+    ):
+        logger.warning(f"Invalid Twilio signature on status callback for {client_id}: {message_sid}")
+        raise HTTPException(status_code=403, detail="Invalid Twilio signature")
+
+    accepted = get_delivery_status_buffer().add(
+        config_manager.get_client_config(client_id),
+        delivery_row(message_sid, client_id, to_number, status, error_code)
+    )
+    if not accepted:
+        logger.warning(f"Delivery status buffer full, rejecting {message_sid} ({status})")
+        raise HTTPException(status_code=503, detail="Delivery status buffer full")
+
+    return Response(status_code=204)
@@ -3,7 +3,7 @@ Gestión del contexto del cliente actual.
 Utiliza ContextVar para ser thread-safe en entornos async.
 """
 from contextvars import ContextVar
-from typing import Optional
+from typing import Optional, Any
 from src.core.config import ClientConfig
 
 # Context variable para el cliente actual (thread-safe para async)
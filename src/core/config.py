@@ -2,14 +2,24 @@
 Gestión de configuración del bot template.
 Carga configuraciones por cliente desde archivos YAML.
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Dict, Any, Optional, Literal
+from typing import Callable, Dict, Any, Iterable, Mapping, Optional, Literal, Set, Tuple
+from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
 from functools import lru_cache
+import asyncio
+import hashlib
+import logging
+import threading
 import yaml
 import os
 
+from src.utils.phone import normalize_phone_number
+
+logger = logging.getLogger(__name__)
+
 
 class FeatureConfig(BaseModel):
     """Configuración de una feature específica"""
@@ -18,7 +28,9 @@ class FeatureConfig(BaseModel):
 
 
 class ClientConfig(BaseModel):
-    """Configuración completa de un cliente"""
+    """Configuración completa de un cliente (inmutable: un cambio de YAML crea otra instancia)"""
+    model_config = ConfigDict(frozen=True)
+
     client_id: str
     client_name: str
     plan: Literal["basic", "pro", "enterprise"]
@@ -34,21 +46,44 @@ class ClientConfig(BaseModel):
     messaging_config: Dict[str, Any]
 
     # Configuración de AI
-    ai_provider: Literal["gemini", "claude", "openai"]
+    ai_provider: Literal["gemini", "claude", "openai", "fake"]
     ai_config: Dict[str, Any]
 
     # Base de datos
     database_url: Optional[str] = None
 
-    # Rate limits
+    # Rate limits: messages_per_minute/hour por usuario,
+    # client_messages_per_minute/hour (opcional) para el total del cliente
     rate_limits: Dict[str, int] = Field(default_factory=lambda: {
         "messages_per_minute": 10,
         "messages_per_hour": 100
     })
 
+    # Agrupar ráfagas de mensajes de un usuario en una sola respuesta:
+    # enabled, debounce_seconds (tiempo máximo entre mensajes de una ráfaga),
+    # max_wait_seconds (desde el primer mensaje), max_messages. La respuesta
+    # arranca con el primer mensaje; uno que llega antes de que se envíe algo
+    # reinicia la generación con los mensajes combinados
+    burst_coalescing: Dict[str, Any] = Field(default_factory=lambda: {"enabled": False})
+
     # Horarios de atención
     business_hours: Optional[Dict[str, Any]] = None
 
+    # Fracción de mensajes que emiten sus logs DEBUG (None = settings.log_debug_sample_rate)
+    debug_log_sample_rate: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+
+    _version: Optional[str] = PrivateAttr(default=None)
+
+    @property
+    def config_version(self) -> str:
+        """
+        Hash corto del contenido de la configuración.
+        Cambia cuando se edita el YAML; sirve para invalidar caches derivados.
+        """
+        if self._version is None:
+            self._version = hashlib.sha1(self.model_dump_json().encode("utf-8")).hexdigest()[:12]
+        return self._version
+
 
 class Settings(BaseSettings):
     """Configuración global de la aplicación"""
@@ -69,15 +104,33 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
 
+    # Workers pre-forkeados (src.server): comparten el socket, la config y los
+    # imports cargados en el padre. Un worker cuya memoria propia (USS) supera
+    # worker_memory_limit_mb se reemplaza al terminar sus requests; 0 = sin límite
+    workers: int = 1
+    worker_memory_limit_mb: int = 0
+    worker_memory_check_interval_seconds: float = 10.0
+    worker_graceful_timeout_seconds: float = 30.0
+
     # Default Client
     default_client_id: str = "demo_client"
 
     # Database
     database_url: str = "sqlite+aiosqlite:///./data/bot.db"
 
+    # Historial de conversaciones (cache en memoria por teléfono)
+    history_cache_max_turns: int = 20
+    history_cache_max_mb: int = 64
+    history_summary_max_chars: int = 2000
+
     # Redis
     redis_url: str = "redis://localhost:6379/0"
 
+    # Cache de respuestas de IA ("memory" o "redis" = memoria + Redis compartido)
+    response_cache_backend: Literal["memory", "redis"] = "memory"
+    response_cache_max_entries: int = 10_000
+    response_cache_ttl_seconds: float = 3600.0
+
     # Admin
     admin_api_key: str = "change-this-in-production"
 
@@ -86,13 +139,96 @@ class Settings(BaseSettings):
 
     # Logging
     log_level: str = "INFO"
-    log_format: str = "json"
+    log_format: Literal["json", "text"] = "json"
+    # Fracción de mensajes cuyas líneas DEBUG se emiten (ClientConfig.debug_log_sample_rate la pisa)
+    log_debug_sample_rate: float = 0.01
+
+    # Webhook
+    # "sync": responde a Twilio después de generar la respuesta
+    # "ack_first": guarda el mensaje en el spool, responde 200 y lo procesan los workers
+    webhook_mode: Literal["sync", "ack_first"] = "sync"
+    # Tamaño máximo del formulario de un webhook (Twilio envía pocos KB)
+    webhook_max_body_bytes: int = 64 * 1024
+    spool_path: str = "./data/spool.db"
+    spool_workers: int = 4
+    spool_drain_timeout_seconds: float = 30.0
+    spool_retention_seconds: float = 86400.0
+    # Intentos por mensaje (con backoff exponencial) antes de dejarlo muerto en el spool
+    spool_max_attempts: int = 3
+    spool_retry_base_seconds: float = 2.0
+    spool_retry_max_seconds: float = 60.0
+
+    # Deduplicación de webhooks por MessageSid ("memory" o "redis" para multi-worker)
+    idempotency_backend: Literal["memory", "redis"] = "memory"
+    idempotency_ttl_seconds: float = 86400.0
+    idempotency_processing_ttl_seconds: float = 300.0
+
+    # Rate limiting (ClientConfig.rate_limits) - "memory" o "redis" para multi-worker
+    rate_limit_enabled: bool = True
+    rate_limit_backend: Literal["memory", "redis"] = "memory"
+
+    # Envíos salientes (OutboundScheduler): ritmo por número emisor (token bucket;
+    # messaging_config sender_rate_per_second / sender_burst del cliente lo pisan),
+    # reintentos con backoff exponencial y jitter ante errores transitorios
+    outbound_sender_rate_per_second: float = 20.0
+    outbound_sender_burst: int = 20
+    outbound_max_in_flight: int = 50
+    outbound_max_queue: int = 10_000
+    outbound_max_attempts: int = 4
+    outbound_retry_base_seconds: float = 0.5
+    outbound_retry_max_seconds: float = 30.0
+    outbound_drain_timeout_seconds: float = 10.0
+
+    # Callbacks de estado de entrega (/webhook/status): se acumulan en memoria
+    # y se escriben con un upsert por lote (al llenarse o cada flush_interval)
+    delivery_status_batch_size: int = 500
+    delivery_status_flush_interval_seconds: float = 1.0
+    delivery_status_max_pending: int = 50_000
+
+    # HTTP client pool (providers de IA y mensajería)
+    http_timeout_seconds: float = 30.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+
+    # Hot reload de configs/clients/*.yaml (watchfiles si está instalado, si no polling de mtime)
+    config_watch_enabled: bool = True
+    config_watch_interval_seconds: float = 2.0
+
+    # Métricas (/metrics). Con varios workers, directorio compartido donde cada
+    # uno deja su snapshot (src.server lo vacía al arrancar, o usa uno temporal
+    # si está vacío); vacío = un solo proceso
+    metrics_multiprocess_dir: str = ""
+    metrics_flush_interval_seconds: float = 5.0
+
+
+# Archivo de config -> (mtime_ns, size) para detectar cambios
+FileStamp = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Estado completo de las configuraciones en un momento dado.
+
+    Nunca se modifica: una recarga arma un snapshot nuevo y lo reemplaza
+    de una sola asignación. Quien tomó una referencia (un request en
+    curso) sigue viendo el snapshot con el que empezó.
+    """
+    clients: Mapping[str, ClientConfig]
+    # Número de WhatsApp normalizado -> client_id
+    number_index: Mapping[str, str]
+    # Archivo -> client_id y stamp con el que se leyó
+    files: Mapping[Path, Tuple[Optional[str], FileStamp]]
+    generation: int = 0
 
 
 class ConfigManager:
     """
     Gestiona la carga y acceso a configuraciones de clientes.
     Implementa patrón Singleton para tener una única instancia.
+
+    Las lecturas usan el snapshot vigente (ver ConfigSnapshot); las
+    recargas (reload_client, refresh) arman uno nuevo y lo reemplazan.
     """
 
     _instance = None
@@ -105,33 +241,143 @@ class ConfigManager:
     def __init__(self):
         if not hasattr(self, '_initialized'):
             self.config_dir = Path("configs")
-            self._clients: Dict[str, ClientConfig] = {}
+            self._snapshot = ConfigSnapshot(
+                clients=MappingProxyType({}),
+                number_index=MappingProxyType({}),
+                files=MappingProxyType({})
+            )
+            # Serializa las recargas (pueden correr en threads)
+            self._reload_lock = threading.Lock()
+            # Callbacks a notificar cuando se recarga un cliente (reciben el client_id)
+            self._reload_listeners: list[Callable[[str], None]] = []
             self._initialized = True
             self._load_clients()
 
+    @property
+    def clients_dir(self) -> Path:
+        return self.config_dir / "clients"
+
+    def snapshot(self) -> ConfigSnapshot:
+        """Snapshot vigente (inmutable)"""
+        return self._snapshot
+
     def _load_clients(self):
         """Carga todas las configuraciones de clientes desde archivos YAML"""
-        client_configs = self.config_dir / "clients"
-
-        if not client_configs.exists():
-            print(f"Warning: Config directory {client_configs} does not exist")
+        if not self.clients_dir.exists():
+            logger.warning(f"Config directory {self.clients_dir} does not exist")
             return
 
-        for config_file in client_configs.glob("*.yaml"):
-            try:
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    data = yaml.safe_load(f)
-
-                    # Reemplazar variables de entorno en el config
-                    data = self._replace_env_vars(data)
+        self._refresh_sync()
 
-                    config = ClientConfig(**data)
-                    self._clients[config.client_id] = config
+    def _read_client_file(self, config_file: Path) -> ClientConfig:
+        """Lee, resuelve variables de entorno y valida un YAML de cliente"""
+        with open(config_file, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f)
 
-                    print(f"✓ Loaded config for client: {config.client_id} ({config.plan})")
+        # Reemplazar variables de entorno en el config
+        data = self._replace_env_vars(data)
+        return ClientConfig(**data)
 
-            except Exception as e:
-                print(f"✗ Error loading config {config_file}: {e}")
+    def _scan_files(self) -> Dict[Path, FileStamp]:
+        """Stamps actuales de configs/clients/*.yaml"""
+        stamps = {}
+        for config_file in self.clients_dir.glob("*.yaml"):
+            try:
+                stat = config_file.stat()
+            except FileNotFoundError:
+                continue
+            stamps[config_file] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def _refresh_sync(self, force: Iterable[Path] = ()) -> Set[str]:
+        """
+        Relee los archivos nuevos, modificados o borrados (y los de force),
+        arma un snapshot nuevo y lo publica.
+
+        Un archivo que no parsea o no valida se reporta y el cliente
+        conserva su config anterior.
+
+        Returns:
+            client_ids cuya configuración cambió
+        """
+        with self._reload_lock:
+            previous = self._snapshot
+            stamps = self._scan_files()
+            force = set(force)
+
+            clients = dict(previous.clients)
+            files = dict(previous.files)
+            changed: Set[str] = set()
+
+            # Archivos borrados: el cliente deja de existir
+            for config_file in set(previous.files) - set(stamps):
+                client_id, _ = files.pop(config_file)
+                if client_id is not None and clients.pop(client_id, None) is not None:
+                    changed.add(client_id)
+                    logger.info(f"✓ Removed config for client: {client_id}")
+
+            for config_file, stamp in sorted(stamps.items()):
+                known = previous.files.get(config_file)
+                if known is not None and known[1] == stamp and config_file not in force:
+                    continue
+
+                old_client_id = known[0] if known else None
+                try:
+                    config = self._read_client_file(config_file)
+                except Exception as e:
+                    logger.error(f"✗ Error loading config {config_file}: {e}", exc_info=True)
+                    # Recordar el stamp para no reintentar hasta el próximo cambio
+                    files[config_file] = (old_client_id, stamp)
+                    continue
+
+                owner = next(
+                    (path for path, (cid, _) in files.items() if cid == config.client_id and path != config_file),
+                    None
+                )
+                if owner is not None:
+                    logger.warning(
+                        f"✗ Client '{config.client_id}' in {config_file} is already "
+                        f"defined in {owner}; ignoring"
+                    )
+                    files[config_file] = (old_client_id, stamp)
+                    continue
+
+                if old_client_id is not None and old_client_id != config.client_id:
+                    clients.pop(old_client_id, None)
+                    changed.add(old_client_id)
+
+                if previous.clients.get(config.client_id) != config:
+                    changed.add(config.client_id)
+                clients[config.client_id] = config
+                files[config_file] = (config.client_id, stamp)
+
+                verb = "Reloaded" if known else "Loaded"
+                logger.info(f"✓ {verb} config for client: {config.client_id} ({config.plan})")
+
+            if not changed and files == dict(previous.files):
+                return set()
+
+            # Se reemplaza el snapshot completo para que los lectores nunca vean un estado a medias
+            self._snapshot = ConfigSnapshot(
+                clients=MappingProxyType(clients),
+                number_index=MappingProxyType(self._build_number_index(clients)),
+                files=MappingProxyType(files),
+                generation=previous.generation + 1
+            )
+            return changed
+
+    async def refresh(self) -> Set[str]:
+        """
+        Recarga los YAML que cambiaron sin bloquear el event loop: leer y
+        validar corre en un thread; los listeners se notifican en el loop.
+
+        Returns:
+            client_ids cuya configuración cambió
+        """
+        changed = await asyncio.to_thread(self._refresh_sync)
+        for client_id in sorted(changed):
+            self._notify_reload(client_id)
+        return changed
 
     def _replace_env_vars(self, data: Any) -> Any:
         """Reemplaza ${VAR_NAME} con variables de entorno"""
@@ -148,30 +394,155 @@ class ConfigManager:
         else:
             return data
 
+    def _client_whatsapp_numbers(self, config: ClientConfig) -> list[str]:
+        """
+        Números de WhatsApp de un cliente.
+        Usa messaging_config (whatsapp_number / whatsapp_numbers) y, si la
+        variable no se resolvió, TWILIO_WHATSAPP_NUMBER_{CLIENT_ID}.
+        """
+        numbers = list(config.messaging_config.get('whatsapp_numbers') or [])
+        number = config.messaging_config.get('whatsapp_number')
+        if number:
+            numbers.append(number)
+
+        numbers = [n for n in numbers if isinstance(n, str) and not n.startswith("${")]
+        if not numbers:
+            env_number = os.getenv(f"TWILIO_WHATSAPP_NUMBER_{config.client_id.upper()}")
+            if env_number:
+                numbers.append(env_number)
+
+        return numbers
+
+    def _build_number_index(self, clients: Mapping[str, ClientConfig]) -> Dict[str, str]:
+        """Construye el índice número de WhatsApp -> client_id"""
+        index: Dict[str, str] = {}
+
+        for client_id, config in sorted(clients.items()):
+            for number in self._client_whatsapp_numbers(config):
+                key = normalize_phone_number(number)
+                if key in index and index[key] != client_id:
+                    logger.warning(
+                        f"✗ WhatsApp number {number} is configured for both "
+                        f"'{index[key]}' and '{client_id}'; keeping '{index[key]}'"
+                    )
+                    continue
+                index[key] = client_id
+
+        return index
+
+    def resolve_client_id(self, whatsapp_number: str) -> Optional[str]:
+        """
+        Obtiene el client_id dueño de un número de WhatsApp (campo To del webhook).
+
+        Returns:
+            client_id o None si ningún cliente usa ese número
+        """
+        return self._snapshot.number_index.get(normalize_phone_number(whatsapp_number))
+
     def get_client_config(self, client_id: str) -> ClientConfig:
         """Obtiene la configuración de un cliente"""
-        if client_id not in self._clients:
-            raise ValueError(f"Client '{client_id}' not found. Available: {list(self._clients.keys())}")
-        return self._clients[client_id]
+        clients = self._snapshot.clients
+        if client_id not in clients:
+            raise ValueError(f"Client '{client_id}' not found. Available: {list(clients.keys())}")
+        return clients[client_id]
 
     def list_clients(self) -> list[str]:
         """Lista todos los clientes configurados"""
-        return list(self._clients.keys())
+        return list(self._snapshot.clients.keys())
 
     def reload_client(self, client_id: str):
         """Recarga la configuración de un cliente específico (hot reload)"""
-        config_file = self.config_dir / "clients" / f"{client_id}.yaml"
+        config_file = self.clients_dir / f"{client_id}.yaml"
 
         if not config_file.exists():
             raise FileNotFoundError(f"Config file not found: {config_file}")
 
-        with open(config_file, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-            data = self._replace_env_vars(data)
-            config = ClientConfig(**data)
-            self._clients[config.client_id] = config
+        # Validar primero: si el YAML es inválido se lanza el error y no se publica nada
+        self._read_client_file(config_file)
+
+        changed = self._refresh_sync(force=[config_file])
+
+        for changed_id in sorted(changed | {client_id}):
+            self._notify_reload(changed_id)
+
+    def add_reload_listener(self, listener: Callable[[str], None]):
+        """Registra un callback que se llama con el client_id tras recargar su config"""
+        self._reload_listeners.append(listener)
+
+    def _notify_reload(self, client_id: str):
+        for listener in self._reload_listeners:
+            try:
+                listener(client_id)
+            except Exception as e:
+                logger.error(f"✗ Error in reload listener for client '{client_id}': {e}", exc_info=True)
+
 
-        print(f"✓ Reloaded config for client: {client_id}")
+class ConfigWatcher:
+    """
+    Vigila configs/clients/ y recarga los YAML que cambian.
+
+    Usa watchfiles (inotify/FSEvents, viene con uvicorn[standard]) si
+    está instalado; si no, compara mtimes cada interval_seconds. Con
+    watchfiles también se revisa cada interval_seconds sin eventos, por
+    si algo cambió antes de empezar a vigilar. La detección final es
+    siempre por stamp (mtime + tamaño), así que eventos repetidos o
+    perdidos no cambian el resultado.
+    """
+
+    def __init__(self, config_manager: ConfigManager, interval_seconds: float = 2.0):
+        self.config_manager = config_manager
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+
+    def start(self):
+        if self._task is None:
+            self._stop.clear()
+            self._task = asyncio.create_task(self._run(), name="config-watcher")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        try:
+            import watchfiles
+        except ImportError:
+            watchfiles = None
+
+        directory = self.config_manager.clients_dir
+        if watchfiles is not None and directory.exists():
+            logger.info(f"👀 Watching {directory} for config changes (watchfiles)")
+            async for _ in watchfiles.awatch(
+                directory,
+                stop_event=self._stop,
+                debounce=200,
+                rust_timeout=int(self.interval_seconds * 1000),
+                yield_on_timeout=True
+            ):
+                await self._refresh()
+            return
+
+        logger.info(f"👀 Watching {directory} for config changes (polling every {self.interval_seconds}s)")
+        while not self._stop.is_set():
+            await asyncio.sleep(self.interval_seconds)
+            await self._refresh()
+
+    async def _refresh(self):
+        try:
+            changed = await self.config_manager.refresh()
+        except Exception as e:
+            logger.error(f"✗ Error reloading client configs: {e}", exc_info=True)
+            return
+        if changed:
+            logger.info(f"🔄 Client config(s) reloaded: {sorted(changed)}")
 
 
 @lru_cache
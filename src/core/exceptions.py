@@ -1,6 +1,7 @@
 """
 Excepciones personalizadas del bot template.
 """
+from typing import Optional
 
 
 class BotException(Exception):
@@ -44,10 +45,24 @@ class FeatureNotEnabledError(BotException):
         )
 
 
-class TwilioError(BotException):
+class MessagingError(BotException):
+    """
+    Error al enviar por el messaging provider.
+
+    retryable indica si conviene reintentar (rate limit, 5xx, red);
+    retry_after, cuánto pidió esperar el provider antes de volver a
+    enviar desde ese número.
+    """
+    def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message, status_code=502)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class TwilioError(MessagingError):
     """Errores relacionados con Twilio"""
-    def __init__(self, message: str):
-        super().__init__(f"Twilio error: {message}", status_code=502)
+    def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(f"Twilio error: {message}", retryable=retryable, retry_after=retry_after)
 
 
 class AIServiceError(BotException):
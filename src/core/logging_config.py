@@ -0,0 +1,278 @@
+"""
+Configuración de logging: JSON (o texto) formateado fuera del event loop.
+
+- El logger raíz tiene un único QueueHandler: en el event loop emitir un
+  log sólo crea el record y lo encola. Un QueueListener (thread propio)
+  lo formatea y lo escribe a stdout.
+- Cada request/mensaje abre un RequestLog (correlation_id = MessageSid)
+  que acumula la duración de cada etapa y al cerrarse emite un único
+  record resumen, en lugar de varias líneas INFO por mensaje.
+- Las líneas por mensaje van en DEBUG y se muestrean por cliente: un
+  request muestreado (debug_log_sample_rate del cliente o
+  settings.log_debug_sample_rate) emite todas sus líneas DEBUG, el resto
+  ninguna. Fuera de un request sólo pasan si log_level es DEBUG.
+- Al forkear (workers de src.server) el listener se detiene antes del
+  fork y se vuelve a arrancar en el padre y en el hijo: un thread no
+  sobrevive al fork y la cola no puede quedar tomada a medias.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, Optional
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+
+from src.core.config import ClientConfig, get_settings
+
+logger = logging.getLogger(__name__)
+
+# Atributos estándar de LogRecord: el resto son campos extra (logger.info(..., extra={...}))
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "taskName", "correlation_id", "client_id", "color_message",
+}
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class RequestLog:
+    """
+    Estado de logging de un request (o de un mensaje procesado por el spool).
+
+    Args:
+        correlation_id: Identificador que llevan todas sus líneas (MessageSid)
+        client_id: Cliente, si ya se conoce
+    """
+
+    def __init__(self, correlation_id: str, client_id: Optional[str] = None):
+        self.correlation_id = correlation_id
+        self.client_id = client_id
+        self.debug_sampled = False
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.fields: Dict[str, Any] = {}
+
+    def set_client(self, client_id: str, sample_rate: float):
+        """Asigna el cliente y decide (una vez por request) si se muestrean sus DEBUG"""
+        self.client_id = client_id
+        self.debug_sampled = sample_rate > 0 and random.random() < sample_rate
+
+    def add_stage(self, stage: str, seconds: float):
+        # Una etapa que se repite (un envío por segmento) suma su duración
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "client_id": self.client_id,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()},
+            "debug_sampled": self.debug_sampled,
+            **self.fields,
+        }
+
+
+_current_request: ContextVar[Optional[RequestLog]] = ContextVar("current_request_log", default=None)
+
+
+def current_request_log() -> Optional[RequestLog]:
+    """RequestLog del request en curso (None fuera de un request)"""
+    return _current_request.get()
+
+
+def record_stage(stage: str, seconds: float):
+    """Suma la duración de una etapa al resumen del request en curso"""
+    request_log = _current_request.get()
+    if request_log is not None:
+        request_log.add_stage(stage, seconds)
+
+
+@contextmanager
+def request_log(correlation_id: str, client_id: Optional[str] = None, sample_rate: float = 0.0) -> Iterator[RequestLog]:
+    """
+    Abre el contexto de logging de un request y al salir emite su resumen.
+
+    Args:
+        correlation_id: MessageSid (o un id propio si no hay)
+        client_id: Cliente, si ya se conoce
+        sample_rate: Probabilidad de emitir las líneas DEBUG de este request
+    """
+    current = RequestLog(correlation_id)
+    if client_id is not None:
+        current.set_client(client_id, sample_rate)
+
+    token = _current_request.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fields.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        _current_request.reset(token)
+        logger.info("request completed", extra={
+            "correlation_id": current.correlation_id,
+            **current.summary(),
+        })
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea con los campos extra del record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("correlation_id", "client_id"):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato de texto clásico; los campos extra se agregan como clave=valor"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = {
+            key: getattr(record, key, None) for key in ("correlation_id", "client_id")
+            if getattr(record, key, None)
+        }
+        extra.update(
+            (key, value) for key, value in record.__dict__.items()
+            if key not in _RECORD_ATTRIBUTES
+        )
+        if extra:
+            line += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        return line
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler que, en el thread que loguea, sólo agrega el contexto del
+    request (los ContextVar no existen en el thread del listener) y descarta
+    las líneas DEBUG de requests no muestreados. El formateo queda para el
+    listener.
+
+    Args:
+        log_queue: Cola compartida con el QueueListener
+        level: Nivel configurado (log_level). Lo que está por debajo sólo
+            pasa si el request en curso fue muestreado.
+    """
+
+    def __init__(self, log_queue: queue.Queue, level: int):
+        super().__init__(log_queue)
+        self.base_level = level
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Sin copiar ni pre-formatear: la cola es del mismo proceso
+        request = _current_request.get()
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = request.correlation_id if request is not None else None
+        if not hasattr(record, "client_id"):
+            record.client_id = request.client_id if request is not None else None
+        return record
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.base_level:
+            request = _current_request.get()
+            if request is None or not request.debug_sampled:
+                return False
+        return super().filter(record)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: str = "INFO", log_format: str = "json"):
+    """
+    Configura el logger raíz (y los de uvicorn) sobre la cola. Idempotente.
+
+    Args:
+        level: Nivel de logging (settings.log_level)
+        log_format: "json" o "text" (settings.log_format)
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    base_level = logging.getLevelName(level.upper())
+    if not isinstance(base_level, int):
+        base_level = logging.INFO
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter(TEXT_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    handler = ContextQueueHandler(log_queue, base_level)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(base_level)
+
+    # El muestreo es por cliente (ClientConfig.debug_log_sample_rate), así que
+    # los loggers de la app siempre dejan pasar DEBUG hasta el handler
+    logging.getLogger("src").setLevel(min(base_level, logging.DEBUG))
+
+    # uvicorn configura sus propios handlers: también van a la cola
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Vacía la cola y detiene el listener (al salir del proceso)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _pause_listener():
+    # Vacía la cola y une el thread: el fork copia la cola sin locks tomados
+    if _listener is not None:
+        _listener.stop()
+
+
+def _resume_listener():
+    if _listener is not None:
+        _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=_pause_listener,
+        after_in_parent=_resume_listener,
+        after_in_child=_resume_listener
+    )
+
+
+def debug_sample_rate(client_config: ClientConfig) -> float:
+    """Tasa de muestreo de DEBUG de un cliente (su YAML o settings.log_debug_sample_rate)"""
+    rate = client_config.debug_log_sample_rate
+    return get_settings().log_debug_sample_rate if rate is None else rate
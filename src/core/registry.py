@@ -0,0 +1,66 @@
+"""
+Registro de implementaciones por nombre con import diferido.
+
+Las features, los providers de IA y los clientes de mensajería se
+registran como "modulo:atributo" y el módulo se importa recién la
+primera vez que alguien pide ese nombre. Así un proceso no paga el
+import de SDKs (y sus dependencias) que ningún cliente usa, y arrancar
+un worker nuevo es más rápido.
+"""
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator
+import importlib
+import threading
+
+
+class LazyRegistry(Mapping):
+    """
+    Mapping nombre -> objeto que importa cada entrada al accederla.
+
+    Uso:
+        PROVIDERS = LazyRegistry({
+            'gemini': 'src.features.ai_responses.providers.gemini_provider:GeminiProvider',
+        })
+        provider_class = PROVIDERS.get('gemini')   # importa el módulo acá
+
+    Iterar, len() e `in` no importan nada.
+    """
+
+    def __init__(self, targets: Dict[str, str]):
+        self._targets = dict(targets)
+        self._loaded: Dict[str, Any] = {}
+        # Los runtimes se construyen en threads (to_thread): un import a la vez
+        self._lock = threading.Lock()
+
+    def register(self, name: str, target: str):
+        """Agrega (o reemplaza) una entrada "modulo:atributo" """
+        with self._lock:
+            self._targets[name] = target
+            self._loaded.pop(name, None)
+
+    def __getitem__(self, name: str) -> Any:
+        loaded = self._loaded.get(name)
+        if loaded is not None:
+            return loaded
+
+        target = self._targets[name]
+        with self._lock:
+            loaded = self._loaded.get(name)
+            if loaded is None:
+                module_name, _, attribute = target.partition(":")
+                loaded = getattr(importlib.import_module(module_name), attribute)
+                self._loaded[name] = loaded
+        return loaded
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._targets)
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._targets
+
+    def is_loaded(self, name: str) -> bool:
+        """Si la entrada ya fue importada"""
+        return name in self._loaded
@@ -0,0 +1,233 @@
+"""
+Runtime por cliente (tenant).
+
+Cada cliente tiene un FeatureManager con sus features ya inicializadas
+(incluyendo el provider de IA). Se construye una sola vez al arrancar
+la app y los webhooks lo reutilizan en lugar de recrearlo por mensaje.
+
+Cuando cambia el YAML de un cliente su runtime se reemplaza: los
+requests nuevos usan el nuevo y el viejo se cierra cuando terminan los
+requests que lo estaban usando (ver TenantRuntimeRegistry.lease).
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Mapping, Set, Type, Optional, Iterable
+import logging
+
+from src.core.config import ClientConfig, get_config_manager
+from src.core.feature_manager import FeatureManager
+from src.features.base_feature import BaseFeature
+
+logger = logging.getLogger(__name__)
+
+
+class TenantRuntime:
+    """
+    Estado de larga vida de un cliente: su configuración y sus features activas.
+    """
+
+    def __init__(self, client_config: ClientConfig, feature_manager: FeatureManager):
+        self.client_config = client_config
+        self.feature_manager = feature_manager
+        self._closed = False
+        # Requests en curso que usan este runtime y si ya fue reemplazado
+        self._leases = 0
+        self._retired = False
+
+    @property
+    def client_id(self) -> str:
+        return self.client_config.client_id
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def get_feature(self, name: str) -> Optional[BaseFeature]:
+        """Obtiene una feature activa del cliente"""
+        return self.feature_manager.get_feature(name)
+
+    def is_enabled(self, name: str) -> bool:
+        """Verifica si una feature está activa para el cliente"""
+        return self.feature_manager.is_enabled(name)
+
+    def retire(self):
+        """Marca el runtime como reemplazado: se cierra al liberarse el último lease"""
+        self._retired = True
+        if self._leases == 0:
+            self.close()
+
+    def _acquire(self):
+        self._leases += 1
+
+    def _release(self):
+        self._leases -= 1
+        if self._retired and self._leases == 0:
+            self.close()
+
+    def close(self):
+        """Libera las features del cliente. Idempotente: sólo limpia una vez."""
+        if self._closed:
+            return
+        self._closed = True
+        self.feature_manager.cleanup_all()
+        logger.info(f"Runtime closed for client: {self.client_id}")
+
+
+class TenantRuntimeRegistry:
+    """
+    Registro de runtimes por cliente.
+
+    Se crea en el lifespan de la app, se precalienta en paralelo para todos
+    los clientes configurados y se limpia una única vez en el shutdown.
+    """
+
+    def __init__(self, available_features: Mapping[str, Type[BaseFeature]]):
+        self._available_features = available_features
+        self._runtimes: Dict[str, TenantRuntime] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._rebuilds: Set[asyncio.Task] = set()
+
+    def _build_runtime(self, client_id: str) -> TenantRuntime:
+        """Construye el runtime de un cliente (síncrono, se ejecuta en un thread)"""
+        client_config = get_config_manager().get_client_config(client_id)
+        feature_manager = FeatureManager()
+
+        try:
+            # Activar solo las features habilitadas para este cliente
+            for feature_name, feature_config in client_config.features.items():
+                if not feature_config.enabled:
+                    continue
+
+                feature_class = self._available_features.get(feature_name)
+                if feature_class is None:
+                    logger.warning(f"Feature '{feature_name}' not available (not implemented yet)")
+                    continue
+
+                feature_manager.register_feature(feature_name, feature_class)
+                feature_manager.enable_feature(feature_name, feature_config.config)
+
+        except Exception:
+            feature_manager.cleanup_all()
+            raise
+
+        logger.info(
+            f"✓ Runtime ready for client: {client_id} "
+            f"(features: {feature_manager.list_active_features()})"
+        )
+        return TenantRuntime(client_config, feature_manager)
+
+    async def get(self, client_id: str) -> TenantRuntime:
+        """
+        Obtiene el runtime listo de un cliente, construyéndolo si no existe.
+
+        Args:
+            client_id: ID del cliente
+
+        Returns:
+            Runtime del cliente
+
+        Raises:
+            ValueError: Si el cliente no está configurado
+        """
+        runtime = self._runtimes.get(client_id)
+        if runtime is not None:
+            return runtime
+
+        lock = self._locks.setdefault(client_id, asyncio.Lock())
+        async with lock:
+            # Otro request pudo haberlo construido mientras esperábamos
+            runtime = self._runtimes.get(client_id)
+            while runtime is None:
+                runtime = await asyncio.to_thread(self._build_runtime, client_id)
+                if runtime.client_config is not get_config_manager().snapshot().clients.get(client_id):
+                    # La config cambió mientras se construía: construir con la nueva
+                    runtime.close()
+                    runtime = None
+                    # Si el cliente se eliminó, lanza ValueError
+                    get_config_manager().get_client_config(client_id)
+            self._runtimes[client_id] = runtime
+            return runtime
+
+    @asynccontextmanager
+    async def lease(self, client_id: str) -> AsyncIterator[TenantRuntime]:
+        """
+        Runtime del cliente para la duración de un request.
+
+        Si la config del cliente se recarga mientras tanto, el request
+        sigue con este runtime y el runtime se cierra al terminar.
+
+        Raises:
+            ValueError: Si el cliente no está configurado
+        """
+        runtime = await self.get(client_id)
+        runtime._acquire()
+        try:
+            yield runtime
+        finally:
+            runtime._release()
+
+    def invalidate(self, client_id: str):
+        """
+        Descarta el runtime de un cliente (su config cambió o se eliminó).
+
+        El runtime viejo se cierra cuando lo liberan los requests en curso.
+        Si el cliente sigue configurado y hay un event loop, el nuevo se
+        construye en background para que el próximo mensaje no lo espere.
+        """
+        runtime = self._runtimes.pop(client_id, None)
+        if runtime is not None:
+            logger.info(f"🔄 Replacing runtime for client: {client_id}")
+            runtime.retire()
+
+        if client_id not in get_config_manager().list_clients():
+            self._locks.pop(client_id, None)
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        task = loop.create_task(self.warm_up([client_id]))
+        self._rebuilds.add(task)
+        task.add_done_callback(self._rebuilds.discard)
+
+    async def warm_up(self, client_ids: Iterable[str]):
+        """
+        Construye en paralelo los runtimes de los clientes indicados.
+        Los clientes que fallan se loguean y se reintentan en su primer webhook.
+        """
+        client_ids = list(client_ids)
+        results = await asyncio.gather(
+            *(self.get(client_id) for client_id in client_ids),
+            return_exceptions=True
+        )
+
+        for client_id, result in zip(client_ids, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to warm up runtime for '{client_id}': {result}")
+
+        ready = len(client_ids) - sum(isinstance(r, BaseException) for r in results)
+        logger.info(f"✓ Warmed up {ready}/{len(client_ids)} client runtime(s)")
+
+    def list_runtimes(self) -> list[str]:
+        """Lista los clientes con runtime activo"""
+        return list(self._runtimes.keys())
+
+    def ready_runtimes(self) -> list[TenantRuntime]:
+        """Runtimes ya construidos (no construye los que faltan)"""
+        return list(self._runtimes.values())
+
+    def shutdown(self):
+        """Cierra todos los runtimes (una vez cada uno)"""
+        for task in list(self._rebuilds):
+            task.cancel()
+
+        runtimes = list(self._runtimes.values())
+        self._runtimes.clear()
+
+        for runtime in runtimes:
+            try:
+                runtime.close()
+            except Exception as e:
+                logger.error(f"Error closing runtime '{runtime.client_id}': {e}")
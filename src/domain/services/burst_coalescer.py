@@ -0,0 +1,213 @@
+"""
+Agrupación de ráfagas de mensajes del mismo usuario.
+
+En WhatsApp es común escribir varias líneas seguidas ("hola", "quería
+saber", "si abren el domingo"). Sin agrupar, cada una genera su propia
+llamada al LLM y su propia respuesta, que además pueden llegar
+desordenadas.
+
+Estrategia (leading edge, sin demora para mensajes sueltos):
+1. El primer mensaje abre una ráfaga y la respuesta se empieza a generar
+   de inmediato.
+2. Si llega otro mensaje del mismo usuario mientras esa respuesta se
+   genera (a menos de debounce_seconds del anterior, dentro de
+   max_wait_seconds desde el primero y por debajo de max_messages), la
+   generación en curso se cancela y se reinicia con todos los mensajes
+   combinados.
+3. Una vez que la respuesta empezó a enviarse (Burst.seal) la ráfaga ya
+   no se reinicia: el mensaje siguiente abre otra ráfaga, que se genera
+   después de que termine la anterior para que las respuestas salgan en
+   orden.
+4. Sólo el último mensaje de la ráfaga responde; los anteriores quedan
+   marcados como agrupados (superseded) apenas llega el siguiente.
+
+El costo de agrupar son las generaciones canceladas, no latencia: un
+mensaje suelto se responde igual que sin agrupación.
+
+Es por proceso: con varios workers, los mensajes de un usuario sólo se
+agrupan si los atiende el mismo proceso.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BurstResult:
+    """Resultado de procesar un mensaje de una ráfaga"""
+    superseded: bool
+    value: Any = None
+    message_count: int = 1
+
+
+@dataclass
+class Burst:
+    """
+    Ráfaga que responde run(). Es el mismo objeto en cada reinicio, así
+    que run() puede guardar acá lo que no tiene que repetir (admitted).
+    """
+    messages: List[str] = field(default_factory=list)
+    first_message_at: float = 0.0
+    last_message_at: float = 0.0
+    # run() ya contó la ráfaga (ej: en el rate limit); los reinicios no la vuelven a contar
+    admitted: bool = False
+    # La respuesta empezó a enviarse: no se puede reiniciar
+    sealed: bool = False
+    # Ráfaga anterior de la misma clave (se espera a que termine)
+    previous: Optional["Burst"] = None
+    # Future y run() del último mensaje (el que responde por la ráfaga)
+    waiter: Optional[asyncio.Future] = None
+    run: Optional[Callable[["Burst"], Awaitable[Any]]] = None
+    task: Optional[asyncio.Task] = None
+    started: bool = False
+
+    @property
+    def text(self) -> str:
+        """Mensajes de la ráfaga combinados en un solo turno"""
+        return "\n".join(self.messages)
+
+    def seal(self):
+        """Marca que la respuesta empezó a enviarse (desde acá no se reinicia)"""
+        self.sealed = True
+
+    def accepts(
+        self,
+        now: float,
+        debounce_seconds: float,
+        max_wait_seconds: Optional[float],
+        max_messages: int
+    ) -> bool:
+        """Si un mensaje que llega en now se suma a esta ráfaga"""
+        return (
+            not self.sealed
+            and self.task is not None
+            and not self.task.done()
+            and now - self.last_message_at <= debounce_seconds
+            and (max_wait_seconds is None or now - self.first_message_at <= max_wait_seconds)
+            and len(self.messages) < max_messages
+        )
+
+
+class BurstCoalescer:
+    """
+    Agrupa los mensajes de una misma clave (cliente + teléfono) que llegan
+    mientras se genera la respuesta y responde una sola vez.
+
+    Uso:
+        result = await coalescer.submit(key, message, run, debounce_seconds=2)
+        if result.superseded:
+            # otro mensaje posterior responde por este
+        else:
+            reply = result.value
+    """
+
+    def __init__(self):
+        # Última ráfaga de cada clave, hasta que termina su generación
+        self._bursts: Dict[Tuple[str, str], Burst] = {}
+        self._stats = {"bursts": 0, "coalesced": 0, "restarts": 0}
+
+    async def submit(
+        self,
+        key: Tuple[str, str],
+        message: str,
+        run: Callable[[Burst], Awaitable[Any]],
+        debounce_seconds: float,
+        max_wait_seconds: Optional[float] = None,
+        max_messages: int = 5
+    ) -> BurstResult:
+        """
+        Procesa un mensaje, sumándolo a la ráfaga abierta si la hay.
+
+        Args:
+            key: (client_id, teléfono)
+            message: Texto del mensaje
+            run: Corrutina que genera la respuesta para la ráfaga (burst.text);
+                se usa la del último mensaje. Tiene que llamar a burst.seal()
+                antes de enviar algo
+            debounce_seconds: Tiempo máximo entre mensajes de una misma ráfaga
+            max_wait_seconds: Tiempo máximo desde el primer mensaje (default: sin límite)
+            max_messages: Máximo de mensajes por ráfaga (limita los reinicios)
+
+        Returns:
+            BurstResult con el valor de run() o superseded=True
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        burst = self._bursts.get(key)
+
+        if burst is not None and burst.accepts(now, debounce_seconds, max_wait_seconds, max_messages):
+            # El mensaje anterior ya no responde: lo hace este (o uno posterior)
+            if not burst.waiter.done():
+                burst.waiter.set_result(BurstResult(superseded=True, message_count=len(burst.messages)))
+            self._stats["coalesced"] += 1
+            if burst.started:
+                self._stats["restarts"] += 1
+            burst.task.cancel()
+        else:
+            burst = Burst(first_message_at=now, previous=burst)
+            self._bursts[key] = burst
+            self._stats["bursts"] += 1
+
+        burst.messages.append(message)
+        burst.last_message_at = now
+        burst.run = run
+        waiter = burst.waiter = loop.create_future()
+
+        task = burst.task = asyncio.create_task(self._generate(key, burst))
+        task.add_done_callback(lambda done: self._generated(key, burst, done))
+
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # Nadie más va a usar la respuesta de esta ráfaga
+            if burst.waiter is waiter:
+                burst.task.cancel()
+                if self._bursts.get(key) is burst:
+                    del self._bursts[key]
+            raise
+
+    async def _generate(self, key: Tuple[str, str], burst: Burst) -> Any:
+        previous = burst.previous
+        if previous is not None and previous.task is not None:
+            # Responder en orden: la ráfaga anterior termina primero
+            await asyncio.gather(previous.task, return_exceptions=True)
+            burst.previous = None
+
+        if len(burst.messages) > 1:
+            logger.debug(f"🧩 Coalesced {len(burst.messages)} messages from {key[1]} ({key[0]})")
+
+        burst.started = True
+        return await burst.run(burst)
+
+    def _generated(self, key: Tuple[str, str], burst: Burst, task: asyncio.Task):
+        if burst.task is not task:
+            # Generación reiniciada: responde la nueva
+            return
+        if self._bursts.get(key) is burst:
+            del self._bursts[key]
+
+        waiter = burst.waiter
+        if waiter.done():
+            return
+        if task.cancelled():
+            waiter.cancel()
+        elif task.exception() is not None:
+            waiter.set_exception(task.exception())
+        else:
+            waiter.set_result(BurstResult(
+                superseded=False, value=task.result(), message_count=len(burst.messages)
+            ))
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de ráfagas, mensajes agrupados y generaciones reiniciadas"""
+        return {**self._stats, "open_bursts": len(self._bursts)}
+
+
+@lru_cache
+def get_burst_coalescer() -> BurstCoalescer:
+    """Obtiene el BurstCoalescer del proceso (cached, singleton)"""
+    return BurstCoalescer()
@@ -0,0 +1,222 @@
+"""
+Historial de conversaciones con cache caliente por teléfono.
+
+Las lecturas salen del ConversationHistoryCache; sólo la primera lectura
+de una conversación (o después de que fue desalojada) consulta la base.
+Las escrituras actualizan el cache al instante y se persisten en background.
+Los turnos que salen del ring buffer se condensan en el resumen de la
+conversación, que se guarda junto a ella.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+from src.core.config import ClientConfig, get_settings
+from src.domain.services.conversation_summary import fold_into_summary
+from src.infrastructure.cache.history_cache import ConversationHistoryCache
+from src.infrastructure.database.repositories.conversation_repository import ConversationRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConversationState:
+    """Turnos recientes y resumen de los anteriores"""
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    summary: Optional[str] = None
+
+
+class ConversationHistoryStore:
+    """
+    Fachada de historial: cache en memoria delante del repositorio SQL.
+
+    Args:
+        cache: Cache de conversaciones recientes
+        default_database_url: URL usada si el cliente no define database_url
+        summary_max_chars: Tamaño máximo del resumen guardado por conversación
+    """
+
+    def __init__(
+        self,
+        cache: ConversationHistoryCache,
+        default_database_url: str,
+        summary_max_chars: int = 2000
+    ):
+        self.cache = cache
+        self.default_database_url = default_database_url
+        self.summary_max_chars = summary_max_chars
+        self._repositories: Dict[Tuple[str, str], ConversationRepository] = {}
+        self._pending_writes: Set[asyncio.Task] = set()
+        # Última escritura por conversación: las escrituras de un mismo teléfono van en orden
+        self._last_write: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def _repository(self, client_config: ClientConfig) -> ConversationRepository:
+        database_url = client_config.database_url or self.default_database_url
+        key = (database_url, client_config.client_id)
+
+        repository = self._repositories.get(key)
+        if repository is None:
+            repository = ConversationRepository(database_url, client_config.client_id)
+            self._repositories[key] = repository
+        return repository
+
+    async def get_conversation(self, client_config: ClientConfig, phone_number: str) -> ConversationState:
+        """
+        Obtiene los turnos recientes y el resumen de una conversación.
+
+        Los turnos son {'role': 'user'|'assistant', 'content': str} en orden cronológico.
+        """
+        client_id = client_config.client_id
+        turns = self.cache.get(client_id, phone_number)
+        if turns is not None:
+            return ConversationState(turns, self.cache.get_summary(client_id, phone_number))
+
+        repository = self._repository(client_config)
+        try:
+            turns, summary = await asyncio.gather(
+                repository.get_recent(phone_number, self.cache.max_turns),
+                repository.get_summary(phone_number),
+            )
+        except Exception as e:
+            logger.error(f"Error loading conversation history: {e}", exc_info=True)
+            return ConversationState()
+
+        # record_turn pudo cargarla mientras tanto (con los turnos nuevos): no pisarla
+        if self.cache.contains(client_id, phone_number):
+            return ConversationState(
+                self.cache.get(client_id, phone_number), self.cache.get_summary(client_id, phone_number)
+            )
+
+        self.cache.put(client_id, phone_number, turns, summary)
+        return ConversationState(turns, summary)
+
+    async def get_history(self, client_config: ClientConfig, phone_number: str) -> List[Dict[str, str]]:
+        """Obtiene sólo los turnos recientes de una conversación"""
+        return (await self.get_conversation(client_config, phone_number)).turns
+
+    def record_turn(
+        self,
+        client_config: ClientConfig,
+        phone_number: str,
+        user_message: str,
+        response: str
+    ):
+        """
+        Registra un intercambio usuario/bot.
+        El cache se actualiza ya; la escritura en la base corre en background.
+
+        Si la conversación no está cacheada, antes de registrarlo se carga
+        de la base: así se sabe qué turnos salen de la ventana y pasan al resumen.
+        """
+        client_id = client_config.client_id
+        turns = [
+            {'role': 'user', 'content': user_message},
+            {'role': 'assistant', 'content': response},
+        ]
+
+        key = (client_id, phone_number)
+        previous = self._last_write.get(key)
+        if self.cache.contains(client_id, phone_number):
+            summary = self._append_to_cache(client_id, phone_number, turns)
+            write = self._persist(client_config, phone_number, turns, summary, previous)
+        else:
+            write = self._load_and_persist(client_config, phone_number, turns, previous)
+
+        task = asyncio.create_task(write)
+        self._last_write[key] = task
+        self._pending_writes.add(task)
+        task.add_done_callback(lambda t: self._write_done(key, t))
+
+    def _append_to_cache(
+        self,
+        client_id: str,
+        phone_number: str,
+        turns: List[Dict[str, str]]
+    ) -> Optional[str]:
+        """Agrega los turnos al cache y devuelve el resumen nuevo (None si no cambió)"""
+        dropped = self.cache.append(client_id, phone_number, turns)
+        if not dropped:
+            return None
+
+        # Los turnos que salen del ring buffer pasan al resumen
+        summary = fold_into_summary(
+            self.cache.get_summary(client_id, phone_number), dropped, self.summary_max_chars
+        )
+        self.cache.set_summary(client_id, phone_number, summary)
+        return summary
+
+    async def _load_and_persist(
+        self,
+        client_config: ClientConfig,
+        phone_number: str,
+        turns: List[Dict[str, str]],
+        previous: Optional[asyncio.Task] = None
+    ):
+        # Después de las escrituras anteriores: la base ya tiene todos los turnos previos
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+
+        client_id = client_config.client_id
+        if not self.cache.contains(client_id, phone_number):
+            repository = self._repository(client_config)
+            try:
+                recent, summary = await asyncio.gather(
+                    repository.get_recent(phone_number, self.cache.max_turns),
+                    repository.get_summary(phone_number),
+                )
+            except Exception as e:
+                # Sin la conversación no se puede resumir: se guardan sólo los turnos
+                logger.error(f"Error loading conversation history: {e}", exc_info=True)
+                await self._persist(client_config, phone_number, turns, None)
+                return
+
+            # Mientras tanto pudo cargarla get_conversation (con el mismo contenido)
+            if not self.cache.contains(client_id, phone_number):
+                self.cache.put(client_id, phone_number, recent, summary)
+
+        summary = self._append_to_cache(client_id, phone_number, turns)
+        await self._persist(client_config, phone_number, turns, summary)
+
+    def _write_done(self, key: Tuple[str, str], task: asyncio.Task):
+        self._pending_writes.discard(task)
+        if self._last_write.get(key) is task:
+            del self._last_write[key]
+
+    async def _persist(
+        self,
+        client_config: ClientConfig,
+        phone_number: str,
+        turns: List[Dict[str, str]],
+        summary: Optional[str],
+        previous: Optional[asyncio.Task] = None
+    ):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+
+        repository = self._repository(client_config)
+        try:
+            await repository.add_messages(phone_number, turns)
+            if summary is not None:
+                await repository.save_summary(phone_number, summary)
+        except Exception as e:
+            logger.error(f"Error saving conversation: {e}", exc_info=True)
+
+    async def flush(self):
+        """Espera a que terminen las escrituras pendientes (shutdown)"""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+
+
+@lru_cache
+def get_history_store() -> ConversationHistoryStore:
+    """Obtiene el ConversationHistoryStore del proceso (cached, singleton)"""
+    settings = get_settings()
+    cache = ConversationHistoryCache(
+        max_turns=settings.history_cache_max_turns,
+        max_bytes=settings.history_cache_max_mb * 1024 * 1024,
+    )
+    return ConversationHistoryStore(
+        cache, settings.database_url, summary_max_chars=settings.history_summary_max_chars
+    )
@@ -0,0 +1,56 @@
+"""
+Resumen incremental de conversaciones.
+
+Los turnos viejos que ya no entran en el prompt se condensan en un
+resumen extractivo (sin llamar al modelo): una línea corta por turno,
+descartando las más antiguas cuando el resumen supera su tamaño máximo.
+"""
+from typing import Dict, List, Optional
+import re
+
+ROLE_LABELS = {'user': 'Usuario', 'assistant': 'Asistente'}
+
+# Largo máximo de cada línea del resumen
+MAX_LINE_CHARS = 120
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _condense(content: str) -> str:
+    """Primera oración del turno, recortada a MAX_LINE_CHARS"""
+    content = " ".join(content.split())
+    first = _SENTENCE_END.split(content, maxsplit=1)[0]
+    if len(first) > MAX_LINE_CHARS:
+        first = first[:MAX_LINE_CHARS - 1].rstrip() + "…"
+    return first
+
+
+def fold_into_summary(
+    summary: Optional[str],
+    turns: List[Dict[str, str]],
+    max_chars: int
+) -> Optional[str]:
+    """
+    Agrega turnos al resumen existente.
+
+    Args:
+        summary: Resumen actual (o None)
+        turns: Turnos a incorporar, en orden cronológico
+        max_chars: Tamaño máximo del resumen resultante
+
+    Returns:
+        Resumen actualizado y recortado a max_chars (o None si queda vacío)
+    """
+    lines = summary.split("\n") if summary else []
+    for turn in turns:
+        label = ROLE_LABELS.get(turn['role'], turn['role'])
+        lines.append(f"- {label}: {_condense(turn['content'])}")
+
+    # Descartar las líneas más viejas hasta entrar en el tamaño máximo
+    total = sum(len(line) + 1 for line in lines)
+    start = 0
+    while total > max_chars and start < len(lines):
+        total -= len(lines[start]) + 1
+        start += 1
+
+    return "\n".join(lines[start:]) or None
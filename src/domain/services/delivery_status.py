@@ -0,0 +1,232 @@
+"""
+Ingesta de callbacks de estado de entrega (sent/delivered/read/failed).
+
+Twilio llama a /webhook/status por cada cambio de estado de cada mensaje
+enviado: en lugar de una escritura por callback, las actualizaciones se
+acumulan en memoria (una fila por MessageSid, quedándose con el estado más
+avanzado) y se escriben en lote con un único upsert multi-fila, cuando el
+lote se llena (delivery_status_batch_size) o cada
+delivery_status_flush_interval_seconds.
+
+Un callback aceptado y todavía no escrito se pierde si el proceso muere:
+es telemetría, y Twilio no reintenta un 2xx.
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import time
+
+from src.core.config import ClientConfig, get_settings
+from src.infrastructure.database.models.delivery import STATUS_RANKS, STATUS_TIMESTAMPS
+from src.infrastructure.database.repositories.delivery_repository import DeliveryRepository
+from src.infrastructure.metrics import DELIVERY_STATUS_FLUSH_SECONDS, DELIVERY_STATUS_UPDATES
+from src.utils.phone import normalize_phone_number
+
+logger = logging.getLogger(__name__)
+
+_TIMESTAMP_COLUMNS = tuple(sorted(set(STATUS_TIMESTAMPS.values())))
+
+
+def delivery_row(
+    message_sid: str,
+    client_id: str,
+    to_number: str,
+    status: str,
+    error_code: Optional[str] = None,
+    at: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Fila de message_deliveries para un estado recibido.
+
+    Todas las filas tienen las mismas columnas (requisito del insert multi-fila).
+    """
+    at = at or datetime.utcnow()
+    row = {
+        "message_sid": message_sid,
+        "client_id": client_id,
+        "to_number": normalize_phone_number(to_number),
+        "status": status,
+        "status_rank": STATUS_RANKS[status],
+        "error_code": error_code,
+        "created_at": at,
+        "updated_at": at,
+    }
+    row.update(dict.fromkeys(_TIMESTAMP_COLUMNS))
+    column = STATUS_TIMESTAMPS.get(status)
+    if column is not None:
+        row[column] = at
+    return row
+
+
+def _merge(existing: Dict[str, Any], row: Dict[str, Any]):
+    """Combina dos estados del mismo mensaje (mismo criterio que el upsert)"""
+    if row["status_rank"] > existing["status_rank"]:
+        existing["status"] = row["status"]
+        existing["status_rank"] = row["status_rank"]
+    existing["error_code"] = row["error_code"] or existing["error_code"]
+    existing["created_at"] = min(existing["created_at"], row["created_at"])
+    existing["updated_at"] = max(existing["updated_at"], row["updated_at"])
+    for column in _TIMESTAMP_COLUMNS:
+        if existing[column] is None:
+            existing[column] = row[column]
+
+
+class DeliveryStatusBuffer:
+    """
+    Buffer de estados de entrega con escritura en lote por base de datos.
+
+    Args:
+        default_database_url: URL usada si el cliente no define database_url
+        batch_size: Filas pendientes que disparan una escritura inmediata
+        flush_interval: Segundos máximos que una fila espera en memoria
+        max_pending: Filas pendientes a partir de las cuales add() rechaza
+            (la base no da abasto: el endpoint responde 503)
+    """
+
+    def __init__(
+        self,
+        default_database_url: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 50_000
+    ):
+        self.default_database_url = default_database_url
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # database_url -> message_sid -> fila
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._pending_count = 0
+        self._repositories: Dict[str, DeliveryRepository] = {}
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._closed = False
+        self._accepted = 0
+        self._rejected = 0
+        self._written = 0
+        self._flushes = 0
+        self._flush_errors = 0
+
+    def add(self, client_config: ClientConfig, row: Dict[str, Any]) -> bool:
+        """
+        Encola un estado (ver delivery_row). No escribe: sólo toca memoria.
+
+        Returns:
+            False si el buffer está lleno o cerrado y el estado no se aceptó
+        """
+        if self._closed or self._pending_count >= self.max_pending:
+            self._rejected += 1
+            return False
+
+        database_url = client_config.database_url or self.default_database_url
+        pending = self._pending.setdefault(database_url, {})
+        existing = pending.get(row["message_sid"])
+        if existing is None:
+            pending[row["message_sid"]] = row
+            self._pending_count += 1
+        else:
+            _merge(existing, row)
+
+        self._accepted += 1
+        DELIVERY_STATUS_UPDATES.inc(row["client_id"], row["status"])
+        self._ensure_started()
+        if self._pending_count >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    def _ensure_started(self):
+        # El task se crea con el primer estado: el buffer puede construirse fuera del loop
+        if self._task is None or self._task.done():
+            self._batch_ready = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            if self._pending_count:
+                await self.flush()
+
+    def _repository(self, database_url: str) -> DeliveryRepository:
+        repository = self._repositories.get(database_url)
+        if repository is None:
+            repository = DeliveryRepository(database_url)
+            self._repositories[database_url] = repository
+        return repository
+
+    async def flush(self):
+        """Escribe todo lo pendiente (un upsert por base; si falla, las filas vuelven al buffer)"""
+        if self._flush_lock is None:
+            return
+
+        async with self._flush_lock:
+            batches, self._pending, self._pending_count = self._pending, {}, 0
+
+            for database_url, rows in batches.items():
+                started = time.perf_counter()
+                try:
+                    await self._repository(database_url).upsert_many(list(rows.values()))
+                except Exception as e:
+                    self._flush_errors += 1
+                    logger.error(f"Error writing {len(rows)} delivery status(es): {e}", exc_info=True)
+                    self._restore(database_url, rows)
+                    continue
+                finally:
+                    DELIVERY_STATUS_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+                self._written += len(rows)
+                self._flushes += 1
+
+    def _restore(self, database_url: str, rows: Dict[str, Dict[str, Any]]):
+        # Lo recibido mientras se escribía es más nuevo: se combina encima
+        pending = self._pending.setdefault(database_url, {})
+        for message_sid, row in rows.items():
+            newer = pending.get(message_sid)
+            if newer is None:
+                pending[message_sid] = row
+                self._pending_count += 1
+            else:
+                _merge(row, newer)
+                pending[message_sid] = row
+
+    async def close(self):
+        """Detiene el flush periódico y escribe lo pendiente (shutdown)"""
+        self._closed = True
+        if self._task is not None:
+            # Con el lock tomado el task no está a mitad de una escritura
+            async with self._flush_lock:
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._pending_count:
+            logger.warning(f"⚠️ {self._pending_count} delivery status(es) could not be written on shutdown")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._pending_count,
+            "accepted": self._accepted,
+            "rejected": self._rejected,
+            "written": self._written,
+            "flushes": self._flushes,
+            "flush_errors": self._flush_errors,
+        }
+
+
+@lru_cache
+def get_delivery_status_buffer() -> DeliveryStatusBuffer:
+    """Obtiene el DeliveryStatusBuffer del proceso (cached, singleton)"""
+    settings = get_settings()
+    return DeliveryStatusBuffer(
+        settings.database_url,
+        batch_size=settings.delivery_status_batch_size,
+        flush_interval=settings.delivery_status_flush_interval_seconds,
+        max_pending=settings.delivery_status_max_pending
+    )
@@ -0,0 +1,161 @@
+"""
+División de respuestas en mensajes de WhatsApp.
+
+- split_message: corta un texto completo en partes que respetan el
+  tamaño máximo de un mensaje, preferentemente en fin de oración.
+- SentenceSegmenter: hace lo mismo sobre un stream de tokens; el primer
+  segmento se entrega apenas se completa su primera oración para bajar
+  el tiempo hasta el primer mensaje.
+- SegmentSender: envía los segmentos en orden, sin frenar el stream.
+"""
+from typing import Awaitable, Callable, List, Optional
+import asyncio
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Límite del Body de un mensaje de WhatsApp en Twilio
+WHATSAPP_MAX_MESSAGE_CHARS = 1600
+
+# Fin de oración: puntuación (y comillas/paréntesis de cierre) seguida de espacio,
+# o salto de línea. Exigir el espacio evita cortar en "3.5" o a mitad de un token.
+_SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*\s+|\n+")
+
+
+def _cut_position(text: str, max_chars: int) -> int:
+    """Posición donde cortar text para que la primera parte no supere max_chars"""
+    window = text[:max_chars + 1]
+
+    boundaries = [match.end() for match in _SENTENCE_END.finditer(window)]
+    if boundaries and boundaries[-1] > 0:
+        return min(boundaries[-1], max_chars)
+
+    space = window.rfind(" ")
+    if space > 0:
+        return space
+
+    return max_chars
+
+
+def split_message(text: str, max_chars: int = WHATSAPP_MAX_MESSAGE_CHARS) -> List[str]:
+    """
+    Divide un texto en mensajes de hasta max_chars caracteres.
+
+    Corta en el último fin de oración que entre; si no hay, en el último
+    espacio; como último recurso, a max_chars exactos.
+    """
+    parts = []
+    text = text.strip()
+
+    while len(text) > max_chars:
+        cut = _cut_position(text, max_chars)
+        part = text[:cut].strip()
+        if part:
+            parts.append(part)
+        text = text[cut:].strip()
+
+    if text:
+        parts.append(text)
+
+    return parts
+
+
+class SentenceSegmenter:
+    """
+    Segmenta un stream de tokens en mensajes de WhatsApp.
+
+    - El primer segmento se emite en el primer fin de oración a partir de
+      first_segment_min_chars caracteres.
+    - El resto se acumula y se emite al llenar un mensaje (cortando en fin
+      de oración) o al terminar el stream.
+
+    Uso:
+        segmenter = SentenceSegmenter(max_chars=1600)
+        async for delta in stream:
+            for segment in segmenter.feed(delta):
+                await send(segment)
+        for segment in segmenter.flush():
+            await send(segment)
+    """
+
+    def __init__(
+        self,
+        max_chars: int = WHATSAPP_MAX_MESSAGE_CHARS,
+        first_segment_min_chars: int = 40
+    ):
+        self.max_chars = max_chars
+        self.first_segment_min_chars = min(first_segment_min_chars, max_chars)
+        self._buffer = ""
+        self._first_emitted = False
+
+    def feed(self, delta: str) -> List[str]:
+        """Agrega texto del stream y retorna los segmentos completos"""
+        self._buffer += delta
+        segments = []
+
+        if not self._first_emitted:
+            for match in _SENTENCE_END.finditer(self._buffer, self.first_segment_min_chars):
+                if match.end() <= self.max_chars:
+                    segments.extend(self._take(match.end()))
+                break
+
+        while len(self._buffer) > self.max_chars:
+            segments.extend(self._take(_cut_position(self._buffer, self.max_chars)))
+
+        return segments
+
+    def flush(self) -> List[str]:
+        """Retorna lo que queda en el buffer al terminar el stream"""
+        segments = split_message(self._buffer, self.max_chars)
+        self._buffer = ""
+        if segments:
+            self._first_emitted = True
+        return segments
+
+    def _take(self, cut: int) -> List[str]:
+        segment = self._buffer[:cut].strip()
+        self._buffer = self._buffer[cut:].lstrip()
+        if not segment:
+            return []
+        self._first_emitted = True
+        return [segment]
+
+
+class SegmentSender:
+    """
+    Envía segmentos en orden con una única tarea consumidora.
+
+    submit() no espera al envío, así el stream del LLM sigue leyéndose
+    mientras sale el mensaje anterior.
+
+    Args:
+        send: Corrutina que envía un segmento
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]]):
+        self._send = send
+        self._queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        self.sent = 0
+
+    async def submit(self, segment: str):
+        """Encola un segmento para enviarlo después de los anteriores"""
+        self._queue.put_nowait(segment)
+
+    async def close(self):
+        """Espera a que se envíen todos los segmentos encolados"""
+        self._queue.put_nowait(None)
+        await self._task
+
+    async def _run(self):
+        while True:
+            segment = await self._queue.get()
+            if segment is None:
+                return
+
+            try:
+                await self._send(segment)
+                self.sent += 1
+            except Exception as e:
+                logger.error(f"Error sending reply segment: {e}", exc_info=True)
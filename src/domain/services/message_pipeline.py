@@ -0,0 +1,438 @@
+"""
+Pipeline de procesamiento de mensajes entrantes.
+
+Compartido por el webhook (modo sync) y por los workers del spool
+(modo ack_first): genera la respuesta con las features del cliente
+y la envía por WhatsApp.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import logging
+import time
+
+from src.core.config import ClientConfig, get_config_manager, get_settings
+from src.core.tenant_runtime import TenantRuntime, TenantRuntimeRegistry
+from src.core.exceptions import AIServiceError, MessagingError, RateLimitError
+from src.core.logging_config import debug_sample_rate, request_log
+from src.domain.services.burst_coalescer import Burst, BurstResult, get_burst_coalescer
+from src.domain.services.conversation_history import get_history_store
+from src.domain.services.delivery_status import delivery_row, get_delivery_status_buffer
+from src.domain.services.message_chunking import (
+    WHATSAPP_MAX_MESSAGE_CHARS,
+    SegmentSender,
+    SentenceSegmenter,
+    split_message,
+)
+from src.infrastructure.cache.rate_limiter import (
+    RateLimitRule,
+    client_rate_limit_rules,
+    get_rate_limiter,
+)
+from src.core.registry import LazyRegistry
+from src.infrastructure.messaging.outbound import PRIORITY_INTERACTIVE, get_outbound_scheduler
+from src.infrastructure.messaging.spool import SpooledMessage
+from src.infrastructure.metrics import AI_ERRORS, AI_FALLBACKS, IN_FLIGHT, MESSAGES_SENT, observe_stage, time_stage
+
+logger = logging.getLogger(__name__)
+
+# messaging_provider del cliente -> getter del cliente de mensajería (import diferido).
+# El cliente expone is_configured(), sender (número emisor) y send(to, message) -> SID,
+# que falla con MessagingError (retryable si conviene reintentar)
+MESSAGING_CLIENTS = LazyRegistry({
+    'twilio': 'src.integrations.twilio_client:get_twilio_client',
+})
+
+# Recibe cada segmento de la respuesta, en orden, para enviarlo
+SegmentCallback = Callable[[str], Awaitable[None]]
+
+# Tiempo máximo entre mensajes de una ráfaga (burst_coalescing.debounce_seconds).
+# No demora la respuesta: sólo decide si un mensaje reinicia la generación en curso
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+
+DEFAULT_RATE_LIMIT_MESSAGE = (
+    "Estás enviando muchos mensajes seguidos. Esperá un momento y volvé a escribirme."
+)
+
+
+async def enforce_rate_limits(client_config: ClientConfig, phone_number: str):
+    """
+    Aplica ClientConfig.rate_limits al usuario y al cliente.
+
+    Raises:
+        RateLimitError: Si se excede algún límite
+    """
+    rules = client_rate_limit_rules(client_config.client_id, phone_number, client_config.rate_limits)
+    if not rules:
+        return
+
+    decision = await get_rate_limiter().hit(rules)
+    if not decision.allowed:
+        raise RateLimitError(
+            f"Rate limit exceeded for '{decision.rule.key}' "
+            f"({decision.rule.limit}/{decision.rule.window_seconds}s, "
+            f"retry in {decision.retry_after:.0f}s)"
+        )
+
+
+async def _rate_limited_reply(client_config: ClientConfig, phone_number: str) -> Optional[str]:
+    """
+    Respuesta barata para un usuario limitado (sin llamar a la IA).
+    Se envía como mucho una vez por minuto; el resto de los mensajes se ignora.
+    """
+    notice = RateLimitRule(f"notice:{client_config.client_id}:{phone_number}", 1, 60)
+    decision = await get_rate_limiter().hit([notice])
+    if not decision.allowed:
+        return None
+
+    return client_config.personality.get('rate_limit_message', DEFAULT_RATE_LIMIT_MESSAGE)
+
+
+async def _apply_rate_limits(
+    client_config: ClientConfig,
+    phone_number: str,
+    on_segment: Optional[SegmentCallback] = None
+) -> Tuple[bool, Optional[str]]:
+    """
+    Aplica los rate limits y, si el usuario está limitado, le envía el aviso.
+
+    Returns:
+        (limitado, aviso enviado o None)
+    """
+    if not get_settings().rate_limit_enabled:
+        return False, None
+
+    try:
+        await enforce_rate_limits(client_config, phone_number)
+    except RateLimitError as e:
+        logger.warning(f"Rate limited {phone_number} ({client_config.client_id}): {e.message}")
+        notice = await _rate_limited_reply(client_config, phone_number)
+        if notice is not None and on_segment is not None:
+            await on_segment(notice)
+        return True, notice
+
+    return False, None
+
+
+def max_message_chars(client_config: ClientConfig) -> int:
+    """Tamaño máximo de un mensaje saliente (messaging_config.max_message_chars)"""
+    return client_config.messaging_config.get('max_message_chars', WHATSAPP_MAX_MESSAGE_CHARS)
+
+
+def streams_replies(runtime: TenantRuntime) -> bool:
+    """Indica si el cliente tiene habilitado el streaming de respuestas"""
+    if not runtime.is_enabled('ai_responses'):
+        return False
+    return getattr(runtime.get_feature('ai_responses'), 'streaming_enabled', False)
+
+
+async def _stream_ai_reply(
+    ai_feature: Any,
+    message: str,
+    user_context: Dict[str, Any],
+    on_segment: SegmentCallback,
+    max_chars: int
+) -> str:
+    """Genera la respuesta en streaming y entrega cada segmento apenas se completa"""
+    segmenter = SentenceSegmenter(
+        max_chars=max_chars,
+        first_segment_min_chars=ai_feature.streaming_config.get('first_segment_min_chars', 40)
+    )
+    chunks = []
+
+    async for chunk in ai_feature.process_message_stream(message, user_context):
+        chunks.append(chunk)
+        for segment in segmenter.feed(chunk):
+            await on_segment(segment)
+
+    for segment in segmenter.flush():
+        await on_segment(segment)
+
+    return "".join(chunks).strip()
+
+
+async def generate_reply(
+    runtime: TenantRuntime,
+    phone_number: str,
+    message: str,
+    on_segment: Optional[SegmentCallback] = None,
+    check_rate_limits: bool = True
+) -> Optional[str]:
+    """
+    Genera la respuesta a un mensaje usando las features activas del cliente.
+
+    Args:
+        runtime: Runtime del cliente
+        phone_number: Número del usuario (ej: whatsapp:+5491123456789)
+        message: Texto del mensaje recibido
+        on_segment: Si se pasa, la respuesta se entrega por acá dividida en
+            mensajes de WhatsApp; con streaming habilitado, cada segmento
+            sale apenas se completa
+        check_rate_limits: False si el mensaje ya pasó por los rate limits
+
+    Returns:
+        Texto de respuesta (o mensaje de fallback si ninguna feature respondió).
+        None si no hay que responder (usuario limitado que ya fue avisado).
+    """
+    client_config = runtime.client_config
+    client_id = client_config.client_id
+    provider = client_config.ai_provider
+    max_chars = max_message_chars(client_config)
+
+    # Rate limiting antes de cualquier trabajo de features
+    if check_rate_limits:
+        limited, notice = await _apply_rate_limits(client_config, phone_number, on_segment)
+        if limited:
+            return notice
+
+    history_store = get_history_store()
+    with time_stage("history", client_id, provider):
+        conversation = await history_store.get_conversation(client_config, phone_number)
+
+    # Construir contexto del usuario
+    user_context = {
+        'phone_number': phone_number,
+        'personality': client_config.personality,
+        'history': conversation.turns,
+        'summary': conversation.summary,
+        'client_config': client_config
+    }
+
+    # Pasajes de la base de conocimiento para el prompt de la IA
+    if runtime.is_enabled('knowledge_base'):
+        with time_stage("knowledge", client_id, provider):
+            knowledge = await runtime.get_feature('knowledge_base').process_message(message, user_context)
+        if knowledge:
+            user_context['knowledge'] = knowledge['passages']
+
+    response_text = None
+    delivered = False
+
+    # Intentar procesar con AI Responses (feature principal)
+    if runtime.is_enabled('ai_responses'):
+        ai_feature = runtime.get_feature('ai_responses')
+        started = time.perf_counter()
+        IN_FLIGHT.inc("ai", client_id)
+
+        try:
+            if on_segment is not None and ai_feature.streaming_enabled:
+                response_text = await _stream_ai_reply(
+                    ai_feature, message, user_context, on_segment, max_chars
+                )
+                delivered = bool(response_text)
+                logger.debug(f"✓ AI response streamed: {response_text[:50]}...")
+            else:
+                result = await ai_feature.process_message(message, user_context)
+
+                if result:
+                    response_text = result.get('response')
+                    logger.debug(f"✓ AI response generated: {response_text[:50]}...")
+
+        except AIServiceError as e:
+            logger.error(f"AI service error: {e.message}")
+            AI_ERRORS.inc(client_id, provider)
+            AI_FALLBACKS.inc(client_id, provider, "error")
+            response_text = "Lo siento, tuve un problema al procesar tu mensaje. Intenta de nuevo."
+
+        finally:
+            IN_FLIGHT.dec("ai", client_id)
+            observe_stage("ai", client_id, provider, time.perf_counter() - started)
+
+    # Si no hay respuesta, usar mensaje de fallback
+    if not response_text:
+        AI_FALLBACKS.inc(client_id, provider, "empty")
+        fallback_messages = client_config.personality.get('fallback_messages', [])
+        response_text = fallback_messages[0] if fallback_messages else "Lo siento, no pude procesar tu mensaje."
+
+    if on_segment is not None and not delivered:
+        for part in split_message(response_text, max_chars):
+            await on_segment(part)
+
+    history_store.record_turn(client_config, phone_number, message, response_text)
+
+    return response_text
+
+
+async def coalesce_reply(
+    runtime: TenantRuntime,
+    phone_number: str,
+    message: str,
+    on_segment: Optional[SegmentCallback] = None
+) -> BurstResult:
+    """
+    Genera la respuesta agrupando ráfagas de mensajes del usuario
+    (ClientConfig.burst_coalescing). Sin agrupación configurada equivale
+    a generate_reply.
+
+    Returns:
+        BurstResult: superseded=True si un mensaje posterior responde por este;
+        si no, value es el resultado de generate_reply
+    """
+    coalescing = runtime.client_config.burst_coalescing
+    if not coalescing.get('enabled'):
+        value = await generate_reply(runtime, phone_number, message, on_segment)
+        return BurstResult(superseded=False, value=value)
+
+    async def run(burst: Burst) -> Optional[str]:
+        deliver = None
+        if on_segment is not None:
+            async def deliver(segment: str):
+                # Con algo ya enviado, un mensaje nuevo no reinicia esta ráfaga
+                burst.seal()
+                await on_segment(segment)
+
+        # Un solo hit de rate limit por ráfaga, aunque la generación se reinicie
+        if not burst.admitted:
+            limited, notice = await _apply_rate_limits(runtime.client_config, phone_number, deliver)
+            if limited:
+                return notice
+            burst.admitted = True
+
+        return await generate_reply(runtime, phone_number, burst.text, deliver, check_rate_limits=False)
+
+    return await get_burst_coalescer().submit(
+        (runtime.client_id, phone_number),
+        message,
+        run,
+        debounce_seconds=coalescing.get('debounce_seconds', DEFAULT_DEBOUNCE_SECONDS),
+        # window_seconds: nombre anterior de la espera máxima
+        max_wait_seconds=coalescing.get('max_wait_seconds', coalescing.get('window_seconds', 8)),
+        max_messages=coalescing.get('max_messages', 5)
+    )
+
+
+async def send_whatsapp_message(
+    client_id: str,
+    to: str,
+    message: str,
+    priority: int = PRIORITY_INTERACTIVE
+):
+    """
+    Envía un mensaje de WhatsApp con el messaging_provider del cliente
+    (ejecutado en background).
+
+    Cada parte pasa por el OutboundScheduler: sale al ritmo del número
+    emisor del cliente (messaging_config sender_rate_per_second /
+    sender_burst) y se reintenta si el provider falla de forma transitoria.
+
+    Args:
+        client_id: ID del cliente
+        to: Número de destino (ej: +5491123456789)
+        message: Texto del mensaje
+        priority: PRIORITY_INTERACTIVE (respuestas) o PRIORITY_BULK
+    """
+    provider = "unknown"
+    started = time.perf_counter()
+    IN_FLIGHT.inc("send", client_id)
+    try:
+        client_config = get_config_manager().get_client_config(client_id)
+        provider = client_config.messaging_provider
+
+        if provider not in MESSAGING_CLIENTS:
+            logger.error(
+                f"Unknown messaging provider '{provider}' for client '{client_id}'. "
+                f"Message will not be sent: {message[:50]}..."
+            )
+            MESSAGES_SENT.inc(client_id, provider, "skipped")
+            return
+
+        messaging_client = MESSAGING_CLIENTS[provider](client_id)
+
+        if not messaging_client.is_configured():
+            logger.warning(
+                f"{provider} not configured for client '{client_id}'. "
+                f"Message will not be sent: {message[:50]}..."
+            )
+            MESSAGES_SENT.inc(client_id, provider, "skipped")
+            return
+
+        scheduler = get_outbound_scheduler()
+        messaging_config = client_config.messaging_config
+        # Con callbacks de estado, cada envío queda registrado para el embudo de entregas
+        track_delivery = bool(getattr(messaging_client, "status_callback_url", None))
+
+        # En orden: cada parte se encola cuando la anterior ya salió
+        for part in split_message(message, max_message_chars(client_config)):
+            try:
+                message_sid = await scheduler.submit(
+                    client_id,
+                    messaging_client.sender,
+                    lambda part=part: messaging_client.send(to=to, message=part),
+                    provider=provider,
+                    priority=priority,
+                    rate=messaging_config.get('sender_rate_per_second'),
+                    burst=messaging_config.get('sender_burst')
+                )
+            except MessagingError as e:
+                MESSAGES_SENT.inc(client_id, provider, "failed")
+                logger.error(f"Failed to send message to {to}: {e.message}")
+                return
+
+            MESSAGES_SENT.inc(client_id, provider, "sent")
+            logger.debug(f"✓ Message sent successfully. SID: {message_sid}")
+            if track_delivery and message_sid:
+                get_delivery_status_buffer().add(client_config, delivery_row(message_sid, client_id, to, "queued"))
+
+    except Exception as e:
+        MESSAGES_SENT.inc(client_id, provider, "failed")
+        logger.error(f"Error in background task send_whatsapp_message: {e}", exc_info=True)
+
+    finally:
+        IN_FLIGHT.dec("send", client_id)
+        observe_stage("send", client_id, provider, time.perf_counter() - started)
+
+
+def reply_sender(client_id: str, phone_number: str) -> SegmentSender:
+    """SegmentSender que envía cada segmento de la respuesta por WhatsApp, en orden"""
+
+    async def send_segment(segment: str):
+        logger.debug(f"📤 Response segment to {phone_number}: {segment}")
+        await send_whatsapp_message(client_id=client_id, to=phone_number, message=segment)
+
+    return SegmentSender(send_segment)
+
+
+async def handle_inbound_message(
+    runtime: TenantRuntime,
+    phone_number: str,
+    message: str
+) -> Optional[str]:
+    """
+    Procesa un mensaje completo: genera la respuesta y la envía.
+
+    Returns:
+        Texto de la respuesta enviada (None si no se respondió)
+    """
+    if streams_replies(runtime):
+        sender = reply_sender(runtime.client_id, phone_number)
+        try:
+            burst = await coalesce_reply(runtime, phone_number, message, sender.submit)
+        finally:
+            await sender.close()
+        return None if burst.superseded else burst.value
+
+    burst = await coalesce_reply(runtime, phone_number, message)
+    response_text = burst.value
+    if burst.superseded or response_text is None:
+        return None
+
+    logger.debug(f"📤 Response to {phone_number}: {response_text}")
+    await send_whatsapp_message(
+        client_id=runtime.client_id,
+        to=phone_number,
+        message=response_text
+    )
+
+    return response_text
+
+
+def make_spool_handler(
+    registry: TenantRuntimeRegistry
+) -> Callable[[SpooledMessage], Awaitable[None]]:
+    """Crea el handler que usan los workers del spool (modo ack_first)"""
+
+    async def handle_spooled_message(message: SpooledMessage):
+        with request_log(message.message_sid) as current:
+            async with registry.lease(message.client_id) as runtime:
+                current.set_client(runtime.client_id, debug_sample_rate(runtime.client_config))
+                await handle_inbound_message(runtime, message.from_number, message.body)
+
+    return handle_spooled_message
@@ -2,16 +2,27 @@
 Feature de respuestas con IA.
 Soporta múltiples providers (Gemini, Claude, OpenAI) mediante Strategy Pattern.
 """
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Dict, Any, List, Optional
 from fastapi import APIRouter
 from src.features.base_feature import BaseFeature
 from src.features.ai_responses.providers.base_provider import AIProvider
-from src.features.ai_responses.providers.gemini_provider import GeminiProvider
+from src.features.ai_responses.providers.failover_provider import FailoverProvider
+from src.features.ai_responses.providers.guarded_provider import GuardedProvider
 from src.core.exceptions import ConfigurationError, AIServiceError
+from src.core.registry import LazyRegistry
+from src.infrastructure.cache.response_cache import get_response_cache, normalize_message
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Providers disponibles; cada módulo se importa la primera vez que un cliente lo usa
+AI_PROVIDERS = LazyRegistry({
+    'gemini': 'src.features.ai_responses.providers.gemini_provider:GeminiProvider',
+    'claude': 'src.features.ai_responses.providers.claude_provider:ClaudeProvider',
+    'fake': 'src.features.ai_responses.providers.fake_provider:FakeProvider',
+    # 'openai': ...,  # TODO: Implementar
+})
+
 
 class AIResponsesFeature(BaseFeature):
     """
@@ -20,38 +31,77 @@ class AIResponsesFeature(BaseFeature):
     Responsabilidades:
     - Seleccionar el provider de IA (Gemini/Claude/OpenAI)
     - Generar respuestas basadas en la personalidad del bot
-    - Manejar fallbacks si falla el provider principal
+    - Manejar fallbacks si falla o tarda el provider principal
+      (config fallback_providers y hedging, ver FailoverProvider)
+    - Dejar de llamar a un provider degradado: circuit breaker y límite
+      de concurrencia por provider (config resilience, ver GuardedProvider)
+    - Reutilizar respuestas a preguntas repetidas (config response_cache)
+    - Entregar la respuesta en streaming (config streaming)
     """
 
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.ai_provider: Optional[AIProvider] = None
+        self.providers: List[AIProvider] = []
+        self.guards: List[GuardedProvider] = []
+
+        # Cache de respuestas: {enabled, ttl_seconds, min_message_chars}
+        cache_config = config.get('response_cache') or {}
+        self.cache_enabled = cache_config.get('enabled', False)
+        self.cache_ttl = cache_config.get('ttl_seconds')
+        self.cache_min_chars = cache_config.get('min_message_chars', 5)
+
+        # Streaming: {enabled, first_segment_min_chars}
+        self.streaming_config = config.get('streaming') or {}
+        self.streaming_enabled = self.streaming_config.get('enabled', False)
 
     def initialize(self):
-        """Inicializa el proveedor de IA según configuración"""
+        """
+        Inicializa el proveedor de IA según configuración.
+
+        Con fallback_providers (lista de {provider, provider_config}) arma
+        una cadena ordenada: provider principal primero, luego los fallbacks.
+        Cada provider queda detrás de su GuardedProvider salvo que
+        resilience.enabled sea false.
+        """
+        chain = [{
+            'provider': self.config.get('provider', 'gemini'),
+            'provider_config': self.config.get('provider_config', {})
+        }]
+        chain.extend(self.config.get('fallback_providers') or [])
 
-        provider_name = self.config.get('provider', 'gemini')
-        provider_config = self.config.get('provider_config', {})
+        providers = [
+            self._create_provider(entry.get('provider', 'gemini'), entry.get('provider_config', {}))
+            for entry in chain
+        ]
+        self.providers = list(providers)
 
+        resilience = self.config.get('resilience') or {}
+        if resilience.get('enabled', True):
+            guard_config = {key: value for key, value in resilience.items() if key != 'enabled'}
+            self.guards = [GuardedProvider(provider, guard_config) for provider in providers]
+            providers = self.guards
+
+        if len(providers) == 1:
+            self.ai_provider = providers[0]
+        else:
+            self.ai_provider = FailoverProvider(providers, self.config.get('hedging') or {})
+
+    def _create_provider(self, provider_name: str, provider_config: Dict[str, Any]) -> AIProvider:
+        """Crea un provider por nombre"""
         logger.info(f"Initializing AI provider: {provider_name}")
 
         # Factory Pattern para seleccionar provider
-        providers = {
-            'gemini': GeminiProvider,
-            # 'claude': ClaudeProvider,  # TODO: Implementar
-            # 'openai': OpenAIProvider,  # TODO: Implementar
-        }
-
-        provider_class = providers.get(provider_name)
-        if not provider_class:
+        if provider_name not in AI_PROVIDERS:
             raise ConfigurationError(
                 f"Unknown AI provider: {provider_name}. "
-                f"Available: {list(providers.keys())}"
+                f"Available: {list(AI_PROVIDERS)}"
             )
 
         try:
-            self.ai_provider = provider_class(provider_config)
-            logger.info(f"AI provider initialized successfully: {self.ai_provider.get_name()}")
+            provider = AI_PROVIDERS[provider_name](provider_config)
+            logger.info(f"AI provider initialized successfully: {provider.get_name()}")
+            return provider
 
         except Exception as e:
             logger.error(f"Failed to initialize AI provider: {e}", exc_info=True)
@@ -66,6 +116,21 @@ class AIResponsesFeature(BaseFeature):
             except Exception as e:
                 logger.error(f"Error cleaning up AI provider: {e}")
 
+    def provider_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Estado de cada provider (circuito, límite de concurrencia, failover, tokens)"""
+        stats: Dict[str, Dict[str, Any]] = {guard.get_name(): guard.stats() for guard in self.guards}
+
+        for provider in self.providers:
+            usage = provider.usage_stats()
+            if usage:
+                stats.setdefault(provider.get_name(), {})['usage'] = usage
+
+        if isinstance(self.ai_provider, FailoverProvider):
+            for name, chain_stats in self.ai_provider.stats().items():
+                stats.setdefault(name, {}).update(chain_stats)
+
+        return stats
+
     def get_routes(self) -> Optional[APIRouter]:
         """Esta feature no expone rutas propias"""
         return None
@@ -89,6 +154,20 @@ class AIResponsesFeature(BaseFeature):
         if not self.ai_provider:
             raise AIServiceError("AI provider not initialized")
 
+        cache_key = self._cache_key(message, user_context)
+        if cache_key:
+            cached = await get_response_cache().get(cache_key)
+            if cached is not None:
+                logger.debug("AI response served from cache")
+                return {
+                    'response': cached,
+                    'metadata': {
+                        'provider': self.ai_provider.get_name(),
+                        'feature': 'ai_responses',
+                        'cached': True
+                    }
+                }
+
         try:
             # Obtener personalidad del contexto
             personality = user_context.get('personality', {})
@@ -97,19 +176,25 @@ class AIResponsesFeature(BaseFeature):
                 'Eres un asistente virtual útil y amigable.'
             )
 
-            # Obtener historial de conversación
+            # Obtener historial y resumen de la conversación
             conversation_history = user_context.get('history', [])
+            conversation_summary = user_context.get('summary')
 
             # Generar respuesta
-            logger.info(f"Generating AI response for message: {message[:50]}...")
+            logger.debug(f"Generating AI response for message: {message[:50]}...")
 
             response_text = await self.ai_provider.generate_response(
                 message=message,
                 system_prompt=system_prompt,
-                conversation_history=conversation_history
+                conversation_history=conversation_history,
+                conversation_summary=conversation_summary,
+                knowledge=user_context.get('knowledge')
             )
 
-            logger.info(f"AI response generated successfully")
+            logger.debug(f"AI response generated successfully")
+
+            if cache_key:
+                await get_response_cache().set(cache_key, response_text, self.cache_ttl)
 
             return {
                 'response': response_text,
@@ -126,3 +211,72 @@ class AIResponsesFeature(BaseFeature):
         except Exception as e:
             logger.error(f"Unexpected error in AI processing: {e}", exc_info=True)
             raise AIServiceError(f"Unexpected error: {e}")
+
+    async def process_message_stream(
+        self,
+        message: str,
+        user_context: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        Igual que process_message, pero entrega la respuesta en fragmentos
+        a medida que el provider los genera.
+
+        Yields:
+            Fragmentos de texto de la respuesta, en orden
+        """
+        if not self.ai_provider:
+            raise AIServiceError("AI provider not initialized")
+
+        cache_key = self._cache_key(message, user_context)
+        if cache_key:
+            cached = await get_response_cache().get(cache_key)
+            if cached is not None:
+                logger.debug("AI response served from cache")
+                yield cached
+                return
+
+        personality = user_context.get('personality', {})
+        system_prompt = personality.get(
+            'system_prompt',
+            'Eres un asistente virtual útil y amigable.'
+        )
+
+        logger.debug(f"Streaming AI response for message: {message[:50]}...")
+
+        chunks = []
+        try:
+            async for chunk in self.ai_provider.generate_response_stream(
+                message=message,
+                system_prompt=system_prompt,
+                conversation_history=user_context.get('history', []),
+                conversation_summary=user_context.get('summary'),
+                knowledge=user_context.get('knowledge')
+            ):
+                chunks.append(chunk)
+                yield chunk
+
+        except AIServiceError:
+            raise
+
+        except Exception as e:
+            logger.error(f"Unexpected error in AI streaming: {e}", exc_info=True)
+            raise AIServiceError(f"Unexpected error: {e}")
+
+        if cache_key and chunks:
+            await get_response_cache().set(cache_key, "".join(chunks).strip(), self.cache_ttl)
+
+    def _cache_key(self, message: str, user_context: Dict[str, Any]) -> Optional[str]:
+        """
+        Clave de cache del mensaje, o None si no se debe cachear.
+        Los mensajes muy cortos ("si", "ok") dependen del contexto y no se cachean.
+        """
+        client_config = user_context.get('client_config')
+        if not self.cache_enabled or client_config is None:
+            return None
+
+        if len(normalize_message(message)) < self.cache_min_chars:
+            return None
+
+        return get_response_cache().make_key(
+            client_config.client_id, message, client_config.config_version
+        )
@@ -0,0 +1,143 @@
+"""
+Armado de prompts con presupuesto de tokens.
+
+Compartido por todos los AIProvider: decide qué parte del historial
+entra en el prompt según un presupuesto de tokens y condensa el resto
+en el resumen de la conversación.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.domain.services.conversation_summary import ROLE_LABELS, fold_into_summary
+from src.utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+# Cantidad de system prompts distintos cacheados por assembler
+_PREFIX_CACHE_SIZE = 8
+
+
+@dataclass(frozen=True)
+class AssembledPrompt:
+    """Prompt listo para enviar al provider"""
+    system_prompt: str
+    message: str
+    history: List[Dict[str, str]] = field(default_factory=list)
+    summary: Optional[str] = None
+    knowledge: List[str] = field(default_factory=list)
+    estimated_tokens: int = 0
+
+    def to_text(self) -> str:
+        """Renderiza el prompt como texto plano (providers sin roles nativos)"""
+        sections = [self.system_prompt]
+
+        if self.knowledge:
+            passages = "\n".join(f"- {passage}" for passage in self.knowledge)
+            sections.append(f"Información relevante:\n{passages}")
+
+        if self.summary:
+            sections.append(f"Resumen de la conversación:\n{self.summary}")
+
+        if self.history:
+            history_text = "\n".join(
+                f"{ROLE_LABELS.get(msg['role'], msg['role'])}: {msg['content']}"
+                for msg in self.history
+            )
+            sections.append(f"Historial:\n{history_text}")
+
+        sections.append(f"Usuario: {self.message}\nAsistente:")
+        return "\n\n".join(sections)
+
+
+class PromptAssembler:
+    """
+    Ajusta historial y resumen a un presupuesto de tokens.
+
+    Configuración (provider_config del cliente):
+    - max_input_tokens: Presupuesto total del prompt (default: 2048)
+    - history_token_budget: Máximo para el historial (default: lo que quede libre)
+    - summary_token_budget: Máximo para el resumen (default: 256)
+    - knowledge_token_budget: Máximo para los pasajes de la base de conocimiento (default: 512)
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.max_input_tokens = config.get('max_input_tokens', 2048)
+        self.history_token_budget = config.get('history_token_budget')
+        self.summary_token_budget = config.get('summary_token_budget', 256)
+        self.knowledge_token_budget = config.get('knowledge_token_budget', 512)
+        self._prefix_cache: Dict[str, Tuple[str, int]] = {}
+
+    def system_prefix(self, system_prompt: str) -> Tuple[str, int]:
+        """
+        Prefijo estático del cliente (system prompt normalizado) y sus tokens.
+        Se calcula una vez por system prompt distinto.
+        """
+        cached = self._prefix_cache.get(system_prompt)
+        if cached is None:
+            prefix = system_prompt.strip()
+            cached = (prefix, estimate_tokens(prefix))
+
+            if len(self._prefix_cache) >= _PREFIX_CACHE_SIZE:
+                self._prefix_cache.pop(next(iter(self._prefix_cache)))
+            self._prefix_cache[system_prompt] = cached
+        return cached
+
+    def assemble(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> AssembledPrompt:
+        """
+        Arma el prompt respetando el presupuesto.
+
+        Los pasajes de conocimiento (ordenados por relevancia) entran primero,
+        hasta knowledge_token_budget. Después se incluyen los turnos más
+        recientes que entren en el presupuesto; los más viejos se condensan
+        en el resumen.
+        """
+        prefix, prefix_tokens = self.system_prefix(system_prompt)
+        message_tokens = estimate_tokens(message)
+        summary_budget_chars = self.summary_token_budget * CHARS_PER_TOKEN
+
+        passages = []
+        knowledge_tokens = 0
+        for passage in knowledge or []:
+            tokens = estimate_tokens(passage) + 1
+            if knowledge_tokens + tokens > self.knowledge_token_budget:
+                break
+            passages.append(passage)
+            knowledge_tokens += tokens
+
+        history = conversation_history or []
+        turn_tokens = [estimate_tokens(turn['content']) + 2 for turn in history]
+
+        available = self.max_input_tokens - prefix_tokens - message_tokens - knowledge_tokens
+        if self.history_token_budget is not None:
+            available = min(available, self.history_token_budget)
+
+        # Reservar espacio para el resumen sólo si hay (o va a haber) uno
+        if conversation_summary or sum(turn_tokens) > available:
+            available -= self.summary_token_budget
+
+        # Tomar turnos desde el más reciente mientras entren
+        used = 0
+        cut = len(history)
+        while cut > 0 and used + turn_tokens[cut - 1] <= available:
+            used += turn_tokens[cut - 1]
+            cut -= 1
+
+        included = history[cut:]
+        summary = fold_into_summary(conversation_summary, history[:cut], summary_budget_chars)
+
+        return AssembledPrompt(
+            system_prompt=prefix,
+            message=message,
+            history=included,
+            summary=summary,
+            knowledge=passages,
+            estimated_tokens=(
+                prefix_tokens + message_tokens + knowledge_tokens + used
+                + estimate_tokens(summary or "")
+            ),
+        )
@@ -3,7 +3,9 @@ Proveedor base de IA (interface).
 Diferentes providers (Gemini, Claude, OpenAI) implementan esta interface.
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import AsyncIterator, Dict, Any, List, Optional
+
+from src.features.ai_responses.prompt_builder import AssembledPrompt, PromptAssembler
 
 
 class AIProvider(ABC):
@@ -11,13 +13,16 @@ class AIProvider(ABC):
 
     def __init__(self, config: Dict[str, Any]):
         self.config = config
+        self.prompt_assembler = PromptAssembler(config)
 
     @abstractmethod
     async def generate_response(
         self,
         message: str,
         system_prompt: str,
-        conversation_history: List[Dict[str, str]] = None
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
     ) -> str:
         """
         Genera una respuesta usando el modelo de IA.
@@ -26,12 +31,52 @@ class AIProvider(ABC):
             message: Mensaje del usuario
             system_prompt: Prompt de sistema con personalidad
             conversation_history: Historial de conversación
+            conversation_summary: Resumen de los turnos más viejos
+            knowledge: Pasajes relevantes de la base de conocimiento
 
         Returns:
             Respuesta generada por la IA
         """
         pass
 
+    async def generate_response_stream(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Genera la respuesta como un stream de fragmentos de texto.
+
+        Los providers con streaming nativo la sobreescriben; por defecto
+        se entrega la respuesta completa en un único fragmento.
+
+        Yields:
+            Fragmentos de la respuesta, en orden
+        """
+        yield await self.generate_response(
+            message, system_prompt, conversation_history, conversation_summary, knowledge
+        )
+
+    def assemble_prompt(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> AssembledPrompt:
+        """Arma el prompt ajustado al presupuesto de tokens del cliente"""
+        return self.prompt_assembler.assemble(
+            message, system_prompt, conversation_history, conversation_summary, knowledge
+        )
+
+    def usage_stats(self) -> Dict[str, Any]:
+        """Consumo acumulado de tokens (los providers que lo reportan la sobreescriben)"""
+        return {}
+
     @abstractmethod
     def get_name(self) -> str:
         """Retorna el nombre del provider"""
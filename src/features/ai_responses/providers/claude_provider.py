@@ -0,0 +1,277 @@
+"""
+Proveedor de Anthropic Claude (Messages API) con prompt caching.
+
+El system_prompt de cada cliente es largo y no cambia entre turnos: se
+envía como primer bloque de system marcado con cache_control, así la API
+reutiliza ese prefijo ya procesado en los turnos siguientes (menor
+tiempo al primer token y los tokens cacheados se cobran a una fracción).
+La información que sí cambia (pasajes de conocimiento, resumen) va en un
+segundo bloque, después del punto de cache, y el historial como mensajes
+con sus roles.
+
+La API sólo cachea prefijos de al menos ~1024 tokens (2048 en modelos
+Haiku); con prompts más cortos la marca se ignora sin error.
+
+Se llama a la REST API con httpx (la versión fijada del SDK es anterior
+al prompt caching). Cada API key usa su propio pool de conexiones
+keep-alive, compartido por todas las instancias del provider que la usan.
+
+Configuración (provider_config):
+- api_key: API key de Anthropic
+- model: Modelo (default: claude-3-5-haiku-latest)
+- temperature, max_tokens
+- prompt_caching: Marcar el system prompt para cache (default: true)
+- base_url: URL base de la API (default: https://api.anthropic.com)
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional
+import hashlib
+import json
+import logging
+
+from src.features.ai_responses.providers.base_provider import AIProvider
+from src.features.ai_responses.prompt_builder import AssembledPrompt
+from src.core.exceptions import AIServiceError
+from src.infrastructure.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_API_BASE_URL = "https://api.anthropic.com"
+ANTHROPIC_VERSION = "2023-06-01"
+
+_USAGE_FIELDS = (
+    "input_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+    "output_tokens",
+)
+
+
+class ClaudeProvider(AIProvider):
+    """Implementación de AIProvider usando Anthropic Claude"""
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+
+        self.api_key = config.get('api_key')
+        if not self.api_key:
+            raise ValueError("Anthropic API key not provided")
+
+        self.model_name = config.get('model', 'claude-3-5-haiku-latest')
+        self.temperature = config.get('temperature', 0.8)
+        self.max_tokens = config.get('max_tokens', 500)
+        self.prompt_caching = config.get('prompt_caching', True)
+
+        base_url = config.get('base_url', ANTHROPIC_API_BASE_URL).rstrip('/')
+        self.endpoint = f"{base_url}/v1/messages"
+
+        # Un pool por API key (en la práctica, uno por cliente)
+        key_hash = hashlib.sha1(self.api_key.encode("utf-8")).hexdigest()[:10]
+        self.pool_name = f"anthropic-{key_hash}"
+
+        self.usage = {field: 0 for field in _USAGE_FIELDS}
+        self.requests = 0
+
+        logger.info(
+            f"Claude provider initialized: {self.model_name} "
+            f"(prompt caching {'on' if self.prompt_caching else 'off'})"
+        )
+
+    async def generate_response(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> str:
+        """
+        Genera respuesta usando Claude.
+
+        Args:
+            message: Mensaje del usuario
+            system_prompt: Instrucciones del sistema (prefijo cacheado)
+            conversation_history: Historial (opcional)
+            conversation_summary: Resumen de turnos viejos (opcional)
+            knowledge: Pasajes de la base de conocimiento (opcional)
+
+        Returns:
+            Respuesta generada
+        """
+        prompt = self.assemble_prompt(
+            message, system_prompt, conversation_history, conversation_summary, knowledge
+        )
+
+        try:
+            response = await get_http_client(self.pool_name).post(
+                self.endpoint,
+                json=self._payload(prompt),
+                headers=self._headers(),
+            )
+
+            if response.status_code >= 400:
+                raise AIServiceError(self._error_detail(response), "Claude")
+
+            data = response.json()
+            self._record_usage(data.get("usage") or {})
+
+            text = "".join(
+                block.get("text", "")
+                for block in data.get("content") or []
+                if block.get("type") == "text"
+            )
+            if not text.strip():
+                raise AIServiceError("Empty response from Claude", "Claude")
+
+            return text.strip()
+
+        except AIServiceError:
+            raise
+
+        except Exception as e:
+            logger.error(f"Claude generation error: {e}", exc_info=True)
+            raise AIServiceError(str(e), "Claude")
+
+    async def generate_response_stream(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        """Genera la respuesta con streaming (Server-Sent Events)"""
+        prompt = self.assemble_prompt(
+            message, system_prompt, conversation_history, conversation_summary, knowledge
+        )
+        payload = {**self._payload(prompt), "stream": True}
+
+        received = False
+        usage: Dict[str, int] = {}
+        try:
+            async with get_http_client(self.pool_name).stream(
+                "POST", self.endpoint, json=payload, headers=self._headers()
+            ) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise AIServiceError(self._error_detail(response), "Claude")
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+
+                    event = json.loads(line[5:])
+                    event_type = event.get("type")
+
+                    if event_type == "message_start":
+                        usage.update(event.get("message", {}).get("usage") or {})
+                    elif event_type == "content_block_delta":
+                        text = event.get("delta", {}).get("text", "")
+                        if text:
+                            received = True
+                            yield text
+                    elif event_type == "message_delta":
+                        usage.update(event.get("usage") or {})
+                    elif event_type == "error":
+                        detail = event.get("error", {}).get("message", "stream error")
+                        raise AIServiceError(detail, "Claude")
+
+        except AIServiceError:
+            raise
+
+        except Exception as e:
+            logger.error(f"Claude streaming error: {e}", exc_info=True)
+            raise AIServiceError(str(e), "Claude")
+
+        finally:
+            if usage:
+                self._record_usage(usage)
+
+        if not received:
+            raise AIServiceError("Empty response from Claude", "Claude")
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "x-api-key": self.api_key,
+            "anthropic-version": ANTHROPIC_VERSION,
+        }
+
+    def _payload(self, prompt: AssembledPrompt) -> Dict[str, Any]:
+        """Body de la Messages API: system en bloques (estático primero) e historial con roles"""
+        static_block: Dict[str, Any] = {"type": "text", "text": prompt.system_prompt}
+        if self.prompt_caching:
+            static_block["cache_control"] = {"type": "ephemeral"}
+        system = [static_block]
+
+        context = []
+        if prompt.knowledge:
+            passages = "\n".join(f"- {passage}" for passage in prompt.knowledge)
+            context.append(f"Información relevante:\n{passages}")
+        if prompt.summary:
+            context.append(f"Resumen de la conversación:\n{prompt.summary}")
+        if context:
+            system.append({"type": "text", "text": "\n\n".join(context)})
+
+        return {
+            "model": self.model_name,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "system": system,
+            "messages": self._messages(prompt),
+        }
+
+    @staticmethod
+    def _messages(prompt: AssembledPrompt) -> List[Dict[str, str]]:
+        """
+        Historial + mensaje actual con los roles que exige la API: empieza
+        con 'user' y alterna (los turnos seguidos del mismo rol se unen).
+        """
+        messages: List[Dict[str, str]] = []
+        turns = list(prompt.history) + [{'role': 'user', 'content': prompt.message}]
+
+        for turn in turns:
+            role = 'assistant' if turn['role'] == 'assistant' else 'user'
+            if not messages and role == 'assistant':
+                continue
+            if messages and messages[-1]['role'] == role:
+                messages[-1]['content'] += f"\n{turn['content']}"
+            else:
+                messages.append({'role': role, 'content': turn['content']})
+
+        return messages
+
+    def _record_usage(self, usage: Dict[str, Any]):
+        self.requests += 1
+        for field in _USAGE_FIELDS:
+            self.usage[field] += usage.get(field) or 0
+
+        logger.debug(
+            f"Claude usage: {usage.get('cache_read_input_tokens') or 0} cached, "
+            f"{usage.get('cache_creation_input_tokens') or 0} cache write, "
+            f"{usage.get('input_tokens') or 0} uncached input, "
+            f"{usage.get('output_tokens') or 0} output tokens"
+        )
+
+    def usage_stats(self) -> Dict[str, Any]:
+        """Tokens acumulados: cacheados (lectura/escritura), sin cache y de salida"""
+        cached = self.usage["cache_read_input_tokens"]
+        total_input = cached + self.usage["cache_creation_input_tokens"] + self.usage["input_tokens"]
+        return {
+            "requests": self.requests,
+            **self.usage,
+            "cache_hit_ratio": round(cached / total_input, 3) if total_input else None,
+        }
+
+    @staticmethod
+    def _error_detail(response) -> str:
+        try:
+            detail = response.json().get("error", {}).get("message", response.text)
+        except ValueError:
+            detail = response.text
+        return f"HTTP {response.status_code}: {detail}"
+
+    def get_name(self) -> str:
+        return f"Claude ({self.model_name})"
+
+    def cleanup(self):
+        """El pool HTTP se cierra en el shutdown de la app"""
+        logger.info("Claude provider cleaned up")
@@ -0,0 +1,271 @@
+"""
+Cadena de proveedores con failover y requests "hedged".
+
+Los proveedores se prueban en orden. Si el que está corriendo falla, se
+lanza el siguiente en el acto; si tarda más que el percentil configurado
+de su latencia reciente (p95 por defecto), se lanza el siguiente en
+paralelo sin cancelar el primero. Gana la primera respuesta exitosa y
+las demás se cancelan.
+
+Así una caída de un proveedor no deja al bot sin respuestas, y la cola
+de latencia queda acotada por el proveedor más rápido disponible a costa
+de un pequeño porcentaje de requests duplicados.
+
+En streaming se compite por el primer fragmento: una vez que un
+proveedor empezó a responder, el resto del stream sale de él.
+"""
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import math
+
+from src.features.ai_responses.providers.base_provider import AIProvider
+from src.core.exceptions import AIServiceError
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """
+    Percentil de las últimas latencias exitosas de un proveedor.
+
+    Args:
+        window: Cantidad de muestras recientes que se conservan
+        min_samples: Muestras necesarias antes de confiar en el percentil
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Latencia en el percentil dado, o None si todavía no hay suficientes muestras"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = math.ceil(percentile / 100 * len(ordered)) - 1
+        return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+class FailoverProvider(AIProvider):
+    """
+    AIProvider que reparte cada request en una cadena ordenada de providers.
+
+    Configuración (hedging):
+    - enabled: Lanzar el siguiente proveedor si el actual tarda (default: true).
+      Con false sólo hay failover ante errores.
+    - percentile: Percentil de latencia que dispara el hedge (default: 95)
+    - initial_delay_seconds: Demora del hedge hasta tener muestras (default: 3)
+    - min_delay_seconds / max_delay_seconds: Límites de la demora (default: 0.2 / 10)
+    - window: Latencias recientes por proveedor (default: 200)
+    """
+
+    def __init__(self, providers: List[AIProvider], config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        super().__init__(config)
+
+        if not providers:
+            raise ValueError("FailoverProvider needs at least one provider")
+
+        self.providers = providers
+        self.hedging_enabled = config.get('enabled', True)
+        self.percentile = config.get('percentile', 95)
+        self.initial_delay = config.get('initial_delay_seconds', 3.0)
+        self.min_delay = config.get('min_delay_seconds', 0.2)
+        self.max_delay = config.get('max_delay_seconds', 10.0)
+
+        window = config.get('window', 200)
+        # Latencias por proveedor y tipo de llamada (respuesta completa / primer fragmento)
+        self._latency: Dict[Tuple[int, str], LatencyTracker] = {
+            (index, kind): LatencyTracker(window)
+            for index in range(len(providers))
+            for kind in ('response', 'first_chunk')
+        }
+        self._stats = [
+            {'attempts': 0, 'wins': 0, 'failures': 0, 'hedges': 0, 'cancelled': 0}
+            for _ in providers
+        ]
+
+        logger.info(
+            f"AI provider chain: {' → '.join(p.get_name() for p in providers)} "
+            f"(hedging {'p' + str(self.percentile) if self.hedging_enabled else 'off'})"
+        )
+
+    def hedge_delay(self, index: int, kind: str) -> float:
+        """Segundos a esperar al proveedor index antes de lanzar el siguiente"""
+        if not self.hedging_enabled:
+            return math.inf
+
+        delay = self._latency[(index, kind)].percentile(self.percentile)
+        if delay is None:
+            delay = self.initial_delay
+        return min(max(delay, self.min_delay), self.max_delay)
+
+    async def _race(
+        self,
+        start: Callable[[AIProvider], Awaitable[Any]],
+        kind: str,
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> Tuple[int, Any]:
+        """
+        Corre start(provider) sobre la cadena con failover y hedging.
+
+        Args:
+            start: Crea el intento para un provider
+            kind: Tipo de llamada, para las latencias ('response' o 'first_chunk')
+            discard: Libera el resultado de un intento que terminó bien pero perdió
+
+        Returns:
+            (índice del provider ganador, resultado)
+        """
+        loop = asyncio.get_running_loop()
+        pending: Dict[asyncio.Task, Tuple[int, float]] = {}
+        errors: List[str] = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            index = next_index
+            next_index += 1
+            self._stats[index]['attempts'] += 1
+            task = asyncio.create_task(start(self.providers[index]))
+            pending[task] = (index, loop.time())
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if next_index < len(self.providers):
+                    last_index, last_started = max(pending.values(), key=lambda item: item[1])
+                    timeout = max(0.0, last_started + self.hedge_delay(last_index, kind) - loop.time())
+                    if math.isinf(timeout):
+                        timeout = None
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    slow = self.providers[last_index].get_name()
+                    self._stats[last_index]['hedges'] += 1
+                    logger.info(
+                        f"⏱️ {slow} slower than p{self.percentile} "
+                        f"({self.hedge_delay(last_index, kind):.2f}s), hedging with "
+                        f"{self.providers[next_index].get_name()}"
+                    )
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    index, started = pending.pop(task)
+                    if task.exception() is None:
+                        if winner is None:
+                            winner = (index, task.result())
+                            self._latency[(index, kind)].record(loop.time() - started)
+                        elif discard is not None:
+                            await discard(task.result())
+                        continue
+
+                    error = task.exception()
+                    name = self.providers[index].get_name()
+                    self._stats[index]['failures'] += 1
+                    errors.append(f"{name}: {error}")
+                    logger.warning(f"⚠️ AI provider {name} failed: {error}")
+
+                    if next_index < len(self.providers):
+                        logger.info(f"↪️ Failing over to {self.providers[next_index].get_name()}")
+                        launch()
+
+                if winner is not None:
+                    self._stats[winner[0]]['wins'] += 1
+                    return winner
+
+            raise AIServiceError(f"All providers failed ({'; '.join(errors)})", "AI chain")
+
+        finally:
+            for task, (index, _) in pending.items():
+                task.cancel()
+                self._stats[index]['cancelled'] += 1
+            if pending:
+                results = await asyncio.gather(*pending, return_exceptions=True)
+                if discard is not None:
+                    for result in results:
+                        if not isinstance(result, BaseException):
+                            await discard(result)
+
+    async def generate_response(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> str:
+        index, response = await self._race(
+            lambda provider: provider.generate_response(
+                message, system_prompt, conversation_history, conversation_summary, knowledge
+            ),
+            'response'
+        )
+        if index:
+            logger.info(f"AI response served by fallback provider {self.providers[index].get_name()}")
+        return response
+
+    async def generate_response_stream(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        async def first_chunk(provider: AIProvider):
+            stream = provider.generate_response_stream(
+                message, system_prompt, conversation_history, conversation_summary, knowledge
+            )
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        async def discard(result):
+            await result[0].aclose()
+
+        index, (stream, chunk) = await self._race(first_chunk, 'first_chunk', discard)
+        if index:
+            logger.info(f"AI response streamed by fallback provider {self.providers[index].get_name()}")
+
+        try:
+            if chunk is not None:
+                yield chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Contadores por proveedor y demora actual del hedge"""
+        return {
+            provider.get_name(): {
+                **self._stats[index],
+                'hedge_delay_seconds': round(self.hedge_delay(index, 'response'), 3)
+                if self.hedging_enabled else None,
+            }
+            for index, provider in enumerate(self.providers)
+        }
+
+    def get_name(self) -> str:
+        return " → ".join(provider.get_name() for provider in self.providers)
+
+    def cleanup(self):
+        for provider in self.providers:
+            try:
+                provider.cleanup()
+            except Exception as e:
+                logger.error(f"Error cleaning up AI provider {provider.get_name()}: {e}")
@@ -0,0 +1,145 @@
+"""
+Proveedor falso para desarrollo, demos y pruebas de carga.
+
+No llama a ninguna API: responde un texto configurable y lo entrega en
+fragmentos con demoras configurables, imitando el streaming de un LLM.
+
+Configuración (provider_config):
+- name: Nombre del provider (default: Fake)
+- reply: Texto de respuesta; acepta {message} (default: eco del mensaje)
+- first_token_delay_seconds: Demora hasta el primer fragmento (default: 0)
+- chunk_chars: Tamaño de cada fragmento (default: 12)
+- chunk_delay_seconds: Demora entre fragmentos (default: 0)
+- script: Lista de pasos {delay_seconds, error}, uno por llamada y en
+  ciclo. delay_seconds reemplaza a first_token_delay_seconds; con error
+  la llamada falla (AIServiceError) después de la demora. Sirve para
+  simular latencias y caídas de un proveedor.
+- latency: Distribución de la demora hasta el primer fragmento, sorteada
+  en cada llamada (reemplaza a first_token_delay_seconds; ver
+  sample_latency). Ej: {distribution: lognormal, median_seconds: 0.8, sigma: 0.5}
+- error_rate: Probabilidad de que una llamada falle (default: 0)
+- seed: Semilla para latency/error_rate (default: aleatoria)
+"""
+from typing import AsyncIterator, Dict, Any, List, Optional
+import asyncio
+import logging
+import math
+import random
+
+from src.features.ai_responses.providers.base_provider import AIProvider
+from src.core.exceptions import AIServiceError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAKE_REPLY = "Recibí tu mensaje: {message}"
+
+
+def sample_latency(spec: Optional[Dict[str, Any]], rng: random.Random) -> float:
+    """
+    Sortea una latencia en segundos.
+
+    Args:
+        spec: {distribution, ...} con distribution:
+            - fixed: seconds
+            - uniform: min_seconds, max_seconds
+            - exponential: mean_seconds
+            - lognormal: median_seconds, sigma (default 0.5); cola larga como
+              la de una API real
+        rng: Generador a usar
+
+    Returns:
+        Segundos (0 si no hay spec)
+    """
+    if not spec:
+        return 0.0
+
+    distribution = spec.get('distribution', 'fixed')
+    if distribution == 'fixed':
+        return float(spec.get('seconds', 0.0))
+    if distribution == 'uniform':
+        return rng.uniform(spec.get('min_seconds', 0.0), spec.get('max_seconds', 0.0))
+    if distribution == 'exponential':
+        return rng.expovariate(1 / spec['mean_seconds']) if spec.get('mean_seconds') else 0.0
+    if distribution == 'lognormal':
+        median = spec.get('median_seconds', 0.0)
+        return rng.lognormvariate(math.log(median), spec.get('sigma', 0.5)) if median > 0 else 0.0
+
+    raise ValueError(f"Unknown latency distribution: {distribution}")
+
+
+class FakeProvider(AIProvider):
+    """AIProvider determinístico, sin red"""
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.name = config.get('name', 'Fake')
+        self.reply = config.get('reply', DEFAULT_FAKE_REPLY)
+        self.first_token_delay = config.get('first_token_delay_seconds', 0)
+        self.chunk_chars = max(1, config.get('chunk_chars', 12))
+        self.chunk_delay = config.get('chunk_delay_seconds', 0)
+        self.script = config.get('script') or []
+        self.latency = config.get('latency')
+        self.error_rate = config.get('error_rate', 0.0)
+        self.rng = random.Random(config.get('seed'))
+        self.calls = 0
+
+        # Validar la distribución al crear el provider, no en la primera llamada
+        sample_latency(self.latency, random.Random(0))
+
+        logger.info("Fake AI provider initialized")
+
+    def render(self, message: str) -> str:
+        """Texto completo de la respuesta a un mensaje"""
+        return self.reply.format(message=message)
+
+    async def generate_response(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> str:
+        chunks = []
+        async for chunk in self.generate_response_stream(
+            message, system_prompt, conversation_history, conversation_summary, knowledge
+        ):
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    async def generate_response_stream(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        step = self.script[self.calls % len(self.script)] if self.script else {}
+        self.calls += 1
+        text = self.render(message)
+
+        if 'delay_seconds' in step:
+            delay = step['delay_seconds']
+        elif self.latency:
+            delay = sample_latency(self.latency, self.rng)
+        else:
+            delay = self.first_token_delay
+        if delay:
+            await asyncio.sleep(delay)
+
+        if step.get('error'):
+            raise AIServiceError(step['error'], self.get_name())
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise AIServiceError("simulated error", self.get_name())
+
+        for start in range(0, len(text), self.chunk_chars):
+            if start and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield text[start:start + self.chunk_chars]
+
+    def get_name(self) -> str:
+        return self.name
+
+    def cleanup(self):
+        logger.info("Fake provider cleaned up")
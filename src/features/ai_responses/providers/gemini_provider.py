@@ -1,14 +1,26 @@
 """
 Proveedor de Google Gemini para generación de respuestas.
+
+Soporta dos transportes (provider_config.transport):
+- "http" (default): llama a la REST API de Gemini con el cliente httpx
+  compartido. Es async nativo y cada cliente usa su propia API key por
+  request, sin tocar estado global.
+- "sdk": usa google-generativeai. El SDK es síncrono y su API key es
+  global al proceso, por eso la llamada corre en un thread. Sólo
+  recomendado para un único cliente por proceso.
 """
-from typing import Dict, Any, List
-import google.generativeai as genai
+from typing import AsyncIterator, Dict, Any, List, Optional
+import asyncio
+import json
 from src.features.ai_responses.providers.base_provider import AIProvider
 from src.core.exceptions import AIServiceError
+from src.infrastructure.http_client import get_http_client
 import logging
 
 logger = logging.getLogger(__name__)
 
+GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com"
+
 
 class GeminiProvider(AIProvider):
     """Implementación de AIProvider usando Google Gemini"""
@@ -17,27 +29,42 @@ class GeminiProvider(AIProvider):
         super().__init__(config)
 
         # Configurar Gemini
-        api_key = config.get('api_key')
-        if not api_key:
+        self.api_key = config.get('api_key')
+        if not self.api_key:
             raise ValueError("Gemini API key not provided")
 
-        genai.configure(api_key=api_key)
-
         # Parámetros del modelo
         self.model_name = config.get('model', 'gemini-1.5-flash')
         self.temperature = config.get('temperature', 0.8)
         self.max_tokens = config.get('max_tokens', 500)
 
-        # Crear modelo
-        self.model = genai.GenerativeModel(self.model_name)
+        self.transport = config.get('transport', 'http')
+        if self.transport not in ('http', 'sdk'):
+            raise ValueError(f"Unknown Gemini transport: {self.transport}")
+
+        if self.transport == 'http':
+            base_url = config.get('base_url', GEMINI_API_BASE_URL).rstrip('/')
+            self.endpoint = f"{base_url}/v1beta/models/{self.model_name}:generateContent"
+            self.stream_endpoint = (
+                f"{base_url}/v1beta/models/{self.model_name}:streamGenerateContent?alt=sse"
+            )
+        else:
+            # El SDK se importa sólo si se usa (es pesado y configura estado global)
+            import google.generativeai as genai
+
+            genai.configure(api_key=self.api_key)
+            self._genai = genai
+            self.model = genai.GenerativeModel(self.model_name)
 
-        logger.info(f"Gemini provider initialized: {self.model_name}")
+        logger.info(f"Gemini provider initialized: {self.model_name} ({self.transport})")
 
     async def generate_response(
         self,
         message: str,
         system_prompt: str,
-        conversation_history: List[Dict[str, str]] = None
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
     ) -> str:
         """
         Genera respuesta usando Gemini.
@@ -46,43 +73,141 @@ class GeminiProvider(AIProvider):
             message: Mensaje del usuario
             system_prompt: Instrucciones del sistema
             conversation_history: Historial (opcional)
+            conversation_summary: Resumen de turnos viejos (opcional)
+            knowledge: Pasajes de la base de conocimiento (opcional)
 
         Returns:
             Respuesta generada
         """
         try:
-            # Construir prompt completo
-            full_prompt = f"{system_prompt}\n\nUsuario: {message}\nAsistente:"
-
-            # Si hay historial, incluirlo
-            if conversation_history:
-                history_text = "\n".join([
-                    f"{msg['role']}: {msg['content']}"
-                    for msg in conversation_history[-5:]  # Últimos 5 mensajes
-                ])
-                full_prompt = f"{system_prompt}\n\nHistorial:\n{history_text}\n\nUsuario: {message}\nAsistente:"
-
-            # Generar respuesta
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=genai.GenerationConfig(
-                    temperature=self.temperature,
-                    max_output_tokens=self.max_tokens,
-                )
-            )
+            full_prompt = self.assemble_prompt(
+                message, system_prompt, conversation_history, conversation_summary, knowledge
+            ).to_text()
+
+            if self.transport == 'http':
+                text = await self._generate_http(full_prompt)
+            else:
+                text = await asyncio.to_thread(self._generate_sdk, full_prompt)
 
-            if not response or not response.text:
+            if not text:
                 raise AIServiceError("Empty response from Gemini", "Gemini")
 
-            return response.text.strip()
+            return text.strip()
+
+        except AIServiceError:
+            raise
 
         except Exception as e:
             logger.error(f"Gemini generation error: {e}", exc_info=True)
             raise AIServiceError(str(e), "Gemini")
 
+    async def generate_response_stream(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Genera la respuesta con streamGenerateContent (Server-Sent Events).
+        Con transport "sdk" se entrega la respuesta completa.
+        """
+        if self.transport != 'http':
+            async for chunk in super().generate_response_stream(
+                message, system_prompt, conversation_history, conversation_summary, knowledge
+            ):
+                yield chunk
+            return
+
+        full_prompt = self.assemble_prompt(
+            message, system_prompt, conversation_history, conversation_summary, knowledge
+        ).to_text()
+
+        received = False
+        try:
+            async with get_http_client("gemini").stream(
+                "POST",
+                self.stream_endpoint,
+                json=self._payload(full_prompt),
+                headers={"x-goog-api-key": self.api_key},
+            ) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise AIServiceError(self._error_detail(response), "Gemini")
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+
+                    text = self._extract_text(json.loads(line[5:]))
+                    if text:
+                        received = True
+                        yield text
+
+        except AIServiceError:
+            raise
+
+        except Exception as e:
+            logger.error(f"Gemini streaming error: {e}", exc_info=True)
+            raise AIServiceError(str(e), "Gemini")
+
+        if not received:
+            raise AIServiceError("Empty response from Gemini", "Gemini")
+
+    def _payload(self, full_prompt: str) -> Dict[str, Any]:
+        return {
+            "contents": [{"role": "user", "parts": [{"text": full_prompt}]}],
+            "generationConfig": {
+                "temperature": self.temperature,
+                "maxOutputTokens": self.max_tokens,
+            },
+        }
+
+    @staticmethod
+    def _error_detail(response) -> str:
+        try:
+            detail = response.json().get("error", {}).get("message", response.text)
+        except ValueError:
+            detail = response.text
+        return f"HTTP {response.status_code}: {detail}"
+
+    @staticmethod
+    def _extract_text(data: Dict[str, Any]) -> str:
+        candidates = data.get("candidates") or []
+        if not candidates:
+            return ""
+
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    async def _generate_http(self, full_prompt: str) -> str:
+        """Llama a generateContent con el cliente HTTP compartido"""
+        response = await get_http_client("gemini").post(
+            self.endpoint,
+            json=self._payload(full_prompt),
+            headers={"x-goog-api-key": self.api_key},
+        )
+
+        if response.status_code >= 400:
+            raise AIServiceError(self._error_detail(response), "Gemini")
+
+        return self._extract_text(response.json())
+
+    def _generate_sdk(self, full_prompt: str) -> str:
+        """Llama al SDK síncrono de Gemini (se ejecuta en un thread)"""
+        response = self.model.generate_content(
+            full_prompt,
+            generation_config=self._genai.GenerationConfig(
+                temperature=self.temperature,
+                max_output_tokens=self.max_tokens,
+            )
+        )
+        return response.text if response else ""
+
     def get_name(self) -> str:
         return f"Gemini ({self.model_name})"
 
     def cleanup(self):
-        """No hay recursos específicos que limpiar con Gemini"""
+        """El cliente HTTP es compartido y se cierra en el shutdown de la app"""
         logger.info("Gemini provider cleaned up")
@@ -0,0 +1,377 @@
+"""
+Protección de un proveedor de IA: circuit breaker + límite de
+concurrencia adaptativo (AIMD).
+
+Cuando un proveedor se degrada, seguir llamándolo sólo acumula requests
+en vuelo (y memoria) que van a terminar en error. El guard:
+
+- Circuit breaker: después de N fallas seguidas se abre y rechaza al
+  instante durante open_seconds; luego deja pasar una llamada de prueba
+  (half-open) que lo cierra si sale bien o lo vuelve a abrir si falla.
+- Límite AIMD: la cantidad de llamadas simultáneas crece de a poco
+  (aditivo) mientras las respuestas son rápidas y se reduce a la mitad
+  (multiplicativo) cuando los errores o la latencia reciente se
+  disparan, como mucho una vez por RTT. Con el límite lleno y el
+  proveedor sano el límite crece hasta la demanda; sólo con el proveedor
+  degradado las llamadas que lo superan se rechazan sin llegar a él.
+
+Un rechazo es un AIServiceError, así que dentro de una cadena con
+failover se pasa al siguiente proveedor sin esperar.
+
+Cada instancia de AIResponsesFeature (una por cliente) arma sus propios
+guards: el estado es por proveedor y por cliente.
+"""
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+import logging
+import time
+
+from src.features.ai_responses.providers.base_provider import AIProvider
+from src.features.ai_responses.providers.failover_provider import LatencyTracker
+from src.core.exceptions import AIServiceError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados.
+
+    Args:
+        failure_threshold: Fallas consecutivas que abren el circuito
+        open_seconds: Tiempo abierto antes de probar de nuevo
+        half_open_max_calls: Llamadas de prueba simultáneas en half-open
+    """
+
+    def __init__(self, failure_threshold: int = 5, open_seconds: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self.consecutive_failures = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._trial_calls = 0
+        return self._state
+
+    def allow(self) -> bool:
+        """Reserva una llamada si el circuito lo permite"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+            self._trial_calls += 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Segundos hasta la próxima llamada de prueba (0 si no está abierto)"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self._state != CLOSED:
+            logger.info("✅ Circuit closed")
+        self._state = CLOSED
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def release(self):
+        """Devuelve una llamada de prueba que no llegó a un resultado (cancelada)"""
+        if self._state == HALF_OPEN and self._trial_calls > 0:
+            self._trial_calls -= 1
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+
+
+class AIMDLimit:
+    """
+    Límite de concurrencia Additive Increase / Multiplicative Decrease.
+
+    El límite sólo descarta carga de un proveedor degradado:
+
+    - Si llega una llamada con el límite lleno y no hay señales de
+      degradación (latencia reciente dentro de la tolerancia, sin una
+      reducción en el último RTT), el límite crece hasta la demanda y la
+      llamada pasa. Sin esto el límite nunca alcanzaría a una demanda que
+      él mismo rechaza, porque sólo crece con las respuestas.
+    - Una respuesta lenta aislada no lo reduce: hace falta que el
+      percentil latency_percentile de las últimas latency_window respuestas
+      supere latency_tolerance × la latencia promedio. Después de esa
+      reducción la ventana se vacía y el límite no vuelve a crecer por
+      demanda hasta juntar muestras nuevas.
+    - Un error aislado tampoco: hace falta que la proporción de errores en
+      los últimos latency_window resultados supere error_tolerance.
+    - Como mucho una reducción por latencia promedio (un RTT): las llamadas
+      que ya estaban en vuelo reflejan la misma congestión.
+
+    Args:
+        initial_limit: Límite inicial de llamadas simultáneas
+        min_limit / max_limit: Rango del límite
+        decrease_factor: Factor aplicado ante errores o congestión
+        latency_tolerance: Congestión = percentil mayor a tolerance × latencia promedio
+        latency_window: Resultados recientes que se consideran
+        latency_percentile: Percentil de la ventana que se compara
+        error_tolerance: Proporción de errores recientes que reduce el límite
+        warmup_samples: Resultados antes de detectar congestión o errores
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 50,
+        min_limit: float = 1,
+        max_limit: float = 200,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 3.0,
+        latency_window: int = 20,
+        latency_percentile: float = 90,
+        error_tolerance: float = 0.1,
+        warmup_samples: int = 10
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_percentile = latency_percentile
+        self.error_tolerance = error_tolerance
+        self.warmup_samples = warmup_samples
+
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.decreases = 0
+        self._samples = 0
+        self._recent = LatencyTracker(window=latency_window, min_samples=min(warmup_samples, latency_window))
+        self._outcomes: Deque[bool] = deque(maxlen=latency_window)
+        self._last_decrease_at: Optional[float] = None
+        # Tras reducir por latencia: no crecer por demanda hasta tener muestras nuevas
+        self._awaiting_samples = False
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            if not self._healthy() or self.limit >= self.max_limit:
+                return False
+            # Demanda por encima del límite con el proveedor sano: el límite la sigue
+            self.limit = min(self.max_limit, float(self.in_flight + 1))
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def on_success(self, latency: float):
+        self._outcomes.append(True)
+        self._recent.record(latency)
+
+        if self._congested():
+            if self._decrease():
+                self._recent.samples.clear()
+                self._awaiting_samples = True
+        elif self.in_flight + 1 >= self.limit / 2:
+            # Crecer sólo si el límite se está usando: +1 por cada "limit" respuestas
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        # Los picos no entran al promedio para que no se normalicen solos
+        if self.latency_ewma is None or latency <= self.latency_tolerance * self.latency_ewma:
+            self._samples += 1
+            self.latency_ewma = latency if self.latency_ewma is None else (
+                0.9 * self.latency_ewma + 0.1 * latency
+            )
+
+    def on_failure(self):
+        self._outcomes.append(False)
+        if self._failing():
+            self._decrease()
+
+    def _failing(self) -> bool:
+        if len(self._outcomes) < self.warmup_samples:
+            return False
+        errors = len(self._outcomes) - sum(self._outcomes)
+        return errors / len(self._outcomes) > self.error_tolerance
+
+    def _congested(self) -> bool:
+        if self._samples < self.warmup_samples:
+            return False
+        recent = self._recent.percentile(self.latency_percentile)
+        return recent is not None and recent > self.latency_tolerance * self.latency_ewma
+
+    def _healthy(self) -> bool:
+        """Sin señales de degradación: se puede crecer por demanda"""
+        if self._recently_decreased() or self._failing():
+            return False
+        if self._awaiting_samples:
+            if self._recent.percentile(self.latency_percentile) is None:
+                return False
+            self._awaiting_samples = False
+        return not self._congested()
+
+    def _recently_decreased(self) -> bool:
+        return (
+            self._last_decrease_at is not None
+            and time.monotonic() - self._last_decrease_at < (self.latency_ewma or 0.0)
+        )
+
+    def _decrease(self) -> bool:
+        if self._recently_decreased():
+            return False
+        self._last_decrease_at = time.monotonic()
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        self.decreases += 1
+        return True
+
+
+class GuardedProvider(AIProvider):
+    """
+    AIProvider que envuelve a otro con CircuitBreaker y AIMDLimit.
+
+    Configuración (resilience):
+    - circuit_breaker: {failure_threshold: 5, open_seconds: 30, half_open_max_calls: 1}
+    - concurrency: {initial_limit: 50, min_limit: 1, max_limit: 200,
+      decrease_factor: 0.5, latency_tolerance: 3.0, latency_window: 20,
+      latency_percentile: 90, error_tolerance: 0.1}
+    """
+
+    def __init__(self, provider: AIProvider, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        super().__init__(provider.config)
+        self.provider = provider
+        self.breaker = CircuitBreaker(**(config.get('circuit_breaker') or {}))
+        self.limit = AIMDLimit(**(config.get('concurrency') or {}))
+        self.rejected = 0
+
+    def _acquire(self):
+        name = self.provider.get_name()
+
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise AIServiceError(
+                f"circuit open, retry in {self.breaker.retry_after():.0f}s", name
+            )
+
+        if not self.limit.try_acquire():
+            self.breaker.release()
+            self.rejected += 1
+            raise AIServiceError(
+                f"concurrency limit reached ({int(self.limit.limit)} in flight)", name
+            )
+
+    def _on_success(self, latency: float):
+        self.limit.release()
+        self.limit.on_success(latency)
+        self.breaker.record_success()
+
+    def _on_failure(self):
+        state = self.breaker.state
+        self.limit.release()
+        self.limit.on_failure()
+        self.breaker.record_failure()
+
+        if self.breaker.state == OPEN and state != OPEN:
+            logger.warning(
+                f"🔌 Circuit opened for {self.provider.get_name()} "
+                f"after {self.breaker.consecutive_failures} failure(s); "
+                f"retrying in {self.breaker.open_seconds:.0f}s"
+            )
+
+    def _on_cancel(self):
+        """Llamada cancelada (por ejemplo, perdió un hedge): no cuenta como resultado"""
+        self.limit.release()
+        self.breaker.release()
+
+    async def generate_response(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> str:
+        self._acquire()
+        started = time.monotonic()
+        try:
+            response = await self.provider.generate_response(
+                message, system_prompt, conversation_history, conversation_summary, knowledge
+            )
+        except Exception:
+            self._on_failure()
+            raise
+        except BaseException:
+            self._on_cancel()
+            raise
+
+        self._on_success(time.monotonic() - started)
+        return response
+
+    async def generate_response_stream(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        conversation_summary: Optional[str] = None,
+        knowledge: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        self._acquire()
+        started = time.monotonic()
+        first_chunk_latency = None
+        finished = False
+        try:
+            async for chunk in self.provider.generate_response_stream(
+                message, system_prompt, conversation_history, conversation_summary, knowledge
+            ):
+                if first_chunk_latency is None:
+                    first_chunk_latency = time.monotonic() - started
+                yield chunk
+
+        except Exception:
+            finished = True
+            self._on_failure()
+            raise
+
+        else:
+            finished = True
+            self._on_success(first_chunk_latency if first_chunk_latency is not None else time.monotonic() - started)
+
+        finally:
+            # Stream cerrado antes de terminar (cancelado o descartado)
+            if not finished:
+                self._on_cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del circuito y del límite de concurrencia"""
+        return {
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.consecutive_failures,
+            'times_opened': self.breaker.times_opened,
+            'retry_after_seconds': round(self.breaker.retry_after(), 1),
+            'concurrency_limit': round(self.limit.limit, 2),
+            'concurrency_decreases': self.limit.decreases,
+            'in_flight': self.limit.in_flight,
+            'latency_ewma_seconds': round(self.limit.latency_ewma, 3)
+            if self.limit.latency_ewma is not None else None,
+            'rejected': self.rejected,
+        }
+
+    def get_name(self) -> str:
+        return self.provider.get_name()
+
+    def cleanup(self):
+        self.provider.cleanup()
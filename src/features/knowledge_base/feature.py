@@ -0,0 +1,194 @@
+"""
+Feature de base de conocimiento.
+Busca en los documentos del cliente (menú, FAQs, políticas) los pasajes
+relevantes a cada mensaje para pasarlos al prompt de la IA, en lugar de
+cargar todo en el system_prompt.
+
+Con vector_index_path la búsqueda es híbrida: los resultados BM25 y los
+del índice vectorial se combinan con reciprocal rank fusion.
+"""
+from typing import Dict, Any, List, Optional
+from pathlib import Path
+from fastapi import APIRouter
+from src.features.base_feature import BaseFeature
+from src.features.knowledge_base.index import KnowledgeIndex
+from src.infrastructure.ai.embeddings import CachedEmbedder, Embedder, create_embedder
+from src.infrastructure.ai.vector_index import VectorIndex
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Constante de reciprocal rank fusion: score = Σ 1 / (RRF_K + rank)
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = RRF_K) -> List[int]:
+    """
+    Combina varios rankings de doc_ids en uno solo.
+
+    Args:
+        rankings: Listas de doc_ids, cada una del más relevante al menos
+
+    Returns:
+        doc_ids ordenados por score RRF descendente
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+
+
+class KnowledgeBaseFeature(BaseFeature):
+    """
+    Búsqueda BM25 sobre un índice precompilado del cliente.
+
+    Configuración:
+    - index_path: Índice generado con scripts/build_knowledge_index.py
+    - documents_path: Directorio de documentos (.md/.txt) a indexar
+    - top_k: Pasajes por mensaje (default: 3)
+    - min_score: Score BM25 mínimo para incluir un pasaje (default: 0)
+    - vector_index_path: Índice vectorial de los mismos pasajes (opcional)
+    - embedder: Config del embedder de las consultas (ver create_embedder);
+      debe ser el mismo con el que se construyó el índice vectorial
+    - min_similarity: Similitud coseno mínima de un pasaje vectorial (default: 0.2)
+    - n_probe: Listas IVF a recorrer por consulta (default: 8)
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.index: Optional[KnowledgeIndex] = None
+        self.vector_index: Optional[VectorIndex] = None
+        self.embedder: Optional[Embedder] = None
+        self.top_k = config.get('top_k', 3)
+        self.min_score = config.get('min_score', 0.0)
+        self.min_similarity = config.get('min_similarity', 0.2)
+        self.n_probe = config.get('n_probe', 8)
+
+    def initialize(self):
+        """Abre el índice con mmap (no lo carga en memoria)"""
+        index_path = self.config.get('index_path')
+        if not index_path:
+            logger.warning("Knowledge base enabled without index_path; no passages will be added")
+            return
+
+        path = Path(index_path)
+        if not path.exists():
+            logger.warning(
+                f"Knowledge base index not found: {path}. "
+                f"Build it with: python -m scripts.build_knowledge_index --client <client_id>"
+            )
+            return
+
+        self.index = KnowledgeIndex.open(path)
+        logger.info(
+            f"Knowledge base index loaded: {path} "
+            f"({len(self.index):,} passages, {self.index.vocabulary_size:,} terms)"
+        )
+
+        self._initialize_vector_index()
+
+    def _initialize_vector_index(self):
+        """Abre el índice vectorial (opcional) y crea el embedder de consultas"""
+        vector_index_path = self.config.get('vector_index_path')
+        if not vector_index_path:
+            return
+
+        path = Path(vector_index_path)
+        if not path.exists():
+            logger.warning(f"Knowledge base vector index not found: {path}; using BM25 only")
+            return
+
+        embedder = create_embedder(self.config.get('embedder', {}))
+        vector_index = VectorIndex.open(path)
+
+        if vector_index.embedder_name != embedder.name:
+            logger.warning(
+                f"Vector index {path} was built with '{vector_index.embedder_name}' "
+                f"but queries use '{embedder.name}'; using BM25 only"
+            )
+            vector_index.close()
+            return
+
+        if len(vector_index) != len(self.index):
+            logger.warning(f"Vector index {path} is out of date with the BM25 index; using BM25 only")
+            vector_index.close()
+            return
+
+        self.vector_index = vector_index
+        self.embedder = CachedEmbedder(embedder)
+        logger.info(
+            f"Knowledge base vector index loaded: {path} "
+            f"({len(vector_index):,} vectors, {vector_index.dim} dims, {vector_index.n_lists} lists)"
+        )
+
+    def cleanup(self):
+        """Cierra los índices"""
+        if self.vector_index is not None:
+            self.vector_index.close()
+            self.vector_index = None
+            self.embedder = None
+
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+            logger.info("Knowledge base index closed")
+
+    def get_routes(self) -> Optional[APIRouter]:
+        """Esta feature no expone rutas propias"""
+        return None
+
+    async def process_message(
+        self,
+        message: str,
+        user_context: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Busca los pasajes relevantes al mensaje.
+        No genera una respuesta: los pasajes se agregan al contexto de la IA.
+
+        Returns:
+            Dict con 'passages' (textos, del más relevante al menos) o None si no hay
+        """
+        if self.index is None:
+            return None
+
+        results = [
+            result for result in self.index.search(message, k=self.top_k)
+            if result.score >= self.min_score
+        ]
+
+        if self.vector_index is None:
+            if not results:
+                return None
+
+            return {
+                'passages': [result.text for result in results],
+                'metadata': {
+                    'feature': 'knowledge_base',
+                    'scores': [round(result.score, 3) for result in results]
+                }
+            }
+
+        query = await self.embedder.embed([message])
+        hits = [
+            hit for hit in self.vector_index.search_one(query[0], k=self.top_k, n_probe=self.n_probe)
+            if hit.score >= self.min_similarity
+        ]
+
+        doc_ids = reciprocal_rank_fusion([
+            [result.doc_id for result in results],
+            [hit.doc_id for hit in hits],
+        ])[:self.top_k]
+        if not doc_ids:
+            return None
+
+        return {
+            'passages': [self.index.passage(doc_id) for doc_id in doc_ids],
+            'metadata': {
+                'feature': 'knowledge_base',
+                'doc_ids': doc_ids,
+                'lexical_matches': len(results),
+                'semantic_matches': len(hits)
+            }
+        }
@@ -0,0 +1,327 @@
+"""
+Índice invertido BM25 en disco, memory-mapped.
+
+El índice se arma offline (scripts/build_knowledge_index.py) y se abre
+con mmap: las posting lists no se copian a memoria (numpy las lee
+directamente del archivo), sólo el vocabulario se decodifica al cargar.
+
+Formato (little-endian, secciones alineadas a 8 bytes):
+    header
+    vocabulario:  términos en UTF-8 separados por "\\n"
+    term_starts:  uint32[n_terms + 1]  inicio de la posting list de cada término
+    doc_ids:      uint32[n_postings]   postings de cada término, por doc_id
+    impacts:      float32[n_postings]  aporte BM25 precalculado (idf * tf normalizado)
+    text_offsets: uint64[n_docs + 1]
+    textos de los pasajes (UTF-8)
+
+Como el aporte de cada posting ya está calculado, una búsqueda es una
+suma dispersa (scatter-add) de las listas de los términos de la
+consulta y un top-k parcial: BM25 exacto, vectorizado.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+import math
+import mmap
+import re
+import struct
+
+import numpy as np
+
+from src.infrastructure.cache.response_cache import normalize_message
+
+MAGIC = b"KBIDX001"
+
+DOCUMENT_SUFFIXES = (".md", ".txt")
+
+# magic, n_docs, n_terms, n_postings, k1, b, y offsets de las secciones
+_HEADER = struct.Struct("<8sIIQdd6Q")
+
+# Palabras sin valor de búsqueda (ya normalizadas: sin tildes, minúsculas)
+STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes como con contra cual cuando
+de del desde donde dos el ella ellas ellos en entre era eres es esa esas ese eso esos
+esta estan estas este esto estos fue ha hay la las le les lo los mas me mi mis muy
+nada ni no nos o os para pero por porque que quien se sea ser si sin sobre son su sus
+tambien te tiene tu tus un una uno unos y ya yo
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Términos de búsqueda de un texto: normalizado (minúsculas, sin tildes
+    ni puntuación), sin stopwords y con plurales simples reducidos.
+    """
+    terms = []
+    for word in normalize_message(text).split():
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        if len(word) > 5 and word.endswith("es"):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def split_passages(text: str, max_chars: int = 600) -> List[str]:
+    """
+    Divide un documento en pasajes: un párrafo por pasaje (separados por
+    línea en blanco) y los párrafos largos cortados en oraciones.
+    Los títulos markdown (# ...) no son pasajes: se anteponen a los
+    párrafos de su sección ("Horarios: Abrimos de lunes a...").
+    """
+    passages = []
+    heading = None
+    for paragraph in re.split(r"\n\s*\n", text):
+        lines = paragraph.strip().splitlines()
+        while lines and lines[0].lstrip().startswith("#"):
+            heading = lines.pop(0).strip().lstrip("#").strip()
+
+        paragraph = " ".join(" ".join(lines).split())
+        if not paragraph:
+            continue
+        if heading:
+            paragraph = f"{heading}: {paragraph}"
+
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                passages.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            passages.append(current)
+
+    return passages
+
+
+def load_document_passages(documents_dir: Path, max_chars: int = 600) -> Iterator[str]:
+    """Pasajes de los documentos .md y .txt de un directorio (recursivo, en orden)"""
+    for path in sorted(Path(documents_dir).rglob("*")):
+        if path.suffix.lower() in DOCUMENT_SUFFIXES and path.is_file():
+            yield from split_passages(path.read_text(encoding="utf-8"), max_chars)
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % 8)
+
+
+def build_index(passages: Iterable[str], path: Path, k1: float = 1.2, b: float = 0.75) -> int:
+    """
+    Construye el índice de una lista de pasajes y lo escribe en path.
+
+    Returns:
+        Cantidad de pasajes indexados
+    """
+    texts: List[str] = []
+    doc_terms: List[Counter] = []
+    for passage in passages:
+        passage = passage.strip()
+        if passage:
+            texts.append(passage)
+            doc_terms.append(Counter(tokenize(passage)))
+
+    n_docs = len(texts)
+    lengths = np.array([sum(counts.values()) for counts in doc_terms], dtype=np.float64)
+    avgdl = float(lengths.mean()) if n_docs else 0.0
+
+    postings: Dict[str, Tuple[List[int], List[int]]] = {}
+    for doc_id, counts in enumerate(doc_terms):
+        for term, tf in counts.items():
+            docs, tfs = postings.setdefault(term, ([], []))
+            docs.append(doc_id)
+            tfs.append(tf)
+
+    vocabulary = sorted(postings)
+    term_starts = np.zeros(len(vocabulary) + 1, dtype="<u4")
+    doc_id_parts = []
+    impact_parts = []
+
+    for i, term in enumerate(vocabulary):
+        docs = np.array(postings[term][0], dtype="<u4")
+        tfs = np.array(postings[term][1], dtype=np.float64)
+
+        idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+        norm = k1 * (1 - b + b * lengths[docs] / avgdl)
+
+        doc_id_parts.append(docs)
+        impact_parts.append((idf * tfs * (k1 + 1) / (tfs + norm)).astype("<f4"))
+        term_starts[i + 1] = term_starts[i] + len(docs)
+
+    doc_ids = np.concatenate(doc_id_parts) if doc_id_parts else np.zeros(0, dtype="<u4")
+    impacts = np.concatenate(impact_parts) if impact_parts else np.zeros(0, dtype="<f4")
+
+    encoded = [text.encode("utf-8") for text in texts]
+    text_offsets = np.zeros(n_docs + 1, dtype="<u8")
+    np.cumsum([len(data) for data in encoded], out=text_offsets[1:])
+
+    blobs = [
+        _pad("\n".join(vocabulary).encode("utf-8")),
+        _pad(term_starts.tobytes()),
+        _pad(doc_ids.tobytes()),
+        _pad(impacts.tobytes()),
+        _pad(text_offsets.tobytes()),
+        _pad(b"".join(encoded)),
+    ]
+
+    offsets = []
+    position = _HEADER.size
+    for blob in blobs:
+        offsets.append(position)
+        position += len(blob)
+
+    header = _HEADER.pack(MAGIC, n_docs, len(vocabulary), len(doc_ids), k1, b, *offsets)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    tmp_path.replace(path)
+
+    return n_docs
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    """Pasaje encontrado"""
+    doc_id: int
+    score: float
+    text: str
+
+
+class KnowledgeIndex:
+    """
+    Índice BM25 abierto con mmap (sólo lectura).
+
+    Uso:
+        index = KnowledgeIndex.open(path)
+        results = index.search("¿abren el domingo?", k=3)
+        index.close()
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._load()
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def open(cls, path: Path) -> "KnowledgeIndex":
+        return cls(path)
+
+    def _load(self):
+        (
+            magic, self.n_docs, n_terms, n_postings, self.k1, self.b,
+            vocab_at, starts_at, doc_ids_at, impacts_at, text_offsets_at, texts_at
+        ) = _HEADER.unpack_from(self._mmap, 0)
+
+        if magic != MAGIC:
+            raise ValueError(f"Not a knowledge base index: {self.path}")
+
+        vocabulary = self._mmap[vocab_at:starts_at].rstrip(b"\0").decode("utf-8")
+        terms = vocabulary.split("\n") if n_terms else []
+        self._vocabulary = {term: i for i, term in enumerate(terms)}
+
+        # Vistas sobre el mmap, sin copiar
+        self._term_starts = self._array(starts_at, "<u4", n_terms + 1).tolist()
+        self._doc_ids = self._array(doc_ids_at, "<u4", n_postings)
+        self._impacts = self._array(impacts_at, "<f4", n_postings)
+        self._text_offsets = self._array(text_offsets_at, "<u8", self.n_docs + 1)
+        self._texts_at = texts_at
+
+    def _array(self, offset: int, dtype: str, count: int) -> np.ndarray:
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._vocabulary)
+
+    def passage(self, doc_id: int) -> str:
+        """Texto de un pasaje"""
+        start = self._texts_at + int(self._text_offsets[doc_id])
+        end = self._texts_at + int(self._text_offsets[doc_id + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def search(self, query: str, k: int = 3) -> List[SearchResult]:
+        """
+        Top-k pasajes por BM25.
+
+        Args:
+            query: Texto de la consulta
+            k: Cantidad de resultados
+
+        Returns:
+            Resultados ordenados por score descendente
+        """
+        ranges = []
+        for term in set(tokenize(query)):
+            i = self._vocabulary.get(term)
+            if i is not None:
+                ranges.append((self._term_starts[i], self._term_starts[i + 1]))
+
+        if not ranges:
+            return []
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            candidates = self._doc_ids[start:end]
+            candidate_scores = self._impacts[start:end]
+        else:
+            # Un doc aparece a lo sumo una vez por lista: el += con índices no pierde sumas
+            scores = np.zeros(self.n_docs, dtype=np.float32)
+            for start, end in ranges:
+                scores[self._doc_ids[start:end]] += self._impacts[start:end]
+
+            candidates = np.flatnonzero(scores)
+            candidate_scores = scores[candidates]
+
+        k = min(k, len(candidates))
+        if len(candidates) > k:
+            best = np.argpartition(candidate_scores, -k)[-k:]
+        else:
+            best = np.arange(len(candidates))
+
+        ranked = sorted(
+            ((float(candidate_scores[i]), int(candidates[i])) for i in best),
+            key=lambda item: (-item[0], item[1])
+        )
+        return [SearchResult(doc_id, score, self.passage(doc_id)) for score, doc_id in ranked]
+
+    def search_exhaustive(self, query: str, k: int = 3) -> List[SearchResult]:
+        """Top-k acumulando en Python (referencia para verificar search en benchmarks)"""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            i = self._vocabulary.get(term)
+            if i is None:
+                continue
+            start, end = self._term_starts[i], self._term_starts[i + 1]
+            for doc_id, impact in zip(self._doc_ids[start:end].tolist(), self._impacts[start:end].tolist()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + impact
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [SearchResult(doc_id, score, self.passage(doc_id)) for doc_id, score in ranked]
+
+    def close(self):
+        """Libera el mmap"""
+        self._doc_ids = self._impacts = self._text_offsets = None
+
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        if getattr(self, "_file", None) is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,210 @@
+"""
+Funciones de embedding para búsqueda semántica.
+
+- HashEmbedder: local y determinístico (feature hashing de palabras y
+  trigramas). No entiende sinónimos, pero sirve para desarrollo, tests y
+  benchmarks sin red.
+- GeminiEmbedder: text-embedding de Gemini vía REST (cliente httpx compartido).
+- CachedEmbedder: LRU delante de cualquier embedder para las consultas.
+
+Todos devuelven matrices float32 (n, dim) con filas normalizadas (norma 1),
+así el producto punto es la similitud coseno.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List
+import zlib
+
+import numpy as np
+
+from src.infrastructure.cache.response_cache import normalize_message
+from src.infrastructure.http_client import get_http_client
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normaliza cada fila a norma 1 (las filas en cero quedan en cero)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-12)).astype(np.float32, copy=False)
+
+
+class Embedder:
+    """Interface de las funciones de embedding"""
+
+    dim: int
+    name: str
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Calcula los embeddings de una lista de textos.
+
+        Returns:
+            Matriz float32 (len(texts), dim) con filas normalizadas
+        """
+        raise NotImplementedError
+
+
+class HashEmbedder(Embedder):
+    """
+    Embedding por feature hashing: cada palabra y cada trigrama de
+    caracteres suma ±1 en una dimensión elegida por crc32.
+
+    Args:
+        dim: Dimensiones del vector
+        ngram: Tamaño de los n-gramas de caracteres (0 = sólo palabras)
+    """
+
+    def __init__(self, dim: int = 256, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+        self.name = f"hash-{dim}-{ngram}"
+
+    def _features(self, text: str) -> List[str]:
+        words = normalize_message(text).split()
+        features = list(words)
+        if self.ngram:
+            for word in words:
+                padded = f" {word} "
+                features.extend(
+                    padded[i:i + self.ngram] for i in range(len(padded) - self.ngram + 1)
+                )
+        return features
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        """Versión síncrona (el cálculo es local)"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                matrix[row, digest % self.dim] += sign
+        return normalize_rows(matrix)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+
+GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com"
+
+
+class GeminiEmbedder(Embedder):
+    """
+    Embeddings de Gemini (batchEmbedContents).
+
+    Args:
+        api_key: API key de Gemini
+        model: Modelo de embeddings (default: text-embedding-004, 768 dims)
+        dim: Dimensiones de salida
+        base_url: URL base de la API
+        batch_size: Textos por request
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "text-embedding-004",
+        dim: int = 768,
+        base_url: str = GEMINI_API_BASE_URL,
+        batch_size: int = 100
+    ):
+        if not api_key:
+            raise ValueError("Gemini API key not provided")
+
+        self.api_key = api_key
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+        self.name = f"gemini-{model}-{dim}"
+        self.endpoint = f"{base_url.rstrip('/')}/v1beta/models/{model}:batchEmbedContents"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            response = await get_http_client("gemini").post(
+                self.endpoint,
+                json={"requests": [
+                    {
+                        "model": f"models/{self.model}",
+                        "content": {"parts": [{"text": text}]},
+                        "outputDimensionality": self.dim,
+                    }
+                    for text in batch
+                ]},
+                headers={"x-goog-api-key": self.api_key},
+            )
+            response.raise_for_status()
+            rows.extend(item["values"] for item in response.json()["embeddings"])
+
+        return normalize_rows(np.array(rows, dtype=np.float32).reshape(len(texts), self.dim))
+
+
+class CachedEmbedder(Embedder):
+    """
+    LRU de embeddings delante de otro embedder.
+    Pensado para las consultas: los mensajes repetidos no se vuelven a embeber.
+
+    Args:
+        embedder: Embedder real
+        max_entries: Cantidad de textos cacheados
+    """
+
+    def __init__(self, embedder: Embedder, max_entries: int = 4096):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.name = embedder.name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        result = np.empty((len(texts), self.dim), dtype=np.float32)
+        missing = []
+
+        for row, text in enumerate(texts):
+            vector = self._entries.get(text)
+            if vector is None:
+                missing.append(row)
+            else:
+                self._entries.move_to_end(text)
+                result[row] = vector
+                self.hits += 1
+
+        if missing:
+            self.misses += len(missing)
+            computed = await self.embedder.embed([texts[row] for row in missing])
+            for row, vector in zip(missing, computed):
+                result[row] = vector
+                self._entries[texts[row]] = vector
+                self._entries.move_to_end(texts[row])
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def create_embedder(config: Dict[str, Any]) -> Embedder:
+    """
+    Crea un embedder desde la configuración de un cliente.
+
+    Config:
+        type: "hash" (default) o "gemini"
+        dim, ngram: para hash
+        api_key, model, dim: para gemini
+    """
+    embedder_type = config.get('type', 'hash')
+
+    if embedder_type == 'hash':
+        return HashEmbedder(dim=config.get('dim', 256), ngram=config.get('ngram', 3))
+
+    if embedder_type == 'gemini':
+        return GeminiEmbedder(
+            api_key=config.get('api_key'),
+            model=config.get('model', 'text-embedding-004'),
+            dim=config.get('dim', 768),
+        )
+
+    raise ValueError(f"Unknown embedder type: {embedder_type}. Available: ['hash', 'gemini']")
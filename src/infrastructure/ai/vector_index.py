@@ -0,0 +1,362 @@
+"""
+Índice vectorial denso con embeddings cuantizados a int8.
+
+Un archivo por cliente, abierto con mmap. Cada vector (normalizado) se
+guarda como int8 con una escala por fila: v ≈ codes * scale.
+
+Los índices chicos (hasta DEQUANTIZE_MAX_BYTES en float32) se
+decuantizan una vez al abrir: int8 sólo ahorra disco y la búsqueda es un
+producto float32, tan rápido como la búsqueda exacta. Los más grandes se
+recorren desde el mmap por bloques de filas, calculando (codes @ q) * scale
+con una conversión a float32 por bloque que cuesta más que el producto:
+para esos, la latencia baja depende de IVF.
+
+Con n_lists > 0 el índice se particiona estilo IVF: k-means esférico
+agrupa los vectores en n_lists listas contiguas y una búsqueda sólo
+recorre las n_probe listas cuyo centroide está más cerca de la consulta.
+
+Formato (little-endian, secciones alineadas a 8 bytes):
+    header
+    nombre del embedder (UTF-8)
+    codes:        int8[n, dim]       filas agrupadas por lista
+    scales:       float32[n]
+    doc_ids:      uint32[n]          doc_id original de cada fila
+    centroids:    float32[n_lists, dim]
+    list_offsets: uint32[n_lists + 1]
+    text_offsets: uint64[n + 1]      por doc_id
+    textos (UTF-8)
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+import mmap
+import struct
+
+import numpy as np
+
+from src.infrastructure.ai.embeddings import normalize_rows
+
+MAGIC = b"VECIDX01"
+
+# magic, n, dim, n_lists, y offsets de las secciones
+_HEADER = struct.Struct("<8sIII4x8Q")
+
+# Filas por bloque al recorrer el índice en int8 (acota la memoria temporal de la conversión a float32)
+BLOCK_ROWS = 4096
+
+# Tamaño máximo en float32 de un índice que se decuantiza al abrir
+DEQUANTIZE_MAX_BYTES = 128 * 1024 * 1024
+
+# Scores por bloque al recorrer un índice decuantizado (acota la matriz de similitudes)
+SCAN_MAX_SCORES = 256 * 1024
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % 8)
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cuantización simétrica por fila a int8.
+
+    Returns:
+        (codes int8[n, dim], scales float32[n])
+    """
+    max_abs = np.abs(vectors).max(axis=1)
+    scales = np.maximum(max_abs, 1e-12) / 127.0
+    codes = np.rint(vectors / scales[:, None]).clip(-127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    n_lists: int,
+    iterations: int = 10,
+    seed: int = 0,
+    sample_size: int = 50_000
+) -> np.ndarray:
+    """
+    Centroides (normalizados) para particionar vectores por similitud coseno.
+    Se entrena sobre una muestra para que el build escale con corpus grandes.
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > sample_size:
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+
+        counts = np.bincount(assignment, minlength=n_lists)
+        empty = counts == 0
+        if empty.any():
+            # Reubicar centroides vacíos en puntos al azar
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+def build_vector_index(
+    vectors: np.ndarray,
+    texts: Sequence[str],
+    path: Path,
+    embedder_name: str,
+    n_lists: int = 0,
+    kmeans_iterations: int = 10,
+    seed: int = 0
+) -> int:
+    """
+    Construye el índice y lo escribe en path.
+
+    Args:
+        vectors: Embeddings float32 (n, dim), una fila por texto
+        texts: Textos de los pasajes (el doc_id es la posición)
+        path: Archivo de salida
+        embedder_name: Embedder usado (se valida al consultar)
+        n_lists: Particiones IVF (0 = índice plano)
+
+    Returns:
+        Cantidad de vectores indexados
+    """
+    vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    n, dim = vectors.shape
+    if len(texts) != n:
+        raise ValueError(f"Got {n} vectors for {len(texts)} texts")
+
+    n_lists = min(n_lists, n)
+    if n_lists > 0:
+        centroids = spherical_kmeans(vectors, n_lists, kmeans_iterations, seed)
+        assignment = np.empty(n, dtype=np.int64)
+        for start in range(0, n, BLOCK_ROWS):
+            block = vectors[start:start + BLOCK_ROWS]
+            assignment[start:start + BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype("<u4")
+    else:
+        centroids = np.zeros((0, dim), dtype=np.float32)
+        order = np.arange(n)
+        list_offsets = np.array([0, n], dtype="<u4")
+
+    codes, scales = quantize(vectors[order])
+
+    encoded = [text.encode("utf-8") for text in texts]
+    text_offsets = np.zeros(n + 1, dtype="<u8")
+    np.cumsum([len(data) for data in encoded], out=text_offsets[1:])
+
+    blobs = [
+        _pad(embedder_name.encode("utf-8")),
+        _pad(codes.tobytes()),
+        _pad(scales.astype("<f4").tobytes()),
+        _pad(order.astype("<u4").tobytes()),
+        _pad(centroids.astype("<f4").tobytes()),
+        _pad(list_offsets.tobytes()),
+        _pad(text_offsets.tobytes()),
+        _pad(b"".join(encoded)),
+    ]
+
+    offsets = []
+    position = _HEADER.size
+    for blob in blobs:
+        offsets.append(position)
+        position += len(blob)
+
+    header = _HEADER.pack(MAGIC, n, dim, n_lists, *offsets)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    tmp_path.replace(path)
+
+    return n
+
+
+@dataclass(frozen=True)
+class VectorHit:
+    """Pasaje encontrado por similitud"""
+    doc_id: int
+    score: float
+    text: str
+
+
+class VectorIndex:
+    """
+    Índice vectorial abierto con mmap (sólo lectura).
+
+    Uso:
+        index = VectorIndex.open(path)
+        ids, scores = index.search(query_vectors, k=10)
+        index.close()
+
+    Args:
+        path: Archivo del índice
+        dequantize_max_bytes: Si los vectores en float32 ocupan hasta esto,
+            se decuantizan en memoria al abrir (0 = buscar siempre en int8)
+    """
+
+    def __init__(self, path: Path, dequantize_max_bytes: int = DEQUANTIZE_MAX_BYTES):
+        self.path = Path(path)
+        self.dequantize_max_bytes = dequantize_max_bytes
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._load()
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def open(cls, path: Path, dequantize_max_bytes: int = DEQUANTIZE_MAX_BYTES) -> "VectorIndex":
+        return cls(path, dequantize_max_bytes)
+
+    def _load(self):
+        (
+            magic, self.n, self.dim, self.n_lists,
+            name_at, codes_at, scales_at, ids_at, centroids_at,
+            lists_at, text_offsets_at, texts_at
+        ) = _HEADER.unpack_from(self._mmap, 0)
+
+        if magic != MAGIC:
+            raise ValueError(f"Not a vector index: {self.path}")
+
+        self.embedder_name = self._mmap[name_at:codes_at].rstrip(b"\0").decode("utf-8")
+
+        buffer = self._mmap
+        self._codes = np.frombuffer(buffer, np.int8, self.n * self.dim, codes_at).reshape(self.n, self.dim)
+        self._scales = np.frombuffer(buffer, "<f4", self.n, scales_at)
+        self._doc_ids = np.frombuffer(buffer, "<u4", self.n, ids_at)
+        self._centroids = np.frombuffer(
+            buffer, "<f4", self.n_lists * self.dim, centroids_at
+        ).reshape(self.n_lists, self.dim)
+        self._list_offsets = np.frombuffer(buffer, "<u4", max(self.n_lists, 1) + 1, lists_at)
+        self._text_offsets = np.frombuffer(buffer, "<u8", self.n + 1, text_offsets_at)
+        self._texts_at = texts_at
+
+        # Vectores float32 (con la escala aplicada) para buscar sin convertir por consulta
+        self._vectors: Optional[np.ndarray] = None
+        if self.n * self.dim * 4 <= self.dequantize_max_bytes:
+            self._vectors = self._codes.astype(np.float32) * self._scales[:, None]
+
+    @property
+    def dequantized(self) -> bool:
+        """Si la búsqueda usa los vectores decuantizados en memoria"""
+        return self._vectors is not None
+
+    def __len__(self) -> int:
+        return self.n
+
+    def passage(self, doc_id: int) -> str:
+        """Texto de un pasaje"""
+        start = self._texts_at + int(self._text_offsets[doc_id])
+        end = self._texts_at + int(self._text_offsets[doc_id + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def _scan(self, start: int, end: int, queries: np.ndarray) -> np.ndarray:
+        """Similitudes (end - start, m) de un rango contiguo de filas"""
+        if self._vectors is not None:
+            return self._vectors[start:end] @ queries.T
+        codes = self._codes[start:end].astype(np.float32)
+        return (codes @ queries.T) * self._scales[start:end, None]
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        n_probe: Optional[int] = 8
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k por similitud coseno para un lote de consultas.
+
+        Args:
+            queries: Embeddings (m, dim) o (dim,)
+            k: Resultados por consulta
+            n_probe: Listas IVF a recorrer (None = todas; ignorado en índices planos)
+
+        Returns:
+            (doc_ids int64[m, k], scores float32[m, k]), por score descendente.
+            Si hay menos de k resultados, doc_id = -1 y score = -inf.
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        m = len(queries)
+
+        if self.n_lists == 0 or n_probe is None or n_probe >= self.n_lists:
+            ranges = [[(0, self.n)]] * m
+        else:
+            probes = np.argpartition(-(queries @ self._centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+            offsets = self._list_offsets
+            ranges = [
+                [(int(offsets[l]), int(offsets[l + 1])) for l in sorted(row)]
+                for row in probes
+            ]
+
+        best_rows = np.full((m, k), -1, dtype=np.int64)
+        best_scores = np.full((m, k), -np.inf, dtype=np.float32)
+
+        block_rows = BLOCK_ROWS
+        if self._vectors is not None:
+            block_rows = max(BLOCK_ROWS, SCAN_MAX_SCORES // m)
+
+        if all(r is ranges[0] for r in ranges):
+            # Todas las consultas recorren las mismas filas: un producto por bloque para el lote
+            for start, end in ranges[0]:
+                for block_start in range(start, end, block_rows):
+                    block_end = min(end, block_start + block_rows)
+                    sims = self._scan(block_start, block_end, queries).T
+                    rows = np.broadcast_to(np.arange(block_start, block_end), sims.shape)
+                    best_rows, best_scores = self._merge(best_rows, best_scores, rows, sims, k)
+        else:
+            for q in range(m):
+                rows = np.concatenate([np.arange(start, end) for start, end in ranges[q]])
+                sims = np.concatenate([self._scan(start, end, queries[q:q + 1])[:, 0] for start, end in ranges[q]])
+                best_rows[q:q + 1], best_scores[q:q + 1] = self._merge(
+                    best_rows[q:q + 1], best_scores[q:q + 1], rows[None, :], sims[None, :], k
+                )
+
+        doc_ids = self._doc_ids[np.maximum(best_rows, 0)].astype(np.int64)
+        doc_ids[best_rows < 0] = -1
+        return doc_ids, best_scores
+
+    @staticmethod
+    def _merge(best_rows, best_scores, rows, sims, k):
+        """Combina el top-k acumulado (m, k) con un bloque nuevo (m, r)"""
+        if sims.shape[1] > k:
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            rows = np.take_along_axis(rows, top, axis=1)
+            sims = np.take_along_axis(sims, top, axis=1)
+
+        rows = np.concatenate([best_rows, rows], axis=1)
+        sims = np.concatenate([best_scores, sims.astype(np.float32, copy=False)], axis=1)
+        order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(sims, order, axis=1)
+
+    def search_one(self, query: np.ndarray, k: int = 10, n_probe: Optional[int] = 8) -> List[VectorHit]:
+        """Top-k de una sola consulta, con el texto de cada pasaje"""
+        doc_ids, scores = self.search(query, k, n_probe)
+        return [
+            VectorHit(int(doc_id), float(score), self.passage(int(doc_id)))
+            for doc_id, score in zip(doc_ids[0], scores[0])
+            if doc_id >= 0
+        ]
+
+    def close(self):
+        """Libera el mmap"""
+        self._codes = self._scales = self._doc_ids = self._vectors = None
+        self._centroids = self._list_offsets = self._text_offsets = None
+
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        if getattr(self, "_file", None) is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,174 @@
+"""
+Cache en memoria del historial reciente de cada conversación.
+
+Guarda un ring buffer con los últimos turnos por (client_id, teléfono),
+junto con el resumen de los turnos más viejos, y desaloja las
+conversaciones menos usadas (LRU) cuando se supera el límite de memoria
+total.
+"""
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Overhead aproximado por turno (dict + strings) además del contenido
+_TURN_OVERHEAD_BYTES = 120
+# Overhead aproximado por conversación (clave + deque + entrada del OrderedDict)
+_CONVERSATION_OVERHEAD_BYTES = 400
+
+ConversationKey = Tuple[str, str]
+
+
+def _turn_size(turn: Dict[str, str]) -> int:
+    return len(turn['content']) + _TURN_OVERHEAD_BYTES
+
+
+class _Conversation:
+    __slots__ = ("turns", "summary", "size")
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Dict[str, str]] = deque(maxlen=max_turns)
+        self.summary: Optional[str] = None
+        self.size = _CONVERSATION_OVERHEAD_BYTES
+
+
+class ConversationHistoryCache:
+    """
+    LRU de conversaciones acotado por memoria total.
+
+    Args:
+        max_turns: Turnos que se guardan por conversación (ring buffer)
+        max_bytes: Memoria total aproximada antes de desalojar conversaciones
+    """
+
+    def __init__(self, max_turns: int = 20, max_bytes: int = 64 * 1024 * 1024):
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self._conversations: "OrderedDict[ConversationKey, _Conversation]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, client_id: str, phone_number: str) -> Optional[List[Dict[str, str]]]:
+        """
+        Obtiene los turnos cacheados de una conversación.
+
+        Returns:
+            Lista de turnos (puede estar vacía) o None si la conversación no está cacheada
+        """
+        key = (client_id, phone_number)
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            self.misses += 1
+            return None
+
+        self._conversations.move_to_end(key)
+        self.hits += 1
+        return list(conversation.turns)
+
+    def contains(self, client_id: str, phone_number: str) -> bool:
+        """Indica si la conversación está cacheada (sin afectar el orden LRU ni las métricas)"""
+        return (client_id, phone_number) in self._conversations
+
+    def get_summary(self, client_id: str, phone_number: str) -> Optional[str]:
+        """Obtiene el resumen cacheado de una conversación (sin afectar el orden LRU)"""
+        conversation = self._conversations.get((client_id, phone_number))
+        return conversation.summary if conversation is not None else None
+
+    def put(
+        self,
+        client_id: str,
+        phone_number: str,
+        turns: List[Dict[str, str]],
+        summary: Optional[str] = None
+    ):
+        """Carga una conversación completa (ej: leída de la base de datos)"""
+        key = (client_id, phone_number)
+        self._remove(key)
+
+        conversation = _Conversation(self.max_turns)
+        self._conversations[key] = conversation
+        self._total_bytes += conversation.size
+        self._append(conversation, turns)
+        self._set_summary(conversation, summary)
+        self._evict()
+
+    def append(
+        self,
+        client_id: str,
+        phone_number: str,
+        turns: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """
+        Agrega turnos a una conversación cacheada.
+        Si la conversación no está cacheada no hace nada (se cargará completa desde la BD).
+
+        Returns:
+            Turnos que salieron del ring buffer para hacer lugar
+        """
+        key = (client_id, phone_number)
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return []
+
+        self._conversations.move_to_end(key)
+        dropped = self._append(conversation, turns)
+        self._evict()
+        return dropped
+
+    def set_summary(self, client_id: str, phone_number: str, summary: Optional[str]):
+        """Actualiza el resumen de una conversación cacheada"""
+        conversation = self._conversations.get((client_id, phone_number))
+        if conversation is not None:
+            self._set_summary(conversation, summary)
+            self._evict()
+
+    def invalidate_client(self, client_id: str):
+        """Elimina todas las conversaciones cacheadas de un cliente"""
+        for key in [k for k in self._conversations if k[0] == client_id]:
+            self._remove(key)
+
+    def _append(self, conversation: _Conversation, turns: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        dropped = []
+        for turn in turns:
+            if len(conversation.turns) == conversation.turns.maxlen:
+                oldest = conversation.turns[0]
+                dropped.append(oldest)
+                conversation.size -= _turn_size(oldest)
+                self._total_bytes -= _turn_size(oldest)
+
+            conversation.turns.append(turn)
+            added = _turn_size(turn)
+            conversation.size += added
+            self._total_bytes += added
+        return dropped
+
+    def _set_summary(self, conversation: _Conversation, summary: Optional[str]):
+        delta = len(summary or "") - len(conversation.summary or "")
+        conversation.summary = summary
+        conversation.size += delta
+        self._total_bytes += delta
+
+    def _remove(self, key: ConversationKey):
+        conversation = self._conversations.pop(key, None)
+        if conversation is not None:
+            self._total_bytes -= conversation.size
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._conversations) > 1:
+            _, conversation = self._conversations.popitem(last=False)
+            self._total_bytes -= conversation.size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Métricas del cache"""
+        return {
+            "conversations": len(self._conversations),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._conversations)
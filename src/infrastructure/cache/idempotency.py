@@ -0,0 +1,208 @@
+"""
+Deduplicación de webhooks por MessageSid.
+
+Twilio reintenta el webhook ante timeouts y errores 5xx. Este registro
+guarda el estado de cada MessageSid (processing / done + resultado) con
+TTL, para que un reintento no vuelva a ejecutar el pipeline (otra
+llamada paga al LLM y una respuesta duplicada al usuario).
+
+Backend en memoria por defecto; con Redis el registro es compartido
+entre workers e instancias.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+import json
+import logging
+import time
+
+from src.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "msgsid"
+
+STATE_PROCESSING = "processing"
+STATE_DONE = "done"
+
+
+@dataclass
+class DedupRecord:
+    """Estado registrado de un MessageSid"""
+    state: str
+    result: Optional[Dict[str, Any]] = None
+
+
+class MessageDeduplicator:
+    """
+    Registro de MessageSids procesados.
+
+    Uso:
+        existing = await dedup.claim(sid)
+        if existing is not None:
+            # duplicado: devolver existing.result o un 200 inmediato
+        ...
+        await dedup.complete(sid, result)   # o dedup.release(sid) si falló
+
+    Args:
+        ttl_seconds: Cuánto se recuerda un mensaje terminado
+        processing_ttl_seconds: Cuánto dura un claim sin completar (por si el worker muere)
+        redis: Cliente redis.asyncio (opcional)
+        max_entries: Tope del registro en memoria
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 86400,
+        processing_ttl_seconds: float = 300,
+        redis: Any = None,
+        max_entries: int = 100_000
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.processing_ttl_seconds = processing_ttl_seconds
+        self.redis = redis
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, DedupRecord]]" = OrderedDict()
+        self._stats = {
+            "claimed": 0,
+            "duplicates_in_progress": 0,
+            "duplicates_completed": 0,
+            "released": 0,
+            "redis_errors": 0,
+        }
+
+    async def claim(self, message_sid: str) -> Optional[DedupRecord]:
+        """
+        Intenta reservar un MessageSid para procesarlo.
+
+        Returns:
+            None si el mensaje es nuevo (el caller debe procesarlo),
+            o el registro existente si es un duplicado
+        """
+        if self.redis is not None:
+            try:
+                existing = await self._claim_redis(message_sid)
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"Idempotency Redis claim failed, using memory: {e}")
+                existing = self._claim_memory(message_sid)
+        else:
+            existing = self._claim_memory(message_sid)
+
+        if existing is None:
+            self._stats["claimed"] += 1
+        elif existing.state == STATE_DONE:
+            self._stats["duplicates_completed"] += 1
+        else:
+            self._stats["duplicates_in_progress"] += 1
+
+        return existing
+
+    async def complete(self, message_sid: str, result: Dict[str, Any]):
+        """Marca el mensaje como procesado y guarda su resultado"""
+        record = DedupRecord(STATE_DONE, result)
+        self._store_memory(message_sid, record, self.ttl_seconds)
+
+        if self.redis is not None:
+            try:
+                await self.redis.set(
+                    self._key(message_sid), self._dump(record), ex=int(self.ttl_seconds)
+                )
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"Idempotency Redis complete failed: {e}")
+
+    async def release(self, message_sid: str):
+        """Libera el claim de un mensaje que falló, para que un reintento lo procese"""
+        self._entries.pop(message_sid, None)
+        self._stats["released"] += 1
+
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._key(message_sid))
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"Idempotency Redis release failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de claims y duplicados suprimidos"""
+        suppressed = self._stats["duplicates_in_progress"] + self._stats["duplicates_completed"]
+        return {**self._stats, "duplicates_suppressed": suppressed, "entries": len(self._entries)}
+
+    # Backend en memoria
+
+    def _claim_memory(self, message_sid: str) -> Optional[DedupRecord]:
+        entry = self._entries.get(message_sid)
+        if entry is not None:
+            expires_at, record = entry
+            if expires_at >= time.monotonic():
+                return record
+
+        self._store_memory(
+            message_sid, DedupRecord(STATE_PROCESSING), self.processing_ttl_seconds
+        )
+        return None
+
+    def _store_memory(self, message_sid: str, record: DedupRecord, ttl: float):
+        self._entries[message_sid] = (time.monotonic() + ttl, record)
+        self._entries.move_to_end(message_sid)
+
+        # Las entradas más viejas están al principio
+        now = time.monotonic()
+        while self._entries:
+            oldest_sid, (expires_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and expires_at >= now:
+                break
+            del self._entries[oldest_sid]
+
+    # Backend Redis
+
+    @staticmethod
+    def _key(message_sid: str) -> str:
+        return f"{KEY_PREFIX}:{message_sid}"
+
+    @staticmethod
+    def _dump(record: DedupRecord) -> str:
+        return json.dumps({"state": record.state, "result": record.result})
+
+    async def _claim_redis(self, message_sid: str) -> Optional[DedupRecord]:
+        key = self._key(message_sid)
+        claimed = await self.redis.set(
+            key,
+            self._dump(DedupRecord(STATE_PROCESSING)),
+            nx=True,
+            ex=int(self.processing_ttl_seconds),
+        )
+        if claimed:
+            return None
+
+        raw = await self.redis.get(key)
+        if raw is None:
+            # Expiró entre el SET y el GET: tratarlo como en proceso
+            return DedupRecord(STATE_PROCESSING)
+
+        data = json.loads(raw)
+        return DedupRecord(data["state"], data.get("result"))
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+@lru_cache
+def get_deduplicator() -> MessageDeduplicator:
+    """Obtiene el MessageDeduplicator del proceso (cached, singleton)"""
+    settings = get_settings()
+
+    redis = None
+    if settings.idempotency_backend == "redis":
+        import redis.asyncio as redis_asyncio
+
+        redis = redis_asyncio.from_url(settings.redis_url)
+
+    return MessageDeduplicator(
+        ttl_seconds=settings.idempotency_ttl_seconds,
+        processing_ttl_seconds=settings.idempotency_processing_ttl_seconds,
+        redis=redis,
+    )
@@ -0,0 +1,185 @@
+"""
+Rate limiting con ventana deslizante (sliding window counter).
+
+Para cada regla se cuentan los mensajes de la ventana fija actual y de
+la anterior; la estimación es anterior * (fracción que queda) + actual.
+Es O(1) en memoria por clave y se puede evaluar atómicamente en Redis.
+
+Backends:
+- InMemoryRateLimiter: por proceso
+- RedisRateLimiter: compartido entre workers (script Lua atómico)
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+import math
+import time
+
+from src.core.config import get_settings
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Límite de `limit` mensajes cada `window_seconds` para una clave"""
+    key: str
+    limit: int
+    window_seconds: int
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    """Resultado de evaluar las reglas"""
+    allowed: bool
+    retry_after: float = 0.0
+    rule: "RateLimitRule | None" = None
+
+
+class RateLimiter:
+    """Interface de los backends de rate limiting"""
+
+    async def hit(self, rules: List[RateLimitRule]) -> RateLimitDecision:
+        """
+        Evalúa todas las reglas y, si ninguna se excede, cuenta el mensaje en todas.
+        La operación es atómica: un mensaje rechazado no consume cupo.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemoryRateLimiter(RateLimiter):
+    """Rate limiter en memoria (un proceso)"""
+
+    def __init__(self, max_keys: int = 200_000):
+        self.max_keys = max_keys
+        # (key, window) -> (índice de ventana, cuenta actual, cuenta anterior)
+        self._windows: "OrderedDict[Tuple[str, int], Tuple[int, int, int]]" = OrderedDict()
+
+    async def hit(self, rules: List[RateLimitRule]) -> RateLimitDecision:
+        now = time.time()
+        states = []
+
+        for rule in rules:
+            window = rule.window_seconds
+            index = int(now // window)
+            slot = (rule.key, window)
+
+            saved_index, current, previous = self._windows.get(slot, (index, 0, 0))
+            if saved_index != index:
+                # Avanzó la ventana: la actual pasa a ser la anterior (si es contigua)
+                previous = current if saved_index == index - 1 else 0
+                current = 0
+
+            elapsed = (now % window) / window
+            estimated = previous * (1 - elapsed) + current
+            if estimated + 1 > rule.limit:
+                return RateLimitDecision(False, window - (now % window), rule)
+
+            states.append((slot, index, current, previous))
+
+        for slot, index, current, previous in states:
+            self._windows[slot] = (index, current + 1, previous)
+            self._windows.move_to_end(slot)
+
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+
+        return RateLimitDecision(True)
+
+
+# KEYS: por regla, (ventana actual, ventana anterior)
+# ARGV: now, y por regla (limit, window)
+_SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local count = (#ARGV - 1) / 2
+
+for i = 1, count do
+    local limit = tonumber(ARGV[2 * i])
+    local window = tonumber(ARGV[2 * i + 1])
+    local current = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+    local elapsed = (now % window) / window
+    if previous * (1 - elapsed) + current + 1 > limit then
+        return {0, i, tostring(window - (now % window))}
+    end
+end
+
+for i = 1, count do
+    local window = tonumber(ARGV[2 * i + 1])
+    redis.call('INCR', KEYS[2 * i - 1])
+    redis.call('EXPIRE', KEYS[2 * i - 1], window * 2)
+end
+
+return {1, 0, '0'}
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Rate limiter compartido sobre Redis.
+    Chequeo e incremento de todas las reglas ocurren en un único script Lua.
+    """
+
+    def __init__(self, redis: Any, prefix: str = "rl"):
+        self.redis = redis
+        self.prefix = prefix
+        self._script = redis.register_script(_SLIDING_WINDOW_SCRIPT)
+
+    async def hit(self, rules: List[RateLimitRule]) -> RateLimitDecision:
+        now = time.time()
+        keys: List[str] = []
+        args: List[Any] = [now]
+
+        for rule in rules:
+            window = rule.window_seconds
+            index = int(now // window)
+            keys.append(f"{self.prefix}:{rule.key}:{window}:{index}")
+            keys.append(f"{self.prefix}:{rule.key}:{window}:{index - 1}")
+            args.extend([rule.limit, window])
+
+        allowed, rule_index, retry_after = await self._script(keys=keys, args=args)
+        if int(allowed):
+            return RateLimitDecision(True)
+
+        retry_after = float(retry_after.decode() if isinstance(retry_after, bytes) else retry_after)
+        return RateLimitDecision(False, math.ceil(retry_after), rules[int(rule_index) - 1])
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def client_rate_limit_rules(client_id: str, phone_number: str, rate_limits: Dict[str, int]) -> List[RateLimitRule]:
+    """
+    Reglas de un cliente a partir de ClientConfig.rate_limits.
+
+    - messages_per_minute / messages_per_hour: por usuario (client_id, teléfono)
+    - client_messages_per_minute / client_messages_per_hour: total del cliente
+    """
+    user_key = f"{client_id}:{phone_number}"
+    spec = [
+        (user_key, "messages_per_minute", 60),
+        (user_key, "messages_per_hour", 3600),
+        (client_id, "client_messages_per_minute", 60),
+        (client_id, "client_messages_per_hour", 3600),
+    ]
+
+    return [
+        RateLimitRule(key, rate_limits[name], window)
+        for key, name, window in spec
+        if rate_limits.get(name)
+    ]
+
+
+@lru_cache
+def get_rate_limiter() -> RateLimiter:
+    """Obtiene el rate limiter del proceso (cached, singleton)"""
+    settings = get_settings()
+
+    if settings.rate_limit_backend == "redis":
+        import redis.asyncio as redis_asyncio
+
+        return RedisRateLimiter(redis_asyncio.from_url(settings.redis_url))
+
+    return InMemoryRateLimiter()
@@ -0,0 +1,217 @@
+"""
+Cache de respuestas de IA para preguntas repetidas.
+
+Dos niveles:
+1. LRU en memoria con TTL (por proceso, sin latencia de red)
+2. Redis opcional (compartido entre workers/instancias)
+
+La clave incluye el client_id, el mensaje normalizado y la versión de
+la configuración del cliente, así que editar el YAML invalida las
+respuestas viejas automáticamente.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import time
+import unicodedata
+
+from src.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "resp"
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normaliza un mensaje para comparar preguntas equivalentes.
+    Ej: "¿Horario?" y "horario" -> "horario"
+    """
+    text = unicodedata.normalize("NFKD", message.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class LocalTTLCache:
+    """LRU en memoria con expiración por entrada"""
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ResponseCache:
+    """
+    Cache de respuestas de dos niveles.
+
+    Args:
+        local: Cache en memoria
+        redis: Cliente redis.asyncio (opcional)
+        default_ttl: TTL por defecto en segundos
+    """
+
+    def __init__(self, local: LocalTTLCache, redis: Any = None, default_ttl: float = 3600):
+        self.local = local
+        self.redis = redis
+        self.default_ttl = default_ttl
+        self._stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "invalidations": 0,
+            "redis_errors": 0,
+        }
+
+    @staticmethod
+    def make_key(client_id: str, message: str, config_version: str) -> str:
+        """Clave de cache para un mensaje de un cliente"""
+        digest = hashlib.sha1(normalize_message(message).encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}:{client_id}:{config_version}:{digest}"
+
+    async def get(self, key: str) -> Optional[str]:
+        """Busca una respuesta: primero en memoria, después en Redis"""
+        value = self.local.get(key)
+        if value is not None:
+            self._stats["local_hits"] += 1
+            return value
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(key)
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"Response cache Redis get failed: {e}")
+                raw = None
+
+            if raw is not None:
+                value = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+                # En memoria sólo por lo que le queda en Redis (no un TTL completo)
+                ttl = await self._remaining_ttl(key)
+                if ttl is not None:
+                    self.local.set(key, value, ttl)
+                self._stats["redis_hits"] += 1
+                return value
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Guarda una respuesta en ambos niveles"""
+        ttl = ttl or self.default_ttl
+        self.local.set(key, value, ttl)
+        self._stats["sets"] += 1
+
+        if self.redis is not None:
+            try:
+                # En milisegundos: un TTL menor a 1s no se redondea a 0 (Redis lo rechaza)
+                await self.redis.set(key, value, px=max(1, math.ceil(ttl * 1000)))
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"Response cache Redis set failed: {e}")
+
+    async def _remaining_ttl(self, key: str) -> Optional[float]:
+        """
+        TTL restante de una clave en Redis, en segundos.
+        None si ya expiró o no se pudo consultar; default_ttl si no tiene TTL.
+        """
+        try:
+            pttl = await self.redis.pttl(key)
+        except Exception as e:
+            self._stats["redis_errors"] += 1
+            logger.warning(f"Response cache Redis pttl failed: {e}")
+            return None
+
+        if pttl == -1:
+            return self.default_ttl
+        if pttl <= 0:
+            return None
+        return pttl / 1000
+
+    def invalidate_client(self, client_id: str):
+        """
+        Descarta las respuestas cacheadas de un cliente.
+        En memoria es inmediato; en Redis se borra en background.
+        """
+        prefix = f"{KEY_PREFIX}:{client_id}:"
+        removed = self.local.delete_prefix(prefix)
+        self._stats["invalidations"] += 1
+        logger.info(f"Response cache invalidated for '{client_id}' ({removed} local entries)")
+
+        if self.redis is not None:
+            try:
+                asyncio.get_running_loop().create_task(self._delete_redis_prefix(prefix))
+            except RuntimeError:
+                # Sin event loop: las claves viejas expiran solas (y la versión ya cambió)
+                pass
+
+    async def _delete_redis_prefix(self, prefix: str):
+        try:
+            async for key in self.redis.scan_iter(match=f"{prefix}*", count=500):
+                await self.redis.unlink(key)
+        except Exception as e:
+            self._stats["redis_errors"] += 1
+            logger.warning(f"Response cache Redis invalidation failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de hits/misses"""
+        return {**self._stats, "local_entries": len(self.local)}
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+@lru_cache
+def get_response_cache() -> ResponseCache:
+    """Obtiene el ResponseCache del proceso (cached, singleton)"""
+    settings = get_settings()
+
+    redis = None
+    if settings.response_cache_backend == "redis":
+        import redis.asyncio as redis_asyncio
+
+        redis = redis_asyncio.from_url(settings.redis_url)
+
+    return ResponseCache(
+        LocalTTLCache(settings.response_cache_max_entries),
+        redis=redis,
+        default_ttl=settings.response_cache_ttl_seconds,
+    )
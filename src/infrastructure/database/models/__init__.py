@@ -0,0 +1,5 @@
+from src.infrastructure.database.models.base import Base
+from src.infrastructure.database.models.conversation import ConversationMessage, ConversationSummary
+from src.infrastructure.database.models.delivery import MessageDelivery
+
+__all__ = ["Base", "ConversationMessage", "ConversationSummary", "MessageDelivery"]
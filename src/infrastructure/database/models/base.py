@@ -0,0 +1,9 @@
+"""
+Base declarativa de los modelos SQLAlchemy.
+"""
+from sqlalchemy.orm import DeclarativeBase
+
+
+class Base(DeclarativeBase):
+    """Base de todos los modelos de la base de datos"""
+    pass
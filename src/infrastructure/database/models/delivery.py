@@ -0,0 +1,64 @@
+"""
+Modelo de estado de entrega de los mensajes enviados.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.infrastructure.database.models.base import Base
+
+# Estados de Twilio/WhatsApp -> orden de avance. Los terminales de error
+# quedan arriba: después de failed/undelivered no llega otro estado
+STATUS_RANKS = {
+    "accepted": 0,
+    "scheduled": 0,
+    "queued": 0,
+    "sending": 1,
+    "sent": 2,
+    "delivered": 3,
+    "read": 4,
+    "undelivered": 5,
+    "failed": 5,
+    "canceled": 5,
+}
+FAILED_STATUSES = ("undelivered", "failed", "canceled")
+
+# Estado -> columna con el momento en que se vio por primera vez
+STATUS_TIMESTAMPS = {
+    "sent": "sent_at",
+    "delivered": "delivered_at",
+    "read": "read_at",
+    "undelivered": "failed_at",
+    "failed": "failed_at",
+    "canceled": "failed_at",
+}
+
+
+class MessageDelivery(Base):
+    """
+    Último estado conocido de un mensaje saliente (callbacks de estado del provider).
+
+    status_rank ordena los estados (queued < sent < delivered < read <
+    failed/undelivered): un callback que llega tarde con un estado anterior
+    no pisa al más avanzado, pero sí completa su timestamp.
+    """
+    __tablename__ = "message_deliveries"
+
+    message_sid: Mapped[str] = mapped_column(String(64), primary_key=True)
+    client_id: Mapped[str] = mapped_column(String(100))
+    to_number: Mapped[str] = mapped_column(String(50))
+    status: Mapped[str] = mapped_column(String(20))
+    status_rank: Mapped[int] = mapped_column(Integer)
+    error_code: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    delivered_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    read_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    failed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_message_deliveries_funnel", "client_id", "created_at"),
+    )
@@ -0,0 +1,103 @@
+"""
+Repositorio async del historial de conversaciones.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+
+from sqlalchemy import select
+
+from src.infrastructure.database.models import ConversationMessage, ConversationSummary
+from src.infrastructure.database.session import get_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationRepository:
+    """
+    Acceso al historial de mensajes de un cliente.
+
+    Args:
+        database_url: URL de la base del cliente (ClientConfig.database_url)
+        client_id: ID del cliente
+    """
+
+    def __init__(self, database_url: str, client_id: str):
+        self.database_url = database_url
+        self.client_id = client_id
+
+    async def get_recent(self, phone_number: str, limit: int) -> List[Dict[str, str]]:
+        """
+        Obtiene los últimos mensajes de una conversación.
+
+        Returns:
+            Lista de {'role', 'content'} en orden cronológico
+        """
+        maker = await get_sessionmaker(self.database_url)
+
+        async with maker() as session:
+            result = await session.execute(
+                select(ConversationMessage.role, ConversationMessage.content)
+                .where(
+                    ConversationMessage.client_id == self.client_id,
+                    ConversationMessage.phone_number == phone_number,
+                )
+                .order_by(ConversationMessage.id.desc())
+                .limit(limit)
+            )
+            rows = result.all()
+
+        return [{'role': role, 'content': content} for role, content in reversed(rows)]
+
+    async def add_messages(self, phone_number: str, messages: List[Dict[str, str]]):
+        """Guarda uno o más turnos de una conversación"""
+        maker = await get_sessionmaker(self.database_url)
+
+        async with maker() as session:
+            session.add_all([
+                ConversationMessage(
+                    client_id=self.client_id,
+                    phone_number=phone_number,
+                    role=msg['role'],
+                    content=msg['content'],
+                )
+                for msg in messages
+            ])
+            await session.commit()
+
+    async def get_summary(self, phone_number: str) -> Optional[str]:
+        """Obtiene el resumen guardado de una conversación"""
+        maker = await get_sessionmaker(self.database_url)
+
+        async with maker() as session:
+            result = await session.execute(
+                select(ConversationSummary.summary).where(
+                    ConversationSummary.client_id == self.client_id,
+                    ConversationSummary.phone_number == phone_number,
+                )
+            )
+            return result.scalar_one_or_none()
+
+    async def save_summary(self, phone_number: str, summary: str):
+        """Crea o actualiza el resumen de una conversación (upsert atómico)"""
+        maker = await get_sessionmaker(self.database_url)
+
+        async with maker() as session:
+            dialect = session.bind.dialect.name
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+
+            stmt = insert(ConversationSummary).values(
+                client_id=self.client_id,
+                phone_number=phone_number,
+                summary=summary,
+                updated_at=datetime.utcnow(),
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["client_id", "phone_number"],
+                set_={"summary": stmt.excluded.summary, "updated_at": stmt.excluded.updated_at},
+            )
+            await session.execute(stmt)
+            await session.commit()
@@ -0,0 +1,154 @@
+"""
+Repositorio async del estado de entrega de los mensajes enviados.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+
+from sqlalchemy import case, func, select
+
+from src.infrastructure.database.models import MessageDelivery
+from src.infrastructure.database.models.delivery import FAILED_STATUSES, STATUS_TIMESTAMPS
+from src.infrastructure.database.session import get_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# Filas por INSERT (los parámetros por statement son limitados, sobre todo en SQLite)
+UPSERT_CHUNK_ROWS = 500
+
+
+class DeliveryRepository:
+    """
+    Acceso a message_deliveries de una base (compartida por los clientes que la usan).
+
+    Args:
+        database_url: URL de la base (ClientConfig.database_url o settings.database_url)
+    """
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+
+    async def upsert_many(self, rows: List[Dict[str, Any]]):
+        """
+        Inserta o actualiza un lote de estados (un message_sid por fila).
+
+        El estado sólo avanza (status_rank mayor); los timestamps de cada
+        etapa se completan aunque el callback llegue fuera de orden.
+        """
+        if not rows:
+            return
+
+        maker = await get_sessionmaker(self.database_url)
+
+        async with maker() as session:
+            dialect = session.bind.dialect.name
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+
+            table = MessageDelivery.__table__
+            for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+                stmt = insert(table).values(rows[start:start + UPSERT_CHUNK_ROWS])
+                excluded = stmt.excluded
+                advances = excluded.status_rank > table.c.status_rank
+
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["message_sid"],
+                    set_={
+                        "status": case((advances, excluded.status), else_=table.c.status),
+                        "status_rank": case((advances, excluded.status_rank), else_=table.c.status_rank),
+                        "error_code": func.coalesce(excluded.error_code, table.c.error_code),
+                        "updated_at": excluded.updated_at,
+                        **{
+                            column: func.coalesce(table.c[column], excluded[column])
+                            for column in sorted(set(STATUS_TIMESTAMPS.values()))
+                        },
+                    },
+                )
+                await session.execute(stmt)
+            await session.commit()
+
+    async def funnel(
+        self,
+        client_id: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Embudo de entrega de un cliente: enviados -> entregados -> leídos, y fallidos.
+
+        Args:
+            client_id: ID del cliente
+            since: Sólo mensajes registrados desde este momento (UTC)
+            until: Sólo mensajes registrados antes de este momento (UTC)
+
+        Returns:
+            Conteos por etapa y códigos de error más frecuentes
+        """
+        maker = await get_sessionmaker(self.database_url)
+
+        conditions = [MessageDelivery.client_id == client_id]
+        if since is not None:
+            conditions.append(MessageDelivery.created_at >= since)
+        if until is not None:
+            conditions.append(MessageDelivery.created_at < until)
+
+        def count_where(condition):
+            return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+        read = MessageDelivery.read_at.is_not(None)
+        delivered = MessageDelivery.delivered_at.is_not(None) | read
+        sent = MessageDelivery.sent_at.is_not(None) | delivered
+        failed = MessageDelivery.status.in_(FAILED_STATUSES)
+
+        async with maker() as session:
+            totals = (await session.execute(
+                select(
+                    func.count(),
+                    count_where(sent),
+                    count_where(delivered),
+                    count_where(read),
+                    count_where(failed),
+                ).where(*conditions)
+            )).one()
+
+            errors = (await session.execute(
+                select(MessageDelivery.error_code, func.count())
+                .where(*conditions, failed)
+                .group_by(MessageDelivery.error_code)
+                .order_by(func.count().desc())
+                .limit(10)
+            )).all()
+
+        total, sent_count, delivered_count, read_count, failed_count = (int(value) for value in totals)
+        return {
+            "total": total,
+            "sent": sent_count,
+            "delivered": delivered_count,
+            "read": read_count,
+            "failed": failed_count,
+            "pending": total - failed_count - delivered_count,
+            "delivery_rate": round(delivered_count / sent_count, 4) if sent_count else None,
+            "read_rate": round(read_count / delivered_count, 4) if delivered_count else None,
+            "failure_codes": {code or "unknown": int(count) for code, count in errors},
+        }
+
+    async def get(self, client_id: str, message_sid: str) -> Optional[Dict[str, Any]]:
+        """Estado guardado de un mensaje (None si no se registró)"""
+        maker = await get_sessionmaker(self.database_url)
+
+        async with maker() as session:
+            delivery = (await session.execute(
+                select(MessageDelivery).where(
+                    MessageDelivery.client_id == client_id,
+                    MessageDelivery.message_sid == message_sid,
+                )
+            )).scalar_one_or_none()
+
+        if delivery is None:
+            return None
+        return {
+            column.name: getattr(delivery, column.name)
+            for column in MessageDelivery.__table__.columns
+        }
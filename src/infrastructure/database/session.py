@@ -0,0 +1,71 @@
+"""
+Engines y sesiones async de SQLAlchemy.
+
+Cada cliente puede tener su propia base (ClientConfig.database_url); se
+mantiene un engine por URL y el esquema se crea la primera vez que se usa.
+"""
+from pathlib import Path
+from typing import Dict
+import asyncio
+import logging
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from src.infrastructure.database.models import Base
+
+logger = logging.getLogger(__name__)
+
+_engines: Dict[str, AsyncEngine] = {}
+_sessionmakers: Dict[str, async_sessionmaker] = {}
+_schema_ready: Dict[str, asyncio.Lock] = {}
+_schema_created: set[str] = set()
+
+
+def get_engine(database_url: str) -> AsyncEngine:
+    """Obtiene (o crea) el engine async para una URL de base de datos"""
+    engine = _engines.get(database_url)
+    if engine is None:
+        url = make_url(database_url)
+
+        # SQLite: crear el directorio de la base si no existe
+        if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+            Path(url.database).parent.mkdir(parents=True, exist_ok=True)
+
+        engine = create_async_engine(database_url)
+        _engines[database_url] = engine
+    return engine
+
+
+async def get_sessionmaker(database_url: str) -> async_sessionmaker:
+    """
+    Obtiene el sessionmaker de una URL, creando el esquema la primera vez.
+    """
+    if database_url not in _schema_created:
+        lock = _schema_ready.setdefault(database_url, asyncio.Lock())
+        async with lock:
+            if database_url not in _schema_created:
+                async with get_engine(database_url).begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                _schema_created.add(database_url)
+                logger.info(f"Database schema ready: {make_url(database_url).render_as_string()}")
+
+    maker = _sessionmakers.get(database_url)
+    if maker is None:
+        maker = async_sessionmaker(get_engine(database_url), expire_on_commit=False)
+        _sessionmakers[database_url] = maker
+    return maker
+
+
+async def dispose_engines():
+    """Cierra todos los engines (shutdown)"""
+    engines = list(_engines.items())
+    _engines.clear()
+    _sessionmakers.clear()
+    _schema_created.clear()
+
+    for url, engine in engines:
+        try:
+            await engine.dispose()
+        except Exception as e:
+            logger.error(f"Error disposing database engine: {e}")
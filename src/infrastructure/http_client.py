@@ -0,0 +1,54 @@
+"""
+Pool compartido de clientes HTTP async (httpx).
+
+Los providers de IA y de mensajería reutilizan estos clientes para
+mantener conexiones keep-alive en lugar de abrir una por request.
+Las credenciales van en cada request, nunca en el cliente compartido.
+"""
+from typing import Dict
+import logging
+
+import httpx
+
+from src.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_http_client(name: str = "default") -> httpx.AsyncClient:
+    """
+    Obtiene (o crea) un cliente HTTP async compartido.
+
+    Args:
+        name: Nombre del pool. Permite separar pools por servicio externo.
+
+    Returns:
+        Cliente httpx con conexiones keep-alive
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        settings = get_settings()
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.http_timeout_seconds),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+            ),
+        )
+        _clients[name] = client
+        logger.info(f"HTTP client pool created: {name}")
+    return client
+
+
+async def close_http_clients():
+    """Cierra todos los clientes HTTP compartidos (shutdown)"""
+    clients = list(_clients.items())
+    _clients.clear()
+
+    for name, client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error(f"Error closing HTTP client '{name}': {e}")
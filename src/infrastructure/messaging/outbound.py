@@ -0,0 +1,398 @@
+"""
+Scheduler de envíos salientes.
+
+Los providers de WhatsApp limitan cuántos mensajes por segundo puede
+enviar cada número emisor; una ráfaga de respuestas de un mismo cliente
+lo supera y el provider rechaza el resto. El scheduler:
+
+- Encola cada envío en el carril de su número emisor. Cada carril sale
+  a su ritmo (token bucket: rate por segundo, burst de capacidad) y en
+  orden de prioridad: las respuestas a usuarios (PRIORITY_INTERACTIVE)
+  antes que los envíos masivos (PRIORITY_BULK); a igual prioridad, en
+  orden de llegada.
+- Reintenta los errores transitorios (MessagingError.retryable: rate
+  limit, 5xx, conexión) con backoff exponencial y jitter. Un rate limit
+  con retry_after además pausa todo el carril de ese número.
+- Limita los envíos en vuelo en total (max_in_flight).
+
+submit() devuelve un future con el SID (o la última excepción si no se
+pudo enviar). Quien necesita orden (los segmentos de una respuesta)
+espera cada uno antes de encolar el siguiente.
+
+Es por proceso: con varios workers cada uno respeta el rate completo
+del número; repartirlo (rate / workers en messaging_config) queda a
+cargo de la configuración.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+
+from src.core.config import get_settings
+from src.core.exceptions import MessagingError
+from src.infrastructure.metrics import (
+    OUTBOUND_ATTEMPT_SECONDS,
+    OUTBOUND_QUEUE_DEPTH,
+    OUTBOUND_RETRIES,
+    OUTBOUND_SEND_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+# Envía el mensaje y devuelve su SID; falla con MessagingError
+SendFunction = Callable[[], Awaitable[str]]
+
+
+class TokenBucket:
+    """
+    Token bucket: hasta `burst` envíos seguidos, luego `rate` por segundo.
+
+    Args:
+        rate: Tokens por segundo
+        burst: Capacidad máxima
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # El provider pidió no enviar desde este número hasta entonces
+        self.paused_until = 0.0
+
+    def configure(self, rate: float, burst: float):
+        """Actualiza rate/burst (cambió la config del cliente) sin perder los tokens acumulados"""
+        if rate != self.rate or burst != self.burst:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.burst = burst
+            self.tokens = min(self.tokens, burst)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Segundos hasta poder tomar un token (0 = ya)"""
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+
+
+@dataclass(order=True)
+class _Outbound:
+    priority: int
+    sequence: int
+    client_id: str = field(compare=False)
+    provider: str = field(compare=False)
+    send: SendFunction = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued: float = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+    @property
+    def priority_name(self) -> str:
+        return PRIORITY_NAMES.get(self.priority, str(self.priority))
+
+
+@dataclass
+class _Lane:
+    """Envíos pendientes de un número emisor"""
+    sender: str
+    bucket: TokenBucket
+    heap: List[_Outbound] = field(default_factory=list)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+
+class OutboundScheduler:
+    """
+    Cola de envíos con ritmo por número emisor, prioridades y reintentos.
+
+    Uso:
+        sid = await scheduler.submit(
+            client_id, sender, lambda: client.send(to, text), provider="twilio"
+        )
+
+    Args:
+        rate: Envíos por segundo por número emisor (default)
+        burst: Envíos seguidos permitidos por número emisor (default)
+        max_in_flight: Envíos en curso como máximo (todos los números)
+        max_queue: Envíos pendientes como máximo; después submit() falla
+        max_attempts: Intentos por mensaje (1 = sin reintentos)
+        retry_base_seconds: Espera antes del primer reintento
+        retry_max_seconds: Espera máxima entre reintentos
+    """
+
+    def __init__(
+        self,
+        rate: float = 20.0,
+        burst: float = 20.0,
+        max_in_flight: int = 50,
+        max_queue: int = 10_000,
+        max_attempts: int = 4,
+        retry_base_seconds: float = 0.5,
+        retry_max_seconds: float = 30.0
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+        self._lanes: Dict[str, _Lane] = {}
+        self._sequence = itertools.count()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._attempts: Set[asyncio.Task] = set()
+        # sequence -> (timer, envío) de los reintentos esperando su backoff
+        self._retries: Dict[int, Tuple[asyncio.TimerHandle, _Outbound]] = {}
+        self._pending = 0
+        self._closed = False
+        self._stats = {"sent": 0, "failed": 0, "retried": 0, "rate_limited": 0, "rejected": 0}
+
+    def submit(
+        self,
+        client_id: str,
+        sender: str,
+        send: SendFunction,
+        provider: str = "unknown",
+        priority: int = PRIORITY_INTERACTIVE,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None
+    ) -> asyncio.Future:
+        """
+        Encola un envío.
+
+        Args:
+            client_id: Cliente (para métricas)
+            sender: Número emisor: define el carril y su límite
+            send: Corrutina sin argumentos que envía el mensaje y devuelve el SID
+            provider: Messaging provider (para métricas)
+            priority: PRIORITY_INTERACTIVE o PRIORITY_BULK
+            rate: Envíos por segundo de este número (None = default)
+            burst: Capacidad del bucket de este número (None = default)
+
+        Returns:
+            Future con el SID, o con la excepción del último intento
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if self._closed or self._pending >= self.max_queue:
+            self._stats["rejected"] += 1
+            reason = "scheduler closed" if self._closed else f"outbound queue full ({self.max_queue})"
+            future.set_exception(MessagingError(reason))
+            return future
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+
+        lane = self._lanes.get(sender)
+        if lane is None:
+            lane = _Lane(sender, TokenBucket(rate or self.rate, burst or self.burst))
+            lane.task = loop.create_task(self._run_lane(lane), name=f"outbound-{sender}")
+            self._lanes[sender] = lane
+        else:
+            lane.bucket.configure(rate or self.rate, burst or self.burst)
+
+        item = _Outbound(
+            priority=priority,
+            sequence=next(self._sequence),
+            client_id=client_id,
+            provider=provider,
+            send=send,
+            future=future,
+            enqueued=time.perf_counter()
+        )
+        self._pending += 1
+        self._enqueue(lane, item)
+        return future
+
+    def _enqueue(self, lane: _Lane, item: _Outbound):
+        heapq.heappush(lane.heap, item)
+        OUTBOUND_QUEUE_DEPTH.inc(item.client_id, item.priority_name)
+        lane.wakeup.set()
+
+    async def _run_lane(self, lane: _Lane):
+        """Despacha los envíos de un número: el de mayor prioridad cuando hay token"""
+        while True:
+            if not lane.heap:
+                lane.wakeup.clear()
+                await lane.wakeup.wait()
+                continue
+
+            delay = lane.bucket.delay(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            await self._slots.acquire()
+            if not lane.heap:
+                self._slots.release()
+                continue
+
+            # El mejor pendiente *ahora*: lo que llegó durante la espera también compite
+            item = heapq.heappop(lane.heap)
+            OUTBOUND_QUEUE_DEPTH.dec(item.client_id, item.priority_name)
+            if item.future.done():
+                # Quien esperaba el envío lo canceló
+                self._slots.release()
+                self._finish(item, "cancelled")
+                continue
+
+            lane.bucket.take(time.monotonic())
+            task = asyncio.create_task(self._attempt(lane, item))
+            self._attempts.add(task)
+            task.add_done_callback(self._attempts.discard)
+
+    async def _attempt(self, lane: _Lane, item: _Outbound):
+        item.attempts += 1
+        started = time.perf_counter()
+        try:
+            sid = await item.send()
+        except Exception as e:
+            self._failed_attempt(lane, item, e)
+        else:
+            if not item.future.done():
+                item.future.set_result(sid)
+            self._stats["sent"] += 1
+            self._finish(item, "sent")
+        finally:
+            OUTBOUND_ATTEMPT_SECONDS.observe(time.perf_counter() - started, item.client_id, item.provider)
+            self._slots.release()
+
+    def _failed_attempt(self, lane: _Lane, item: _Outbound, error: Exception):
+        retryable = isinstance(error, MessagingError) and error.retryable
+        retry_after = error.retry_after if isinstance(error, MessagingError) else None
+
+        if retry_after is not None:
+            # El provider limitó al número: se pausa el carril completo
+            self._stats["rate_limited"] += 1
+            lane.bucket.pause(time.monotonic() + retry_after)
+
+        if not retryable or item.attempts >= self.max_attempts or self._closed or item.future.done():
+            logger.warning(
+                f"Outbound message for client '{item.client_id}' failed after "
+                f"{item.attempts} attempt(s): {error}"
+            )
+            if not item.future.done():
+                item.future.set_exception(error)
+            self._stats["failed"] += 1
+            self._finish(item, "failed")
+            return
+
+        delay = max(retry_after or 0.0, self.backoff(item.attempts))
+        reason = "rate_limited" if retry_after is not None else "error"
+        logger.debug(
+            f"Retrying outbound message for client '{item.client_id}' in {delay:.2f}s "
+            f"(attempt {item.attempts}/{self.max_attempts}, {reason}): {error}"
+        )
+        self._stats["retried"] += 1
+        OUTBOUND_RETRIES.inc(item.client_id, reason)
+        OUTBOUND_QUEUE_DEPTH.inc(item.client_id, item.priority_name)
+
+        handle = asyncio.get_running_loop().call_later(delay, self._retry, lane, item)
+        self._retries[item.sequence] = (handle, item)
+
+    def backoff(self, attempts: int) -> float:
+        """Espera antes del reintento número `attempts`: exponencial, con la mitad al azar"""
+        ceiling = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def _retry(self, lane: _Lane, item: _Outbound):
+        self._retries.pop(item.sequence, None)
+        # _failed_attempt ya lo contó en la profundidad de la cola
+        heapq.heappush(lane.heap, item)
+        lane.wakeup.set()
+
+    def _finish(self, item: _Outbound, result: str):
+        self._pending -= 1
+        OUTBOUND_SEND_SECONDS.observe(
+            time.perf_counter() - item.enqueued, item.client_id, item.priority_name, result
+        )
+
+    async def close(self, timeout: float = 10.0):
+        """
+        Deja de aceptar envíos, espera hasta `timeout` a que se vacíe la cola
+        (reintentos incluidos) y falla lo que quede.
+        """
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        for lane in self._lanes.values():
+            if lane.task is not None:
+                lane.task.cancel()
+        abandoned = 0
+        for handle, item in self._retries.values():
+            handle.cancel()
+            self._abandon(item)
+            abandoned += 1
+        for lane in self._lanes.values():
+            while lane.heap:
+                self._abandon(heapq.heappop(lane.heap))
+                abandoned += 1
+        for task in list(self._attempts):
+            task.cancel()
+
+        await asyncio.gather(
+            *(lane.task for lane in self._lanes.values() if lane.task is not None),
+            *self._attempts,
+            return_exceptions=True
+        )
+        if abandoned:
+            logger.warning(f"Outbound scheduler closed with {abandoned} unsent message(s)")
+        self._retries.clear()
+        self._lanes.clear()
+
+    def _abandon(self, item: _Outbound):
+        OUTBOUND_QUEUE_DEPTH.dec(item.client_id, item.priority_name)
+        if not item.future.done():
+            item.future.set_exception(MessagingError("scheduler closed before sending"))
+        self._stats["failed"] += 1
+        self._finish(item, "failed")
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de envíos y estado de la cola"""
+        return {
+            **self._stats,
+            "queued": self._pending - len(self._attempts),
+            "in_flight": len(self._attempts),
+            "senders": len(self._lanes),
+        }
+
+
+@lru_cache
+def get_outbound_scheduler() -> OutboundScheduler:
+    """Obtiene el OutboundScheduler del proceso (cached, singleton)"""
+    settings = get_settings()
+    return OutboundScheduler(
+        rate=settings.outbound_sender_rate_per_second,
+        burst=settings.outbound_sender_burst,
+        max_in_flight=settings.outbound_max_in_flight,
+        max_queue=settings.outbound_max_queue,
+        max_attempts=settings.outbound_max_attempts,
+        retry_base_seconds=settings.outbound_retry_base_seconds,
+        retry_max_seconds=settings.outbound_retry_max_seconds
+    )
@@ -0,0 +1,190 @@
+"""
+Spool durable de mensajes entrantes (SQLite en modo WAL).
+
+En modo ack_first el webhook guarda aquí el mensaje y responde 200 de
+inmediato. Los workers lo procesan después y lo marcan como terminado.
+Si el proceso se reinicia, los mensajes no terminados se retoman en el
+siguiente startup.
+
+Un mensaje que falla vuelve a pending hasta agotar sus intentos (attempts
+cuenta cada vez que un worker lo toma); después queda en failed (muerto)
+hasta que purge_finished lo borra.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+@dataclass
+class SpooledMessage:
+    """Mensaje entrante guardado en el spool"""
+    message_sid: str
+    client_id: str
+    from_number: str
+    to_number: str
+    body: str
+    id: Optional[int] = None
+    attempts: int = 0
+
+
+class MessageSpool:
+    """
+    Cola durable sobre SQLite.
+
+    Usa una única conexión protegida por un lock; las operaciones corren
+    en un thread para no bloquear el event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Abre la base del spool y crea la tabla si no existe"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS inbound_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_sid TEXT NOT NULL UNIQUE,
+                client_id TEXT NOT NULL,
+                from_number TEXT NOT NULL,
+                to_number TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_inbound_status ON inbound_messages (status)"
+        )
+        logger.info(f"Message spool opened: {self.path}")
+
+    def close(self):
+        """Cierra la conexión del spool"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            if self._conn is None:
+                raise RuntimeError("Message spool is not open")
+            return self._conn.execute(sql, params)
+
+    def _enqueue(self, message: SpooledMessage) -> bool:
+        now = time.time()
+        cursor = self._execute(
+            """
+            INSERT OR IGNORE INTO inbound_messages
+                (message_sid, client_id, from_number, to_number, body, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                message.message_sid, message.client_id, message.from_number,
+                message.to_number, message.body, STATUS_PENDING, now, now,
+            )
+        )
+        if cursor.rowcount == 0:
+            return False
+        message.id = cursor.lastrowid
+        return True
+
+    async def enqueue(self, message: SpooledMessage) -> bool:
+        """
+        Guarda un mensaje en el spool.
+
+        Returns:
+            True si se guardó, False si el MessageSid ya estaba (reintento de Twilio)
+        """
+        return await asyncio.to_thread(self._enqueue, message)
+
+    def _set_status(self, message_id: int, status: str, error: Optional[str] = None):
+        self._execute(
+            """
+            UPDATE inbound_messages
+            SET status = ?, error = ?, updated_at = ?,
+                attempts = attempts + (CASE WHEN ? = 'processing' THEN 1 ELSE 0 END)
+            WHERE id = ?
+            """,
+            (status, error, time.time(), status, message_id)
+        )
+
+    async def mark_processing(self, message_id: int):
+        await asyncio.to_thread(self._set_status, message_id, STATUS_PROCESSING)
+
+    async def mark_done(self, message_id: int):
+        await asyncio.to_thread(self._set_status, message_id, STATUS_DONE)
+
+    async def mark_retry(self, message_id: int, error: str):
+        """Vuelve a pending después de un intento fallido (guarda el error)"""
+        await asyncio.to_thread(self._set_status, message_id, STATUS_PENDING, error)
+
+    async def mark_failed(self, message_id: int, error: str):
+        """Marca el mensaje como muerto: no se vuelve a intentar"""
+        await asyncio.to_thread(self._set_status, message_id, STATUS_FAILED, error)
+
+    def _unfinished(self) -> List[SpooledMessage]:
+        rows = self._execute(
+            """
+            SELECT id, message_sid, client_id, from_number, to_number, body, attempts
+            FROM inbound_messages
+            WHERE status IN (?, ?)
+            ORDER BY id
+            """,
+            (STATUS_PENDING, STATUS_PROCESSING)
+        ).fetchall()
+
+        return [
+            SpooledMessage(
+                id=row[0], message_sid=row[1], client_id=row[2], from_number=row[3],
+                to_number=row[4], body=row[5], attempts=row[6]
+            )
+            for row in rows
+        ]
+
+    async def unfinished(self) -> List[SpooledMessage]:
+        """Mensajes pendientes o que quedaron a medio procesar"""
+        return await asyncio.to_thread(self._unfinished)
+
+    def _count(self, status: str) -> int:
+        return self._execute(
+            "SELECT COUNT(*) FROM inbound_messages WHERE status = ?", (status,)
+        ).fetchone()[0]
+
+    async def count(self, status: str) -> int:
+        """Cantidad de mensajes en un estado"""
+        return await asyncio.to_thread(self._count, status)
+
+    def _purge_finished(self, older_than_seconds: float) -> int:
+        cursor = self._execute(
+            "DELETE FROM inbound_messages WHERE status IN (?, ?) AND updated_at < ?",
+            (STATUS_DONE, STATUS_FAILED, time.time() - older_than_seconds)
+        )
+        return cursor.rowcount
+
+    async def purge_finished(self, older_than_seconds: float) -> int:
+        """Borra mensajes terminados (y muertos) más viejos que el período indicado"""
+        return await asyncio.to_thread(self._purge_finished, older_than_seconds)
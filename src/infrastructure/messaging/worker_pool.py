@@ -0,0 +1,200 @@
+"""
+Pool de workers asyncio que procesa los mensajes del spool.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import random
+
+from src.infrastructure.messaging.spool import STATUS_FAILED, MessageSpool, SpooledMessage
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[SpooledMessage], Awaitable[None]]
+
+
+class SpoolWorkerPool:
+    """
+    Ejecuta el handler para cada mensaje del spool con N workers concurrentes.
+
+    - start(): retoma los mensajes no terminados y lanza los workers
+    - submit(): guarda un mensaje nuevo y lo encola
+    - stop(): deja de aceptar mensajes y drena la cola antes de cancelar
+
+    Un mensaje cuyo handler falla se reintenta con backoff exponencial
+    hasta max_attempts intentos; después queda muerto (failed) en el spool.
+    Los intentos se cuentan al tomarlo, así que un mensaje que tira abajo
+    el proceso tampoco se retoma indefinidamente en cada startup.
+
+    Args:
+        spool: Spool durable
+        handler: Procesa un mensaje (si lanza una excepción, el intento falló)
+        workers: Workers concurrentes
+        max_attempts: Intentos por mensaje antes de darlo por muerto
+        retry_base_seconds: Espera antes del primer reintento (se duplica en cada uno)
+        retry_max_seconds: Espera máxima entre reintentos
+    """
+
+    def __init__(
+        self,
+        spool: MessageSpool,
+        handler: MessageHandler,
+        workers: int = 4,
+        max_attempts: int = 3,
+        retry_base_seconds: float = 2.0,
+        retry_max_seconds: float = 60.0
+    ):
+        self.spool = spool
+        self.handler = handler
+        self.num_workers = workers
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._queue: asyncio.Queue[SpooledMessage] = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._retries: Dict[int, asyncio.TimerHandle] = {}
+        self._accepting = False
+        self._processed = 0
+        self._retried = 0
+        self._dead = 0
+
+    async def start(self):
+        """Retoma mensajes pendientes del spool y lanza los workers"""
+        self._dead = await self.spool.count(STATUS_FAILED)
+
+        pending = await self.spool.unfinished()
+        resumed = 0
+        for message in pending:
+            if message.attempts >= self.max_attempts:
+                # Se cortó en cada intento (el proceso murió procesándolo)
+                await self._give_up(message, f"interrupted on each of {message.attempts} attempt(s)")
+                continue
+            self._queue.put_nowait(message)
+            resumed += 1
+
+        if resumed:
+            logger.info(f"Resuming {resumed} unfinished spooled message(s)")
+
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"spool-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+        self._accepting = True
+        logger.info(f"✓ Started {self.num_workers} spool worker(s)")
+
+    async def submit(self, message: SpooledMessage) -> bool:
+        """
+        Guarda el mensaje en el spool y lo encola para los workers.
+
+        Returns:
+            True si se encoló, False si era un duplicado ya recibido
+        """
+        if not self._accepting:
+            raise RuntimeError("Spool worker pool is not accepting messages")
+
+        if not await self.spool.enqueue(message):
+            logger.info(f"Duplicate spooled message ignored: {message.message_sid}")
+            return False
+
+        self._queue.put_nowait(message)
+        return True
+
+    def queue_size(self) -> int:
+        """Cantidad de mensajes esperando un worker"""
+        return self._queue.qsize()
+
+    def backoff(self, attempts: int) -> float:
+        """Espera antes del reintento número `attempts`: exponencial, con la mitad al azar"""
+        ceiling = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    async def _worker(self, worker_id: int):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self.spool.mark_processing(message.id)
+                message.attempts += 1
+                await self.handler(message)
+                await self.spool.mark_done(message.id)
+                self._processed += 1
+
+            except asyncio.CancelledError:
+                # Queda en 'processing' y se retoma en el próximo startup
+                raise
+
+            except Exception as e:
+                logger.error(
+                    f"Spool worker {worker_id} failed processing {message.message_sid} "
+                    f"(attempt {message.attempts}/{self.max_attempts}): {e}",
+                    exc_info=True
+                )
+                try:
+                    await self._failed_attempt(message, str(e))
+                except Exception as mark_error:
+                    logger.error(f"Could not record failed spooled message: {mark_error}")
+
+            finally:
+                self._queue.task_done()
+
+    async def _failed_attempt(self, message: SpooledMessage, error: str):
+        if message.attempts >= self.max_attempts:
+            await self._give_up(message, error)
+            return
+
+        await self.spool.mark_retry(message.id, error)
+        self._retried += 1
+        delay = self.backoff(message.attempts)
+        self._retries[message.id] = asyncio.get_running_loop().call_later(
+            delay, self._requeue, message
+        )
+        logger.info(f"🔁 Retrying spooled message {message.message_sid} in {delay:.1f}s")
+
+    def _requeue(self, message: SpooledMessage):
+        self._retries.pop(message.id, None)
+        if self._accepting:
+            self._queue.put_nowait(message)
+
+    async def _give_up(self, message: SpooledMessage, error: str):
+        await self.spool.mark_failed(message.id, error)
+        self._dead += 1
+        logger.error(
+            f"✗ Giving up on spooled message {message.message_sid} after "
+            f"{message.attempts} attempt(s): {error}"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "retry_scheduled": len(self._retries),
+            "processed": self._processed,
+            "retried": self._retried,
+            "dead": self._dead,
+        }
+
+    async def stop(self, timeout: Optional[float] = None):
+        """
+        Deja de aceptar mensajes y espera a que la cola se vacíe.
+        Lo que no termine dentro del timeout (o espere un reintento) queda
+        en el spool para el próximo startup.
+        """
+        self._accepting = False
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            logger.info("✓ Spool workers drained")
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Spool drain timed out with {self._queue.qsize()} message(s) queued; "
+                f"they will be resumed on next startup"
+            )
+
+        if self._retries:
+            logger.info(f"{len(self._retries)} spooled message(s) waiting to retry will be resumed on next startup")
+            for handle in self._retries.values():
+                handle.cancel()
+            self._retries.clear()
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
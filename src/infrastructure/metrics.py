@@ -0,0 +1,477 @@
+"""
+Métricas en formato Prometheus (texto 0.0.4), sin dependencias externas.
+
+Registrar una muestra es barato y no toma locks: cada proceso acumula
+en dicts en memoria que sólo modifica su event loop (los incrementos son
+operaciones simples sobre el GIL). Exportar sí hace trabajo: arma un
+snapshot y lo serializa.
+
+Con varios workers de uvicorn cada proceso tiene sus propios valores y
+el scrape de /metrics cae en uno solo de ellos. Con
+settings.metrics_multiprocess_dir cada worker escribe su snapshot en
+`<dir>/<pid>.json` cada metrics_flush_interval_seconds (y al apagarse),
+y /metrics suma los archivos de todos:
+
+- counters e histogramas: se suman todos, incluso los de workers que ya
+  terminaron (así un reinicio no hace "retroceder" los totales);
+- gauges: sólo los de procesos vivos (un request en vuelo de un worker
+  muerto ya no existe).
+
+El directorio tiene que vaciarse antes de arrancar los workers, igual que
+PROMETHEUS_MULTIPROC_DIR en prometheus_client.
+"""
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from src.core.logging_config import record_stage
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Latencias del pipeline: de milisegundos (lookup) a decenas de segundos (IA lenta)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (nombre, tipo, help, labels, valor) producido por un collector al exportar
+CollectedSample = Tuple[str, str, str, Dict[str, str], float]
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "help": self.help,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(labels), value] for labels, value in self._samples()],
+        }
+
+    def _samples(self) -> Iterable[Tuple[Tuple[str, ...], Any]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Valor que sólo crece. Los label values van en el orden de labelnames."""
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self):
+        return list(self._values.items())
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja (requests en vuelo, tamaños)"""
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def set(self, *labels: str, value: float):
+        self._values[labels] = value
+
+    @contextmanager
+    def track(self, *labels: str) -> Iterator[None]:
+        """Suma 1 mientras dura el bloque"""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+    def _samples(self):
+        return list(self._values.items())
+
+
+class Histogram(_Metric):
+    """
+    Distribución en buckets fijos. Por cada combinación de labels guarda
+    [cuenta por bucket..., +Inf, suma]; las cuentas acumuladas que pide
+    Prometheus se calculan al exportar.
+    """
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observa la duración del bloque (también si termina con excepción)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+    def _samples(self):
+        return [(labels, list(counts)) for labels, counts in self._values.items()]
+
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas de la app y de collectors.
+
+    Los collectors son funciones que se llaman al exportar y devuelven
+    muestras calculadas en el momento (por ejemplo, los stats() de los
+    caches), así no cuestan nada en el camino de cada request.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[CollectedSample]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[CollectedSample]]):
+        self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Iterable[CollectedSample]]):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Estado de todas las métricas de este proceso (serializable a JSON)"""
+        snapshot = {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+        for collector in list(self._collectors):
+            try:
+                samples = list(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}", exc_info=True)
+                continue
+
+            for name, metric_type, help, labels, value in samples:
+                entry = snapshot.setdefault(name, {
+                    "type": metric_type,
+                    "help": help,
+                    "labelnames": list(labels),
+                    "samples": [],
+                })
+                entry["samples"].append([[str(labels[key]) for key in entry["labelnames"]], value])
+
+        return snapshot
+
+
+def merge_snapshots(snapshots: Iterable[Tuple[Dict[str, Dict[str, Any]], bool]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Suma snapshots de varios procesos.
+
+    Args:
+        snapshots: (snapshot, proceso vivo). Los gauges de procesos que ya
+            terminaron se descartan; counters e histogramas se suman siempre.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+
+    for snapshot, alive in snapshots:
+        for name, metric in snapshot.items():
+            if metric["type"] == "gauge" and not alive:
+                continue
+
+            entry = merged.get(name)
+            if entry is None:
+                entry = merged[name] = {**metric, "values": {}}
+            values = entry["values"]
+
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                current = values.get(key)
+                if current is None:
+                    values[key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    values[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    values[key] = current + value
+
+    for entry in merged.values():
+        entry["samples"] = [[list(key), value] for key, value in entry.pop("values").items()]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(snapshot: Dict[str, Dict[str, Any]]) -> str:
+    """Snapshot -> formato de texto de Prometheus"""
+    lines: List[str] = []
+
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        if not metric["samples"]:
+            continue
+
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+
+        for labels, value in sorted(metric["samples"], key=lambda sample: sample[0]):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+                continue
+
+            cumulative = 0.0
+            for bound, count in zip(list(metric["buckets"]) + [float("inf")], value[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{name}_bucket{_format_labels(labelnames, labels, le)} {_format_value(cumulative)}"
+                )
+            lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(labelnames, labels)} {_format_value(cumulative)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiprocessMetrics:
+    """
+    Comparte las métricas entre workers a través de un directorio.
+
+    Cada proceso escribe su snapshot de forma atómica (archivo temporal +
+    rename) y el que atiende el scrape lee y suma los de todos.
+
+    Args:
+        registry: Registro de este proceso
+        directory: Directorio compartido por los workers
+        flush_interval_seconds: Cada cuánto se escribe el snapshot
+    """
+
+    def __init__(self, registry: MetricsRegistry, directory: str, flush_interval_seconds: float = 5.0):
+        self.registry = registry
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval_seconds
+        self.pid = os.getpid()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def path(self) -> Path:
+        return self.directory / f"{self.pid}.json"
+
+    def flush(self, snapshot: Optional[Dict[str, Dict[str, Any]]] = None):
+        """Escribe el snapshot de este proceso"""
+        if snapshot is None:
+            snapshot = self.registry.snapshot()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = self.directory / f".{self.pid}.json.tmp"
+        temporary.write_text(json.dumps({"pid": self.pid, "metrics": snapshot}))
+        os.replace(temporary, self.path)
+
+    def collect(self, snapshot: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Snapshot sumado de todos los workers.
+
+        Args:
+            snapshot: Estado actual de este proceso. Conviene tomarlo en el
+                event loop y llamar a collect desde un thread (lee archivos).
+        """
+        self.flush(snapshot)
+
+        snapshots = []
+        for path in self.directory.glob("*.json"):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError) as e:
+                # Un worker que murió a mitad de escritura no deja el archivo final
+                logger.warning(f"Skipping unreadable metrics file {path.name}: {e}")
+                continue
+            pid = data.get("pid", 0)
+            snapshots.append((data.get("metrics") or {}, pid == self.pid or _pid_alive(pid)))
+
+        return merge_snapshots(snapshots)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # El snapshot se toma en el event loop (dueño de los dicts); la escritura en un thread
+                await asyncio.to_thread(self.flush, self.registry.snapshot())
+            except Exception as e:
+                logger.error(f"Error writing metrics snapshot: {e}")
+
+    def start(self):
+        if self._task is None:
+            self.flush()
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"📈 Sharing metrics through {self.directory} (pid {self.pid})")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Último snapshot: sus counters siguen sumando después de que el worker termina
+        self.flush()
+
+
+REGISTRY = MetricsRegistry()
+
+# Etapas: resolve (cliente por número), runtime (runtime/features del cliente),
+# history, knowledge, ai, reply (generación completa), send, webhook (request total).
+# provider: messaging provider en resolve/send, AI provider en el resto.
+STAGE_SECONDS = REGISTRY.histogram(
+    "whatsapp_stage_duration_seconds",
+    "Latency of each message pipeline stage",
+    ("stage", "client_id", "provider"),
+)
+AI_ERRORS = REGISTRY.counter(
+    "whatsapp_ai_errors_total",
+    "AI generation failures (after failover)",
+    ("client_id", "provider"),
+)
+AI_FALLBACKS = REGISTRY.counter(
+    "whatsapp_ai_fallbacks_total",
+    "Replies that used a canned message instead of the AI (reason: error or empty)",
+    ("client_id", "provider", "reason"),
+)
+MESSAGES_SENT = REGISTRY.counter(
+    "whatsapp_messages_sent_total",
+    "Outbound WhatsApp messages by result",
+    ("client_id", "provider", "status"),
+)
+IN_FLIGHT = REGISTRY.gauge(
+    "whatsapp_in_flight",
+    "Operations in progress (operation: webhook, ai, send)",
+    ("operation", "client_id"),
+)
+
+# Scheduler de envíos (src.infrastructure.messaging.outbound)
+OUTBOUND_QUEUE_DEPTH = REGISTRY.gauge(
+    "whatsapp_outbound_queue_depth",
+    "Outbound messages waiting to be sent, including retries waiting for their backoff",
+    ("client_id", "priority"),
+)
+OUTBOUND_SEND_SECONDS = REGISTRY.histogram(
+    "whatsapp_outbound_send_seconds",
+    "Time from enqueue until an outbound message is sent or given up (pacing and retries included)",
+    ("client_id", "priority", "result"),
+)
+OUTBOUND_ATTEMPT_SECONDS = REGISTRY.histogram(
+    "whatsapp_outbound_attempt_seconds",
+    "Latency of each call to the messaging provider",
+    ("client_id", "provider"),
+)
+OUTBOUND_RETRIES = REGISTRY.counter(
+    "whatsapp_outbound_retries_total",
+    "Outbound send attempts scheduled for retry (reason: rate_limited or error)",
+    ("client_id", "reason"),
+)
+
+
+# Callbacks de estado de entrega (src.domain.services.delivery_status)
+DELIVERY_STATUS_UPDATES = REGISTRY.counter(
+    "whatsapp_delivery_status_updates_total",
+    "Delivery status callbacks accepted, by reported status",
+    ("client_id", "status"),
+)
+DELIVERY_STATUS_FLUSH_SECONDS = REGISTRY.histogram(
+    "whatsapp_delivery_status_flush_seconds",
+    "Latency of each batched delivery status upsert",
+    (),
+)
+
+
+def observe_stage(stage: str, client_id: str, provider: str, seconds: float):
+    """Registra la duración de una etapa en el histograma y en el resumen del request"""
+    STAGE_SECONDS.observe(seconds, stage, client_id, provider)
+    record_stage(stage, seconds)
+
+
+@contextmanager
+def time_stage(stage: str, client_id: str, provider: str) -> Iterator[None]:
+    """observe_stage con la duración del bloque (también si termina con excepción)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, client_id, provider, time.perf_counter() - started)
@@ -1,14 +1,223 @@
 """
 Cliente de Twilio para enviar mensajes de WhatsApp.
+
+- AsyncTwilioClient: envío async sobre el pool httpx compartido (usado por el webhook).
+- TwilioClient: cliente síncrono basado en el SDK oficial.
+
+El SDK (twilio.rest) es pesado y sólo lo usa TwilioClient: se importa al
+crearlo, no al importar este módulo.
 """
 import os
+import base64
+import hashlib
+import hmac
 import logging
-from typing import Optional
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioRestException
+from typing import Dict, Iterable, Mapping, Optional
+
+import httpx
+
+from src.core.exceptions import TwilioError
+from src.infrastructure.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
+TWILIO_API_BASE_URL = "https://api.twilio.com"
+
+# Espera ante un 429 sin Retry-After
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+
+def _whatsapp_address(number: str) -> str:
+    """Asegura que el número tenga el prefijo whatsapp:"""
+    if not number.startswith('whatsapp:'):
+        return f"whatsapp:{number}"
+    return number
+
+
+def _retry_after_seconds(value: Optional[str]) -> float:
+    """Retry-After en segundos (Twilio lo envía como número; una fecha HTTP usa el default)"""
+    try:
+        return max(0.0, float(value)) if value else DEFAULT_RETRY_AFTER_SECONDS
+    except ValueError:
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+
+def compute_signature(auth_token: str, url: str, params: Mapping[str, Iterable[str]]) -> str:
+    """
+    Firma X-Twilio-Signature de un request de Twilio.
+
+    HMAC-SHA1 con el auth token sobre la URL completa seguida de cada
+    parámetro del POST (ordenados por nombre) como nombre + valor, en base64.
+    """
+    payload = url + "".join(
+        name + value
+        for name in sorted(params)
+        for value in sorted(params[name])
+    )
+    digest = hmac.new(auth_token.encode("utf-8"), payload.encode("utf-8"), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+class AsyncTwilioClient:
+    """
+    Cliente async para enviar mensajes de WhatsApp vía la REST API de Twilio.
+
+    Usa el cliente httpx compartido (conexiones keep-alive) y no bloquea el
+    event loop. Las credenciales se leen una sola vez de las mismas variables
+    de entorno que TwilioClient. Usar get_twilio_client() para obtener la
+    instancia cacheada de cada cliente.
+    """
+
+    def __init__(self, client_id: str, base_url: Optional[str] = None):
+        """
+        Args:
+            client_id: ID del cliente (ej: "demo_client", "restaurante_pepe")
+            base_url: URL base de la API (default: TWILIO_API_BASE_URL o api.twilio.com)
+        """
+        self.client_id = client_id.upper()
+
+        self.account_sid = os.getenv(f"TWILIO_ACCOUNT_SID_{self.client_id}")
+        self.auth_token = os.getenv(f"TWILIO_AUTH_TOKEN_{self.client_id}")
+        self.whatsapp_number = os.getenv(f"TWILIO_WHATSAPP_NUMBER_{self.client_id}")
+
+        base_url = base_url or os.getenv("TWILIO_API_BASE_URL", TWILIO_API_BASE_URL)
+        self.messages_url = (
+            f"{base_url.rstrip('/')}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        )
+        # URL pública de /webhook/status: Twilio avisa ahí cada cambio de estado
+        self.status_callback_url = os.getenv("TWILIO_STATUS_CALLBACK_URL")
+
+        if not self.is_configured():
+            logger.warning(
+                f"Twilio credentials not found for client '{client_id}'. "
+                f"Make sure to set TWILIO_ACCOUNT_SID_{self.client_id}, "
+                f"TWILIO_AUTH_TOKEN_{self.client_id}, and "
+                f"TWILIO_WHATSAPP_NUMBER_{self.client_id} in .env file"
+            )
+
+    def is_configured(self) -> bool:
+        """Verifica si el cliente de Twilio está correctamente configurado."""
+        return all([self.account_sid, self.auth_token, self.whatsapp_number])
+
+    def validate_signature(self, url: str, params: Mapping[str, Iterable[str]], signature: str) -> bool:
+        """
+        Verifica que un webhook venga de Twilio (header X-Twilio-Signature).
+
+        Args:
+            url: URL que llamó Twilio (la configurada, con query string si la tiene)
+            params: Parámetros del POST (nombre -> valores, como parse_qs)
+            signature: Valor del header X-Twilio-Signature
+
+        Returns:
+            False si la firma no coincide o no hay auth token para verificarla
+        """
+        if not self.auth_token or not signature:
+            return False
+        expected = compute_signature(self.auth_token, url, params)
+        return hmac.compare_digest(expected.encode("ascii"), signature.encode("utf-8"))
+
+    @property
+    def sender(self) -> Optional[str]:
+        """Número emisor: los límites de envío de WhatsApp son por número"""
+        return self.whatsapp_number
+
+    async def send(self, to: str, message: str) -> str:
+        """
+        Envía un mensaje de WhatsApp.
+
+        Args:
+            to: Número de destino (formato: +5491123456789)
+            message: Texto del mensaje a enviar
+
+        Returns:
+            Message SID
+
+        Raises:
+            TwilioError: Si el envío falló. retryable para 429, 5xx y
+                errores de conexión; retry_after con el Retry-After de un 429.
+        """
+        if not self.is_configured():
+            raise TwilioError(f"not configured for client '{self.client_id}'")
+
+        to = _whatsapp_address(to)
+        logger.debug(f"Sending WhatsApp message to {to}")
+
+        try:
+            data = {
+                "Body": message,
+                "From": _whatsapp_address(self.whatsapp_number),
+                "To": to,
+            }
+            if self.status_callback_url:
+                data["StatusCallback"] = self.status_callback_url
+
+            response = await get_http_client("twilio").post(
+                self.messages_url,
+                data=data,
+                auth=(self.account_sid, self.auth_token),
+            )
+
+        except httpx.TransportError as e:
+            # Sólo se reintenta si el request no llegó a salir: tras un timeout
+            # de lectura Twilio pudo haberlo enviado (reintentar lo duplicaría)
+            not_sent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+            raise TwilioError(f"{type(e).__name__}: {e}", retryable=not_sent) from e
+
+        if response.status_code >= 400:
+            try:
+                error = response.json()
+            except ValueError:
+                error = {"message": response.text}
+
+            retry_after = None
+            if response.status_code == 429:
+                retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+
+            raise TwilioError(
+                f"{response.status_code} {error.get('code')} - {error.get('message')}",
+                retryable=response.status_code == 429 or response.status_code >= 500,
+                retry_after=retry_after
+            )
+
+        data = response.json()
+        logger.debug(
+            f"✓ Message sent successfully. SID: {data.get('sid')}, "
+            f"Status: {data.get('status')}"
+        )
+        return data.get("sid")
+
+    async def send_message(self, to: str, message: str) -> Optional[str]:
+        """
+        Envía un mensaje de WhatsApp sin reintentos (ver send()).
+
+        Args:
+            to: Número de destino (formato: +5491123456789)
+            message: Texto del mensaje a enviar
+
+        Returns:
+            Message SID si el envío fue exitoso, None si falló
+        """
+        try:
+            return await self.send(to, message)
+        except TwilioError as e:
+            logger.error(f"Error sending message: {e.message}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error sending message: {e}", exc_info=True)
+            return None
+
+
+_async_clients: Dict[str, AsyncTwilioClient] = {}
+
+
+def get_twilio_client(client_id: str) -> AsyncTwilioClient:
+    """Obtiene el AsyncTwilioClient cacheado de un cliente (lo crea la primera vez)"""
+    client = _async_clients.get(client_id)
+    if client is None:
+        client = AsyncTwilioClient(client_id)
+        _async_clients[client_id] = client
+    return client
+
 
 class TwilioClient:
     """
@@ -49,10 +258,12 @@ class TwilioClient:
                 f"TWILIO_AUTH_TOKEN_{self.client_id}, and "
                 f"TWILIO_WHATSAPP_NUMBER_{self.client_id} in .env file"
             )
-            self.client: Optional[Client] = None
+            self.client = None
         else:
             # Inicializar cliente de Twilio
             try:
+                from twilio.rest import Client
+
                 self.client = Client(self.account_sid, self.auth_token)
                 logger.info(f"Twilio client initialized for '{client_id}'")
             except Exception as e:
@@ -80,18 +291,15 @@ class TwilioClient:
             )
             return None
 
-        try:
-            # Asegurar que 'to' tenga el prefijo whatsapp:
-            if not to.startswith('whatsapp:'):
-                to = f"whatsapp:{to}"
+        from twilio.base.exceptions import TwilioRestException
 
-            # Asegurar que 'from' tenga el prefijo whatsapp:
-            from_number = self.whatsapp_number
-            if not from_number.startswith('whatsapp:'):
-                from_number = f"whatsapp:{from_number}"
+        try:
+            # Asegurar que 'to' y 'from' tengan el prefijo whatsapp:
+            to = _whatsapp_address(to)
+            from_number = _whatsapp_address(self.whatsapp_number)
 
             # Enviar mensaje
-            logger.info(f"Sending WhatsApp message to {to}")
+            logger.debug(f"Sending WhatsApp message to {to}")
 
             message_obj = self.client.messages.create(
                 body=message,
@@ -99,7 +307,7 @@ class TwilioClient:
                 to=to
             )
 
-            logger.info(
+            logger.debug(
                 f"✓ Message sent successfully. SID: {message_obj.sid}, "
                 f"Status: {message_obj.status}"
             )
@@ -119,7 +327,10 @@ class TwilioClient:
 
     def get_message_status(self, message_sid: str) -> Optional[str]:
         """
-        Obtiene el estado de un mensaje enviado.
+        Obtiene el estado de un mensaje enviado (un request a Twilio por mensaje).
+
+        Para seguir entregas en volumen usar los callbacks de /webhook/status
+        (TWILIO_STATUS_CALLBACK_URL) y GET /deliveries/{client_id}/funnel.
 
         Args:
             message_sid: SID del mensaje de Twilio
@@ -131,6 +342,8 @@ class TwilioClient:
             logger.error("Cannot check message status: Twilio not configured")
             return None
 
+        from twilio.base.exceptions import TwilioRestException
+
         try:
             message = self.client.messages(message_sid).fetch()
             return message.status
@@ -6,20 +6,40 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 
-from src.core.config import get_settings, get_config_manager
-from src.core.feature_manager import FeatureManager
-from src.features.ai_responses.feature import AIResponsesFeature
-from src.api.routes import health, webhook
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+from src.core.config import ConfigWatcher, get_settings, get_config_manager
+from src.core.logging_config import setup_logging
+from src.core.registry import LazyRegistry
+from src.core.tenant_runtime import TenantRuntimeRegistry
+from src.infrastructure.http_client import close_http_clients
+from src.infrastructure.metrics import REGISTRY as METRICS_REGISTRY, MultiprocessMetrics
+from src.infrastructure.messaging.outbound import get_outbound_scheduler
+from src.infrastructure.messaging.spool import MessageSpool
+from src.infrastructure.messaging.worker_pool import SpoolWorkerPool
+from src.domain.services.message_pipeline import make_spool_handler
+from src.domain.services.conversation_history import get_history_store
+from src.domain.services.delivery_status import get_delivery_status_buffer
+from src.infrastructure.database.session import dispose_engines
+from src.infrastructure.cache.response_cache import get_response_cache
+from src.infrastructure.cache.idempotency import get_deduplicator
+from src.infrastructure.cache.rate_limiter import get_rate_limiter
+from src.api.routes import deliveries, health, metrics, webhook
+from src.api.middleware.client_resolver import ClientResolverMiddleware
 
 settings = get_settings()
 
+# Setup logging: JSON (settings.log_format) formateado en un thread aparte
+setup_logging(settings.log_level, settings.log_format)
+logger = logging.getLogger(__name__)
+
+# Features disponibles globalmente; luego cada cliente activa las que necesita.
+# Cada feature (y sus SDKs) se importa recién cuando un cliente la usa
+# (o antes de forkear los workers, ver src.server)
+AVAILABLE_FEATURES = LazyRegistry({
+    'ai_responses': 'src.features.ai_responses.feature:AIResponsesFeature',
+    'knowledge_base': 'src.features.knowledge_base.feature:KnowledgeBaseFeature',
+    # Aquí se agregan más features cuando se implementen
+})
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -29,23 +49,91 @@ async def lifespan(app: FastAPI):
 
     # Cargar configuraciones de clientes
     config_manager = get_config_manager()
+    # Con src.server el snapshot se cargó en el proceso padre antes de
+    # forkear: un worker (re)iniciado después trae los cambios desde entonces
+    await config_manager.refresh()
     clients = config_manager.list_clients()
     logger.info(f"📋 Loaded {len(clients)} client(s): {clients}")
 
-    # Registrar features disponibles globalmente
-    # Esto se hace una sola vez, luego cada cliente activa las que necesita
-    app.state.available_features = {
-        'ai_responses': AIResponsesFeature,
-        # Aquí se agregan más features cuando se implementen
-    }
+    app.state.available_features = AVAILABLE_FEATURES
     logger.info(f"✓ Registered {len(app.state.available_features)} feature(s)")
 
+    # Invalidar respuestas cacheadas cuando se recarga el YAML de un cliente
+    config_manager.add_reload_listener(get_response_cache().invalidate_client)
+
+    # Construir una vez el runtime de cada cliente (features + AI provider)
+    # para que los webhooks lo reutilicen en lugar de recrearlo por mensaje
+    app.state.tenant_runtimes = TenantRuntimeRegistry(app.state.available_features)
+    await app.state.tenant_runtimes.warm_up(clients)
+
+    # Modo ack_first: spool durable + workers (retoma lo que quedó pendiente)
+    app.state.spool_workers = None
+    if settings.webhook_mode == "ack_first":
+        spool = MessageSpool(settings.spool_path)
+        spool.open()
+        await spool.purge_finished(settings.spool_retention_seconds)
+
+        app.state.spool_workers = SpoolWorkerPool(
+            spool,
+            make_spool_handler(app.state.tenant_runtimes),
+            workers=settings.spool_workers,
+            max_attempts=settings.spool_max_attempts,
+            retry_base_seconds=settings.spool_retry_base_seconds,
+            retry_max_seconds=settings.spool_retry_max_seconds
+        )
+        await app.state.spool_workers.start()
+
+    # Métricas: stats de componentes/providers al exportar y, con varios
+    # workers, snapshot compartido para que /metrics sume todos
+    app.state.metrics_collector = metrics.app_stats_collector(
+        app.state.tenant_runtimes, app.state.spool_workers
+    )
+    METRICS_REGISTRY.register_collector(app.state.metrics_collector)
+    app.state.metrics_multiprocess = None
+    if settings.metrics_multiprocess_dir:
+        app.state.metrics_multiprocess = MultiprocessMetrics(
+            METRICS_REGISTRY,
+            settings.metrics_multiprocess_dir,
+            settings.metrics_flush_interval_seconds
+        )
+        app.state.metrics_multiprocess.start()
+
+    # Hot reload: al cambiar el YAML de un cliente se reemplaza su runtime
+    # (los requests en curso terminan con el anterior)
+    config_manager.add_reload_listener(app.state.tenant_runtimes.invalidate)
+    app.state.config_watcher = None
+    if settings.config_watch_enabled:
+        app.state.config_watcher = ConfigWatcher(config_manager, settings.config_watch_interval_seconds)
+        app.state.config_watcher.start()
+
     logger.info("✓ Application started successfully")
 
     yield
 
     # Shutdown
     logger.info("🛑 Shutting down...")
+    if app.state.config_watcher is not None:
+        await app.state.config_watcher.stop()
+
+    if app.state.spool_workers is not None:
+        await app.state.spool_workers.stop(timeout=settings.spool_drain_timeout_seconds)
+        app.state.spool_workers.spool.close()
+
+    # Después de los workers del spool: lo que encolaron todavía puede salir
+    await get_outbound_scheduler().close(timeout=settings.outbound_drain_timeout_seconds)
+
+    if app.state.metrics_multiprocess is not None:
+        await app.state.metrics_multiprocess.stop()
+    METRICS_REGISTRY.unregister_collector(app.state.metrics_collector)
+
+    app.state.tenant_runtimes.shutdown()
+    await get_history_store().flush()
+    await get_delivery_status_buffer().close()
+    await dispose_engines()
+    await get_response_cache().close()
+    await get_deduplicator().close()
+    await get_rate_limiter().close()
+    await close_http_clients()
 
 
 # Create FastAPI app
@@ -67,9 +155,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Resolución de cliente por número de WhatsApp (setea ClientContext)
+app.add_middleware(ClientResolverMiddleware)
+
 # Include Routers
 app.include_router(health.router)
 app.include_router(webhook.router)
+app.include_router(metrics.router)
+app.include_router(deliveries.router)
 
 
 @app.get("/")
@@ -84,11 +177,19 @@ async def root():
 
 
 if __name__ == "__main__":
+    if settings.workers > 1 and not settings.debug:
+        # Varios workers pre-forkeados (config e imports compartidos)
+        from src.server import serve
+        serve()
+        raise SystemExit(0)
+
     import uvicorn
     uvicorn.run(
         "src.main:app",
         host=settings.host,
         port=settings.port,
         reload=settings.debug,
-        log_level=settings.log_level.lower()
+        log_level=settings.log_level.lower(),
+        # Los logs de uvicorn van por la misma cola que los de la app (setup_logging)
+        log_config=None
     )
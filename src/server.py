@@ -0,0 +1,412 @@
+"""
+Servidor multi-worker pre-fork.
+
+    python -m src.server                # settings.workers procesos
+    python -m src.server --workers 4
+
+El proceso padre:
+- importa la app, carga y valida los YAML de clientes (ConfigManager) e
+  importa las features, providers de IA y clientes de mensajería que
+  usan, una sola vez;
+- abre el socket y forkea los workers después de gc.freeze(): heredan
+  todo eso copy-on-write y el GC de cada worker no vuelve a tocar (ni a
+  copiar) esos objetos;
+- vigila los workers: reemplaza al que termina inesperadamente y, con
+  worker_memory_limit_mb, retira al que supera el límite de memoria
+  propia (SIGTERM: deja de aceptar conexiones, termina lo que tiene en
+  curso) y arranca otro en su lugar.
+
+Cada worker corre su propio lifespan (runtimes de clientes, clientes
+HTTP, spool, métricas). Las métricas se comparten por
+METRICS_MULTIPROCESS_DIR, que el padre vacía al arrancar (o crea en un
+directorio temporal si no está definido). En modo ack_first cada worker
+usa su propio spool (ver worker_spool_path) para no retomar los mensajes
+de otro. Lo que sigue siendo por proceso con backend "memory" (cache de
+respuestas, deduplicación, rate limiting) conviene pasarlo a "redis".
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import time
+
+import uvicorn
+
+from src.core.config import ConfigSnapshot, Settings, get_config_manager, get_settings
+from src.core.logging_config import stop_logging
+
+logger = logging.getLogger(__name__)
+
+# Un worker que muere antes de esto cuenta como fallo de arranque: se
+# espera (cada vez más) antes de reemplazarlo para no forkear en un loop
+MIN_WORKER_UPTIME_SECONDS = 5.0
+MAX_RESPAWN_DELAY_SECONDS = 30.0
+
+# Código de salida de un worker cuyo lifespan no arrancó (igual que uvicorn)
+STARTUP_FAILURE = 3
+
+
+def read_memory(pid: int) -> Optional[Dict[str, int]]:
+    """
+    Memoria de un proceso en bytes, de /proc/<pid>/smaps_rollup (Linux).
+
+    Args:
+        pid: Proceso a medir
+
+    Returns:
+        {"rss", "pss", "uss"}, o None si no se puede leer. uss son las
+        páginas privadas del proceso: no cuenta lo que sigue compartido
+        con el padre.
+    """
+    fields: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                parts = value.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[key] = int(parts[0]) * 1024
+    except (OSError, ValueError):
+        return None
+
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def worker_spool_path(spool_path: str, slot: int) -> str:
+    """
+    Spool de un worker: el 0 usa spool_path tal cual (lo pendiente de un
+    despliegue de un solo proceso no se pierde) y el resto le agrega su
+    número (data/spool.db -> data/spool.2.db). El reemplazo de un worker
+    toma su mismo número y retoma lo que dejó pendiente.
+    """
+    if slot == 0:
+        return spool_path
+    path = Path(spool_path)
+    return str(path.with_name(f"{path.stem}.{slot}{path.suffix}"))
+
+
+def preload(snapshot: ConfigSnapshot) -> List[str]:
+    """
+    Importa lo que usa algún cliente del snapshot (features, providers de
+    IA, clientes de mensajería) para que los workers lo hereden importado.
+
+    Args:
+        snapshot: Configuración de clientes ya cargada
+
+    Returns:
+        Entradas importadas ("feature:ai_responses", "ai:gemini", ...)
+    """
+    from src.domain.services.message_pipeline import MESSAGING_CLIENTS
+    from src.main import AVAILABLE_FEATURES
+
+    loaded = []
+
+    def load(registry, kind: str, name: Optional[str]):
+        if name and name in registry and f"{kind}:{name}" not in loaded:
+            try:
+                registry[name]
+            except Exception as e:
+                # Lo reporta el worker al construir el runtime del cliente
+                logger.warning(f"⚠️ Could not preload {kind} '{name}': {e}")
+                return
+            loaded.append(f"{kind}:{name}")
+
+    for config in snapshot.clients.values():
+        for name, feature in config.features.items():
+            if feature.enabled:
+                load(AVAILABLE_FEATURES, "feature", name)
+
+        ai_feature = config.features.get('ai_responses')
+        if ai_feature is not None and ai_feature.enabled and AVAILABLE_FEATURES.is_loaded('ai_responses'):
+            from src.features.ai_responses.feature import AI_PROVIDERS
+
+            chain = [ai_feature.config] + list(ai_feature.config.get('fallback_providers') or [])
+            for entry in chain:
+                load(AI_PROVIDERS, "ai", entry.get('provider', 'gemini'))
+
+        load(MESSAGING_CLIENTS, "messaging", config.messaging_provider)
+
+    return loaded
+
+
+@dataclass
+class Worker:
+    """Un worker forkeado"""
+    slot: int
+    pid: int
+    started: float
+    # Desde cuándo se le pidió terminar (None = activo)
+    retiring_since: Optional[float] = None
+    killed: bool = False
+
+
+class PreforkServer:
+    """
+    Proceso padre: prepara lo compartido, forkea los workers y los vigila.
+
+    Args:
+        settings: Settings de la app (workers, worker_memory_limit_mb, ...)
+        workers: Cantidad de workers (por defecto settings.workers)
+    """
+
+    def __init__(self, settings: Settings, workers: Optional[int] = None):
+        self.settings = settings
+        self.workers = max(1, workers or settings.workers)
+        self.memory_limit = settings.worker_memory_limit_mb * 1024 * 1024
+        self.graceful_timeout = settings.worker_graceful_timeout_seconds
+
+        self._workers: Dict[int, Worker] = {}
+        # Worker (slot) -> cuándo reemplazarlo, y muertes tempranas seguidas
+        self._respawn_at: Dict[int, float] = {}
+        self._early_exits: Dict[int, int] = {}
+        self._next_memory_check = 0.0
+        self._stopping = False
+        self._config: Optional[uvicorn.Config] = None
+        self._socket = None
+        self._temporary_metrics_dir: Optional[str] = None
+
+    def run(self):
+        """Arranca los workers y los vigila hasta recibir SIGTERM/SIGINT"""
+        self._prepare()
+
+        signal.signal(signal.SIGTERM, self._handle_exit)
+        signal.signal(signal.SIGINT, self._handle_exit)
+
+        for slot in range(self.workers):
+            self._spawn(slot)
+        # Los objetos del arranque ya quedaron congelados: el padre vuelve a recolectar
+        gc.enable()
+
+        try:
+            while not self._stopping:
+                self._reap()
+                self._respawn_due()
+                self._check_memory()
+                self._kill_overdue()
+                time.sleep(0.2)
+        finally:
+            self._shutdown()
+
+    def _prepare(self):
+        # Sin GC hasta el fork: no deja huecos en páginas que después se comparten
+        gc.disable()
+
+        self._prepare_metrics_dir()
+
+        # La app (settings, logging, rutas) se importa acá, no al importar este módulo
+        from src.main import app
+
+        config_manager = get_config_manager()
+        snapshot = config_manager.snapshot()
+        if not snapshot.clients:
+            logger.warning("⚠️ No client configs loaded; workers will start without clients")
+        loaded = preload(snapshot)
+        logger.info(
+            f"📦 Preloaded {len(snapshot.clients)} client config(s) and {len(loaded)} module(s): {loaded}"
+        )
+
+        self._config = uvicorn.Config(
+            app,
+            host=self.settings.host,
+            port=self.settings.port,
+            log_level=self.settings.log_level.lower(),
+            # Los logs de uvicorn van por la misma cola que los de la app (setup_logging)
+            log_config=None,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        self._socket = self._config.bind_socket()
+        logger.info(f"🚀 Starting {self.workers} worker(s) on {self.settings.host}:{self.settings.port}")
+
+    def _prepare_metrics_dir(self):
+        """Vacía (o crea) el directorio de métricas compartido por los workers"""
+        directory = self.settings.metrics_multiprocess_dir
+        if directory:
+            path = Path(directory)
+            path.mkdir(parents=True, exist_ok=True)
+            # Snapshots de una corrida anterior: sus pids ya no existen
+            for stale in [*path.glob("*.json"), *path.glob(".*.json.tmp")]:
+                stale.unlink(missing_ok=True)
+        else:
+            directory = self._temporary_metrics_dir = tempfile.mkdtemp(prefix="whatsapp-metrics-")
+
+        # Los workers leen settings (heredado) y los procesos hijos, el entorno
+        self.settings.metrics_multiprocess_dir = directory
+        os.environ["METRICS_MULTIPROCESS_DIR"] = directory
+
+    def _spawn(self, slot: int):
+        # Lo creado desde el freeze anterior (p. ej. al reemplazar un worker) también se comparte
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(slot)
+
+        self._workers[pid] = Worker(slot=slot, pid=pid, started=time.monotonic())
+        logger.info(f"👷 Started worker {slot} (pid {pid})")
+
+    def _run_worker(self, slot: int):
+        """Cuerpo del proceso hijo: nunca vuelve al loop del padre"""
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            gc.enable()
+
+            self.settings.spool_path = worker_spool_path(self.settings.spool_path, slot)
+
+            server = uvicorn.Server(self._config)
+            server.run(sockets=[self._socket])
+            if not server.started:
+                code = STARTUP_FAILURE
+        except BaseException:
+            logger.exception(f"❌ Worker {slot} crashed")
+            code = 1
+        finally:
+            stop_logging()
+            os._exit(code)
+
+    def _handle_exit(self, signum, frame):
+        self._stopping = True
+
+    def _reap(self):
+        """Recoge los workers que terminaron y agenda su reemplazo"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            worker = self._workers.pop(pid, None)
+            if worker is None or self._stopping:
+                continue
+
+            now = time.monotonic()
+            code = os.waitstatus_to_exitcode(status)
+            if worker.retiring_since is not None:
+                logger.info(f"♻️ Worker {worker.slot} (pid {pid}) retired with code {code}; starting replacement")
+                self._early_exits.pop(worker.slot, None)
+                self._respawn_at[worker.slot] = now
+                continue
+
+            if now - worker.started < MIN_WORKER_UPTIME_SECONDS:
+                self._early_exits[worker.slot] = self._early_exits.get(worker.slot, 0) + 1
+            else:
+                self._early_exits.pop(worker.slot, None)
+            failures = self._early_exits.get(worker.slot, 0)
+            delay = min(MAX_RESPAWN_DELAY_SECONDS, 2 ** (failures - 1)) if failures else 0.0
+
+            logger.warning(
+                f"⚠️ Worker {worker.slot} (pid {pid}) exited unexpectedly with code {code}; "
+                f"restarting in {delay:.0f}s"
+            )
+            self._respawn_at[worker.slot] = now + delay
+
+    def _respawn_due(self):
+        now = time.monotonic()
+        for slot, when in sorted(self._respawn_at.items()):
+            if when <= now:
+                del self._respawn_at[slot]
+                self._spawn(slot)
+
+    def _check_memory(self):
+        """Retira (de a uno) al worker que más supera worker_memory_limit_mb"""
+        if not self.memory_limit:
+            return
+        now = time.monotonic()
+        if now < self._next_memory_check:
+            return
+        self._next_memory_check = now + self.settings.worker_memory_check_interval_seconds
+
+        # De a un worker por vez: el resto sigue atendiendo
+        if self._respawn_at or any(worker.retiring_since is not None for worker in self._workers.values()):
+            return
+
+        over_limit = []
+        for worker in self._workers.values():
+            memory = read_memory(worker.pid)
+            if memory is not None and memory["uss"] > self.memory_limit:
+                over_limit.append((memory["uss"], worker))
+        if not over_limit:
+            return
+
+        uss, worker = max(over_limit, key=lambda item: item[0])
+        logger.warning(
+            f"🧠 Worker {worker.slot} (pid {worker.pid}) uses {uss / 2**20:.0f}MB "
+            f"(limit {self.settings.worker_memory_limit_mb}MB); restarting it gracefully"
+        )
+        self._retire(worker)
+
+    def _retire(self, worker: Worker):
+        worker.retiring_since = time.monotonic()
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _kill_overdue(self):
+        """SIGKILL a los workers que no terminaron dentro de worker_graceful_timeout_seconds"""
+        now = time.monotonic()
+        for worker in self._workers.values():
+            if worker.retiring_since is None or worker.killed:
+                continue
+            if now - worker.retiring_since > self.graceful_timeout:
+                logger.error(f"❌ Worker {worker.slot} (pid {worker.pid}) did not stop in time; killing it")
+                worker.killed = True
+                try:
+                    os.kill(worker.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def _shutdown(self):
+        logger.info(f"🛑 Stopping {len(self._workers)} worker(s)...")
+        for worker in self._workers.values():
+            if worker.retiring_since is None:
+                self._retire(worker)
+
+        while self._workers:
+            self._reap()
+            self._kill_overdue()
+            time.sleep(0.1)
+
+        if self._socket is not None:
+            self._socket.close()
+        if self._temporary_metrics_dir is not None:
+            shutil.rmtree(self._temporary_metrics_dir, ignore_errors=True)
+        logger.info("✓ All workers stopped")
+
+
+def serve(workers: Optional[int] = None):
+    """
+    Corre la app con workers pre-forkeados.
+
+    Args:
+        workers: Cantidad de workers (por defecto settings.workers)
+    """
+    PreforkServer(get_settings(), workers).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WhatsApp Bot Template con workers pre-forkeados")
+    parser.add_argument("--workers", type=int, help="Cantidad de workers (default: WORKERS)")
+    parser.add_argument("--host", help="Default: HOST")
+    parser.add_argument("--port", type=int, help="Default: PORT")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if args.host:
+        settings.host = args.host
+    if args.port:
+        settings.port = args.port
+
+    serve(args.workers)
@@ -0,0 +1,19 @@
+"""
+Utilidades para números de teléfono de WhatsApp.
+"""
+import re
+
+_NON_DIGITS = re.compile(r"[^\d+]")
+
+
+def normalize_phone_number(number: str) -> str:
+    """
+    Normaliza un número para usarlo como clave de búsqueda.
+
+    Quita el prefijo "whatsapp:", espacios, guiones y paréntesis.
+    Ej: "whatsapp:+1 (415) 523-8886" -> "+14155238886"
+    """
+    number = number.strip()
+    if number.lower().startswith("whatsapp:"):
+        number = number[len("whatsapp:"):]
+    return _NON_DIGITS.sub("", number)
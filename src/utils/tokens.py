@@ -0,0 +1,15 @@
+"""
+Estimación rápida de tokens.
+
+No depende del tokenizer de cada provider: usa la aproximación de
+~4 caracteres por token, suficiente para presupuestar prompts.
+"""
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estima la cantidad de tokens de un texto"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -0,0 +1,68 @@
+"""
+Fixtures compartidas de los tests.
+
+Los providers y el cliente de Twilio usan los pools de
+src.infrastructure.http_client: en los tests cada pool se reemplaza por un
+cliente httpx con MockTransport (un endpoint falso local, sin red).
+Los repositorios usan una base SQLite temporal por test.
+"""
+from typing import Any, AsyncIterator, Callable
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from src.core.config import ClientConfig
+from src.infrastructure import http_client
+from src.infrastructure.database.session import dispose_engines
+
+
+@pytest_asyncio.fixture
+async def mock_http() -> AsyncIterator[Callable[[str, Callable], httpx.AsyncClient]]:
+    """
+    Instala un endpoint falso en un pool compartido: mock_http("gemini", handler).
+
+    handler recibe el httpx.Request y devuelve un httpx.Response (puede ser async).
+    """
+    installed = []
+
+    def install(name: str, handler: Callable) -> httpx.AsyncClient:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        http_client._clients[name] = client
+        installed.append((name, client))
+        return client
+
+    yield install
+
+    for name, client in installed:
+        if http_client._clients.get(name) is client:
+            del http_client._clients[name]
+        await client.aclose()
+
+
+@pytest_asyncio.fixture
+async def database_url(tmp_path) -> AsyncIterator[str]:
+    """URL de una base SQLite nueva (el esquema se crea en el primer uso)"""
+    yield f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}"
+    await dispose_engines()
+
+
+@pytest.fixture
+def make_client_config() -> Callable[..., ClientConfig]:
+    """Crea un ClientConfig mínimo; los kwargs pisan los campos"""
+
+    def make(client_id: str = "test_client", **fields: Any) -> ClientConfig:
+        config = {
+            "client_id": client_id,
+            "client_name": "Test Client",
+            "plan": "basic",
+            "features": {},
+            "personality": {},
+            "messaging_config": {},
+            "ai_provider": "fake",
+            "ai_config": {},
+            **fields,
+        }
+        return ClientConfig(**config)
+
+    return make
@@ -0,0 +1,232 @@
+"""
+Tests de BurstCoalescer (leading edge con reinicio, por cliente + teléfono).
+"""
+import asyncio
+
+import pytest
+
+from src.core.exceptions import RateLimitError
+from src.domain.services.burst_coalescer import BurstCoalescer
+from src.domain.services.message_pipeline import enforce_rate_limits
+from src.infrastructure.cache.rate_limiter import get_rate_limiter
+
+KEY = ("test_client", "+5491100000000")
+DEBOUNCE = 0.5
+GENERATION = 0.1
+
+
+class Recorder:
+    """run() que registra cada generación: cuándo arranca, con qué texto y si se canceló"""
+
+    def __init__(self, name: str = "run", delay: float = GENERATION, seal_after: float = None):
+        self.name = name
+        self.delay = delay
+        self.seal_after = seal_after
+        self.calls = []
+        self.started_at = []
+        self.cancelled = 0
+
+    async def __call__(self, burst):
+        self.calls.append(burst.text)
+        self.started_at.append(asyncio.get_running_loop().time())
+        try:
+            if self.seal_after is not None:
+                await asyncio.sleep(self.seal_after)
+                # Empieza a enviar: ya no se puede reiniciar
+                burst.seal()
+                await asyncio.sleep(self.delay - self.seal_after)
+            else:
+                await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"{self.name}: {burst.text}"
+
+
+async def submit_after(coalescer, delay, message, run, **kwargs):
+    await asyncio.sleep(delay)
+    kwargs.setdefault("debounce_seconds", DEBOUNCE)
+    return await coalescer.submit(KEY, message, run, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_a_single_message_is_answered_without_delay():
+    coalescer = BurstCoalescer()
+    run = Recorder(delay=0)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    result = await coalescer.submit(KEY, "hola", run, debounce_seconds=5)
+
+    assert loop.time() - started < 0.05
+    assert result.superseded is False
+    assert result.value == "run: hola"
+    assert run.calls == ["hola"]
+
+
+@pytest.mark.asyncio
+async def test_messages_during_generation_restart_it_with_the_combined_turn():
+    coalescer = BurstCoalescer()
+    run = Recorder()
+
+    results = await asyncio.gather(
+        submit_after(coalescer, 0, "hola", run),
+        submit_after(coalescer, 0.02, "quería saber", run),
+        submit_after(coalescer, 0.04, "si abren el domingo", run),
+    )
+
+    # Cada mensaje arranca de inmediato y cancela la generación anterior
+    assert run.calls == ["hola", "hola\nquería saber", "hola\nquería saber\nsi abren el domingo"]
+    assert run.cancelled == 2
+    assert [r.superseded for r in results] == [True, True, False]
+    assert results[-1].value == "run: hola\nquería saber\nsi abren el domingo"
+    assert results[-1].message_count == 3
+    assert coalescer.stats() == {"bursts": 1, "coalesced": 2, "restarts": 2, "open_bursts": 0}
+
+
+@pytest.mark.asyncio
+async def test_message_after_the_reply_opens_a_new_burst():
+    coalescer = BurstCoalescer()
+    run = Recorder(delay=0.02)
+
+    first, second = await asyncio.gather(
+        submit_after(coalescer, 0, "primero", run),
+        submit_after(coalescer, 0.15, "segundo", run),
+    )
+
+    assert (first.value, second.value) == ("run: primero", "run: segundo")
+    assert run.cancelled == 0
+
+
+@pytest.mark.asyncio
+async def test_a_sealed_reply_is_not_restarted_and_the_next_waits_for_it():
+    coalescer = BurstCoalescer()
+    run = Recorder(delay=0.2, seal_after=0.01)
+
+    first, second = await asyncio.gather(
+        submit_after(coalescer, 0, "primero", run),
+        # Llega con la primera respuesta ya enviándose
+        submit_after(coalescer, 0.08, "segundo", run),
+    )
+
+    assert first.superseded is False
+    assert first.value == "run: primero"
+    assert second.value == "run: segundo"
+    assert run.calls == ["primero", "segundo"]
+    assert run.cancelled == 0
+    # La segunda generación empieza cuando termina la primera
+    assert run.started_at[1] - run.started_at[0] >= 0.19
+
+
+@pytest.mark.asyncio
+async def test_message_after_the_debounce_gap_opens_a_new_burst():
+    coalescer = BurstCoalescer()
+    run = Recorder(delay=0.2)
+
+    first, second = await asyncio.gather(
+        submit_after(coalescer, 0, "primero", run, debounce_seconds=0.05),
+        submit_after(coalescer, 0.1, "segundo", run, debounce_seconds=0.05),
+    )
+
+    assert (first.value, second.value) == ("run: primero", "run: segundo")
+    assert run.cancelled == 0
+
+
+@pytest.mark.asyncio
+async def test_max_wait_and_max_messages_stop_the_restarts():
+    coalescer = BurstCoalescer()
+    run = Recorder(delay=0.3)
+
+    await asyncio.gather(*[
+        submit_after(coalescer, i * 0.05, f"m{i}", run, max_wait_seconds=0.125, max_messages=10)
+        for i in range(4)
+    ])
+    # m3 llegó a los 0.15s del primero: abre otra ráfaga
+    assert run.calls[-2:] == ["m0\nm1\nm2", "m3"]
+
+    run = Recorder(delay=0.3)
+    await asyncio.gather(*[
+        submit_after(coalescer, i * 0.05, f"m{i}", run, max_messages=2)
+        for i in range(3)
+    ])
+    assert run.calls[-2:] == ["m0\nm1", "m2"]
+
+
+@pytest.mark.asyncio
+async def test_burst_uses_the_run_of_its_last_message():
+    coalescer = BurstCoalescer()
+    first_run, last_run = Recorder("first"), Recorder("last")
+
+    results = await asyncio.gather(
+        submit_after(coalescer, 0, "a", first_run),
+        submit_after(coalescer, 0.01, "b", last_run),
+    )
+
+    assert first_run.cancelled == 1
+    assert last_run.calls == ["a\nb"]
+    assert results[-1].value == "last: a\nb"
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_last_waiter_cancels_the_burst():
+    coalescer = BurstCoalescer()
+    run = Recorder()
+
+    task = asyncio.create_task(coalescer.submit(KEY, "hola", run, debounce_seconds=DEBOUNCE))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # Un mensaje posterior abre una ráfaga nueva en lugar de sumarse a la cancelada
+    result = await coalescer.submit(KEY, "sigo acá", run, debounce_seconds=DEBOUNCE)
+
+    assert run.cancelled == 1
+    assert run.calls == ["hola", "sigo acá"]
+    assert result.value == "run: sigo acá"
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_the_answering_message():
+    coalescer = BurstCoalescer()
+
+    async def failing(burst):
+        await asyncio.sleep(GENERATION)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(
+        submit_after(coalescer, 0, "a", failing),
+        submit_after(coalescer, 0.01, "b", failing),
+        return_exceptions=True,
+    )
+
+    assert results[0].superseded is True
+    assert isinstance(results[1], RuntimeError)
+
+
+@pytest.mark.asyncio
+async def test_a_restarted_burst_counts_as_a_single_rate_limit_hit(make_client_config):
+    get_rate_limiter.cache_clear()
+    client_config = make_client_config(rate_limits={"messages_per_minute": 1})
+    coalescer = BurstCoalescer()
+
+    # Como coalesce_reply: el rate limit se aplica una vez por ráfaga
+    async def run(burst):
+        if not burst.admitted:
+            await enforce_rate_limits(client_config, KEY[1])
+            burst.admitted = True
+        await asyncio.sleep(GENERATION)
+        return burst.text
+
+    try:
+        results = await asyncio.gather(*[
+            submit_after(coalescer, i * 0.01, f"m{i}", run) for i in range(3)
+        ])
+        assert results[-1].value == "m0\nm1\nm2"
+        assert coalescer.stats()["restarts"] == 2
+
+        # La ráfaga siguiente sí excede el límite de 1 por minuto
+        with pytest.raises(RateLimitError):
+            await coalescer.submit(KEY, "otra", run, debounce_seconds=DEBOUNCE)
+    finally:
+        get_rate_limiter.cache_clear()
@@ -0,0 +1,188 @@
+"""
+Tests de ClaudeProvider contra un endpoint falso de /v1/messages.
+"""
+import json
+
+import httpx
+import pytest
+
+from src.core.exceptions import AIServiceError
+from src.features.ai_responses.providers.claude_provider import ANTHROPIC_VERSION, ClaudeProvider
+
+BASE_URL = "http://anthropic.test"
+SYSTEM_PROMPT = " ".join(["Sos el asistente de Restaurante Pepe."] * 20)
+
+
+def make_provider(**config) -> ClaudeProvider:
+    return ClaudeProvider({
+        "api_key": "test-key",
+        "model": "claude-test",
+        "temperature": 0.2,
+        "max_tokens": 128,
+        "base_url": BASE_URL,
+        **config,
+    })
+
+
+def claude_reply(text: str, **usage) -> dict:
+    return {
+        "type": "message",
+        "role": "assistant",
+        "content": [{"type": "text", "text": text}],
+        "usage": {"input_tokens": 0, "output_tokens": 0, **usage},
+    }
+
+
+def install(mock_http, provider: ClaudeProvider, *replies: dict) -> list:
+    """Responde replies en orden y devuelve los bodies recibidos"""
+    payloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url == f"{BASE_URL}/v1/messages"
+        assert request.headers["x-api-key"] == "test-key"
+        assert request.headers["anthropic-version"] == ANTHROPIC_VERSION
+        payloads.append(json.loads(request.content))
+        return httpx.Response(200, json=replies[len(payloads) - 1])
+
+    mock_http(provider.pool_name, handler)
+    return payloads
+
+
+@pytest.mark.asyncio
+async def test_static_system_prompt_is_cached_and_context_is_not(mock_http):
+    provider = make_provider()
+    payloads = install(mock_http, provider, claude_reply("  Abrimos a las 20.  "))
+
+    reply = await provider.generate_response(
+        "¿a qué hora abren?",
+        SYSTEM_PROMPT,
+        conversation_summary="El usuario preguntó por reservas.",
+        knowledge=["Horario: martes a domingo de 20 a 24."],
+    )
+
+    assert reply == "Abrimos a las 20."
+    payload = payloads[0]
+    assert payload["model"] == "claude-test"
+    assert payload["max_tokens"] == 128
+    assert payload["temperature"] == 0.2
+
+    static_block, context_block = payload["system"]
+    assert static_block == {
+        "type": "text",
+        "text": SYSTEM_PROMPT,
+        "cache_control": {"type": "ephemeral"},
+    }
+    # Lo que cambia en cada turno va después del punto de cache, sin marca
+    assert "cache_control" not in context_block
+    assert "Horario: martes a domingo de 20 a 24." in context_block["text"]
+    assert "El usuario preguntó por reservas." in context_block["text"]
+    assert SYSTEM_PROMPT not in context_block["text"]
+
+
+@pytest.mark.asyncio
+async def test_system_is_a_single_block_without_context(mock_http):
+    provider = make_provider()
+    payloads = install(mock_http, provider, claude_reply("Hola"))
+
+    await provider.generate_response("hola", SYSTEM_PROMPT)
+
+    assert len(payloads[0]["system"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_prompt_caching_can_be_disabled(mock_http):
+    provider = make_provider(prompt_caching=False)
+    payloads = install(mock_http, provider, claude_reply("Hola"))
+
+    await provider.generate_response("hola", SYSTEM_PROMPT)
+
+    assert "cache_control" not in payloads[0]["system"][0]
+
+
+@pytest.mark.asyncio
+async def test_messages_start_with_user_and_alternate_roles(mock_http):
+    provider = make_provider()
+    payloads = install(mock_http, provider, claude_reply("Dale"))
+    history = [
+        {"role": "assistant", "content": "¡Bienvenido!"},
+        {"role": "user", "content": "hola"},
+        {"role": "user", "content": "quería reservar"},
+        {"role": "assistant", "content": "¿Para cuántos?"},
+        {"role": "user", "content": "cuatro"},
+    ]
+
+    await provider.generate_response("para el sábado", SYSTEM_PROMPT, history)
+
+    assert payloads[0]["messages"] == [
+        {"role": "user", "content": "hola\nquería reservar"},
+        {"role": "assistant", "content": "¿Para cuántos?"},
+        {"role": "user", "content": "cuatro\npara el sábado"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_usage_stats_add_up_cache_reads_and_writes(mock_http):
+    provider = make_provider()
+    install(
+        mock_http, provider,
+        # Primer turno: escribe el prefijo en cache
+        claude_reply("Uno", input_tokens=50, cache_creation_input_tokens=1500, output_tokens=20),
+        # Siguientes: lo leen de cache
+        claude_reply("Dos", input_tokens=60, cache_read_input_tokens=1500, output_tokens=30),
+        claude_reply("Tres", input_tokens=40, cache_read_input_tokens=1500, output_tokens=10),
+    )
+
+    for message in ("uno", "dos", "tres"):
+        await provider.generate_response(message, SYSTEM_PROMPT)
+
+    stats = provider.usage_stats()
+    assert stats["requests"] == 3
+    assert stats["input_tokens"] == 150
+    assert stats["cache_creation_input_tokens"] == 1500
+    assert stats["cache_read_input_tokens"] == 3000
+    assert stats["output_tokens"] == 60
+    assert stats["cache_hit_ratio"] == round(3000 / (3000 + 1500 + 150), 3)
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_deltas_and_records_usage(mock_http):
+    provider = make_provider()
+    payloads = []
+    events = [
+        {"type": "message_start", "message": {"usage": {"input_tokens": 30, "cache_read_input_tokens": 1500}}},
+        {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+        {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "Hola, "}},
+        {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "¿qué tal?"}},
+        {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 7}},
+        {"type": "message_stop"},
+    ]
+    body = "".join(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n" for event in events)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payloads.append(json.loads(request.content))
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    mock_http(provider.pool_name, handler)
+
+    chunks = [chunk async for chunk in provider.generate_response_stream("hola", SYSTEM_PROMPT)]
+
+    assert chunks == ["Hola, ", "¿qué tal?"]
+    assert payloads[0]["stream"] is True
+    assert payloads[0]["system"][0]["cache_control"] == {"type": "ephemeral"}
+    stats = provider.usage_stats()
+    assert stats["requests"] == 1
+    assert stats["cache_read_input_tokens"] == 1500
+    assert stats["input_tokens"] == 30
+    assert stats["output_tokens"] == 7
+
+
+@pytest.mark.asyncio
+async def test_http_error_raises_ai_service_error(mock_http):
+    provider = make_provider()
+    mock_http(
+        provider.pool_name,
+        lambda request: httpx.Response(529, json={"type": "error", "error": {"message": "Overloaded"}}),
+    )
+
+    with pytest.raises(AIServiceError, match="HTTP 529: Overloaded"):
+        await provider.generate_response("hola", SYSTEM_PROMPT)
@@ -0,0 +1,90 @@
+"""
+Tests del límite de tamaño de body de ClientResolverMiddleware.
+"""
+from urllib.parse import urlencode
+
+import httpx
+import pytest
+from starlette.types import Receive, Scope, Send
+
+from src.api.middleware.client_resolver import ClientResolverMiddleware
+
+LIMIT = 1024
+
+
+class EchoApp:
+    """App ASGI que responde con el tamaño del body que recibió"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.calls += 1
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": str(len(body)).encode()})
+
+
+@pytest.fixture
+def echo_app():
+    return EchoApp()
+
+
+def client_for(app) -> httpx.AsyncClient:
+    middleware = ClientResolverMiddleware(app, max_body_bytes=LIMIT)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test")
+
+
+def twilio_form(body: str) -> str:
+    return urlencode({"MessageSid": "SM" + "0" * 32, "From": "whatsapp:+5491100000000",
+                      "To": "whatsapp:+14155238886", "Body": body})
+
+
+@pytest.mark.asyncio
+async def test_small_form_reaches_the_app(echo_app):
+    form = twilio_form("hola")
+    async with client_for(echo_app) as client:
+        response = await client.post(
+            "/webhook/whatsapp", content=form,
+            headers={"content-type": "application/x-www-form-urlencoded"}
+        )
+
+    assert response.status_code == 200
+    assert response.text == str(len(form))
+
+
+@pytest.mark.asyncio
+async def test_oversized_content_length_is_rejected(echo_app):
+    async with client_for(echo_app) as client:
+        response = await client.post("/webhook/whatsapp", content=twilio_form("x" * 2 * LIMIT))
+
+    assert response.status_code == 413
+    assert echo_app.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_oversized_chunked_body_is_rejected(echo_app):
+    async def chunks():
+        for _ in range(100):
+            yield b"a" * 512
+
+    async with client_for(echo_app) as client:
+        # Sin Content-Length: el límite se aplica mientras se lee
+        response = await client.post("/webhook/whatsapp", content=chunks())
+
+    assert response.status_code == 413
+    assert echo_app.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_other_paths_are_not_limited(echo_app):
+    async with client_for(echo_app) as client:
+        response = await client.post("/other", content=b"x" * 4 * LIMIT)
+
+    assert response.status_code == 200
+    assert response.text == str(4 * LIMIT)
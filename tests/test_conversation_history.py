@@ -0,0 +1,74 @@
+"""
+Tests de ConversationHistoryStore: ventana de turnos y resumen de los que salen.
+"""
+import pytest
+
+from src.domain.services.conversation_history import ConversationHistoryStore
+from src.infrastructure.cache.history_cache import ConversationHistoryCache
+from src.infrastructure.database.repositories.conversation_repository import ConversationRepository
+
+
+def make_store(database_url: str, max_turns: int = 4) -> ConversationHistoryStore:
+    return ConversationHistoryStore(
+        ConversationHistoryCache(max_turns=max_turns), database_url, summary_max_chars=2000
+    )
+
+
+@pytest.mark.asyncio
+async def test_dropped_turns_are_summarized_when_cached(database_url, make_client_config):
+    client_config = make_client_config(database_url=database_url)
+    store = make_store(database_url)
+
+    await store.get_conversation(client_config, "+549111")
+    store.record_turn(client_config, "+549111", "Hola", "Hola, ¿qué necesitás?")
+    store.record_turn(client_config, "+549111", "Quiero una pizza", "¿De qué gusto?")
+    store.record_turn(client_config, "+549111", "Muzzarella", "Listo, sale en 30 minutos.")
+    await store.flush()
+
+    state = await store.get_conversation(client_config, "+549111")
+    assert [turn["content"] for turn in state.turns] == [
+        "Quiero una pizza", "¿De qué gusto?", "Muzzarella", "Listo, sale en 30 minutos.",
+    ]
+    assert state.summary == "- Usuario: Hola\n- Asistente: Hola, ¿qué necesitás?"
+
+    saved = await ConversationRepository(database_url, client_config.client_id).get_summary("+549111")
+    assert saved == state.summary
+
+
+@pytest.mark.asyncio
+async def test_uncached_conversation_is_loaded_before_recording(database_url, make_client_config):
+    client_config = make_client_config(database_url=database_url)
+    first = make_store(database_url)
+    first.record_turn(client_config, "+549111", "Hola", "Hola, ¿qué necesitás?")
+    first.record_turn(client_config, "+549111", "Quiero una pizza", "¿De qué gusto?")
+    await first.flush()
+
+    # Otro proceso (o el mismo después de desalojarla): la conversación no está en su cache
+    second = make_store(database_url)
+    second.record_turn(client_config, "+549111", "Muzzarella", "Listo, sale en 30 minutos.")
+    await second.flush()
+
+    expected_summary = "- Usuario: Hola\n- Asistente: Hola, ¿qué necesitás?"
+    state = await second.get_conversation(client_config, "+549111")
+    assert [turn["content"] for turn in state.turns][-2:] == ["Muzzarella", "Listo, sale en 30 minutos."]
+    assert state.summary == expected_summary
+
+    # El resumen quedó guardado: un cache vacío lo vuelve a leer de la base
+    third = make_store(database_url)
+    reloaded = await third.get_conversation(client_config, "+549111")
+    assert reloaded.summary == expected_summary
+    assert reloaded.turns == state.turns
+
+
+@pytest.mark.asyncio
+async def test_read_during_load_does_not_lose_the_new_turns(database_url, make_client_config):
+    client_config = make_client_config(database_url=database_url)
+    store = make_store(database_url)
+
+    store.record_turn(client_config, "+549111", "Hola", "¿Qué necesitás?")
+    # Lectura concurrente mientras el turno se registra en background
+    await store.get_conversation(client_config, "+549111")
+    await store.flush()
+
+    state = await store.get_conversation(client_config, "+549111")
+    assert [turn["content"] for turn in state.turns] == ["Hola", "¿Qué necesitás?"]
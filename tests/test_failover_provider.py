@@ -0,0 +1,161 @@
+"""
+Tests de FailoverProvider (failover ante errores y requests hedged).
+"""
+import asyncio
+
+import pytest
+
+from src.core.exceptions import AIServiceError
+from src.features.ai_responses.providers.failover_provider import FailoverProvider, LatencyTracker
+from src.features.ai_responses.providers.fake_provider import FakeProvider
+
+HEDGING = {"initial_delay_seconds": 0.05, "min_delay_seconds": 0.01}
+
+
+def fake(name: str, *script, **config) -> FakeProvider:
+    return FakeProvider({"name": name, "reply": f"{name}: {{message}}", "script": list(script), **config})
+
+
+class CancellationAwareFake(FakeProvider):
+    """FakeProvider que registra si su llamada se canceló"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.cancelled = 0
+
+    async def generate_response(self, *args, **kwargs):
+        try:
+            return await super().generate_response(*args, **kwargs)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+async def collect(stream) -> str:
+    return "".join([chunk async for chunk in stream])
+
+
+@pytest.mark.asyncio
+async def test_primary_answers_when_it_is_fast():
+    primary, secondary = fake("primary"), fake("secondary")
+    chain = FailoverProvider([primary, secondary], HEDGING)
+
+    assert await chain.generate_response("hola", "system") == "primary: hola"
+    assert secondary.calls == 0
+    assert chain.stats()["primary"]["wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_fires_after_the_delay_and_the_loser_is_cancelled():
+    primary = CancellationAwareFake({"name": "primary", "script": [{"delay_seconds": 1.0}]})
+    secondary = fake("secondary", {"delay_seconds": 0.01})
+    chain = FailoverProvider([primary, secondary], HEDGING)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    response = await chain.generate_response("hola", "system")
+
+    elapsed = loop.time() - started
+    assert response == "secondary: hola"
+    # Se lanzó a los 0.05s y no se esperó al primario
+    assert 0.05 <= elapsed < 0.5
+    assert primary.cancelled == 1
+    stats = chain.stats()
+    assert stats["primary"]["hedges"] == 1
+    assert stats["primary"]["cancelled"] == 1
+    assert stats["secondary"]["wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_before_the_delay():
+    primary = fake("primary", {"delay_seconds": 0.02})
+    secondary = fake("secondary")
+    chain = FailoverProvider([primary, secondary], {**HEDGING, "initial_delay_seconds": 0.5})
+
+    assert await chain.generate_response("hola", "system") == "primary: hola"
+    assert secondary.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_hedging_disabled_waits_for_the_primary():
+    primary = fake("primary", {"delay_seconds": 0.1})
+    secondary = fake("secondary")
+    chain = FailoverProvider([primary, secondary], {**HEDGING, "enabled": False})
+
+    assert await chain.generate_response("hola", "system") == "primary: hola"
+    assert secondary.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_fails_over_on_ai_service_error():
+    primary = fake("primary", {"error": "overloaded"})
+    secondary = fake("secondary")
+    chain = FailoverProvider([primary, secondary], {**HEDGING, "initial_delay_seconds": 5})
+
+    assert await chain.generate_response("hola", "system") == "secondary: hola"
+    stats = chain.stats()
+    assert stats["primary"]["failures"] == 1
+    assert stats["secondary"]["wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_raises_when_all_providers_fail():
+    chain = FailoverProvider([
+        fake("primary", {"error": "overloaded"}),
+        fake("secondary", {"error": "timeout"}),
+    ], HEDGING)
+
+    with pytest.raises(AIServiceError) as error:
+        await chain.generate_response("hola", "system")
+
+    assert "All providers failed" in str(error.value)
+    assert "overloaded" in str(error.value)
+    assert "timeout" in str(error.value)
+
+
+@pytest.mark.asyncio
+async def test_stream_is_served_by_the_hedge_and_the_loser_stream_is_closed():
+    primary = fake("primary", {"delay_seconds": 1.0}, chunk_chars=4)
+    secondary = fake("secondary", {"delay_seconds": 0.01}, chunk_chars=4)
+    chain = FailoverProvider([primary, secondary], HEDGING)
+
+    assert await collect(chain.generate_response_stream("hola", "system")) == "secondary: hola"
+    assert chain.stats()["primary"]["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_fails_over_before_the_first_chunk():
+    primary = fake("primary", {"error": "overloaded"})
+    secondary = fake("secondary")
+    chain = FailoverProvider([primary, secondary], HEDGING)
+
+    assert await collect(chain.generate_response_stream("hola", "system")) == "secondary: hola"
+
+
+def test_hedge_delay_follows_recent_latency_percentile():
+    chain = FailoverProvider([fake("primary"), fake("secondary")], {
+        "percentile": 95, "initial_delay_seconds": 3, "min_delay_seconds": 0.2, "max_delay_seconds": 10,
+    })
+    assert chain.hedge_delay(0, "response") == 3
+
+    tracker = chain._latency[(0, "response")]
+    for latency in [0.5] * 19 + [4.0]:
+        tracker.record(latency)
+    assert chain.hedge_delay(0, "response") == 0.5
+
+    for latency in [20.0] * 5:
+        tracker.record(latency)
+    assert chain.hedge_delay(0, "response") == 10
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker(window=5, min_samples=3)
+    tracker.record(1.0)
+    tracker.record(2.0)
+    assert tracker.percentile(50) is None
+
+    for latency in (3.0, 4.0, 5.0, 6.0):
+        tracker.record(latency)
+    # Sólo quedan las últimas 5
+    assert tracker.percentile(100) == 6.0
+    assert tracker.percentile(0) == 2.0
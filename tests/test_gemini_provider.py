@@ -0,0 +1,136 @@
+"""
+Tests de GeminiProvider (transport "http") contra un endpoint falso de Gemini.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.core.exceptions import AIServiceError
+from src.features.ai_responses.providers.gemini_provider import GeminiProvider
+from src.infrastructure.http_client import get_http_client
+
+BASE_URL = "http://gemini.test"
+
+
+def make_provider(**config) -> GeminiProvider:
+    return GeminiProvider({
+        "api_key": "test-key",
+        "model": "gemini-test",
+        "temperature": 0.3,
+        "max_tokens": 64,
+        "base_url": BASE_URL,
+        **config,
+    })
+
+
+def gemini_reply(text: str) -> dict:
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+@pytest.mark.asyncio
+async def test_generate_response_sends_key_and_payload(mock_http):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=gemini_reply("  Hola, ¿en qué te ayudo?  "))
+
+    mock_http("gemini", handler)
+    provider = make_provider()
+
+    reply = await provider.generate_response("hola", "Sos un asistente")
+
+    assert reply == "Hola, ¿en qué te ayudo?"
+    assert len(requests) == 1
+    request = requests[0]
+    assert str(request.url) == f"{BASE_URL}/v1beta/models/gemini-test:generateContent"
+    assert request.headers["x-goog-api-key"] == "test-key"
+    # La API key nunca viaja en la URL
+    assert "key=" not in str(request.url)
+
+    payload = json.loads(request.content)
+    assert payload["generationConfig"] == {"temperature": 0.3, "maxOutputTokens": 64}
+    prompt = payload["contents"][0]["parts"][0]["text"]
+    assert payload["contents"][0]["role"] == "user"
+    assert "Sos un asistente" in prompt
+    assert "hola" in prompt
+
+
+@pytest.mark.asyncio
+async def test_http_error_raises_ai_service_error(mock_http):
+    mock_http("gemini", lambda request: httpx.Response(429, json={"error": {"message": "quota"}}))
+
+    with pytest.raises(AIServiceError, match="HTTP 429: quota"):
+        await make_provider().generate_response("hola", "sistema")
+
+
+@pytest.mark.asyncio
+async def test_empty_candidates_raise(mock_http):
+    mock_http("gemini", lambda request: httpx.Response(200, json={"candidates": []}))
+
+    with pytest.raises(AIServiceError, match="Empty response"):
+        await make_provider().generate_response("hola", "sistema")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_overlap_on_shared_client(mock_http):
+    in_flight = 0
+    max_in_flight = 0
+    release = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        if in_flight == 5:
+            release.set()
+        # Ninguna respuesta sale hasta que las 5 llamadas están en vuelo
+        await asyncio.wait_for(release.wait(), timeout=2)
+        in_flight -= 1
+        return httpx.Response(200, json=gemini_reply("ok"))
+
+    shared = mock_http("gemini", handler)
+    providers = [make_provider(), make_provider(api_key="other-key")]
+
+    replies = await asyncio.gather(*(
+        providers[index % 2].generate_response(f"mensaje {index}", "sistema")
+        for index in range(5)
+    ))
+
+    assert replies == ["ok"] * 5
+    assert max_in_flight == 5
+    # Todos los providers usan el mismo pool (no un cliente por llamada)
+    assert get_http_client("gemini") is shared
+
+
+@pytest.mark.asyncio
+async def test_generate_response_stream_parses_sse(mock_http):
+    requests = []
+    events = [gemini_reply("Hola, "), gemini_reply("soy el "), {"candidates": []}, gemini_reply("bot.")]
+    body = "".join(f"data: {json.dumps(event)}\r\n\r\n" for event in events)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    mock_http("gemini", handler)
+    provider = make_provider()
+
+    chunks = [chunk async for chunk in provider.generate_response_stream("hola", "sistema")]
+
+    assert chunks == ["Hola, ", "soy el ", "bot."]
+    request = requests[0]
+    assert request.url.path == "/v1beta/models/gemini-test:streamGenerateContent"
+    assert request.url.params["alt"] == "sse"
+    assert request.headers["x-goog-api-key"] == "test-key"
+
+
+@pytest.mark.asyncio
+async def test_stream_http_error_raises(mock_http):
+    mock_http("gemini", lambda request: httpx.Response(500, json={"error": {"message": "boom"}}))
+
+    with pytest.raises(AIServiceError, match="HTTP 500: boom"):
+        async for _ in make_provider().generate_response_stream("hola", "sistema"):
+            pass
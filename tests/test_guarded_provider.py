@@ -0,0 +1,274 @@
+"""
+Tests de GuardedProvider: circuit breaker y límite de concurrencia AIMD.
+"""
+import asyncio
+
+import pytest
+
+from src.core.exceptions import AIServiceError
+from src.features.ai_responses.providers import guarded_provider
+from src.features.ai_responses.providers.fake_provider import FakeProvider
+from src.features.ai_responses.providers.guarded_provider import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    AIMDLimit,
+    GuardedProvider,
+)
+
+FAST = {"delay_seconds": 0.005}
+SLOW = {"delay_seconds": 0.1}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def guarded(*script, **config) -> GuardedProvider:
+    return GuardedProvider(FakeProvider({"name": "fake", "script": list(script)}), config)
+
+
+async def call(provider: GuardedProvider) -> str:
+    return await provider.generate_response("hola", "system")
+
+
+@pytest.mark.asyncio
+async def test_circuit_goes_closed_open_half_open_closed():
+    provider = guarded(
+        {"error": "overloaded"}, {"error": "overloaded"}, FAST,
+        circuit_breaker={"failure_threshold": 2, "open_seconds": 0.05},
+    )
+    assert provider.breaker.state == CLOSED
+
+    for _ in range(2):
+        with pytest.raises(AIServiceError, match="overloaded"):
+            await call(provider)
+    assert provider.breaker.state == OPEN
+
+    # Abierto: se rechaza sin llegar al proveedor
+    with pytest.raises(AIServiceError, match="circuit open"):
+        await call(provider)
+    assert provider.provider.calls == 2
+    assert provider.rejected == 1
+
+    await asyncio.sleep(0.06)
+    assert provider.breaker.state == HALF_OPEN
+
+    # La llamada de prueba sale bien y cierra el circuito
+    await call(provider)
+    assert provider.breaker.state == CLOSED
+    assert provider.stats()["times_opened"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_trial_call_reopens_the_circuit():
+    provider = guarded(
+        {"error": "overloaded"},
+        circuit_breaker={"failure_threshold": 1, "open_seconds": 0.05},
+    )
+
+    with pytest.raises(AIServiceError):
+        await call(provider)
+    await asyncio.sleep(0.06)
+    assert provider.breaker.state == HALF_OPEN
+
+    with pytest.raises(AIServiceError, match="overloaded"):
+        await call(provider)
+    assert provider.breaker.state == OPEN
+    assert provider.breaker.times_opened == 2
+
+
+@pytest.mark.asyncio
+async def test_half_open_lets_a_single_trial_call_through():
+    provider = guarded(
+        {"error": "overloaded"}, SLOW,
+        circuit_breaker={"failure_threshold": 1, "open_seconds": 0.05},
+    )
+    with pytest.raises(AIServiceError):
+        await call(provider)
+    await asyncio.sleep(0.06)
+
+    trial = asyncio.create_task(call(provider))
+    await asyncio.sleep(0)
+    with pytest.raises(AIServiceError, match="circuit open"):
+        await call(provider)
+
+    await trial
+    assert provider.breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_while_it_is_used():
+    provider = guarded(FAST, concurrency={"initial_limit": 2})
+
+    for _ in range(10):
+        await asyncio.gather(*[call(provider) for _ in range(int(provider.limit.limit))])
+
+    assert provider.limit.limit > 4
+    assert provider.limit.decreases == 0
+
+
+@pytest.mark.asyncio
+async def test_limit_does_not_grow_while_unused():
+    provider = guarded(FAST, concurrency={"initial_limit": 10})
+
+    for _ in range(20):
+        await call(provider)
+
+    assert provider.limit.limit == 10
+
+
+@pytest.mark.asyncio
+async def test_steady_healthy_demand_above_the_initial_limit_is_never_rejected():
+    provider = guarded({"delay_seconds": 0.03}, concurrency={"initial_limit": 2})
+
+    # ~15 llamadas en vuelo a la vez, sostenido
+    calls = []
+    for _ in range(150):
+        calls.append(asyncio.create_task(call(provider)))
+        await asyncio.sleep(0.002)
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    assert not [r for r in results if isinstance(r, BaseException)]
+    assert provider.rejected == 0
+    assert provider.limit.limit >= 10
+    assert provider.limit.decreases == 0
+
+
+@pytest.mark.asyncio
+async def test_calls_over_max_limit_are_rejected():
+    provider = guarded(SLOW, concurrency={"initial_limit": 2, "max_limit": 2})
+
+    results = await asyncio.gather(*[call(provider) for _ in range(3)], return_exceptions=True)
+
+    rejected = [r for r in results if isinstance(r, AIServiceError)]
+    assert len(rejected) == 1
+    assert "concurrency limit" in str(rejected[0])
+
+
+@pytest.mark.asyncio
+async def test_degraded_provider_sheds_calls_over_the_limit():
+    provider = guarded(
+        *[FAST] * 12, *[{"delay_seconds": 0.2}] * 20,
+        concurrency={"initial_limit": 4},
+    )
+    for _ in range(12):
+        await call(provider)
+    # Latencia sostenida x40: el límite baja a 2 y no crece por demanda
+    for _ in range(3):
+        await call(provider)
+    assert provider.limit.decreases == 1
+
+    results = await asyncio.gather(*[call(provider) for _ in range(4)], return_exceptions=True)
+
+    assert len([r for r in results if isinstance(r, AIServiceError)]) == 2
+    assert provider.rejected == 2
+
+
+@pytest.mark.asyncio
+async def test_an_isolated_error_does_not_shrink_the_limit():
+    provider = guarded(*[FAST] * 15, {"error": "boom"}, *[FAST] * 15, concurrency={"initial_limit": 10})
+
+    for _ in range(31):
+        try:
+            await call(provider)
+        except AIServiceError:
+            pass
+
+    assert provider.limit.decreases == 0
+
+
+@pytest.mark.asyncio
+async def test_a_single_latency_spike_does_not_shrink_the_limit():
+    provider = guarded(*[FAST] * 12, SLOW, *[FAST] * 5, concurrency={"initial_limit": 10})
+
+    for _ in range(18):
+        await call(provider)
+
+    assert provider.limit.decreases == 0
+    assert provider.limit.limit >= 10
+
+
+@pytest.mark.asyncio
+async def test_sustained_latency_shrinks_the_limit_once_per_window():
+    provider = guarded(*[FAST] * 12, *[SLOW] * 4, concurrency={"initial_limit": 10})
+
+    for _ in range(16):
+        await call(provider)
+
+    # 3 lentas de 15 en la ventana ya superan el p90; la ventana se vacía al reducir
+    assert provider.limit.decreases == 1
+    assert provider.limit.limit == pytest.approx(5, abs=0.5)
+
+
+@pytest.mark.asyncio
+async def test_a_burst_of_failures_shrinks_the_limit_once():
+    provider = guarded(
+        *[{"delay_seconds": 0.05}] * 10, *[{"delay_seconds": 0.01, "error": "boom"}] * 4,
+        concurrency={"initial_limit": 10},
+    )
+    for _ in range(10):
+        await call(provider)
+    limit = provider.limit.limit
+
+    # Las 4 fallan juntas, dentro del mismo RTT (~0.05s)
+    results = await asyncio.gather(*[call(provider) for _ in range(4)], return_exceptions=True)
+
+    assert all(isinstance(r, AIServiceError) for r in results)
+    assert provider.limit.decreases == 1
+    assert provider.limit.limit == pytest.approx(limit / 2)
+
+
+def test_aimd_decreases_again_after_an_rtt(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(guarded_provider.time, "monotonic", clock)
+    limit = AIMDLimit(initial_limit=16)
+    for _ in range(10):
+        limit.on_success(1.0)
+
+    # 1 error de 11 no supera error_tolerance (10%); 2 de 12 sí
+    limit.on_failure()
+    assert limit.limit == 16
+    limit.on_failure()
+    assert limit.limit == 8
+    # Dentro del mismo RTT (1s) no se vuelve a reducir
+    clock.now += 0.5
+    limit.on_failure()
+    assert limit.limit == 8
+
+    clock.now += 0.6
+    limit.on_failure()
+    assert limit.limit == 4
+
+    for _ in range(10):
+        limit.on_failure()
+        clock.now += 1.0
+    assert limit.limit == limit.min_limit
+    # Con el proveedor fallando no se crece por demanda
+    limit.in_flight = int(limit.limit)
+    assert limit.try_acquire() is False
+
+
+def test_limit_grows_on_demand_only_when_healthy(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(guarded_provider.time, "monotonic", clock)
+    limit = AIMDLimit(initial_limit=2, max_limit=5)
+
+    assert all(limit.try_acquire() for _ in range(5))
+    assert limit.limit == 5
+    # max_limit es un techo duro
+    assert limit.try_acquire() is False
+
+
+def test_spikes_do_not_enter_the_latency_average():
+    limit = AIMDLimit(warmup_samples=3)
+    for _ in range(3):
+        limit.on_success(1.0)
+
+    limit.on_success(10.0)
+
+    assert limit.latency_ewma == pytest.approx(1.0)
@@ -0,0 +1,163 @@
+"""
+Tests de MessageDeduplicator (claim / complete / release por MessageSid).
+"""
+import pytest
+
+from src.infrastructure.cache import idempotency
+from src.infrastructure.cache.idempotency import (
+    STATE_DONE,
+    STATE_PROCESSING,
+    MessageDeduplicator,
+)
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401
+except ImportError:
+    fakeredis = None
+
+SID = "SM" + "0" * 32
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class BrokenRedis:
+    """Redis caído: toda operación falla"""
+
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def get(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def delete(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+@pytest.fixture(params=[
+    "memory",
+    pytest.param("fakeredis", marks=pytest.mark.skipif(fakeredis is None, reason="fakeredis not installed")),
+])
+def dedup(request):
+    redis = fakeredis.FakeAsyncRedis() if request.param == "fakeredis" else None
+    return MessageDeduplicator(ttl_seconds=60, processing_ttl_seconds=10, redis=redis)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_of_a_completed_message_returns_the_stored_result(dedup):
+    assert await dedup.claim(SID) is None
+    await dedup.complete(SID, {"status": "success", "reply": "Abrimos a las 20"})
+
+    existing = await dedup.claim(SID)
+
+    assert existing.state == STATE_DONE
+    assert existing.result == {"status": "success", "reply": "Abrimos a las 20"}
+    stats = dedup.stats()
+    assert (stats["claimed"], stats["duplicates_completed"], stats["duplicates_suppressed"]) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_while_processing_is_reported_in_progress(dedup):
+    assert await dedup.claim(SID) is None
+
+    existing = await dedup.claim(SID)
+
+    assert existing.state == STATE_PROCESSING
+    assert existing.result is None
+    assert dedup.stats()["duplicates_in_progress"] == 1
+
+
+@pytest.mark.asyncio
+async def test_released_claim_can_be_claimed_again(dedup):
+    assert await dedup.claim(SID) is None
+    await dedup.release(SID)
+
+    # El reintento de Twilio procesa el mensaje
+    assert await dedup.claim(SID) is None
+    assert dedup.stats()["released"] == 1
+    assert dedup.stats()["claimed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_memory_claims_and_results_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(idempotency.time, "monotonic", clock)
+    dedup = MessageDeduplicator(ttl_seconds=60, processing_ttl_seconds=10)
+
+    # Un claim sin completar (worker muerto) vence a los processing_ttl_seconds
+    assert await dedup.claim(SID) is None
+    clock.now += 9
+    assert (await dedup.claim(SID)).state == STATE_PROCESSING
+    clock.now += 2
+    assert await dedup.claim(SID) is None
+
+    # Un resultado se recuerda ttl_seconds
+    await dedup.complete(SID, {"status": "success"})
+    clock.now += 59
+    assert (await dedup.claim(SID)).state == STATE_DONE
+    clock.now += 2
+    assert await dedup.claim(SID) is None
+
+
+@pytest.mark.skipif(fakeredis is None, reason="fakeredis not installed")
+@pytest.mark.asyncio
+async def test_redis_keys_carry_the_ttl():
+    redis = fakeredis.FakeAsyncRedis()
+    dedup = MessageDeduplicator(ttl_seconds=60, processing_ttl_seconds=10, redis=redis)
+    key = f"{idempotency.KEY_PREFIX}:{SID}"
+
+    await dedup.claim(SID)
+    assert 0 < await redis.ttl(key) <= 10
+
+    await dedup.complete(SID, {"status": "success"})
+    assert 10 < await redis.ttl(key) <= 60
+
+    await dedup.release(SID)
+    assert await redis.exists(key) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_registry_is_bounded(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(idempotency.time, "monotonic", clock)
+    dedup = MessageDeduplicator(ttl_seconds=60, processing_ttl_seconds=10, max_entries=3)
+
+    for n in range(5):
+        assert await dedup.claim(f"SM{n:032x}") is None
+        await dedup.complete(f"SM{n:032x}", {"status": "success"})
+
+    assert dedup.stats()["entries"] == 3
+    # Se descartaron los más viejos
+    assert await dedup.claim(f"SM{0:032x}") is None
+    assert (await dedup.claim(f"SM{4:032x}")).state == STATE_DONE
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_dropped_from_the_front(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(idempotency.time, "monotonic", clock)
+    dedup = MessageDeduplicator(ttl_seconds=60, processing_ttl_seconds=10)
+
+    for n in range(3):
+        await dedup.claim(f"SM{n:032x}")
+    clock.now += 11
+    await dedup.claim(SID)
+
+    assert dedup.stats()["entries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_fall_back_to_memory():
+    dedup = MessageDeduplicator(redis=BrokenRedis())
+
+    assert await dedup.claim(SID) is None
+    await dedup.complete(SID, {"status": "success"})
+
+    assert (await dedup.claim(SID)).result == {"status": "success"}
+    assert dedup.stats()["redis_errors"] == 3
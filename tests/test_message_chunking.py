@@ -0,0 +1,158 @@
+"""
+Tests de la división de respuestas en mensajes de WhatsApp.
+"""
+import asyncio
+import random
+
+import pytest
+
+from src.domain.services.message_chunking import (
+    WHATSAPP_MAX_MESSAGE_CHARS,
+    SegmentSender,
+    SentenceSegmenter,
+    split_message,
+)
+from src.features.ai_responses.providers.fake_provider import FakeProvider
+
+
+def sentences(count: int, words: int = 12) -> str:
+    return " ".join(
+        " ".join(f"palabra{i}_{j}" for j in range(words)) + "." for i in range(count)
+    )
+
+
+def feed_all(segmenter: SentenceSegmenter, text: str, chunk_chars: int):
+    segments = []
+    for start in range(0, len(text), chunk_chars):
+        segments.extend(segmenter.feed(text[start:start + chunk_chars]))
+    segments.extend(segmenter.flush())
+    return segments
+
+
+def test_first_segment_is_emitted_at_the_first_sentence_end():
+    segmenter = SentenceSegmenter(first_segment_min_chars=10)
+
+    assert segmenter.feed("Hola, ") == []
+    assert segmenter.feed("¿cómo") == []
+    # El fin de oración exige el espacio siguiente
+    assert segmenter.feed(" estás?") == []
+    assert segmenter.feed(" Te cuento") == ["Hola, ¿cómo estás?"]
+    assert segmenter.feed(" que abrimos. El resto") == []
+    assert segmenter.flush() == ["Te cuento que abrimos. El resto"]
+
+
+def test_short_sentences_wait_for_first_segment_min_chars():
+    segmenter = SentenceSegmenter(first_segment_min_chars=20)
+
+    assert segmenter.feed("Sí. Abrimos el domingo. ") == ["Sí. Abrimos el domingo."]
+
+
+def test_decimal_points_are_not_sentence_ends():
+    segmenter = SentenceSegmenter(first_segment_min_chars=5)
+
+    assert segmenter.feed("Cuesta 3.5 dólares") == []
+    assert segmenter.flush() == ["Cuesta 3.5 dólares"]
+
+
+def test_segments_are_capped_at_whatsapp_limit_and_cut_on_sentence_ends():
+    text = sentences(80)
+    assert len(text) > 3 * WHATSAPP_MAX_MESSAGE_CHARS
+
+    segments = feed_all(SentenceSegmenter(), text, chunk_chars=37)
+
+    assert all(len(segment) <= WHATSAPP_MAX_MESSAGE_CHARS for segment in segments)
+    assert all(segment.endswith(".") for segment in segments)
+    assert " ".join(segments) == text
+
+
+def test_segmenter_caps_text_without_sentence_ends():
+    text = "x" * (WHATSAPP_MAX_MESSAGE_CHARS * 2 + 10)
+
+    segments = feed_all(SentenceSegmenter(), text, chunk_chars=100)
+
+    assert [len(segment) for segment in segments] == [1600, 1600, 10]
+
+
+def test_split_message_prefers_sentence_then_space():
+    assert split_message("Primera oración. Segunda oración.", max_chars=20) == [
+        "Primera oración.", "Segunda oración."
+    ]
+    assert split_message("una dos tres cuatro", max_chars=9) == ["una dos", "tres", "cuatro"]
+    assert split_message("abcdefghij", max_chars=4) == ["abcd", "efgh", "ij"]
+    assert split_message("   ") == []
+
+
+def test_split_message_never_exceeds_the_cap():
+    rng = random.Random(7)
+    alphabet = "abc de. f!\ng?"
+    for _ in range(200):
+        max_chars = rng.randint(1, 60)
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 400)))
+
+        parts = split_message(text, max_chars)
+
+        assert all(0 < len(part) <= max_chars for part in parts)
+        # No se pierde texto (sólo espacios en los cortes)
+        assert "".join(parts).replace(" ", "").replace("\n", "") == (
+            text.replace(" ", "").replace("\n", "")
+        )
+
+
+@pytest.mark.asyncio
+async def test_segment_sender_delivers_in_order_without_blocking_the_stream():
+    provider = FakeProvider({
+        "reply": "Primera oración del bot. Segunda oración. Tercera oración. Cuarta y última.",
+        "first_token_delay_seconds": 0.01,
+        "chunk_chars": 7,
+        "chunk_delay_seconds": 0.005,
+    })
+    # Envíos lentos y desparejos: el primero es el más lento
+    delays = [0.2, 0.01, 0.03, 0.0]
+    sent = []
+
+    async def send(segment):
+        await asyncio.sleep(delays[len(sent) % len(delays)])
+        sent.append(segment)
+
+    sender = SegmentSender(send)
+    segmenter = SentenceSegmenter(max_chars=30, first_segment_min_chars=10)
+    submitted = []
+
+    async for delta in provider.generate_response_stream("hola", "system"):
+        for segment in segmenter.feed(delta):
+            submitted.append(segment)
+            await sender.submit(segment)
+    for segment in segmenter.flush():
+        submitted.append(segment)
+        await sender.submit(segment)
+
+    # El stream terminó sin esperar al primer envío
+    assert sent == []
+    await sender.close()
+
+    assert sent == submitted
+    assert sent == [
+        "Primera oración del bot.",
+        "Segunda oración.",
+        "Tercera oración.",
+        "Cuarta y última.",
+    ]
+    assert sender.sent == 4
+
+
+@pytest.mark.asyncio
+async def test_segment_sender_keeps_going_after_a_failed_send():
+    sent = []
+
+    async def send(segment):
+        if segment == "b":
+            raise RuntimeError("twilio down")
+        sent.append(segment)
+
+    sender = SegmentSender(send)
+    for segment in "abc":
+        await sender.submit(segment)
+    await sender.close()
+
+    assert sent == ["a", "c"]
+    assert sender.sent == 2
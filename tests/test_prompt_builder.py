@@ -0,0 +1,81 @@
+"""
+Tests de PromptAssembler (presupuesto de tokens del historial y el resumen).
+"""
+from src.features.ai_responses.prompt_builder import PromptAssembler
+from src.utils.tokens import estimate_tokens
+
+# 40 caracteres = 10 tokens
+SYSTEM_PROMPT = "Sos el asistente de Restaurante Pepe....."
+MESSAGE = "hola"
+
+
+def turn(i: int) -> dict:
+    # 38 caracteres = 10 tokens (+2 por turno)
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"turno {i}".ljust(38, ".")}
+
+
+def history(count: int) -> list:
+    return [turn(i) for i in range(count)]
+
+
+def budget_for(turns: int) -> int:
+    """max_input_tokens en el que entran justo system prompt, mensaje y turns turnos"""
+    return estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(MESSAGE) + turns * 12
+
+
+def test_history_that_exactly_fits_is_kept_whole():
+    assembler = PromptAssembler({"max_input_tokens": budget_for(4)})
+
+    prompt = assembler.assemble(MESSAGE, SYSTEM_PROMPT, history(4))
+
+    assert prompt.history == history(4)
+    assert prompt.summary is None
+    assert prompt.estimated_tokens == budget_for(4)
+
+
+def test_history_that_overflows_is_folded_into_the_summary():
+    assembler = PromptAssembler({"max_input_tokens": budget_for(4), "summary_token_budget": 30})
+
+    prompt = assembler.assemble(MESSAGE, SYSTEM_PROMPT, history(5))
+
+    # Reservar 30 tokens para el resumen deja lugar para un solo turno
+    assert prompt.history == history(5)[-1:]
+    # El resumen conserva lo más reciente de lo que no entró
+    assert "turno 3" in prompt.summary
+    assert "turno 0" not in prompt.summary
+    assert len(prompt.summary) <= 30 * 4
+    assert prompt.estimated_tokens <= budget_for(4)
+
+
+def test_existing_summary_reserves_its_budget():
+    assembler = PromptAssembler({"max_input_tokens": budget_for(4), "summary_token_budget": 20})
+
+    prompt = assembler.assemble(MESSAGE, SYSTEM_PROMPT, history(4), conversation_summary="- Usuario: reservó")
+
+    # Sin resumen el historial entraba justo; con él quedan 28 tokens (2 turnos)
+    assert prompt.history == history(4)[-2:]
+    assert "turno 1" in prompt.summary
+    assert prompt.estimated_tokens <= budget_for(4)
+
+
+def test_static_prefix_larger_than_the_budget_keeps_the_prefix_and_drops_history():
+    system_prompt = "Carta completa del restaurante. " * 20
+    assembler = PromptAssembler({"max_input_tokens": 64})
+
+    prompt = assembler.assemble(MESSAGE, system_prompt, history(3))
+
+    # El prefijo estático no se recorta: el historial pasa entero al resumen
+    assert prompt.system_prompt == system_prompt.strip()
+    assert prompt.history == []
+    assert "turno 2" in prompt.summary
+    assert prompt.message == MESSAGE
+
+
+def test_knowledge_passages_stop_at_their_budget():
+    passages = ["a" * 36, "b" * 36, "c" * 36]
+    assembler = PromptAssembler({"knowledge_token_budget": 15})
+
+    prompt = assembler.assemble(MESSAGE, SYSTEM_PROMPT, knowledge=passages)
+
+    # 10 tokens (+1) por pasaje: entra uno
+    assert prompt.knowledge == passages[:1]
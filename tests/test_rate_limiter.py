@@ -0,0 +1,168 @@
+"""
+Tests de los backends de rate limiting (InMemoryRateLimiter y RedisRateLimiter).
+
+RedisRateLimiter corre contra fakeredis si está instalado (con lupa para el
+script Lua) y, si no, contra un Redis falso cuyo script reproduce el Lua.
+"""
+from typing import Any, Dict, List
+
+import pytest
+
+from src.infrastructure.cache import rate_limiter
+from src.infrastructure.cache.rate_limiter import (
+    InMemoryRateLimiter,
+    RateLimitRule,
+    RedisRateLimiter,
+)
+
+WINDOW = 60
+# Inicio exacto de una ventana de 60s
+START = 1_000_020.0
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  (fakeredis lo necesita para EVAL)
+except ImportError:
+    fakeredis = None
+
+
+class Clock:
+    def __init__(self):
+        self.now = START
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class StubRedis:
+    """Redis falso: register_script devuelve el script Lua portado a Python"""
+
+    def __init__(self):
+        self.values: Dict[str, int] = {}
+        self.ttls: Dict[str, int] = {}
+
+    def register_script(self, script: str):
+        assert script == rate_limiter._SLIDING_WINDOW_SCRIPT
+
+        async def run(keys: List[str], args: List[Any]):
+            now = float(args[0])
+            count = (len(args) - 1) // 2
+
+            for i in range(1, count + 1):
+                limit, window = int(args[2 * i - 1]), int(args[2 * i])
+                current = self.values.get(keys[2 * i - 2], 0)
+                previous = self.values.get(keys[2 * i - 1], 0)
+                elapsed = (now % window) / window
+                if previous * (1 - elapsed) + current + 1 > limit:
+                    return [0, i, str(window - (now % window)).encode()]
+
+            for i in range(1, count + 1):
+                window = int(args[2 * i])
+                self.values[keys[2 * i - 2]] = self.values.get(keys[2 * i - 2], 0) + 1
+                self.ttls[keys[2 * i - 2]] = window * 2
+
+            return [1, 0, b"0"]
+
+        return run
+
+
+@pytest.fixture(params=[
+    "memory",
+    "redis_stub",
+    pytest.param("fakeredis", marks=pytest.mark.skipif(fakeredis is None, reason="fakeredis[lua] not installed")),
+])
+def limiter(request, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "time", clock)
+
+    if request.param == "memory":
+        backend = InMemoryRateLimiter()
+    elif request.param == "redis_stub":
+        backend = RedisRateLimiter(StubRedis())
+    else:
+        backend = RedisRateLimiter(fakeredis.FakeAsyncRedis())
+    backend.clock = clock
+    return backend
+
+
+async def hits(limiter, rules, count: int) -> List[bool]:
+    return [(await limiter.hit(rules)).allowed for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_rejects_at_the_limit_without_consuming_quota(limiter):
+    rule = RateLimitRule("client:+549", 3, WINDOW)
+    limiter.clock.now += 15
+
+    assert await hits(limiter, [rule], 3) == [True, True, True]
+
+    decision = await limiter.hit([rule])
+    assert decision.allowed is False
+    assert decision.rule == rule
+    assert decision.retry_after == pytest.approx(45)
+
+    # Un mensaje rechazado no cuenta: otra clave con el mismo límite no se ve afectada
+    assert await hits(limiter, [RateLimitRule("client:+550", 3, WINDOW)], 3) == [True, True, True]
+
+
+@pytest.mark.asyncio
+async def test_previous_window_weighs_in_across_the_boundary(limiter):
+    rule = RateLimitRule("client:+549", 4, WINDOW)
+    assert await hits(limiter, [rule], 4) == [True] * 4
+
+    # Recién empezada la ventana siguiente, la anterior pesa entera
+    limiter.clock.now = START + WINDOW
+    assert (await limiter.hit([rule])).allowed is False
+
+    # A mitad de ventana pesa la mitad (2): entran 2 más
+    limiter.clock.now = START + WINDOW * 1.5
+    assert await hits(limiter, [rule], 3) == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_old_hits_expire_after_two_windows(limiter):
+    rule = RateLimitRule("client:+549", 2, WINDOW)
+    assert await hits(limiter, [rule], 3) == [True, True, False]
+
+    limiter.clock.now = START + WINDOW * 2
+    assert await hits(limiter, [rule], 3) == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_a_rejected_rule_does_not_count_in_the_others(limiter):
+    per_user = RateLimitRule("client:+549", 1, WINDOW)
+    per_client = RateLimitRule("client", 2, WINDOW)
+
+    assert (await limiter.hit([per_user, per_client])).allowed is True
+    decision = await limiter.hit([per_user, per_client])
+    assert decision.allowed is False
+    assert decision.rule == per_user
+
+    # per_client sólo contó el primer mensaje
+    assert await hits(limiter, [RateLimitRule("client:+550", 1, WINDOW), per_client], 2) == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_redis_keys_expire_after_two_windows(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "time", Clock())
+    redis = StubRedis()
+    limiter = RedisRateLimiter(redis, prefix="rl")
+
+    await limiter.hit([RateLimitRule("client:+549", 5, WINDOW)])
+
+    index = int(START // WINDOW)
+    assert redis.values == {f"rl:client:+549:{WINDOW}:{index}": 1}
+    assert redis.ttls == {f"rl:client:+549:{WINDOW}:{index}": WINDOW * 2}
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_bounds_its_keys(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "time", Clock())
+    limiter = InMemoryRateLimiter(max_keys=3)
+
+    for n in range(5):
+        await limiter.hit([RateLimitRule(f"user{n}", 1, WINDOW)])
+
+    assert len(limiter._windows) == 3
+    # Las claves más viejas se descartaron
+    assert (await limiter.hit([RateLimitRule("user0", 1, WINDOW)])).allowed is True
@@ -0,0 +1,216 @@
+"""
+Tests de ResponseCache (memoria + Redis) con un Redis falso en memoria.
+"""
+import asyncio
+import fnmatch
+
+import pytest
+
+from src.infrastructure.cache import response_cache
+from src.infrastructure.cache.response_cache import LocalTTLCache, ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """Lo que ResponseCache usa de redis.asyncio: get, set con px, pttl, scan_iter, unlink"""
+
+    def __init__(self, clock: Clock):
+        self.clock = clock
+        self.data = {}
+        self.gets = 0
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+            del self.data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        self.gets += 1
+        entry = self._live(key)
+        return None if entry is None else entry[0].encode("utf-8")
+
+    async def pttl(self, key):
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return int((entry[1] - self.clock()) * 1000)
+
+    async def set(self, key, value, ex=None, px=None):
+        # Como Redis: un expire de 0 es un error
+        if (ex is not None and ex <= 0) or (px is not None and px <= 0):
+            raise ValueError("invalid expire time in 'set' command")
+        if px is not None:
+            ex = px / 1000
+        self.data[key] = (value, self.clock() + ex if ex else None)
+
+    async def scan_iter(self, match="*", count=None):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key.encode("utf-8")
+
+    async def unlink(self, *keys):
+        for key in keys:
+            self.data.pop(key.decode("utf-8") if isinstance(key, bytes) else key, None)
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def redis(clock):
+    return FakeRedis(clock)
+
+
+async def drain_background_tasks():
+    current = asyncio.current_task()
+    await asyncio.gather(*(task for task in asyncio.all_tasks() if task is not current))
+
+
+def test_equivalent_questions_share_a_key():
+    key = ResponseCache.make_key("pepe", "¿Cuál es el HORARIO?", "v1")
+
+    assert ResponseCache.make_key("pepe", "cual es el horario", "v1") == key
+    assert ResponseCache.make_key("otro", "cual es el horario", "v1") != key
+
+
+@pytest.mark.asyncio
+async def test_local_hit(clock):
+    cache = ResponseCache(LocalTTLCache(), default_ttl=60)
+    key = ResponseCache.make_key("pepe", "horario", "v1")
+
+    assert await cache.get(key) is None
+    await cache.set(key, "De 9 a 18")
+
+    assert await cache.get(key) == "De 9 a 18"
+    assert cache.stats()["local_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_hit_fills_local_tier(clock, redis):
+    writer = ResponseCache(LocalTTLCache(), redis=redis, default_ttl=60)
+    reader = ResponseCache(LocalTTLCache(), redis=redis, default_ttl=60)
+    key = ResponseCache.make_key("pepe", "horario", "v1")
+
+    await writer.set(key, "De 9 a 18")
+
+    # Otro worker: no lo tiene en memoria, lo trae de Redis
+    assert await reader.get(key) == "De 9 a 18"
+    assert reader.stats()["redis_hits"] == 1
+
+    # La segunda lectura sale de memoria, sin ir a Redis
+    gets = redis.gets
+    assert await reader.get(key) == "De 9 a 18"
+    assert redis.gets == gets
+    assert reader.stats()["local_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_hit_fills_local_tier_with_the_remaining_ttl(clock, redis):
+    writer = ResponseCache(LocalTTLCache(), redis=redis, default_ttl=60)
+    reader = ResponseCache(LocalTTLCache(), redis=redis, default_ttl=60)
+    key = ResponseCache.make_key("pepe", "horario", "v1")
+    await writer.set(key, "De 9 a 18", ttl=30)
+
+    clock.now += 20
+    assert await reader.get(key) == "De 9 a 18"
+
+    # Vence en memoria junto con Redis (a los 30s), no 60s después de la lectura
+    clock.now += 9
+    assert await reader.get(key) == "De 9 a 18"
+    clock.now += 2
+    assert await reader.get(key) is None
+
+
+@pytest.mark.asyncio
+async def test_sub_second_ttl_is_stored_in_milliseconds(clock, redis):
+    cache = ResponseCache(LocalTTLCache(), redis=redis, default_ttl=60)
+    key = ResponseCache.make_key("pepe", "horario", "v1")
+
+    await cache.set(key, "De 9 a 18", ttl=0.5)
+
+    assert cache.stats()["redis_errors"] == 0
+    assert await redis.pttl(key) == 500
+    clock.now += 0.6
+    assert await redis.get(key) is None
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_ttl(clock, redis):
+    cache = ResponseCache(LocalTTLCache(), redis=redis, default_ttl=60)
+    key = ResponseCache.make_key("pepe", "horario", "v1")
+    await cache.set(key, "De 9 a 18", ttl=30)
+
+    clock.now += 29
+    assert await cache.get(key) == "De 9 a 18"
+
+    clock.now += 2
+    assert await cache.get(key) is None
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_config_version_change_misses_old_entry(clock, redis, make_client_config):
+    before = make_client_config("pepe", personality={"tone": "formal"})
+    after = make_client_config("pepe", personality={"tone": "casual"})
+    assert before.config_version != after.config_version
+
+    cache = ResponseCache(LocalTTLCache(), redis=redis, default_ttl=60)
+    await cache.set(ResponseCache.make_key("pepe", "horario", before.config_version), "Respuesta vieja")
+
+    assert await cache.get(ResponseCache.make_key("pepe", "horario", after.config_version)) is None
+    assert await cache.get(ResponseCache.make_key("pepe", "horario", before.config_version)) == "Respuesta vieja"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_client_removes_local_and_redis_entries(clock, redis):
+    cache = ResponseCache(LocalTTLCache(), redis=redis, default_ttl=60)
+    pepe_keys = [ResponseCache.make_key("pepe", question, "v1") for question in ("horario", "menu")]
+    other_key = ResponseCache.make_key("gomez", "horario", "v1")
+    for key in pepe_keys + [other_key]:
+        await cache.set(key, "respuesta")
+
+    cache.invalidate_client("pepe")
+    await drain_background_tasks()
+
+    assert len(cache.local) == 1
+    assert set(redis.data) == {other_key}
+    for key in pepe_keys:
+        assert await cache.get(key) is None
+    assert await cache.get(other_key) == "respuesta"
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_degrade_to_local_cache(clock):
+    class BrokenRedis(FakeRedis):
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+        async def set(self, key, value, ex=None, px=None):
+            raise ConnectionError("redis down")
+
+    cache = ResponseCache(LocalTTLCache(), redis=BrokenRedis(clock), default_ttl=60)
+    key = ResponseCache.make_key("pepe", "horario", "v1")
+
+    assert await cache.get(key) is None
+    await cache.set(key, "De 9 a 18")
+    assert await cache.get(key) == "De 9 a 18"
+    assert cache.stats()["redis_errors"] == 2
@@ -0,0 +1,162 @@
+"""
+Tests de SpoolWorkerPool: reintentos con backoff y mensajes muertos.
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from src.infrastructure.messaging.spool import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_PROCESSING,
+    MessageSpool,
+    SpooledMessage,
+)
+from src.infrastructure.messaging.worker_pool import SpoolWorkerPool
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = MessageSpool(str(tmp_path / "spool.db"))
+    spool.open()
+    yield spool
+    spool.close()
+
+
+def message(sid: str) -> SpooledMessage:
+    return SpooledMessage(
+        message_sid=sid, client_id="demo", from_number="+5491100000000",
+        to_number="+14155238886", body="hola"
+    )
+
+
+def row(spool: MessageSpool, sid: str):
+    conn = sqlite3.connect(str(spool.path))
+    try:
+        return conn.execute(
+            "SELECT status, attempts, error FROM inbound_messages WHERE message_sid = ?", (sid,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+async def wait_until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_transient_failure_is_retried_until_done(spool):
+    calls = []
+
+    async def handler(spooled: SpooledMessage):
+        calls.append(spooled.attempts)
+        if len(calls) < 3:
+            raise RuntimeError("LLM unavailable")
+
+    pool = SpoolWorkerPool(spool, handler, workers=1, max_attempts=3, retry_base_seconds=0.01)
+    await pool.start()
+    await pool.submit(message("SM1"))
+
+    await wait_until(lambda: pool.stats()["processed"] == 1)
+    await pool.stop(timeout=1)
+
+    assert calls == [1, 2, 3]
+    assert row(spool, "SM1")[:2] == (STATUS_DONE, 3)
+    assert pool.stats()["retried"] == 2
+    assert pool.stats()["dead"] == 0
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts(spool):
+    calls = 0
+
+    async def handler(spooled: SpooledMessage):
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("poison")
+
+    pool = SpoolWorkerPool(spool, handler, workers=2, max_attempts=2, retry_base_seconds=0.01)
+    await pool.start()
+    await pool.submit(message("SM1"))
+
+    await wait_until(lambda: pool.stats()["dead"] == 1)
+    await pool.stop(timeout=1)
+
+    assert calls == 2
+    assert row(spool, "SM1") == (STATUS_FAILED, 2, "poison")
+    assert await spool.count(STATUS_FAILED) == 1
+
+
+@pytest.mark.asyncio
+async def test_backoff_grows_and_is_capped(spool):
+    pool = SpoolWorkerPool(spool, None, retry_base_seconds=1.0, retry_max_seconds=4.0)
+
+    for attempts, ceiling in ((1, 1.0), (2, 2.0), (3, 4.0), (10, 4.0)):
+        delay = pool.backoff(attempts)
+        assert ceiling / 2 <= delay <= ceiling
+
+
+@pytest.mark.asyncio
+async def test_startup_kills_messages_interrupted_on_every_attempt(spool):
+    # Un mensaje que tiró abajo el proceso en cada intento quedó en processing
+    crashed, fresh = message("SM-crash"), message("SM-fresh")
+    await spool.enqueue(crashed)
+    await spool.enqueue(fresh)
+    for _ in range(3):
+        await spool.mark_processing(crashed.id)
+    assert row(spool, "SM-crash")[:2] == (STATUS_PROCESSING, 3)
+
+    handled = []
+
+    async def handler(spooled: SpooledMessage):
+        handled.append(spooled.message_sid)
+
+    pool = SpoolWorkerPool(spool, handler, workers=1, max_attempts=3)
+    await pool.start()
+    await wait_until(lambda: pool.stats()["processed"] == 1)
+    await pool.stop(timeout=1)
+
+    assert handled == ["SM-fresh"]
+    assert row(spool, "SM-crash")[0] == STATUS_FAILED
+    assert pool.stats()["dead"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pending_retry_is_resumed_after_stop(spool):
+    async def failing(spooled: SpooledMessage):
+        raise RuntimeError("twilio down")
+
+    pool = SpoolWorkerPool(spool, failing, workers=1, max_attempts=3, retry_base_seconds=60)
+    await pool.start()
+    await pool.submit(message("SM1"))
+    await wait_until(lambda: pool.stats()["retry_scheduled"] == 1)
+    await pool.stop(timeout=1)
+
+    assert row(spool, "SM1") == (STATUS_PENDING, 1, "twilio down")
+
+    handled = []
+
+    async def handler(spooled: SpooledMessage):
+        handled.append((spooled.message_sid, spooled.attempts))
+
+    restarted = SpoolWorkerPool(spool, handler, workers=1, max_attempts=3)
+    await restarted.start()
+    await wait_until(lambda: restarted.stats()["processed"] == 1)
+    await restarted.stop(timeout=1)
+
+    assert handled == [("SM1", 2)]
+
+
+@pytest.mark.asyncio
+async def test_purge_removes_dead_messages(spool):
+    dead = message("SM1")
+    await spool.enqueue(dead)
+    await spool.mark_failed(dead.id, "poison")
+
+    assert await spool.purge_finished(older_than_seconds=-1) == 1
+    assert await spool.count(STATUS_FAILED) == 0
@@ -0,0 +1,236 @@
+"""
+Tests de POST /webhook/status: firma de Twilio, errores y escritura en lote.
+"""
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+
+from src.api.routes import webhook
+from src.domain.services.delivery_status import DeliveryStatusBuffer
+from src.infrastructure.database.repositories.delivery_repository import DeliveryRepository
+from src.integrations import twilio_client
+from src.integrations.twilio_client import compute_signature
+
+AUTH_TOKEN = "secret-token"
+SENDER = "whatsapp:+14155238886"
+REQUEST_URL = "http://test/webhook/status"
+
+
+def sid(n: int) -> str:
+    return f"SM{n:032x}"
+
+
+class FakeConfigManager:
+    """Lo que status_webhook usa de ConfigManager"""
+
+    def __init__(self, client_config):
+        self.client_config = client_config
+
+    def resolve_client_id(self, number: str) -> Optional[str]:
+        return self.client_config.client_id if number == SENDER else None
+
+    def get_client_config(self, client_id: str):
+        return self.client_config
+
+
+class StatusApp:
+    """App con el router del webhook, un ConfigManager falso y un buffer propio"""
+
+    def __init__(self, buffer: DeliveryStatusBuffer):
+        self.buffer = buffer
+        app = FastAPI()
+        app.include_router(webhook.router)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    async def post(self, params: Dict[str, str], url: str = REQUEST_URL,
+                   token: str = AUTH_TOKEN, signature: Optional[str] = None) -> httpx.Response:
+        if signature is None:
+            signature = compute_signature(token, url, {k: [v] for k, v in params.items()})
+        return await self.client.post(
+            "/webhook/status",
+            content=urlencode(params),
+            headers={
+                "content-type": "application/x-www-form-urlencoded",
+                "X-Twilio-Signature": signature,
+            },
+        )
+
+
+def callback(message_sid: str, status: str, **extra) -> Dict[str, str]:
+    return {
+        "MessageSid": message_sid,
+        "MessageStatus": status,
+        "From": SENDER,
+        "To": "whatsapp:+5491100000000",
+        "AccountSid": "AC" + "0" * 32,
+        **extra,
+    }
+
+
+@pytest_asyncio.fixture
+async def status_app(monkeypatch, database_url, make_client_config):
+    monkeypatch.setenv("TWILIO_AUTH_TOKEN_TEST_CLIENT", AUTH_TOKEN)
+    monkeypatch.delenv("TWILIO_STATUS_CALLBACK_URL", raising=False)
+    monkeypatch.setattr(twilio_client, "_async_clients", {})
+
+    client_config = make_client_config(database_url=database_url)
+    monkeypatch.setattr(webhook, "get_config_manager", lambda: FakeConfigManager(client_config))
+
+    buffer = DeliveryStatusBuffer(database_url, batch_size=100, flush_interval=60, max_pending=10)
+    monkeypatch.setattr(webhook, "get_delivery_status_buffer", lambda: buffer)
+
+    app = StatusApp(buffer)
+    yield app
+    await app.client.aclose()
+    await buffer.close()
+
+
+def test_compute_signature_matches_twilio_sdk():
+    from twilio.request_validator import RequestValidator
+
+    url = "https://mycompany.com/myapp.php?foo=1&bar=2"
+    params = {
+        "CallSid": "CA1234567890ABCDE",
+        "Caller": "+12349013030",
+        "Digits": "1234",
+        "From": "+12349013030",
+        "To": "+18005551212",
+    }
+
+    signature = compute_signature("12345", url, {k: [v] for k, v in params.items()})
+
+    assert signature == RequestValidator("12345").compute_signature(url, params)
+
+
+@pytest.mark.asyncio
+async def test_signed_callback_is_accepted(status_app):
+    response = await status_app.post(callback(sid(1), "delivered"))
+
+    assert response.status_code == 204
+    assert status_app.buffer.stats()["accepted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalid_or_missing_signature_is_rejected(status_app):
+    forged = await status_app.post(callback(sid(1), "delivered"), token="other-token")
+    missing = await status_app.post(callback(sid(2), "delivered"), signature="")
+
+    assert forged.status_code == 403
+    assert missing.status_code == 403
+    assert status_app.buffer.stats()["accepted"] == 0
+
+
+@pytest.mark.asyncio
+async def test_tampered_params_are_rejected(status_app):
+    params = callback(sid(1), "sent")
+    signature = compute_signature(AUTH_TOKEN, REQUEST_URL, {k: [v] for k, v in params.items()})
+
+    response = await status_app.post({**params, "MessageStatus": "read"}, signature=signature)
+
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_signature_uses_configured_callback_url(status_app, monkeypatch):
+    public_url = "https://bot.example.com/webhook/status"
+    monkeypatch.setenv("TWILIO_STATUS_CALLBACK_URL", public_url)
+    monkeypatch.setattr(twilio_client, "_async_clients", {})
+
+    # Detrás de un proxy la URL del request no es la que firmó Twilio
+    assert (await status_app.post(callback(sid(1), "sent"), url=public_url)).status_code == 204
+    assert (await status_app.post(callback(sid(2), "sent"), url=REQUEST_URL)).status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_blank_params_are_part_of_the_signature(status_app):
+    response = await status_app.post(callback(sid(1), "sent", ErrorCode=""))
+
+    assert response.status_code == 204
+
+
+@pytest.mark.asyncio
+async def test_unknown_sender_is_404(status_app):
+    response = await status_app.post({**callback(sid(1), "sent"), "From": "whatsapp:+10000000000"})
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_invalid_fields_are_400(status_app):
+    assert (await status_app.post(callback("SM123", "sent"))).status_code == 400
+    assert (await status_app.post(callback(sid(1), "bogus"))).status_code == 400
+    assert (await status_app.post(callback(sid(1), "failed", ErrorCode="x1"))).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_body_over_the_limit_is_413(status_app, monkeypatch):
+    monkeypatch.setattr(webhook.settings, "webhook_max_body_bytes", 512)
+    oversized = callback(sid(1), "sent", Padding="x" * 1024)
+
+    assert (await status_app.post(oversized)).status_code == 413
+
+    # Sin Content-Length (chunked) se corta al leer
+    async def chunks():
+        for _ in range(8):
+            yield b"Padding=" + b"x" * 100 + b"&"
+
+    response = await status_app.client.post(
+        "/webhook/status",
+        content=chunks(),
+        headers={"content-type": "application/x-www-form-urlencoded"},
+    )
+    assert response.status_code == 413
+    assert "content-length" not in response.request.headers
+
+    assert (await status_app.post(callback(sid(2), "sent"))).status_code == 204
+    assert status_app.buffer.stats()["accepted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_is_503(status_app):
+    for n in range(status_app.buffer.max_pending):
+        assert (await status_app.post(callback(sid(n), "sent"))).status_code == 204
+
+    response = await status_app.post(callback(sid(99), "sent"))
+
+    assert response.status_code == 503
+    assert status_app.buffer.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_callbacks_are_written_in_a_single_batched_upsert(status_app, database_url):
+    for status in ("queued", "sent", "delivered", "read"):
+        assert (await status_app.post(callback(sid(1), status))).status_code == 204
+    for status in ("sent", "failed"):
+        extra = {"ErrorCode": "63016"} if status == "failed" else {}
+        assert (await status_app.post(callback(sid(2), status, **extra))).status_code == 204
+    # Fuera de orden: un 'sent' tardío no hace retroceder un 'delivered'
+    assert (await status_app.post(callback(sid(3), "delivered"))).status_code == 204
+    assert (await status_app.post(callback(sid(3), "sent"))).status_code == 204
+
+    # Una fila pendiente por mensaje, nada escrito todavía
+    assert status_app.buffer.stats()["pending"] == 3
+    await status_app.buffer.flush()
+
+    stats = status_app.buffer.stats()
+    assert stats["flushes"] == 1
+    assert stats["written"] == 3
+
+    repository = DeliveryRepository(database_url)
+    first = await repository.get("test_client", sid(1))
+    assert first["status"] == "read"
+    assert first["sent_at"] is not None and first["read_at"] is not None
+    second = await repository.get("test_client", sid(2))
+    assert (second["status"], second["error_code"]) == ("failed", "63016")
+    third = await repository.get("test_client", sid(3))
+    assert third["status"] == "delivered"
+    assert third["sent_at"] is not None
+
+    # Un segundo lote actualiza las filas existentes (upsert)
+    assert (await status_app.post(callback(sid(3), "read"))).status_code == 204
+    await status_app.buffer.flush()
+    assert (await repository.get("test_client", sid(3)))["status"] == "read"
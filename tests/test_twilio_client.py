@@ -0,0 +1,172 @@
+"""
+Tests de AsyncTwilioClient contra un endpoint Messages.json falso.
+"""
+from urllib.parse import parse_qs
+import base64
+
+import httpx
+import pytest
+
+from src.core.exceptions import TwilioError
+from src.integrations.twilio_client import DEFAULT_RETRY_AFTER_SECONDS, AsyncTwilioClient
+
+BASE_URL = "http://twilio.test"
+ACCOUNT_SID = "AC" + "0" * 32
+MESSAGE_SID = "SM" + "a" * 32
+
+
+@pytest.fixture
+def twilio_env(monkeypatch):
+    monkeypatch.setenv("TWILIO_ACCOUNT_SID_TEST_CLIENT", ACCOUNT_SID)
+    monkeypatch.setenv("TWILIO_AUTH_TOKEN_TEST_CLIENT", "secret-token")
+    monkeypatch.setenv("TWILIO_WHATSAPP_NUMBER_TEST_CLIENT", "+14155238886")
+    monkeypatch.delenv("TWILIO_STATUS_CALLBACK_URL", raising=False)
+    return monkeypatch
+
+
+def form(request: httpx.Request) -> dict:
+    return {key: values[0] for key, values in parse_qs(request.content.decode()).items()}
+
+
+@pytest.mark.asyncio
+async def test_send_posts_form_and_returns_sid(mock_http, twilio_env):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(201, json={"sid": MESSAGE_SID, "status": "queued"})
+
+    mock_http("twilio", handler)
+    client = AsyncTwilioClient("test_client", base_url=BASE_URL)
+
+    assert await client.send("+5491100000000", "hola") == MESSAGE_SID
+
+    request = requests[0]
+    assert request.method == "POST"
+    assert str(request.url) == f"{BASE_URL}/2010-04-01/Accounts/{ACCOUNT_SID}/Messages.json"
+    expected_auth = base64.b64encode(f"{ACCOUNT_SID}:secret-token".encode()).decode()
+    assert request.headers["authorization"] == f"Basic {expected_auth}"
+    assert form(request) == {
+        "Body": "hola",
+        "From": "whatsapp:+14155238886",
+        "To": "whatsapp:+5491100000000",
+    }
+
+
+@pytest.mark.asyncio
+async def test_status_callback_sent_when_configured(mock_http, twilio_env):
+    twilio_env.setenv("TWILIO_STATUS_CALLBACK_URL", "https://bot.test/webhook/status")
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(201, json={"sid": MESSAGE_SID})
+
+    mock_http("twilio", handler)
+    client = AsyncTwilioClient("test_client", base_url=BASE_URL)
+
+    await client.send("+5491100000000", "hola")
+
+    assert form(requests[0])["StatusCallback"] == "https://bot.test/webhook/status"
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_is_retryable_with_retry_after(mock_http, twilio_env):
+    mock_http("twilio", lambda request: httpx.Response(
+        429, json={"code": 20429, "message": "Too Many Requests"}, headers={"Retry-After": "7"}
+    ))
+    client = AsyncTwilioClient("test_client", base_url=BASE_URL)
+
+    with pytest.raises(TwilioError) as raised:
+        await client.send("+5491100000000", "hola")
+
+    assert raised.value.retryable is True
+    assert raised.value.retry_after == 7.0
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_without_header_uses_default_wait(mock_http, twilio_env):
+    mock_http("twilio", lambda request: httpx.Response(429, json={"code": 20429}))
+    client = AsyncTwilioClient("test_client", base_url=BASE_URL)
+
+    with pytest.raises(TwilioError) as raised:
+        await client.send("+5491100000000", "hola")
+
+    assert raised.value.retry_after == DEFAULT_RETRY_AFTER_SECONDS
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status_code", [500, 503])
+async def test_server_errors_are_retryable(mock_http, twilio_env, status_code):
+    mock_http("twilio", lambda request: httpx.Response(status_code, text="unavailable"))
+    client = AsyncTwilioClient("test_client", base_url=BASE_URL)
+
+    with pytest.raises(TwilioError) as raised:
+        await client.send("+5491100000000", "hola")
+
+    assert raised.value.retryable is True
+    assert raised.value.retry_after is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status_code", [400, 401, 404])
+async def test_client_errors_are_not_retryable(mock_http, twilio_env, status_code):
+    mock_http("twilio", lambda request: httpx.Response(
+        status_code, json={"code": 21211, "message": "Invalid 'To' Phone Number"}
+    ))
+    client = AsyncTwilioClient("test_client", base_url=BASE_URL)
+
+    with pytest.raises(TwilioError) as raised:
+        await client.send("+5491100000000", "hola")
+
+    assert raised.value.retryable is False
+    assert "21211" in raised.value.message
+
+
+@pytest.mark.asyncio
+async def test_connect_error_is_retryable(mock_http, twilio_env):
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    mock_http("twilio", handler)
+    client = AsyncTwilioClient("test_client", base_url=BASE_URL)
+
+    with pytest.raises(TwilioError) as raised:
+        await client.send("+5491100000000", "hola")
+
+    assert raised.value.retryable is True
+
+
+@pytest.mark.asyncio
+async def test_read_timeout_is_not_retryable(mock_http, twilio_env):
+    # El request pudo haber llegado: reintentarlo duplicaría el mensaje
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    mock_http("twilio", handler)
+    client = AsyncTwilioClient("test_client", base_url=BASE_URL)
+
+    with pytest.raises(TwilioError) as raised:
+        await client.send("+5491100000000", "hola")
+
+    assert raised.value.retryable is False
+
+
+@pytest.mark.asyncio
+async def test_send_message_returns_none_on_failure(mock_http, twilio_env):
+    mock_http("twilio", lambda request: httpx.Response(500, text="boom"))
+    client = AsyncTwilioClient("test_client", base_url=BASE_URL)
+
+    assert await client.send_message("+5491100000000", "hola") is None
+
+
+@pytest.mark.asyncio
+async def test_not_configured_raises(monkeypatch):
+    for name in ("ACCOUNT_SID", "AUTH_TOKEN", "WHATSAPP_NUMBER"):
+        monkeypatch.delenv(f"TWILIO_{name}_MISSING_CLIENT", raising=False)
+    client = AsyncTwilioClient("missing_client", base_url=BASE_URL)
+
+    assert not client.is_configured()
+    with pytest.raises(TwilioError):
+        await client.send("+5491100000000", "hola")
+    assert await client.send_message("+5491100000000", "hola") is None
@@ -0,0 +1,146 @@
+"""
+Tests del índice vectorial: cuantización, build/open y orden de resultados.
+"""
+import numpy as np
+import pytest
+
+from src.infrastructure.ai.embeddings import HashEmbedder, normalize_rows
+from src.infrastructure.ai.vector_index import VectorIndex, build_vector_index, quantize
+
+TEXTS = [
+    "Abrimos de martes a domingo de 20 a 24",
+    "La pizza napolitana lleva tomate, mozzarella y ajo",
+    "Hacemos envíos a domicilio en todo Palermo",
+    "Aceptamos efectivo, débito y Mercado Pago",
+    "Las reservas para más de 8 personas se hacen por teléfono",
+    "El menú del día incluye entrada, plato y postre",
+]
+
+
+def corpus(n: int = 500, dim: int = 32, seed: int = 3) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return normalize_rows(rng.standard_normal((n, dim), dtype=np.float32))
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(normalize_rows(queries) @ vectors.T), axis=1, kind="stable")[:, :k]
+
+
+@pytest.fixture(params=["dequantized", "int8"])
+def open_index(request):
+    opened = []
+
+    def open_(path):
+        index = VectorIndex.open(path, dequantize_max_bytes=0 if request.param == "int8" else 1 << 30)
+        assert index.dequantized is (request.param == "dequantized")
+        opened.append(index)
+        return index
+
+    yield open_
+    for index in opened:
+        index.close()
+
+
+def test_quantize_reconstructs_within_half_a_step():
+    vectors = corpus()
+
+    codes, scales = quantize(vectors)
+
+    assert codes.dtype == np.int8 and scales.dtype == np.float32
+    assert np.abs(codes).max(axis=1).tolist() == [127] * len(vectors)
+    error = np.abs(codes * scales[:, None] - vectors)
+    assert (error <= scales[:, None] / 2 + 1e-6).all()
+
+
+def test_quantize_handles_zero_rows():
+    codes, scales = quantize(np.zeros((2, 4), dtype=np.float32))
+
+    assert not codes.any()
+    assert np.isfinite(scales).all()
+
+
+def test_build_and_open_round_trip(tmp_path, open_index):
+    embedder = HashEmbedder(dim=64)
+    vectors = embedder.embed_sync(TEXTS)
+    path = tmp_path / "kb.vec"
+
+    assert build_vector_index(vectors, TEXTS, path, embedder.name) == len(TEXTS)
+    index = open_index(path)
+
+    assert (len(index), index.dim, index.n_lists) == (len(TEXTS), 64, 0)
+    assert index.embedder_name == embedder.name
+    assert [index.passage(i) for i in range(len(TEXTS))] == TEXTS
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_build_rejects_mismatched_texts(tmp_path):
+    with pytest.raises(ValueError):
+        build_vector_index(corpus(3), ["uno", "dos"], tmp_path / "kb.vec", "hash")
+
+
+def test_open_rejects_other_files(tmp_path):
+    path = tmp_path / "kb.vec"
+    path.write_bytes(b"\0" * 256)
+
+    with pytest.raises(ValueError, match="Not a vector index"):
+        VectorIndex.open(path)
+
+
+def test_flat_search_is_ordered_and_matches_exact_search(tmp_path, open_index):
+    vectors = corpus()
+    build_vector_index(vectors, [str(i) for i in range(len(vectors))], tmp_path / "kb.vec", "test")
+    index = open_index(tmp_path / "kb.vec")
+    queries = vectors[:20] + 0.05 * corpus(20, seed=9)
+
+    doc_ids, scores = index.search(queries, k=5)
+
+    assert (np.diff(scores, axis=1) <= 0).all()
+    # El error de int8 no cambia el primero; el resto casi siempre coincide
+    expected = exact_top_k(vectors, queries, 5)
+    assert (doc_ids[:, 0] == expected[:, 0]).all()
+    assert np.mean([len(set(a) & set(b)) / 5 for a, b in zip(doc_ids, expected)]) >= 0.9
+    exact_scores = np.take_along_axis(normalize_rows(queries) @ vectors.T, doc_ids, axis=1)
+    assert scores == pytest.approx(exact_scores, abs=0.02)
+
+
+def test_search_one_returns_the_matching_passage(tmp_path, open_index):
+    embedder = HashEmbedder(dim=128)
+    build_vector_index(embedder.embed_sync(TEXTS), TEXTS, tmp_path / "kb.vec", embedder.name)
+    index = open_index(tmp_path / "kb.vec")
+
+    hits = index.search_one(embedder.embed_sync(["¿hacen envíos a domicilio?"])[0], k=3)
+
+    assert hits[0].text == TEXTS[2]
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+
+
+def test_fewer_results_than_k_are_padded(tmp_path, open_index):
+    build_vector_index(corpus(3), ["a", "b", "c"], tmp_path / "kb.vec", "test")
+    index = open_index(tmp_path / "kb.vec")
+
+    doc_ids, scores = index.search(corpus(1, seed=5), k=5)
+
+    assert sorted(doc_ids[0, :3].tolist()) == [0, 1, 2]
+    assert doc_ids[0, 3:].tolist() == [-1, -1]
+    assert np.isneginf(scores[0, 3:]).all()
+
+
+def test_ivf_with_all_lists_probed_equals_flat(tmp_path, open_index):
+    vectors = corpus()
+    texts = [str(i) for i in range(len(vectors))]
+    build_vector_index(vectors, texts, tmp_path / "flat.vec", "test")
+    build_vector_index(vectors, texts, tmp_path / "ivf.vec", "test", n_lists=8)
+    flat, ivf = open_index(tmp_path / "flat.vec"), open_index(tmp_path / "ivf.vec")
+    queries = corpus(10, seed=11)
+
+    flat_ids, flat_scores = flat.search(queries, k=5)
+    ivf_ids, ivf_scores = ivf.search(queries, k=5, n_probe=None)
+    # Con n_probe acotado cada consulta recorre sólo sus listas
+    probed_ids, _ = ivf.search(queries, k=5, n_probe=2)
+
+    assert (ivf_ids == flat_ids).all()
+    assert ivf_scores == pytest.approx(flat_scores)
+    assert ((probed_ids >= 0) & (probed_ids < len(vectors))).all()
+    # La consulta igual a un vector siempre encuentra ese vector en su lista
+    own_ids, _ = ivf.search(vectors[:10], k=1, n_probe=1)
+    assert own_ids[:, 0].tolist() == list(range(10))